@@ -57,6 +57,40 @@ local function log_test_result(test_name, success, message, details)
   })
 end
 
+-- Call fn, raising an error inside it once it has used `timeout` seconds of
+-- CPU time; returns what pcall returns. The error comes from a VM hook, so it
+-- surfaces through the caller's own pcall. Line coverage and the CPU profiler
+-- hook the VM too: when one of them is active the deadline is checked from
+-- their hook, which is called on as a tail call (so it still sees the script's
+-- stack levels) and is put back afterwards.
+local function call_with_timeout(fn, timeout)
+  local deadline = os.clock() + timeout
+  local hook, mask, count = debug.gethook()
+  local function expired()
+    debug.sethook(hook, mask, count)
+    return string.format("timed out after %s seconds (TestConfig.test_timeout)", timeout)
+  end
+  if hook then
+    local events = 0
+    debug.sethook(function(...)
+      events = events + 1
+      if events % 1000 == 0 and os.clock() > deadline then
+        error(expired(), 2)
+      end
+      return hook(...)
+    end, mask, count)
+  else
+    debug.sethook(function()
+      if os.clock() > deadline then
+        error(expired(), 2)
+      end
+    end, "", 1000000)
+  end
+  local results = table.pack(pcall(fn))
+  debug.sethook(hook, mask, count)
+  return table.unpack(results, 1, results.n)
+end
+
 -- ==================== INDIVIDUAL TESTS ====================
 
 local function test_environment_initialization()
@@ -640,15 +674,17 @@ local function test_enhanced_reaper_api_functions()
     assert(type(marker_id) == "number", "AddProjectMarker should return marker ID")
     
     local found, isrgn, pos, rgnend, name, markrgnindexnumber = reaper.EnumProjectMarkers(0)
-    assert(found == true, "EnumProjectMarkers should find first marker")
+    assert(found == 1, "EnumProjectMarkers should return the next index for the first marker")
     assert(type(pos) == "number", "Marker position should be number")
     
     -- Test MIDI functions
-    local retval = reaper.MIDI_InsertNote(nil, false, false, 0, 480, 0, 60, 100, false)
+    local midi_item = reaper.CreateNewMIDIItemInProj(reaper.GetTrack(0, 0), 0, 2)
+    local midi_take = reaper.GetActiveTake(midi_item)
+    local retval = reaper.MIDI_InsertNote(midi_take, false, false, 0, 480, 0, 60, 100, false)
     assert(retval == true, "MIDI_InsertNote should return true")
     
-    local notes, ccs, sysex = reaper.MIDI_CountEvts(nil)
-    assert(type(notes) == "number", "MIDI_CountEvts should return numbers")
+    local _, notes, ccs, sysex = reaper.MIDI_CountEvts(midi_take)
+    assert(notes == 1, "MIDI_CountEvts should count the inserted note")
     
     -- Test undo functions
     reaper.Undo_BeginBlock()
@@ -665,6 +701,1393 @@ local function test_enhanced_reaper_api_functions()
   return success
 end
 
+local function test_ext_state_persistence()
+  local test_name = "ExtState Persistence and Write Batching"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    local ini_path = os.tmpname()
+    os.remove(ini_path)
+    
+    VirtualReaper.set_ext_state_file(ini_path)
+    VirtualReaper.set_ext_state_flush_interval(30)
+    local stats = VirtualReaper.get_statistics()
+    local flushes_before = stats.ext_state_flushes
+    
+    -- A UI script saving its window state on every frame
+    local frames = 0
+    local function loop()
+      frames = frames + 1
+      reaper.SetExtState("songbase_ui", "scroll", tostring(frames), true)
+      reaper.SetExtState("songbase_ui", "tab", "browser", true)
+      reaper.SetExtState("songbase_ui", "hover", tostring(frames), false)
+      if frames < 600 then reaper.defer(loop) end
+    end
+    loop()
+    VirtualReaper.shutdown()
+    
+    local writes = stats.ext_state_flushes - flushes_before
+    print(string.format("   %d SetExtState calls -> %d ini writes", frames * 3, writes))
+    assert(writes > 0, "Persistent ExtState was never written")
+    assert(writes <= 600 / 30 + 1, "ExtState writes were not batched: " .. writes)
+    assert(reaper.GetExtState("songbase_ui", "hover") == "600", "Non-persistent value not readable")
+    assert(reaper.HasExtState("songbase_ui", "scroll"), "HasExtState should find persisted key")
+    
+    -- Reload from disk: only persistent values survive
+    VirtualReaper.set_ext_state_file(ini_path)
+    assert(reaper.GetExtState("songbase_ui", "scroll") == "600", "Persisted value not reloaded")
+    assert(reaper.GetExtState("songbase_ui", "hover") == "", "Non-persistent value survived reload")
+    assert(reaper.GetExtState("songbase_ui", "tab") == "browser", "Persisted value not reloaded")
+    
+    -- Newlines, backslashes and "=" in keys survive the ini file
+    local ui_state = '{"a":1}\n{"b":2}\r\nC:\\new\\ = done\\'
+    reaper.SetExtState("songbase_ui", "layout", ui_state, true)
+    reaper.SetExtState("songbase_ui", "k=v", "x=y", true)
+    reaper.SetExtState("songbase_ui", "multi\nline\\key", "1", true)
+    VirtualReaper.flush_ext_state()
+    VirtualReaper.set_ext_state_file(ini_path)
+    assert(reaper.GetExtState("songbase_ui", "layout") == ui_state, "Multi-line value not reloaded whole")
+    assert(reaper.GetExtState("songbase_ui", "k=v") == "x=y", "Key containing '=' not reloaded")
+    assert(reaper.GetExtState("songbase_ui", "multi\nline\\key") == "1", "Escaped key not reloaded")
+    assert(reaper.GetExtState("songbase_ui", "scroll") == "600", "Escaping disturbed other keys")
+    
+    reaper.DeleteExtState("songbase_ui", "tab", true)
+    VirtualReaper.flush_ext_state()
+    VirtualReaper.set_ext_state_file(ini_path)
+    assert(reaper.HasExtState("songbase_ui", "scroll"), "Unrelated key lost on delete")
+    
+    -- Project ext state
+    reaper.SetProjExtState(0, "songbase", "current_song", "song1.jcrd")
+    local len, value = reaper.GetProjExtState(0, "songbase", "current_song")
+    assert(value == "song1.jcrd" and len == #value, "Project ext state not stored")
+    local found, key = reaper.EnumProjExtState(0, "songbase", 0)
+    assert(found and key == "current_song", "EnumProjExtState should list keys")
+    reaper.SetProjExtState(0, "songbase", "", "")
+    local _, cleared = reaper.GetProjExtState(0, "songbase", "current_song")
+    assert(cleared == "", "Empty key should clear the section")
+    
+    VirtualReaper.set_ext_state_file(nil)
+    os.remove(ini_path)
+    return true
+  end)
+  
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_project_model()
+  local test_name = "Project Model (Tracks, Items, Takes)"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    -- Handles are stable and indexes follow inserts/deletes
+    local first = reaper.GetTrack(0, 0)
+    local base_count = reaper.GetNumTracks()
+    reaper.InsertTrackAtIndex(0, true)
+    assert(reaper.GetNumTracks() == base_count + 1, "InsertTrackAtIndex should add a track")
+    assert(reaper.GetTrack(0, 1) == first, "Existing track handle should shift, not change")
+    assert(reaper.GetMediaTrackInfo_Value(first, "IP_TRACKNUMBER") == 2, "Track number not updated")
+    reaper.DeleteTrack(reaper.GetTrack(0, 0))
+    assert(reaper.GetTrack(0, 0) == first, "DeleteTrack should shift later tracks up")
+    assert(reaper.GetNumTracks() == base_count, "DeleteTrack should remove the track")
+    
+    -- Items come back in timeline order, per track and project-wide
+    local track = reaper.GetTrack(0, 7)
+    local late = reaper.AddMediaItemToTrack(track)
+    reaper.SetMediaItemPosition(late, 50.0, false)
+    local early = reaper.AddMediaItemToTrack(track)
+    reaper.SetMediaItemPosition(early, 5.0, false)
+    assert(reaper.GetTrackMediaItem(track, 0) == early, "Track items should be sorted by position")
+    local total = reaper.CountMediaItems(0)
+    assert(reaper.GetMediaItem(0, total - 1) == late, "Project items should be ordered by track")
+    assert(reaper.GetMediaItem_Track(late) == track, "Item should know its track")
+    
+    local take = reaper.AddTakeToMediaItem(late)
+    reaper.GetSetMediaItemTakeInfo_String(take, "P_NAME", "Verse take", true)
+    assert(reaper.GetActiveTake(late) == take, "First take should become active")
+    assert(reaper.GetTakeName(take) == "Verse take", "Take name not stored")
+    assert(reaper.GetMediaItemTake_Item(take) == late, "Take should know its item")
+    
+    reaper.DeleteTrack(track)
+    assert(reaper.CountMediaItems(0) == total - 2, "Deleting a track should delete its items")
+    assert(not reaper.ValidatePtr(late, "MediaItem*"), "Deleted item handle should be invalid")
+    
+    -- Scale: 10,000 tracks and 100,000 items
+    local start_time = os.clock()
+    for i = 1, 10000 do
+      reaper.InsertTrackAtIndex(reaper.GetNumTracks(), false)
+    end
+    local num_tracks = reaper.GetNumTracks()
+    for i = 0, 99999 do
+      local item = reaper.AddMediaItemToTrack(reaper.GetTrack(0, i % num_tracks))
+      reaper.SetMediaItemInfo_Value(item, "D_POSITION", (i % 977) * 1.5)
+    end
+    local sum = 0
+    for i = 0, reaper.CountMediaItems(0) - 1 do
+      sum = sum + reaper.GetMediaItemInfo_Value(reaper.GetMediaItem(0, i), "D_LENGTH")
+    end
+    local duration = os.clock() - start_time
+    print(string.format("   10k tracks + 100k items created and iterated in %.3f seconds", duration))
+    assert(reaper.CountMediaItems(0) >= 100000, "Items missing after bulk insert")
+    assert(duration < 20.0, "Project model too slow: " .. duration .. " seconds")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_midi_storage()
+  local test_name = "MIDI Storage (Sorted Events, Bulk Buffers)"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local item = reaper.CreateNewMIDIItemInProj(reaper.GetTrack(0, 0), 0, 8)
+    local take = reaper.GetActiveTake(item)
+    assert(reaper.TakeIsMIDI(take), "CreateNewMIDIItemInProj should create a MIDI take")
+    
+    -- Sorted inserts keep notes in PPQ order
+    reaper.MIDI_InsertNote(take, false, false, 960, 1920, 0, 64, 90, false)
+    reaper.MIDI_InsertNote(take, true, false, 0, 480, 0, 60, 100, false)
+    reaper.MIDI_InsertNote(take, false, false, 480, 960, 1, 62, 80, false)
+    local _, _, _, first_start, _, _, first_pitch = reaper.MIDI_GetNote(take, 0)
+    assert(first_start == 0 and first_pitch == 60, "Notes should be sorted by start")
+    assert(reaper.MIDI_EnumSelNotes(take, -1) == 0, "MIDI_EnumSelNotes should find the selected note")
+    assert(VirtualReaper.midi_find_note(take, 700) == 2, "midi_find_note should binary-search by PPQ")
+    
+    -- noSort defers ordering until MIDI_Sort
+    reaper.MIDI_InsertNote(take, false, false, 100, 200, 0, 72, 100, true)
+    local _, _, _, last_start = reaper.MIDI_GetNote(take, 3)
+    assert(last_start == 100, "noSort insert should append")
+    reaper.MIDI_Sort(take)
+    local _, _, _, second_start = reaper.MIDI_GetNote(take, 1)
+    assert(second_start == 100, "MIDI_Sort should reorder deferred inserts")
+    
+    reaper.MIDI_InsertCC(take, false, false, 240, 0xB0, 0, 7, 100)
+    reaper.MIDI_InsertTextSysexEvt(take, false, false, 0, 3, "Lead")
+    
+    -- GetAllEvts/SetAllEvts round-trip through the packed buffer
+    local ok, buf = reaper.MIDI_GetAllEvts(take)
+    assert(ok and #buf > 0, "MIDI_GetAllEvts should return a buffer")
+    local copy = reaper.GetActiveTake(reaper.CreateNewMIDIItemInProj(reaper.GetTrack(0, 1), 0, 8))
+    assert(reaper.MIDI_SetAllEvts(copy, buf), "MIDI_SetAllEvts should accept the buffer")
+    local _, notes, ccs, texts = reaper.MIDI_CountEvts(copy)
+    assert(notes == 4 and ccs == 1 and texts == 1, "Round-trip lost events")
+    for i = 0, notes - 1 do
+      local a = {reaper.MIDI_GetNote(take, i)}
+      local b = {reaper.MIDI_GetNote(copy, i)}
+      for k = 1, #a do assert(a[k] == b[k], "Round-trip changed note " .. i) end
+    end
+    local _, _, _, _, text_type, text = reaper.MIDI_GetTextSysexEvt(copy, 0)
+    assert(text_type == 3 and text == "Lead", "Round-trip changed text event")
+    
+    -- Bulk: 200,000 notes written with noSort, then encoded and decoded
+    local start_time = os.clock()
+    local bulk = reaper.GetActiveTake(reaper.CreateNewMIDIItemInProj(reaper.GetTrack(0, 2), 0, 600))
+    reaper.MIDI_DisableSort(bulk)
+    for i = 0, 199999 do
+      local ppq = (i * 7919) % 1000000
+      reaper.MIDI_InsertNote(bulk, false, false, ppq, ppq + 120, i % 16, 36 + i % 48, 100, true)
+    end
+    reaper.MIDI_Sort(bulk)
+    local _, bulk_buf = reaper.MIDI_GetAllEvts(bulk)
+    reaper.MIDI_SetAllEvts(bulk, bulk_buf)
+    local found = VirtualReaper.midi_find_note(bulk, 500000)
+    local duration = os.clock() - start_time
+    print(string.format("   200k notes inserted, sorted and round-tripped in %.3f seconds", duration))
+    local _, bulk_notes = reaper.MIDI_CountEvts(bulk)
+    assert(bulk_notes == 200000, "Bulk round-trip lost notes")
+    local _, _, _, found_start = reaper.MIDI_GetNote(bulk, found)
+    assert(found_start >= 500000, "midi_find_note returned an earlier note")
+    assert(duration < 30.0, "MIDI storage too slow: " .. duration .. " seconds")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_markers_and_regions()
+  local test_name = "Markers and Regions (Ordered Store, Region Lookup)"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local total, num_markers, num_regions = reaper.CountProjectMarkers(0)
+    assert(total == 3 and num_markers == 3 and num_regions == 0, "Default project should have three markers")
+    
+    -- Regions interleave with markers in position order
+    local verse = reaper.AddProjectMarker(0, true, 50.0, 90.0, "Verse region", -1)
+    local bridge = reaper.AddProjectMarker2(0, true, 70.0, 80.0, "Bridge", -1, 0x1FF0000)
+    assert(verse ~= bridge, "Region numbers should be unique")
+    local retval, isrgn, pos, rgnend, name = reaper.EnumProjectMarkers(1)
+    assert(retval == 2 and isrgn and pos == 50.0 and rgnend == 90.0, "Region should sort between markers")
+    local _, _, _, _, _, _, color = reaper.EnumProjectMarkers3(0, 3)
+    assert(color == 0x1FF0000, "EnumProjectMarkers3 should return the color")
+    assert(reaper.EnumProjectMarkers(5) == 0, "Enumeration should end after the last entry")
+    
+    -- Last marker and innermost region at a time
+    local marker_idx, region_idx = reaper.GetLastMarkerAndCurRegion(0, 75.0)
+    assert(marker_idx == 2, "Last marker before 75s should be Verse")
+    assert(region_idx == 3, "Bridge should be the current region at 75s")
+    marker_idx, region_idx = reaper.GetLastMarkerAndCurRegion(0, 85.0)
+    assert(region_idx == 1, "Verse region should be current once Bridge ends")
+    marker_idx, region_idx = reaper.GetLastMarkerAndCurRegion(0, 5.0)
+    assert(marker_idx == -1 and region_idx == -1, "Nothing should precede the first marker")
+    
+    -- Edits move entries and keep lookups current
+    assert(reaper.SetProjectMarker(bridge, true, 100.0, 110.0, ""), "SetProjectMarker should find the region")
+    local _, _, bridge_pos, _, bridge_name = reaper.EnumProjectMarkers(3)
+    assert(bridge_pos == 100.0 and bridge_name == "Bridge", "Moved region should keep its name")
+    assert(reaper.DeleteProjectMarker(0, verse, true), "DeleteProjectMarker should remove the region")
+    marker_idx, region_idx = reaper.GetLastMarkerAndCurRegion(0, 75.0)
+    assert(region_idx == -1, "Deleted region should no longer be current")
+    assert(not reaper.DeleteProjectMarker(0, verse, true), "Deleting twice should fail")
+    
+    -- Scale: 20,000 regions, then a lookup per region
+    local start_time = os.clock()
+    for i = 0, 19999 do
+      reaper.AddProjectMarker(0, true, 200.0 + i * 4.0, 200.0 + i * 4.0 + 6.0, "Section " .. i, -1)
+    end
+    local hits = 0
+    for i = 0, 19999 do
+      local _, current = reaper.GetLastMarkerAndCurRegion(0, 200.0 + i * 4.0 + 5.0)
+      if current >= 0 then hits = hits + 1 end
+    end
+    local duration = os.clock() - start_time
+    print(string.format("   20k regions added and looked up in %.3f seconds", duration))
+    assert(hits == 20000, "Every lookup should land in a region")
+    assert(duration < 20.0, "Marker store too slow: " .. duration .. " seconds")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_project_fixture_loading()
+  local test_name = "Project Fixtures (Lazy Track Loading)"
+  local fixture_path = os.tmpname()
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    -- Hand-written fixture: 300 tracks, every third one with two items;
+    -- track 1's first item carries a packed MIDI take
+    local midi = string.pack("<i4Bs4", 0, 0, "\144\60\100") .. string.pack("<i4Bs4", 960, 0, "\128\60\0")
+    local chunks, tracks, offset = {}, {}, 0
+    for t = 1, 300 do
+      local track = string.format("{name=%q,volume=0.5,items=0}", "Track " .. t)
+      if t % 3 == 1 then
+        local takes = t == 1 and string.format("{{{name=\"Piano\",midi=%q}},{{name=\"Gtr\"}}}", midi)
+                           or "{{{name=\"A\"}},{{name=\"B\"}}}"
+        local chunk = "return {count=2,position={1.0,0.5},length={2.0,1.0},mute={false,true},"
+                   .. "selected={false,false},active_take={1,1},takes=" .. takes .. "}\n"
+        chunks[#chunks + 1] = chunk
+        track = string.format("{name=%q,volume=0.5,items=2,offset=%d,size=%d}", "Track " .. t, offset, #chunk)
+        offset = offset + #chunk
+      end
+      if t == 2 then
+        track = track:sub(1, -2) .. ",fx={{name=\"ReaEQ\"},{name=\"ReaComp\",enabled=false}}}"
+      end
+      tracks[t] = track
+    end
+    local header = "return {version=1,tempo=90.0,tracks={" .. table.concat(tracks, ",")
+                .. "},markers={{isrgn=true,pos=4.0,rgnend=8.0,name=\"Chorus\",number=1}}}\n"
+    local file = assert(io.open(fixture_path, "wb"))
+    file:write("-- EnviREAment fixture v1 header=" .. #header .. "\n", header, table.concat(chunks))
+    file:close()
+    
+    VirtualReaper.reset_statistics()
+    local ok, track_count = VirtualReaper.load_fixture(fixture_path)
+    assert(ok and track_count == 300, "load_fixture should load every track header")
+    assert(reaper.CountMediaItems(0) == 200, "Item count should come from the header")
+    assert(reaper.GetTrackName(reaper.GetTrack(0, 299)) == "Track 300", "Track headers not loaded")
+    assert(reaper.CountTrackMediaItems(reaper.GetTrack(0, 3)) == 2, "Per-track count should not need the chunk")
+    assert(VirtualReaper.get_statistics().fixture_chunks_loaded == 0, "No item chunk should load up front")
+    local fx_track = reaper.GetTrack(0, 1)
+    assert(reaper.TrackFX_GetCount(fx_track) == 2, "FX chains should come from the header")
+    assert(select(2, reaper.TrackFX_GetFXName(fx_track, 1)) == "ReaComp", "FX names should be kept")
+    assert(reaper.TrackFX_GetEnabled(fx_track, 0) and not reaper.TrackFX_GetEnabled(fx_track, 1),
+           "FX enabled state should be kept")
+    
+    -- Touching a track loads only that track
+    local item = reaper.GetTrackMediaItem(reaper.GetTrack(0, 0), 0)
+    assert(reaper.GetMediaItemInfo_Value(item, "D_POSITION") == 0.5, "Fixture items should be sorted by position")
+    assert(VirtualReaper.get_statistics().fixture_chunks_loaded == 1, "Exactly one chunk should be loaded")
+    local midi_item = reaper.GetTrackMediaItem(reaper.GetTrack(0, 0), 1)
+    local take = reaper.GetActiveTake(midi_item)
+    assert(reaper.TakeIsMIDI(take), "Packed MIDI take should be a MIDI take")
+    local _, _, _, start_ppq, end_ppq, _, pitch = reaper.MIDI_GetNote(take, 0)
+    assert(start_ppq == 0 and end_ppq == 960 and pitch == 60, "Packed MIDI should decode on access")
+    
+    -- Project-wide indexing loads the tracks it walks through
+    local last = reaper.GetMediaItem(0, 199)
+    assert(reaper.GetMediaItem_Track(last) == reaper.GetTrack(0, 297), "Last item should be on the last loaded track")
+    assert(VirtualReaper.get_statistics().fixture_chunks_loaded == 2, "Only the indexed track should load")
+    local _, region = reaper.GetLastMarkerAndCurRegion(0, 5.0)
+    assert(region == 0, "Fixture markers should be loaded")
+    
+    -- A format newer than the mock is refused rather than misread
+    file = assert(io.open(fixture_path, "wb"))
+    file:write("-- EnviREAment fixture v99 header=" .. #header .. "\n", header)
+    file:close()
+    local loaded, err = VirtualReaper.load_fixture(fixture_path)
+    assert(not loaded and tostring(err):find("newer", 1, true), "Newer fixture versions should be refused")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  os.remove(fixture_path)
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+-- Test resetting the environment in place between scripts
+local function test_reset_state()
+  local test_name = "Warm Reset (reset_state)"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    -- Leave behind everything a script typically changes
+    local default_tracks = reaper.CountTracks(0)
+    reaper.SetExtState("WarmReset", "key", "value", false)
+    reaper.InsertTrackAtIndex(0, false)
+    reaper.atexit(function() error("atexit handler should not survive a reset") end)
+    local original_count = reaper.CountTracks
+    reaper.CountTracks = function() return 99 end
+    reaper.WarmResetAdded = function() end
+    
+    VirtualReaper.reset_state()
+    assert(reaper.GetExtState("WarmReset", "key") == "", "ExtState should be cleared")
+    assert(reaper.CountTracks == original_count, "Replaced API functions should be restored")
+    assert(reaper.WarmResetAdded == nil, "Added API functions should be removed")
+    assert(reaper.CountTracks(0) == default_tracks, "Project should be fresh")
+    VirtualReaper.shutdown()
+    assert(VirtualReaper.get_statistics().errors == 0, "No atexit handler should run")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_scope_balance()
+  local test_name = "Scope Balance (Begin/End, Push/Pop)"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    VirtualReaper.reset_state()
+    local ctx = reaper.ImGui_CreateContext("Balance Test")
+    local violations = VirtualReaper.get_scope_violations()
+    
+    -- Frame 1: a color pushed inside the window is never popped
+    reaper.ImGui_Begin(ctx, "Balance")
+    reaper.ImGui_PushStyleColor(ctx, 0, 0xFF0000FF); local push_line = debug.getinfo(1, "l").currentline -- envireament-lint: disable=push-pop-balance
+    reaper.ImGui_End(ctx)
+    reaper.defer(function() end)
+    assert(#violations == 1, "Unpopped color should be reported at the frame boundary")
+    assert(violations[1].frame == 1, "Violation should name the frame")
+    assert(violations[1].name == "ImGui_PushStyleColor", "Violation should name the push")
+    assert(violations[1].source:find("enhanced_test_runner.lua", 1, true), "Violation should name the file")
+    assert(violations[1].line == push_line, "Violation should name the line of the push")
+    
+    -- Frame 2: End closes the window while a child is still open
+    reaper.ImGui_Begin(ctx, "Balance")
+    reaper.ImGui_BeginChild(ctx, "child"); local child_line = debug.getinfo(1, "l").currentline
+    reaper.ImGui_End(ctx)
+    assert(#violations == 2 and violations[2].name == "ImGui_BeginChild", "Mismatched End should be reported")
+    assert(violations[2].frame == 2 and violations[2].line == child_line, "Open child should be located")
+    reaper.ImGui_PopID(ctx) -- envireament-lint: disable=push-pop-balance
+    assert(#violations == 3, "Pop without push should be reported")
+    reaper.defer(function() end)
+    
+    -- Frame 3: balanced, including closed trees and skipped combos
+    reaper.ImGui_Begin(ctx, "Balance")
+    reaper.ImGui_PushID(ctx, "row")
+    if reaper.ImGui_TreeNode(ctx, "Node", reaper.ImGui_TreeNodeFlags_DefaultOpen()) then
+      if reaper.ImGui_BeginTable(ctx, "table", 2) then
+        reaper.ImGui_TableNextColumn(ctx)
+        reaper.ImGui_EndTable(ctx)
+      end
+      reaper.ImGui_TreePop(ctx)
+    end
+    if reaper.ImGui_BeginCombo(ctx, "Combo", "preview") then
+      reaper.ImGui_EndCombo(ctx)
+    end
+    reaper.ImGui_PopID(ctx)
+    reaper.ImGui_End(ctx)
+    reaper.defer(function() end)
+    assert(#violations == 3, "Balanced frame should add no violations")
+    
+    VirtualReaper.reset_state()
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_api_coverage()
+  local test_name = "API Coverage Bitset"
+  
+  local success, result = pcall(function()
+    local reaper = VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    reaper.CountTracks(0)
+    reaper.ImGui_WindowFlags_MenuBar()
+    local names, total = VirtualReaper.get_api_coverage()
+    local seen = {}
+    for _, name in ipairs(names) do seen[name] = true end
+    assert(seen.CountTracks, "Logged API calls should be recorded")
+    assert(seen.ImGui_WindowFlags_MenuBar, "Constants should be recorded")
+    assert(reaper.ImGui_WindowFlags_MenuBar() == 1024, "Constants should keep their value")
+    assert(#names < total, "Uncalled functions should not be recorded")
+    
+    -- The bitset and its catalog land next to a temporary file
+    local probe = os.tmpname()
+    local directory = probe:match("^(.*)[/\\]") or "."
+    os.remove(probe)
+    local path, catalog = VirtualReaper.write_api_coverage(directory)
+    assert(path, "Coverage should be written")
+    local f = assert(io.open(path, "rb"))
+    local text = f:read("*a")
+    f:close()
+    os.remove(path)
+    os.remove(catalog)
+    local count, bits = text:match("catalog %x+ (%d+)\nbits (%x+)")
+    assert(tonumber(count) == total, "Header should carry the API count")
+    assert(#bits == 2 * math.ceil(total / 8), "One bit per API function")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_line_coverage()
+  local test_name = "Line Coverage (Exact and Sampled)"
+  
+  local success, result = pcall(function()
+    if os.getenv("ENVIREAMENT_COVERAGE") then
+      return true -- this run is being measured; restarting would discard it
+    end
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local script = os.tmpname()
+    local f = assert(io.open(script, "w"))
+    f:write("local total = 0\n",
+            "for i = 1, 200000 do\n",
+            "  total = total + i\n",
+            "end\n",
+            "if total < 0 then\n",
+            "  total = 0\n",
+            "end\n",
+            "return total\n")
+    f:close()
+    local directory = script:match("^(.*)[/\\]") or "."
+    
+    local function measure(mode)
+      VirtualReaper.start_coverage(mode, 100)
+      dofile(script)
+      VirtualReaper.stop_coverage()
+      local path = assert(VirtualReaper.write_coverage(directory), "Coverage should be written")
+      local out = assert(io.open(path, "rb"))
+      local text = out:read("*a")
+      out:close()
+      os.remove(path)
+      local hits = {}
+      for line, n in (text:match("\nhits ([^\n]*)") or ""):gmatch("(%d+):(%d+)") do
+        hits[tonumber(line)] = tonumber(n)
+      end
+      return text, hits
+    end
+    
+    local text, hits = measure("exact")
+    assert(text:find("mode exact", 1, true), "Mode should be recorded")
+    assert(hits[3] == 200000, "Exact mode should count every execution of a line")
+    assert(hits[6] == nil and text:find("lines [%d,]*6"), "Unexecuted lines should be listed with no hits")
+    
+    text, hits = measure("sampled")
+    assert(text:find("mode sampled 100", 1, true), "Mode and interval should be recorded")
+    assert((hits[2] or 0) + (hits[3] or 0) > 0, "Samples should land in the hot loop")
+    assert((hits[3] or 0) < 200000, "Samples should be far fewer than executions")
+    
+    os.remove(script)
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_cpu_profiler()
+  local test_name = "CPU Profiler (Collapsed Stacks)"
+  
+  local success, result = pcall(function()
+    if os.getenv("ENVIREAMENT_PROFILE") or os.getenv("ENVIREAMENT_COVERAGE") then
+      return true -- the VM hook is already taken by this run
+    end
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local function hot_loop()
+      local total = 0
+      for i = 1, 20000 do
+        total = total + #reaper.GetAppVersion() + i
+      end
+      return total
+    end
+    
+    VirtualReaper.start_profile(50)
+    hot_loop()
+    VirtualReaper.stop_profile()
+    local path, samples = VirtualReaper.write_profile(os.tmpname())
+    assert(path, "Profile should be written")
+    assert(samples and samples > 0, "Samples should be taken")
+    local f = assert(io.open(path, "rb"))
+    local text = f:read("*a")
+    f:close()
+    os.remove(path)
+    assert(text:find("hot_loop (", 1, true), "Script frames should be named")
+    assert(text:find(";%[mock%] GetAppVersion"), "Mock calls should appear under their caller")
+    for line in text:gmatch("[^\n]+") do
+      assert(line:match(" %d+$"), "Lines should end in a sample count")
+      assert(not line:find("[mock] log_api_call", 1, true), "Mock internals should be collapsed")
+    end
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_timeout_keeps_vm_hooks()
+  local test_name = "Test Timeout (Keeps Coverage and Profiler Hooks)"
+  
+  local success, result = pcall(function()
+    if os.getenv("ENVIREAMENT_PROFILE") or os.getenv("ENVIREAMENT_COVERAGE") then
+      return true -- the VM hook is already taken by this run
+    end
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local script = os.tmpname()
+    local f = assert(io.open(script, "w"))
+    f:write("local total = 0\n",
+            "for i = 1, 20000 do\n",
+            "  total = total + #reaper.GetAppVersion() + i\n",
+            "end\n",
+            "return total\n")
+    f:close()
+    local directory = script:match("^(.*)[/\\]") or "."
+    
+    VirtualReaper.start_coverage("exact")
+    local hook = debug.gethook()
+    assert(call_with_timeout(function() dofile(script) end, 30), "Script should run")
+    assert(debug.gethook() == hook, "Coverage hook should be put back")
+    local ok, err = call_with_timeout(function() while true do end end, 0.05)
+    assert(not ok and tostring(err):find("timed out", 1, true), "Timeout should still fire")
+    assert(debug.gethook() == hook, "Coverage hook should be put back after a timeout")
+    VirtualReaper.stop_coverage()
+    local path = assert(VirtualReaper.write_coverage(directory), "Coverage should be written")
+    f = assert(io.open(path, "rb"))
+    local text = f:read("*a")
+    f:close()
+    os.remove(path)
+    assert(text:find("\nhits [%d:,]*3:20000"), "Every line run under the timeout should be counted")
+    
+    VirtualReaper.start_profile(50)
+    assert(call_with_timeout(function() dofile(script) end, 30), "Script should run")
+    VirtualReaper.stop_profile()
+    local samples
+    path, samples = VirtualReaper.write_profile(os.tmpname())
+    assert(path, "Profile should be written")
+    os.remove(path)
+    assert(samples and samples > 0, "Samples should be taken under the timeout")
+    
+    os.remove(script)
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_soak_mode()
+  local test_name = "Soak Mode (Memory Growth)"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local function write_script(body)
+      local path = os.tmpname()
+      local f = assert(io.open(path, "w"))
+      f:write(body)
+      f:close()
+      return path
+    end
+    local leaky = write_script([[
+      local history = {}
+      local function loop()
+        history[#history + 1] = {reaper.time_precise(), "frame"}
+        reaper.defer(loop)
+      end
+      reaper.defer(loop)
+    ]])
+    local steady = write_script([[
+      local recent = {}
+      local function loop()
+        local t = reaper.time_precise()
+        recent[math.floor(t * 60 + 0.5) % 50] = {t}
+        reaper.defer(loop)
+      end
+      reaper.defer(loop)
+    ]])
+    
+    local start_clock = reaper.time_precise()
+    local ok, report = VirtualReaper.soak(steady, {frames = 3000, every = 50})
+    assert(ok, "A bounded cache should not count as growth: " .. tostring(report))
+    assert(report.frames == 3000 and report.samples == 60, "Every frame should run and be sampled")
+    assert(math.abs(reaper.time_precise() - start_clock - 2999 / 60) < 1e-3,
+           "Frames should advance the virtual clock")
+    local busy_start, now = reaper.time_precise(), nil
+    for _ = 1, 1e8 do
+      now = reaper.time_precise()
+      if now - busy_start >= 0.002 then break end
+    end
+    assert(now - busy_start >= 0.002, "Work within a frame should advance time_precise")
+    
+    local message
+    ok, message = VirtualReaper.soak(leaky, {frames = 3000, every = 50, limit_kb = 16})
+    assert(not ok and tostring(message):find("memory kept growing"), "Unbounded growth should fail")
+    
+    -- Growth that stops deferring long before the requested frames is still
+    -- judged on the frames it ran
+    local stops_early = write_script([[
+      local history, frames = {}, 0
+      local function loop()
+        frames = frames + 1
+        history[#history + 1] = {reaper.time_precise(), "frame"}
+        if frames < 1000 then reaper.defer(loop) end
+      end
+      reaper.defer(loop)
+    ]])
+    ok, message = VirtualReaper.soak(stops_early, {frames = 4000, every = 25, limit_kb = 16})
+    assert(not ok and tostring(message):find("memory kept growing"),
+           "Growth before the script stopped should fail: " .. tostring(message))
+    os.remove(stops_early)
+    
+    local series = os.tmpname()
+    VirtualReaper.soak(leaky, {frames = 1000, every = 100, limit_kb = 16, output = series})
+    local f = assert(io.open(series, "rb"))
+    local text = f:read("*a")
+    f:close()
+    assert(select(2, text:gsub("\nsample ", "")) == 10, "Each sample should be written")
+    assert(text:find("\ntable %d+ %d+ defer callback %([^\n]*%) %-> history\n"),
+           "The growing table should be named by its path")
+    assert(text:find("\ntrend %d+ [%d.]+ [%d.]+ [%d.]+ growing\n"), "The verdict should be written")
+    
+    os.remove(series)
+    os.remove(leaky)
+    os.remove(steady)
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_frame_budget()
+  local test_name = "Frame Budget (Script/Mock/GC Split)"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local get_track = reaper.GetTrack
+    VirtualReaper.start_frame_timing(16.6)
+    assert(reaper.GetTrack ~= get_track, "API functions should be wrapped while timing")
+    local frames = 0
+    local function frame()
+      frames = frames + 1
+      for i = 1, 50 do reaper.GetTrack(0, 0) end
+      local garbage = {}
+      for i = 1, 200 do garbage[i] = {i} end
+      if frames == 10 then
+        local stop = os.clock() + 0.025 -- one slow frame
+        while os.clock() < stop do end
+      end
+      if frames < 40 then reaper.defer(frame) end
+    end
+    frame()
+    local report = VirtualReaper.stop_frame_timing()
+    assert(reaper.GetTrack == get_track, "Stopping should restore the API functions")
+    
+    assert(report.frames == 39, "Every deferred frame should be timed, got " .. report.frames)
+    assert(report.over_budget == 1 and report.over_budget_frames[1].frame == 10,
+           "Only the slow frame should be over budget")
+    assert(report.over_budget_frames[1].script >= 20, "The slow frame's time is the script's")
+    assert(report.frame.max >= 25 and report.frame.p50 < 16.6, "Percentiles should separate the spike")
+    assert(report.frame.p50 <= report.frame.p95 and report.frame.p95 <= report.frame.p99,
+           "Percentiles should be ordered")
+    assert(report.mock.total > 0, "Mock calls should be timed")
+    assert(report.gc.total > 0, "Allocation should be paid for at frame end")
+    
+    VirtualReaper.assert_frame_budget({p95 = 16.6, mock_max = 16.6})
+    local ok, message = pcall(VirtualReaper.assert_frame_budget, {max = 16.6})
+    assert(not ok and tostring(message):find("max = "), "A frame over budget should fail the assertion")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_input_scenarios()
+  local test_name = "Input Scenario Playback"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local path = os.tmpname()
+    local f = assert(io.open(path, "w"))
+    f:write([[
+      local ctx = reaper.ImGui_CreateContext("Scenario")
+      scenario_state = {query = "", saved = 0, loop = false, enter = 0, hovered = 0, right = 0}
+      local function loop()
+        local s = scenario_state
+        if reaper.ImGui_Begin(ctx, "Browser") then
+          local changed, q = reaper.ImGui_InputText(ctx, "##search", s.query)
+          if changed then s.query = q end
+          if reaper.ImGui_Button(ctx, "Save") then s.saved = s.saved + 1 end
+          local toggled, v = reaper.ImGui_Checkbox(ctx, "Loop", s.loop)
+          if toggled then s.loop = v end
+          for i, name in ipairs({"Alpha", "Beta"}) do
+            reaper.ImGui_PushID(ctx, i)
+            if reaper.ImGui_Button(ctx, "Load") then s.loaded = name end
+            if reaper.ImGui_IsItemClicked(ctx, 1) then s.right = s.right + 1 end
+            reaper.ImGui_PopID(ctx)
+          end
+          if reaper.ImGui_TreeNode(ctx, "More") then
+            reaper.ImGui_Text(ctx, "inside")
+            if reaper.ImGui_IsItemHovered(ctx) then s.hovered = s.hovered + 1 end
+            reaper.ImGui_TreePop(ctx)
+          end
+          if reaper.ImGui_IsKeyPressed(ctx, reaper.ImGui_Key_Enter()) then s.enter = s.enter + 1 end
+          s.mouse_x = reaper.ImGui_GetMousePos(ctx)
+          reaper.ImGui_End(ctx)
+        end
+        if not reaper.ImGui_IsKeyPressed(ctx, reaper.ImGui_Key_Escape()) then reaper.defer(loop) end
+      end
+      reaper.defer(loop)
+    ]])
+    f:close()
+    
+    local steps = {
+      {frame = 3, set = "##search", value = "bass"},
+      {click = "Save"},
+      {wait = 2, click = "Loop"},
+      {events = {{click = "Browser/2/Load"}, {key = "Enter"}, {mouse = {x = 40, y = 12}}}},
+      {click = "Browser/1/Load", button = 1},
+      {click = "More"},
+      {hover = "inside"},
+    }
+    assert(reaper.ImGui_Button(reaper.ImGui_CreateContext("idle"), "Save") == false,
+           "Widgets should stay idle without a scenario")
+    for i = 1, 500 do steps[#steps + 1] = {wait = 2, click = "Save"} end
+    steps[#steps + 1] = {key = "Escape"}
+    local ok, report = VirtualReaper.play_scenario(path, {name = "browse", steps = steps})
+    assert(ok, "Scenario should play: " .. tostring(report))
+    local s = scenario_state
+    assert(s.query == "bass" and s.loop == true, "Set and click events should change values")
+    assert(s.saved == 501, "Every Save click should land, got " .. s.saved)
+    assert(s.loaded == "Beta", "An ID path should pick the right one of two same-label buttons")
+    assert(s.right == 1 and s.loaded ~= "Alpha", "A right click should not press the button")
+    assert(s.hovered == 1 and s.enter == 1 and s.mouse_x == 40, "Hover, key and mouse events should apply")
+    assert(report.frames == #steps * 2 - 5, "Playback should stop when the script does, got " .. report.frames)
+    assert(math.abs(report.virtual_seconds - (report.frames - 1) / 60) < 1e-6,
+           "Frames should advance the virtual clock")
+    assert(report.steps[1].frame == 3 and report.steps[1].ms and report.steps[1].ms >= 0,
+           "Each step should report its frame cost")
+    
+    local missed_ok, message = VirtualReaper.play_scenario(path, {{wait = 2, click = "Delete"}, {key = "Escape"}})
+    assert(not missed_ok and message:find("matched no widget"), "An event no widget takes should fail")
+    local bad_ok, bad = VirtualReaper.play_scenario(path, {{key = "Hyper"}})
+    assert(not bad_ok and bad:find("unknown key"), "An unknown key should be rejected")
+    os.remove(path)
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_sessions()
+  local test_name = "Sessions (Many Scripts in One VM)"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local function write_script(body)
+      local path = os.tmpname()
+      local f = assert(io.open(path, "w"))
+      f:write(body)
+      f:close()
+      return path
+    end
+    local counter = write_script([[
+      local ctx = reaper.ImGui_CreateContext("Counter")
+      frames = (frames or 0)
+      local limit = tonumber(reaper.GetExtState("session", "limit")) or 3
+      reaper.SetExtState("session", "limit", tostring(limit + 1), false)
+      reaper.GetTrack = function() return "patched" end
+      local function loop()
+        frames = frames + 1
+        if reaper.ImGui_Begin(ctx, "Counter") then reaper.ImGui_End(ctx) end
+        if frames < limit then
+          reaper.defer(loop)
+        else
+          print(string.format("frames=%d clock=%.4f", frames, reaper.time_precise()))
+        end
+      end
+      reaper.defer(loop)
+    ]])
+    local failing = write_script("reaper.defer(function() error('boom') end)")
+    local exiting = write_script("reaper.defer(function() os.exit(0) end)")
+    local endless = write_script("local function loop() reaper.defer(loop) end loop()")
+    
+    reaper.SetExtState("session", "limit", "99", false)
+    local paths = {}
+    for i = 1, 100 do paths[i] = counter end
+    paths[#paths + 1], paths[#paths + 2], paths[#paths + 3] = failing, exiting, endless
+    local results = VirtualReaper.run_sessions(paths, {frames = 50})
+    
+    assert(#results == 103, "Every script should report")
+    for i = 1, 100 do
+      local r = results[i]
+      assert(r.ok and r.stopped, "Counter " .. i .. " should pass: " .. tostring(r.error))
+      assert(r.frames == 4 and r.output:find("frames=3 clock=0.0500", 1, true),
+             "Each session should have its own globals, ExtState and clock: " .. r.output)
+    end
+    assert(not results[101].ok and results[101].error:find("boom"), "An error should fail its session only")
+    assert(results[102].ok and results[102].frames == 2, "os.exit(0) should end its session as passed")
+    assert(results[103].ok and not results[103].stopped and results[103].frames == 50,
+           "A script that never stops should run out of frames")
+    
+    -- A hung script uses up its own CPU time only
+    local hanging = write_script("reaper.defer(function() while true do end end)")
+    results = VirtualReaper.run_sessions({hanging, counter}, {frames = 50, timeout = 0.2})
+    assert(not results[1].ok and results[1].timed_out and results[1].frames == 2
+           and results[1].error:find("timed out", 1, true), "A hung session should time out")
+    assert(results[2].ok and results[2].stopped and not results[2].timed_out,
+           "The other sessions should still finish")
+    os.remove(hanging)
+    
+    assert(reaper.GetExtState("session", "limit") == "99", "The host state should come back")
+    assert(reaper.GetTrack ~= nil and reaper.GetTrack(0, 0) ~= "patched", "Patched API functions stay in their session")
+    assert(rawget(_G, "frames") == nil, "Session globals should not leak into _G")
+    for _, path in ipairs({counter, failing, exiting, endless}) do os.remove(path) end
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_layout()
+  local test_name = "Layout (Cursor, Item Rects, Text Size)"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local ctx = reaper.ImGui_CreateContext("Layout")
+    reaper.ImGui_SetNextWindowSize(ctx, 500, 400, reaper.ImGui_Cond_FirstUseEver())
+    reaper.ImGui_SetNextWindowPos(ctx, 10, 20)
+    reaper.ImGui_Begin(ctx, "Layout")
+    local w, h = reaper.ImGui_GetWindowSize(ctx)
+    assert(w == 500 and h == 400, "SetNextWindowSize should size the window")
+    local x, y = reaper.ImGui_GetCursorPos(ctx)
+    assert(x == 8 and y == 27, "The cursor should start past the title bar and padding")
+    
+    reaper.ImGui_Text(ctx, "Hello")
+    w, h = reaper.ImGui_GetItemRectSize(ctx)
+    assert(w == 35 and h == 13, "The default font should advance 7 pixels a glyph")
+    assert(select(2, reaper.ImGui_GetCursorPos(ctx)) == 44, "Items should advance a line plus spacing")
+    
+    reaper.ImGui_Button(ctx, "OK")
+    local ok_x1 = reaper.ImGui_GetItemRectMax(ctx)
+    assert(select(2, reaper.ImGui_GetItemRectSize(ctx)) == reaper.ImGui_GetFrameHeight(ctx),
+           "Buttons should be a frame high")
+    reaper.ImGui_SameLine(ctx)
+    reaper.ImGui_Button(ctx, "Cancel##dialog")
+    local x0, y0 = reaper.ImGui_GetItemRectMin(ctx)
+    assert(x0 == ok_x1 + 8 and y0 == 64, "SameLine should continue the line after item spacing")
+    assert(reaper.ImGui_GetItemRectSize(ctx) == 50, "Text after ## should not be measured")
+    
+    reaper.ImGui_Indent(ctx)
+    reaper.ImGui_BeginGroup(ctx)
+    reaper.ImGui_Text(ctx, "a")
+    reaper.ImGui_Text(ctx, "bbbbbbbbbb")
+    reaper.ImGui_EndGroup(ctx)
+    x0 = reaper.ImGui_GetItemRectMin(ctx)
+    w, h = reaper.ImGui_GetItemRectSize(ctx)
+    assert(x0 == 39 and w == 70 and h == 30, "A group should be one item around its contents")
+    reaper.ImGui_Unindent(ctx)
+    
+    reaper.ImGui_SliderInt(ctx, "Vol", 1, 0, 10)
+    assert(reaper.ImGui_GetItemRectSize(ctx) == 325 + 4 + 21, "Frames should take the item width and label")
+    reaper.ImGui_SetNextItemWidth(ctx, -100)
+    reaper.ImGui_InputText(ctx, "##q", "")
+    assert(reaper.ImGui_GetItemRectSize(ctx) == 384, "A negative item width should leave room free")
+    
+    if reaper.ImGui_BeginTable(ctx, "grid", 3) then
+      for i = 1, 6 do
+        reaper.ImGui_TableNextColumn(ctx)
+        reaper.ImGui_Text(ctx, "cell " .. i)
+      end
+      reaper.ImGui_EndTable(ctx)
+    end
+    w, h = reaper.ImGui_GetItemRectSize(ctx)
+    assert(w == 484 and h == 34, "A table should take its rows, got " .. w .. "x" .. h)
+    
+    reaper.ImGui_BeginChild(ctx, "list", 0, 100, reaper.ImGui_ChildFlags_Border())
+    w, h = reaper.ImGui_GetContentRegionAvail(ctx)
+    assert(w == 468 and h == 84, "A child should be a padded content region of its own")
+    reaper.ImGui_EndChild(ctx)
+    assert(select(2, reaper.ImGui_GetItemRectSize(ctx)) == 100, "A child should be an item of its parent")
+    
+    w, h = reaper.ImGui_CalcTextSize(ctx, "Hello\nWorld!")
+    assert(w == 42 and h == 26, "Lines should measure separately")
+    local sans = reaper.ImGui_CreateFont("sans-serif", 14)
+    reaper.ImGui_PushFont(ctx, sans)
+    assert(reaper.ImGui_CalcTextSize(ctx, "iiii") < reaper.ImGui_CalcTextSize(ctx, "MMMM"),
+           "A proportional font should measure glyphs by their advance")
+    w, h = reaper.ImGui_CalcTextSize(ctx, "Hello World Hello World", nil, nil, false, 60)
+    assert(w <= 60 and h == 56, "Wrapped text should break between words")
+    reaper.ImGui_PopFont(ctx)
+    reaper.ImGui_End(ctx)
+    
+    -- A 10,000-widget frame, measured after a frame that fills the width caches
+    local labels = {}
+    for i = 1, 10000 do labels[i] = "Row " .. i end
+    local elapsed
+    for frame = 1, 2 do
+      local start = os.clock()
+      reaper.ImGui_Begin(ctx, "Layout")
+      for i = 1, 10000 do
+        reaper.ImGui_Text(ctx, labels[i])
+      end
+      y = select(2, reaper.ImGui_GetCursorPos(ctx))
+      reaper.ImGui_End(ctx)
+      elapsed = os.clock() - start
+    end
+    assert(y == 27 + 10000 * 17, "Every row should advance the cursor")
+    assert(elapsed < 0.25, string.format("A 10,000-widget frame took %.1fms", elapsed * 1000))
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_draw_lists()
+  local test_name = "Draw Lists (Binary Export)"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local path = os.tmpname()
+    assert(VirtualReaper.record_draw_lists(path), "Recording should start")
+    local ctx = reaper.ImGui_CreateContext("Draw")
+    local function draw(bars)
+      reaper.ImGui_SetNextWindowPos(ctx, 0, 0)
+      reaper.ImGui_Begin(ctx, "Meter")
+      local dl = reaper.ImGui_GetWindowDrawList(ctx)
+      for i = 1, bars do
+        reaper.ImGui_DrawList_AddRectFilled(dl, i * 4, 10, i * 4 + 3, 50, 0x00FF00FF)
+      end
+      reaper.ImGui_DrawList_AddPolyline(dl, {0, 0, 10, 10, 20, 0}, 0xFFFFFFFF, reaper.ImGui_DrawFlags_Closed(), 2)
+      reaper.ImGui_DrawList_AddText(dl, 5, 60, 0xFFFFFFFF, "-6 dB")
+      reaper.ImGui_End(ctx)
+      reaper.ImGui_DrawList_AddLine(reaper.ImGui_GetForegroundDrawList(ctx), 0, 0, 100, 100, 0xFF0000FF)
+    end
+    draw(100)
+    reaper.defer(function() draw(2) end) -- ends frame 0 outside a driven loop
+    VirtualReaper.write_draw_lists()
+    
+    local f = assert(io.open(path, "rb"))
+    local data = f:read("a")
+    f:close()
+    os.remove(path)
+    local magic, version, stride, pos = string.unpack("<c4I2I2", data)
+    assert(magic == "EVDL" and version == 1 and stride == 8, "The file should start with its header")
+    local frames = {}
+    while pos <= #data do
+      local tag, frame, count
+      tag, frame, count, pos = string.unpack("<c4I4I4", data, pos)
+      assert(tag == "FRME", "Frames should follow one another")
+      local lists = {}
+      for _ = 1, count do
+        local name, commands, points, text_bytes
+        name, commands, points, text_bytes, pos = string.unpack("<s2I4I4I4", data, pos)
+        local ops = {data:byte(pos, pos + commands - 1)}
+        pos = pos + commands
+        local first_color = string.unpack("<I4", data, pos)
+        pos = pos + commands * 4
+        local args = {string.unpack("<" .. string.rep("f", stride), data, pos)}
+        pos = pos + commands * stride * 4 + points * 8
+        lists[name] = {commands = commands, points = points, ops = ops, color = first_color,
+                       args = args, text = data:sub(pos, pos + text_bytes - 1)}
+        pos = pos + text_bytes
+      end
+      frames[#frames + 1] = {frame = frame, lists = lists}
+    end
+    
+    assert(#frames == 2 and frames[1].frame == 0 and frames[2].frame == 1, "Each frame should be written once")
+    local first, second = frames[1].lists.Meter, frames[2].lists.Meter
+    assert(first.commands == 102 and second.commands == 4,
+           "A list should start over each frame, got " .. first.commands .. " then " .. second.commands)
+    assert(first.ops[1] == 3 and first.color == 0x00FF00FF, "Commands should keep their opcode and color")
+    assert(first.args[1] == 4 and first.args[2] == 10 and first.args[3] == 7 and first.args[4] == 50,
+           "Arguments should round-trip")
+    assert(second.points == 3 and second.ops[3] == 8, "Polylines should keep their points")
+    assert(second.text == "-6 dB", "Text should be exported")
+    assert(frames[2].lists["##Foreground"].commands == 1, "The foreground list should be its own")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_list_clipper()
+  local test_name = "List Clipper (Visible Items Per Frame)"
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    local ctx = reaper.ImGui_CreateContext("Clipper")
+    local clipper = reaper.ImGui_CreateListClipper(ctx)
+    assert(reaper.ImGui_ValidatePtr(clipper, "ImGui_ListClipper*"), "Clippers should validate")
+    local function draw(count, scroll_y)
+      reaper.ImGui_SetNextWindowPos(ctx, 0, 0)
+      reaper.ImGui_SetNextWindowSize(ctx, 300, 400)
+      reaper.ImGui_Begin(ctx, "Library")
+      if scroll_y then reaper.ImGui_SetScrollY(ctx, scroll_y) end
+      local ranges = {}
+      reaper.ImGui_ListClipper_Begin(clipper, count)
+      while reaper.ImGui_ListClipper_Step(clipper) do
+        local first, last = reaper.ImGui_ListClipper_GetDisplayRange(clipper)
+        ranges[#ranges + 1] = {first, last}
+        for i = first, last - 1 do reaper.ImGui_Selectable(ctx, "Song " .. i) end
+      end
+      reaper.ImGui_ListClipper_End(clipper)
+      local end_y = select(2, reaper.ImGui_GetCursorPos(ctx))
+      local scroll, scroll_max = reaper.ImGui_GetScrollY(ctx), reaper.ImGui_GetScrollMaxY(ctx)
+      reaper.ImGui_End(ctx)
+      return ranges, end_y, scroll, scroll_max
+    end
+    
+    -- Item 0 measures the row height (13 + 4 spacing), then the rows that
+    -- fit under the title bar follow
+    local ranges, end_y, scroll = draw(50000, 4000)
+    assert(#ranges == 2 and ranges[1][2] == 1 and ranges[2][1] == 1 and ranges[2][2] == 22,
+           "The clipper should measure one item, then give the visible rows")
+    assert(end_y == 27 + 50000 * 17, "The cursor should end past the whole list")
+    assert(scroll == 0, "SetScrollY should apply as the window next begins")
+    local counts = VirtualReaper.item_counts("Library")
+    assert(counts.last_submitted == 22 and counts.last_visible == 22 and counts.last_listed == 50000,
+           "Only visible rows should be submitted")
+    
+    local scroll_max
+    ranges, end_y, scroll, scroll_max = draw(50000)
+    assert(scroll == 4000 and scroll_max == 50000 * 17 - 4 + 16 - 381, "The window should scroll by 4000")
+    assert(ranges[2][1] == 234 and ranges[2][2] == 258, "Scrolling should move the visible range")
+    counts = VirtualReaper.item_counts("Library")
+    assert(counts.last_submitted == 25 and counts.last_visible == 23, "Item 0 is submitted to measure")
+    
+    reaper.ImGui_ListClipper_Begin(clipper, 50000, 17)
+    reaper.ImGui_ListClipper_IncludeItemByIndex(clipper, 49999)
+    reaper.ImGui_ListClipper_Step(clipper)
+    assert(select(2, reaper.ImGui_ListClipper_GetDisplayRange(clipper)) == 50000,
+           "Included items should join the range")
+    reaper.ImGui_ListClipper_End(clipper)
+    
+    -- A 50k list without a clipper submits everything and is reported
+    reaper.ImGui_Begin(ctx, "Unclipped")
+    for i = 1, 50000 do reaper.ImGui_Selectable(ctx, "Song " .. i) end
+    reaper.ImGui_End(ctx)
+    counts = VirtualReaper.item_counts("Unclipped")
+    assert(counts.last_submitted == 50000 and counts.last_visible < 30 and counts.warned,
+           "Unclipped lists should be flagged")
+    
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_incremental_loading()
+  local test_name = "Song Browser (Frame-Sliced Loading)"
+  local show_console_msg = reaper.ShowConsoleMsg
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    -- 50 folders of 1,000 songs, and one file that does not parse
+    local datasets = {["broken.jcrd"] = "not json"}
+    for d = 1, 50 do
+      local folder = {}
+      for f = 1, 1000 do
+        folder[string.format("song_%05d.jcrd", (d - 1) * 1000 + f)] =
+          string.format('{"title": "Song %d-%d", "artist": "Artist %d", "key": "C"}', d, f, d)
+      end
+      datasets[string.format("set%02d", d)] = folder
+    end
+    local root = reaper.GetResourcePath() .. "/Scripts/songbase"
+    VirtualReaper.mount_files(root, {datasets = datasets, examples = {}, jcrddatasets = {}})
+    assert(reaper.EnumerateSubdirectories(root .. "/datasets", 0) == "set01", "Mounted folders should enumerate")
+    assert(reaper.EnumerateFiles(root .. "/datasets/set02", 0) == "song_01001.jcrd", "Mounted files should enumerate")
+    assert(reaper.file_exists(root .. "/datasets/broken.jcrd"), "Mounted files should exist")
+    local f = assert(io.open(root .. "/datasets/set01/song_00001.jcrd", "r"))
+    assert(f:read("a"):find('"Song 1-1"', 1, true), "io.open should read mounted files")
+    f:close()
+    
+    -- The browser's utils modules live in the songbase repository
+    package.preload["utils.json"] = function()
+      return {
+        decode = function(text)
+          local title = assert(text:match('"title": "(.-)"'), "invalid JSON")
+          return {title = title, artist = text:match('"artist": "(.-)"'), key = text:match('"key": "(.-)"')}
+        end,
+        encode = function() return "{}" end,
+      }
+    end
+    package.preload["utils.file_operations"] = function()
+      return {
+        join_path = function(...) return table.concat({...}, "/") end,
+        read_file = function(path)
+          local file = io.open(path, "rb")
+          if not file then return nil end
+          local text = file:read("a")
+          file:close()
+          return text
+        end,
+        get_filename = function(path) return path:match("[^/]+$") end,
+      }
+    end
+    package.preload["utils.reaper_helpers"] = function() return {} end
+    package.preload["utils.midi_helpers"] = function() return {} end
+    package.loaded["ui.song_browser"] = nil
+    local console = {}
+    reaper.ShowConsoleMsg = function(msg) console[#console + 1] = msg end
+    local song_browser = require("ui.song_browser")
+    
+    local ctx = reaper.ImGui_CreateContext("Browser")
+    local frames, partial = 0, nil
+    local function frame()
+      frames = frames + 1
+      if frames == 1 then song_browser.init(ctx) end
+      reaper.ImGui_SetNextWindowSize(ctx, 800, 600)
+      reaper.ImGui_Begin(ctx, "Song Browser")
+      song_browser.draw(ctx)
+      reaper.ImGui_End(ctx)
+      local progress = song_browser.get_load_progress()
+      if progress.loading and progress.songs > 0 and not partial then partial = progress end
+      if progress.loading then reaper.defer(frame) end
+    end
+    VirtualReaper.start_frame_timing(16.6)
+    frame()
+    VirtualReaper.stop_frame_timing()
+    
+    local progress = song_browser.get_load_progress()
+    assert(progress.phase == "done" and progress.songs == 50000 and progress.failed == 1,
+           "Every song should load and the broken file fail")
+    assert(frames > 10, "Loading should spread over frames, took " .. frames)
+    assert(partial and partial.phase == "parsing" and partial.processed < 50001,
+           "Songs should show while loading goes on")
+    -- The loader's slices, not the collector, are what a script controls
+    VirtualReaper.assert_frame_budget({script_max = 16.6, script_p95 = 8})
+    local counts = VirtualReaper.item_counts("Song Browser/song_list")
+    assert(counts.max_submitted < 50 and counts.listed == 50000, "The song list should be clipped")
+    
+    -- Cancelling keeps the songs loaded so far
+    song_browser.init(ctx)
+    for _ = 1, 5 do song_browser.update_loading() end
+    song_browser.cancel_loading()
+    progress = song_browser.get_load_progress()
+    assert(progress.phase == "cancelled" and not progress.loading and progress.songs < 50000,
+           "Cancelling should stop the load")
+    assert(not song_browser.update_loading(), "Nothing should run after cancelling")
+    
+    reaper.ShowConsoleMsg = show_console_msg
+    VirtualReaper.unmount_files()
+    assert(io.open(root .. "/datasets/broken.jcrd") == nil, "Unmounting should give io.open back")
+    for _, name in ipairs({"ui.song_browser", "utils.json", "utils.file_operations",
+                           "utils.reaper_helpers", "utils.midi_helpers"}) do
+      package.loaded[name], package.preload[name] = nil, nil
+    end
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  reaper.ShowConsoleMsg = show_console_msg
+  VirtualReaper.unmount_files()
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
+local function test_dedupe_map()
+  local test_name = "Song Browser (Dedupe Map)"
+  local show_console_msg = reaper.ShowConsoleMsg
+  
+  local success, result = pcall(function()
+    VirtualReaper.create_environment()
+    VirtualReaper.set_verbose_logging(false)
+    
+    -- Two copies of song A, one of them a near duplicate, and a file mapped
+    -- to a canonical copy that is gone, which must still load
+    local function song(title) return string.format('{"title": "%s", "artist": "X", "key": "C"}', title) end
+    local root = reaper.GetResourcePath() .. "/Scripts/songbase"
+    VirtualReaper.mount_files(root, {
+      datasets = {["a.jcrd"] = song("A"), ["b.jcrd"] = song("B")},
+      examples = {["a.json"] = song("a")},
+      jcrddatasets = {["a_in_d.jcrd"] = song("A (in D)"), ["c.jcrd"] = song("C")},
+      ["songbase_dedupe.json"] = [[{"version": 1, "files": 5, "duplicates": {
+        "examples/a.json": {"of": "datasets/a.jcrd", "kind": "exact", "similarity": 1.0},
+        "jcrddatasets/a_in_d.jcrd": {"of": "datasets/a.jcrd", "kind": "near", "similarity": 0.84},
+        "jcrddatasets/c.jcrd": {"of": "datasets/missing.jcrd", "kind": "exact", "similarity": 1.0}}}]],
+    })
+    
+    -- Enough JSON for these files: objects, strings and numbers
+    package.preload["utils.json"] = function()
+      return {
+        decode = function(text)
+          return assert(load("return " .. text:gsub('"([^"]-)"%s*:', '["%1"]=')))()
+        end,
+        encode = function() return "{}" end,
+      }
+    end
+    package.preload["utils.file_operations"] = function()
+      return {
+        join_path = function(...) return table.concat({...}, "/") end,
+        read_file = function(path)
+          local file = io.open(path, "rb")
+          if not file then return nil end
+          local text = file:read("a")
+          file:close()
+          return text
+        end,
+        get_filename = function(path) return path:match("[^/]+$") end,
+      }
+    end
+    package.preload["utils.reaper_helpers"] = function() return {} end
+    package.preload["utils.midi_helpers"] = function() return {} end
+    package.loaded["ui.song_browser"] = nil
+    local console = {}
+    reaper.ShowConsoleMsg = function(msg) console[#console + 1] = msg end
+    local song_browser = require("ui.song_browser")
+    
+    song_browser.init(reaper.ImGui_CreateContext("Browser"))
+    while song_browser.update_loading() do end
+    local progress = song_browser.get_load_progress()
+    assert(progress.phase == "done" and progress.total == 5, "Every file should be found")
+    assert(progress.songs == 3 and progress.collapsed == 2 and progress.failed == 0,
+           "Mapped copies of a found song should collapse, got " .. progress.songs .. " songs")
+    assert(table.concat(console):find("(2 duplicates collapsed)", 1, true),
+           "The load summary should count collapsed duplicates")
+    
+    -- Without the map every file loads
+    VirtualReaper.unmount_files()
+    VirtualReaper.mount_files(root, {datasets = {["a.jcrd"] = song("A")}, examples = {["a.json"] = song("a")}})
+    song_browser.init(reaper.ImGui_CreateContext("Browser"))
+    while song_browser.update_loading() do end
+    progress = song_browser.get_load_progress()
+    assert(progress.songs == 2 and progress.collapsed == 0, "No map should mean no collapsing")
+    
+    reaper.ShowConsoleMsg = show_console_msg
+    VirtualReaper.unmount_files()
+    for _, name in ipairs({"ui.song_browser", "utils.json", "utils.file_operations",
+                           "utils.reaper_helpers", "utils.midi_helpers"}) do
+      package.loaded[name], package.preload[name] = nil, nil
+    end
+    VirtualReaper.create_environment()
+    return true
+  end)
+  
+  reaper.ShowConsoleMsg = show_console_msg
+  VirtualReaper.unmount_files()
+  VirtualReaper.set_verbose_logging(TestConfig.verbose)
+  log_test_result(test_name, success, result)
+  return success
+end
+
 -- Test newly added comprehensive REAPER API functions
 local function test_comprehensive_reaper_extensions()
   local test_name = "Comprehensive REAPER API Extensions"
@@ -782,40 +2205,71 @@ end
 
 -- ==================== MAIN TEST RUNNER ====================
 
+-- Run one test, aborting it once it has used TestConfig.test_timeout seconds
+-- of CPU time. A failure the test did not catch itself is reported here.
+local function run_with_timeout(test_fn)
+  local ok, err = call_with_timeout(test_fn, TestConfig.test_timeout)
+  if not ok then
+    log_test_result("Test aborted", false, tostring(err))
+  end
+end
+
 local function run_all_tests()
   print_header("Enhanced Virtual REAPER Environment - Test Suite")
   
   VirtualReaper.set_verbose_logging(TestConfig.verbose)
   
   print_section("Core Functionality Tests")
-  test_environment_initialization()
-  test_imgui_context_management()
-  test_window_stack_management()
+  run_with_timeout(test_environment_initialization)
+  run_with_timeout(test_imgui_context_management)
+  run_with_timeout(test_window_stack_management)
   
   print_section("Widget and UI Tests")
-  test_widget_rendering()
-  test_menu_system()
-  test_tab_system()
-  test_style_management()
-  test_font_management()
+  run_with_timeout(test_widget_rendering)
+  run_with_timeout(test_menu_system)
+  run_with_timeout(test_tab_system)
+  run_with_timeout(test_style_management)
+  run_with_timeout(test_font_management)
   
   print_section("Performance Tests")
-  test_widget_performance()
+  run_with_timeout(test_widget_performance)
   
   print_section("Integration Tests")
-  test_complex_ui_structure()
-  test_real_songbase_application()
+  run_with_timeout(test_complex_ui_structure)
+  run_with_timeout(test_real_songbase_application)
   
   print_section("New REAPER Core Functions Tests")
-  test_reaper_core_functions()
-  test_dialog_functions()
-  test_extension_functions()
-  test_media_operations()
-  test_enhanced_reaper_api_functions()
-  test_comprehensive_reaper_extensions()
+  run_with_timeout(test_reaper_core_functions)
+  run_with_timeout(test_dialog_functions)
+  run_with_timeout(test_extension_functions)
+  run_with_timeout(test_media_operations)
+  run_with_timeout(test_enhanced_reaper_api_functions)
+  run_with_timeout(test_comprehensive_reaper_extensions)
+  run_with_timeout(test_ext_state_persistence)
+  run_with_timeout(test_project_model)
+  run_with_timeout(test_midi_storage)
+  run_with_timeout(test_markers_and_regions)
+  run_with_timeout(test_project_fixture_loading)
+  run_with_timeout(test_reset_state)
+  run_with_timeout(test_scope_balance)
+  run_with_timeout(test_api_coverage)
+  run_with_timeout(test_line_coverage)
+  run_with_timeout(test_cpu_profiler)
+  run_with_timeout(test_timeout_keeps_vm_hooks)
+  run_with_timeout(test_soak_mode)
+  run_with_timeout(test_frame_budget)
+  run_with_timeout(test_input_scenarios)
+  run_with_timeout(test_sessions)
+  run_with_timeout(test_layout)
+  run_with_timeout(test_draw_lists)
+  run_with_timeout(test_list_clipper)
+  run_with_timeout(test_incremental_loading)
+  run_with_timeout(test_dedupe_map)
   
   print_section("Final Statistics")
   VirtualReaper.print_statistics()
+  -- Exercised-API bitset for envireament api-coverage, when ENVIREAMENT_API_COVERAGE is set
+  VirtualReaper.write_api_coverage()
   
   -- Print test summary
   local runtime = os.time() - TestResults.start_time
@@ -21,49 +21,121 @@ function EnhancedVirtualReaper.init()
   return true
 end
 
+-- ==================== ENGINES ====================
+-- Self-contained engines live in envireament_*.lua modules beside this
+-- file. Each one reaches the mock only through the host table it is given.
+
+local MOCK_SOURCE = debug.getinfo(1, "S").source
+local MOCK_DIR = MOCK_SOURCE:match("^@(.*[/\\])") or ""
+
+-- Chunk sources of the mock and its engines: code that coverage, the
+-- profiler and soak reports count as the mock's, not the script's
+local mock_sources = {[MOCK_SOURCE] = true}
+
+-- Loads an engine module from beside the mock, whatever the working directory
+local function require_engine(name)
+  local saved = package.path
+  package.path = MOCK_DIR .. "?.lua;" .. saved
+  local ok, engine = pcall(require, name)
+  package.path = saved
+  if not ok then error("cannot load " .. name .. ": " .. tostring(engine), 2) end
+  for _, value in pairs(engine) do
+    if type(value) == "function" then
+      mock_sources[debug.getinfo(value, "S").source] = true
+      break
+    end
+  end
+  return engine
+end
+
 -- ==================== ENHANCED STATE MANAGEMENT ====================
 
-local VirtualState = {
-  -- Global state
-  time = 0,
-  frame_count = 0,
-  delta_time = 1/60, -- 60 FPS simulation
-  
-  -- ImGui state
-  contexts = {},
-  current_ctx = nil,
-  window_stack = {},
-  menu_stack = {},
-  tab_stack = {},
-  popup_stack = {},
-  
-  -- UI interaction state
-  hovered_item = nil,
-  active_item = nil,
-  focused_item = nil,
-  last_clicked = nil,
-  keyboard_focus = nil,
-  
-  -- Testing features
-  verbose_logging = true,
-  performance_tracking = true,
-  ui_validation = true,
-  
-  -- Statistics
-  stats = {
+-- Everything a script can change; reset_state() swaps in a fresh copy
+local function new_virtual_state()
+  return {
+    -- Global state
+    time = 0,
+    frame_count = 0,
+    delta_time = 1/60, -- 60 FPS simulation
+    clock = 0, -- virtual seconds, advanced by delta_time at every frame boundary
+    frame_started = nil, -- os.clock() when the current frame began
+    clock_read = 0, -- latest time_precise(); the clock never goes back past it
+  
+    -- ImGui state
+    contexts = {},
+    current_ctx = nil,
+    window_stack = {},
+    menu_stack = {},
+    tab_stack = {},
+    popup_stack = {},
+  
+    -- UI interaction state
+    hovered_item = nil,
+    active_item = nil,
+    focused_item = nil,
+    last_clicked = nil,
+    keyboard_focus = nil,
+  
+    -- Testing features
+    verbose_logging = true,
+    performance_tracking = true,
+    ui_validation = true,
+
+    -- ExtState store (emulates reaper-extstate.ini and per-project ext state)
+    ext_state = {},              -- section -> key -> value, everything visible to GetExtState
+    ext_state_persist = {},      -- section -> key -> value, what belongs in the ini file
+    ext_state_dirty = {},        -- section -> true when its ini text must be rebuilt
+    ext_state_text = {},         -- section -> cached ini text of clean sections
+    ext_state_file = nil,        -- path of the emulated reaper-extstate.ini (nil = memory only)
+    proj_ext_state = {},         -- section -> key -> value for the current project
+    proj_ext_state_dirty = false,
+    proj_ext_state_file = nil,   -- path the project ext state is saved to (nil = memory only)
+    ext_state_flush_frames = 30, -- batch window: flush at most once per N frames
+    ext_state_dirty_frame = nil, -- frame on which the first unflushed change happened
+
+    -- Begin/End and Push/Pop imbalances found at frame boundaries
+    scope_violations = {},
+
+    -- Window path -> items submitted and visible per frame (see LAYOUT)
+    item_counts = {},
+
+    -- Statistics
+    stats = nil -- filled in by new_statistics() below
+  }
+end
+
+local VirtualState = new_virtual_state()
+
+local function new_statistics()
+  return {
     windows_created = 0,
     widgets_drawn = 0,
     api_calls = 0,
     errors = 0,
     warnings = 0,
+    ext_state_sets = 0,
+    ext_state_flushes = 0,
+    ext_state_bytes_written = 0,
+    fixture_chunks_loaded = 0,
     start_time = os.time()
   }
-}
+end
+
+VirtualState.stats = new_statistics()
 
 -- ==================== LOGGING SYSTEM ====================
 
+-- API name -> id, and id -> true once called; filled in after mock_reaper
+local api_ids = {}
+local api_hits = {}
+-- API name -> calls since the last soak sample (nil outside soak runs)
+local api_window = nil
+
 local function log_api_call(func_name, ...)
   VirtualState.stats.api_calls = VirtualState.stats.api_calls + 1
+  local id = api_ids[func_name]
+  if id then api_hits[id] = true end
+  if api_window then api_window[func_name] = (api_window[func_name] or 0) + 1 end
   if VirtualState.verbose_logging then
     local args = {...}
     local arg_str = ""
@@ -92,13 +164,1497 @@ local function log_error(message)
   print("[ERROR] " .. message)
 end
 
+-- ==================== EXTSTATE STORE ====================
+-- Values live in memory; persistent ones are mirrored to an ini file.
+-- Changes only mark their section dirty. Dirty sections are re-serialized
+-- and the file is rewritten atomically (temp file + rename) once per batch
+-- window at a frame boundary, and once more at exit.
+
+-- Keys and values are escaped so they come back as they were saved:
+-- backslash, newline and carriage return everywhere, and "=" in keys,
+-- where it would end the key. Other backslashes read back as written.
+local INI_ESCAPES = {["\\"] = "\\\\", ["\n"] = "\\n", ["\r"] = "\\r", ["="] = "\\="}
+local INI_UNESCAPES = {["\\\\"] = "\\", ["\\n"] = "\n", ["\\r"] = "\r", ["\\="] = "="}
+
+local function parse_ini(path)
+  local sections = {}
+  local f = io.open(path, "r")
+  if not f then return nil end
+  local current
+  for line in f:lines() do
+    line = line:gsub("\r$", "")
+    local name = line:match("^%[(.*)%]$")
+    if name then
+      current = sections[name] or {}
+      sections[name] = current
+    elseif current then
+      -- The key ends at the first "=" that is not escaped
+      local at = line:find("[\\=]")
+      while at and line:sub(at, at) == "\\" do at = line:find("[\\=]", at + 2) end
+      if at and at > 1 then
+        local key = line:sub(1, at - 1):gsub("\\.", INI_UNESCAPES)
+        current[key] = line:sub(at + 1):gsub("\\.", INI_UNESCAPES)
+      end
+    end
+  end
+  f:close()
+  return sections
+end
+
+local function serialize_ini_section(section, values)
+  local keys = {}
+  for key in pairs(values) do keys[#keys + 1] = key end
+  if #keys == 0 then return "" end
+  table.sort(keys)
+  local lines = {"[" .. section .. "]"}
+  for i = 1, #keys do
+    local key = keys[i]:gsub("[\\\n\r=]", INI_ESCAPES)
+    lines[i + 1] = key .. "=" .. tostring(values[keys[i]]):gsub("[\\\n\r]", INI_ESCAPES)
+  end
+  return table.concat(lines, "\n") .. "\n\n"
+end
+
+local function write_file_atomic(path, text)
+  local tmp_path = path .. ".tmp"
+  local f, err = io.open(tmp_path, "wb")
+  if not f then
+    log_error("Cannot write " .. tmp_path .. ": " .. tostring(err))
+    return false
+  end
+  f:write(text)
+  f:close()
+  -- os.rename does not replace an existing file on Windows
+  if not os.rename(tmp_path, path) then
+    os.remove(path)
+    if not os.rename(tmp_path, path) then
+      log_error("Cannot replace " .. path)
+      return false
+    end
+  end
+  VirtualState.stats.ext_state_bytes_written = VirtualState.stats.ext_state_bytes_written + #text
+  return true
+end
+
+local function mark_ext_state_dirty()
+  VirtualState.ext_state_dirty_frame = VirtualState.ext_state_dirty_frame or VirtualState.frame_count
+end
+
+local function flush_ext_state()
+  if not VirtualState.ext_state_dirty_frame then return 0 end
+  local writes = 0
+
+  if next(VirtualState.ext_state_dirty) then
+    if VirtualState.ext_state_file then
+      local names = {}
+      for name in pairs(VirtualState.ext_state_persist) do names[#names + 1] = name end
+      table.sort(names)
+      local chunks = {}
+      for i, name in ipairs(names) do
+        local text = VirtualState.ext_state_text[name]
+        if not text or VirtualState.ext_state_dirty[name] then
+          text = serialize_ini_section(name, VirtualState.ext_state_persist[name])
+          VirtualState.ext_state_text[name] = text
+        end
+        chunks[i] = text
+      end
+      if write_file_atomic(VirtualState.ext_state_file, table.concat(chunks)) then
+        writes = writes + 1
+      end
+    end
+    VirtualState.ext_state_dirty = {}
+  end
+
+  if VirtualState.proj_ext_state_dirty then
+    if VirtualState.proj_ext_state_file then
+      local names = {}
+      for name in pairs(VirtualState.proj_ext_state) do names[#names + 1] = name end
+      table.sort(names)
+      local chunks = {}
+      for i, name in ipairs(names) do
+        chunks[i] = serialize_ini_section(name, VirtualState.proj_ext_state[name])
+      end
+      if write_file_atomic(VirtualState.proj_ext_state_file, table.concat(chunks)) then
+        writes = writes + 1
+      end
+    end
+    VirtualState.proj_ext_state_dirty = false
+  end
+
+  VirtualState.ext_state_dirty_frame = nil
+  VirtualState.stats.ext_state_flushes = VirtualState.stats.ext_state_flushes + writes
+  return writes
+end
+
+-- ==================== SCOPE BALANCE ====================
+
+-- Every Begin*/Push* the script must close is recorded on its context with
+-- the call site, so an imbalance can be reported against the line that
+-- opened it. Recording is O(1) per call; the check runs at frame boundaries.
+
+-- Begin/End pairs nest strictly: an End must close the innermost open scope
+local SCOPE_OPENERS = {
+  Window = "ImGui_Begin", Child = "ImGui_BeginChild", Tree = "ImGui_TreeNode",
+  TabBar = "ImGui_BeginTabBar", TabItem = "ImGui_BeginTabItem",
+  MenuBar = "ImGui_BeginMenuBar", Menu = "ImGui_BeginMenu", Combo = "ImGui_BeginCombo",
+  ListBox = "ImGui_BeginListBox", Table = "ImGui_BeginTable", Group = "ImGui_BeginGroup",
+  Tooltip = "ImGui_BeginTooltip"
+}
+
+-- Push/Pop pairs are independent counters
+local PUSH_KINDS = {"StyleColor", "StyleVar", "Font", "ID", "ItemWidth", "TextWrapPos"}
+
+local function new_site_stack()
+  return {n = 0, name = {}, src = {}, line = {}, frame = {}}
+end
+
+local function scope_tracker(ctx)
+  local tracker = ctx.balance
+  if not tracker then
+    tracker = {scopes = new_site_stack(), kinds = {}, pushes = {}}
+    for _, kind in ipairs(PUSH_KINDS) do
+      tracker.pushes[kind] = new_site_stack()
+    end
+    ctx.balance = tracker
+  end
+  return tracker
+end
+
+-- The frame in progress; end_frame() passes the same number to its hooks
+local function current_frame()
+  return VirtualState.frame_count + 1
+end
+
+-- Level 4 is the script: caller -> mock API function -> tracker -> here
+local function call_site()
+  local info = debug.getinfo(4, "Sl")
+  if not info then return "?", 0 end
+  return info.short_src, info.currentline
+end
+
+local function site_push(stack, name, src, line)
+  local n = stack.n + 1
+  stack.n = n
+  stack.name[n] = name
+  stack.src[n], stack.line[n] = src, line
+  stack.frame[n] = current_frame()
+  return n
+end
+
+local function scope_violation(frame, name, src, line, message)
+  local text = string.format("[frame %d] %s at %s:%d %s", frame, name, src, line, message)
+  table.insert(VirtualState.scope_violations, {
+    frame = frame, name = name, source = src, line = line, message = text
+  })
+  log_error(text)
+end
+
+local function open_scope(ctx, kind, name)
+  if not ctx then return end
+  local tracker = scope_tracker(ctx)
+  local src, line = call_site()
+  tracker.kinds[site_push(tracker.scopes, name or SCOPE_OPENERS[kind], src, line)] = kind
+end
+
+local function close_scope(ctx, kind, name)
+  if not ctx then return end
+  local tracker = scope_tracker(ctx)
+  local scopes, kinds = tracker.scopes, tracker.kinds
+  local n = scopes.n
+  if n > 0 and kinds[n] == kind then
+    scopes.n = n - 1
+    return
+  end
+  local src, line = call_site()
+  local match = n - 1
+  while match > 0 and kinds[match] ~= kind do match = match - 1 end
+  if n == 0 or match == 0 then
+    scope_violation(current_frame(), name, src, line,
+      "without a matching " .. SCOPE_OPENERS[kind])
+    return
+  end
+  -- Close the scopes left open inside the one this End matches
+  for i = n, match + 1, -1 do
+    scope_violation(scopes.frame[i], scopes.name[i], scopes.src[i], scopes.line[i],
+      string.format("was still open at %s (%s:%d)", name, src, line))
+  end
+  scopes.n = match - 1
+end
+
+local function push_scope(ctx, kind, name)
+  if not ctx then return end
+  local src, line = call_site()
+  site_push(scope_tracker(ctx).pushes[kind], name, src, line)
+end
+
+local function pop_scope(ctx, kind, name, count)
+  if not ctx then return end
+  local stack = scope_tracker(ctx).pushes[kind]
+  count = count or 1
+  if count > stack.n then
+    local src, line = call_site()
+    scope_violation(current_frame(), name, src, line,
+      string.format("pops %d but only %d pushed", count, stack.n))
+    count = stack.n
+  end
+  stack.n = stack.n - count
+end
+
+-- Report everything still open on every context, then start clean
+local function check_scope_balance(frame)
+  for _, ctx in ipairs(VirtualState.contexts) do
+    local tracker = ctx.balance
+    if tracker then
+      local scopes = tracker.scopes
+      for i = 1, scopes.n do
+        scope_violation(frame, scopes.name[i], scopes.src[i], scopes.line[i],
+          "was never closed")
+      end
+      scopes.n = 0
+      for _, kind in ipairs(PUSH_KINDS) do
+        local stack = tracker.pushes[kind]
+        for i = 1, stack.n do
+          scope_violation(frame, stack.name[i], stack.src[i], stack.line[i],
+            "was never popped")
+        end
+        stack.n = 0
+      end
+    end
+  end
+end
+
+-- ==================== FRAME BOUNDARIES ====================
+
+-- Functions run after every frame, in registration order
+local frame_end_hooks = {}
+
+-- Flush batched ExtState writes once the batch window has elapsed
+table.insert(frame_end_hooks, function(frame)
+  local dirty_frame = VirtualState.ext_state_dirty_frame
+  if dirty_frame and frame - dirty_frame >= VirtualState.ext_state_flush_frames then
+    flush_ext_state()
+  end
+end)
+
+-- Anything pushed or begun during the frame must be closed by its end
+table.insert(frame_end_hooks, check_scope_balance)
+
+-- Callbacks queued by defer while drive_frames runs them (nil otherwise)
+local deferred = nil
+
+-- Per-frame CPU accounting, while it runs (see FRAME TIMING)
+local frame_timing = nil
+local frame_timer -- loaded after mock_reaper
+
+local function end_frame()
+  local hooks_start = frame_timing and os.clock()
+  VirtualState.frame_count = VirtualState.frame_count + 1
+  -- A frame that ran past delta_time by time_precise pushes the clock on
+  VirtualState.clock = math.max(VirtualState.clock + VirtualState.delta_time, VirtualState.clock_read)
+  for i = 1, #frame_end_hooks do
+    frame_end_hooks[i](VirtualState.frame_count)
+  end
+  if frame_timing then
+    frame_timing.mock = frame_timing.mock + os.clock() - hooks_start -- frame-end work is the mock's
+    frame_timer.close_frame_timing()
+  end
+  VirtualState.frame_started = os.clock()
+end
+
+local write_api_coverage, write_coverage, write_profile -- defined after mock_reaper
+local write_draw_lists -- defined in DRAW LISTS
+
+-- End of one script: report open scopes, run its atexit handlers and
+-- flush its ExtState
+local function finish_script()
+  check_scope_balance(current_frame())
+  local handlers = VirtualState.atexit_handlers or {}
+  VirtualState.atexit_handlers = {}
+  for _, handler in ipairs(handlers) do
+    local ok, err = pcall(handler)
+    if not ok then log_error("atexit handler failed: " .. tostring(err)) end
+  end
+  flush_ext_state()
+end
+
+-- Exit boundary: finish the script and write the process-wide reports
+local function run_exit_handlers()
+  if frame_timing then frame_timer.close_frame_timing() end -- the last frame ends with the script
+  finish_script()
+  write_api_coverage()
+  write_coverage()
+  write_profile()
+  write_draw_lists()
+end
+
+-- Runs entry as frame 1, then each frame's deferred callbacks in turn, on
+-- the virtual clock and without recursion, until max_frames frames have run
+-- or nothing is deferred. before(frame) runs ahead of each frame and
+-- after(frame) once its callbacks are done.
+-- Returns ok, err, frames run, stopped (the script stopped deferring), pending
+local function drive_frames(entry, max_frames, before, after)
+  if deferred then error("frames are already being driven", 2) end
+  local start = VirtualState.frame_count
+  deferred = {}
+  if before then before(1) end
+  local ok, err = pcall(entry)
+  local frame = 1
+  if ok and after then after(1) end
+  while ok and #deferred > 0 and frame < max_frames do
+    local callbacks = deferred
+    deferred = {}
+    end_frame()
+    frame = VirtualState.frame_count - start + 1
+    if before then before(frame) end
+    for i = 1, #callbacks do
+      ok, err = pcall(callbacks[i])
+      if not ok then break end
+    end
+    if ok and after then after(frame) end
+  end
+  local pending = deferred
+  deferred = nil
+  return ok, err, frame, ok and #pending == 0 and frame < max_frames, pending
+end
+
+-- ==================== PROJECT MODEL ====================
+-- Tracks, items and takes are stored column-wise: one array per property,
+-- indexed by row. Scripts receive small handle tables that stay valid
+-- across inserts and deletes; handle.name reads the column through a
+-- handle -> row map, so lookups stay O(1) however large the project gets.
+
+local function new_store(defaults)
+  local store = {count = 0, handles = {}, rows = {}, columns = {}, defaults = defaults}
+  for name in pairs(defaults) do store.columns[name] = {} end
+  local columns, rows = store.columns, store.rows
+  store.meta = {
+    __index = function(handle, key)
+      local row = rows[handle]
+      if not row then return nil end
+      local column = columns[key]
+      if column then return column[row] end
+      if key == "id" then return row - 1 end
+    end,
+    __newindex = function(handle, key, value)
+      local row = rows[handle]
+      local column = columns[key]
+      if row and column then
+        column[row] = value
+      else
+        rawset(handle, key, value)
+      end
+    end
+  }
+  return store
+end
+
+-- Insert a row (shifting later rows down) and return its new handle
+local function store_insert(store, row, values)
+  local count = store.count + 1
+  row = math.max(1, math.min(row or count, count))
+  for name, column in pairs(store.columns) do
+    local value = values and values[name]
+    if value == nil then value = store.defaults[name] end
+    if row == count then column[row] = value else table.insert(column, row, value) end
+  end
+  local handle = setmetatable({}, store.meta)
+  local handles, rows = store.handles, store.rows
+  if row == count then handles[row] = handle else table.insert(handles, row, handle) end
+  for r = row, count do rows[handles[r]] = r end
+  store.count = count
+  return handle
+end
+
+-- Remove a row. Ordered stores shift later rows up; unordered stores move
+-- the last row into the hole in O(1).
+local function store_remove(store, handle, keep_order)
+  local rows, handles = store.rows, store.handles
+  local row = rows[handle]
+  if not row then return false end
+  local count = store.count
+  if keep_order then
+    for _, column in pairs(store.columns) do table.remove(column, row) end
+    table.remove(handles, row)
+    for r = row, count - 1 do rows[handles[r]] = r end
+  else
+    for _, column in pairs(store.columns) do
+      column[row] = column[count]
+      column[count] = nil
+    end
+    local last = handles[count]
+    handles[row] = last
+    handles[count] = nil
+    if last ~= handle then rows[last] = row end
+  end
+  rows[handle] = nil
+  store.count = count - 1
+  return true
+end
+
+local function new_project()
+  return {
+    tracks = new_store({
+      name = "", volume = 1.0, pan = 0.0, color = 0, mute = false, solo = 0,
+      selected = false, folder_depth = 0,
+      items = false,        -- list of this track's item handles
+      items_sorted = true,  -- false until the list is re-sorted by position
+      items_pending = false -- fixture chunk still to be loaded for this track
+    }),
+    items = new_store({
+      track = false, position = 0.0, length = 1.0, mute = false, selected = false,
+      first_take = false, active_take = false, take_count = 0,
+      serial = 0            -- creation order, breaks position ties
+    }),
+    takes = new_store({
+      item = false, next_take = false, name = "", is_midi = false, source = "",
+      midi = false          -- MIDI event store, created on first use
+    }),
+    tempo = 120,
+    fixture = nil,          -- fixture file backing lazily loaded tracks
+    pending_item_count = 0, -- items described by unloaded fixture chunks
+    next_item_serial = 0,
+    item_counts = {},       -- Fenwick tree of item counts by track row
+    item_counts_dirty = true,
+    selected_tracks = nil,  -- cached selection lists, rebuilt on demand
+    selected_items = nil,
+    master = {name = "MASTER", volume = 1.0, pan = 0.0, id = -1}
+  }
+end
+
+-- Fenwick tree helpers (arithmetic only, no Lua 5.3 bit operators)
+local function lowbit(i)
+  local bit = 1
+  while i % (bit * 2) == 0 do bit = bit * 2 end
+  return bit
+end
+
+local function rebuild_item_counts(project)
+  local tracks = project.tracks
+  local lists, pending, n = tracks.columns.items, tracks.columns.items_pending, tracks.count
+  local tree = {}
+  for i = 1, n do
+    tree[i] = (lists[i] and #lists[i] or 0) + (pending[i] and pending[i].count or 0)
+  end
+  for i = 1, n do
+    local parent = i + lowbit(i)
+    if parent <= n then tree[parent] = tree[parent] + tree[i] end
+  end
+  project.item_counts = tree
+  project.item_counts_dirty = false
+end
+
+local function update_item_count(project, track_row, delta)
+  if project.item_counts_dirty then return end
+  local tree, n = project.item_counts, project.tracks.count
+  while track_row <= n do
+    tree[track_row] = tree[track_row] + delta
+    track_row = track_row + lowbit(track_row)
+  end
+end
+
+-- Map a 1-based project-wide item number to (track row, index in track)
+local function find_item_row(project, k)
+  if project.item_counts_dirty then rebuild_item_counts(project) end
+  local tree, n = project.item_counts, project.tracks.count
+  local step = 1
+  while step * 2 <= n do step = step * 2 end
+  local pos = 0
+  while step >= 1 do
+    local next_pos = pos + step
+    if next_pos <= n and tree[next_pos] < k then
+      pos = next_pos
+      k = k - tree[next_pos]
+    end
+    step = math.floor(step / 2)
+  end
+  return pos + 1, k
+end
+
+-- Assigned in the FIXTURES section; loads one track's item chunk
+local load_track_items
+
+-- Load a fixture-backed track's items on first access
+local function ensure_track_items(project, track_row)
+  local pending = project.tracks.columns.items_pending[track_row]
+  if pending then
+    project.tracks.columns.items_pending[track_row] = false
+    project.pending_item_count = project.pending_item_count - pending.count
+    update_item_count(project, track_row, -pending.count)
+    load_track_items(project, track_row, pending)
+  end
+end
+
+local function project_item_count(project)
+  return project.items.count + project.pending_item_count
+end
+
+-- A track's items in timeline order; sorting is deferred until needed
+local function track_item_list(project, track_row)
+  ensure_track_items(project, track_row)
+  local tracks = project.tracks
+  local list = tracks.columns.items[track_row]
+  if not list then return nil end
+  if not tracks.columns.items_sorted[track_row] then
+    local items = project.items
+    local rows, position, serial = items.rows, items.columns.position, items.columns.serial
+    table.sort(list, function(a, b)
+      local ra, rb = rows[a], rows[b]
+      if position[ra] ~= position[rb] then return position[ra] < position[rb] end
+      return serial[ra] < serial[rb]
+    end)
+    tracks.columns.items_sorted[track_row] = true
+  end
+  return list
+end
+
+local function invalidate_track_order(project)
+  project.item_counts_dirty = true
+  project.selected_tracks = nil
+  project.selected_items = nil
+end
+
+local function project_add_track(project, index, values)
+  local tracks = project.tracks
+  local handle = store_insert(tracks, (index or tracks.count) + 1, values)
+  invalidate_track_order(project)
+  return handle
+end
+
+local function project_add_item(project, track, values)
+  local track_row = project.tracks.rows[track]
+  if not track_row then return nil end
+  ensure_track_items(project, track_row)
+  project.next_item_serial = project.next_item_serial + 1
+  values = values or {}
+  values.track = track
+  values.serial = project.next_item_serial
+  local item = store_insert(project.items, nil, values)
+  local tracks = project.tracks
+  local list = tracks.columns.items[track_row]
+  if not list then
+    list = {}
+    tracks.columns.items[track_row] = list
+  end
+  local count = #list
+  list[count + 1] = item
+  -- Appending in timeline order keeps the list sorted for free
+  if count > 0 and tracks.columns.items_sorted[track_row] then
+    local items = project.items
+    local last_row, row = items.rows[list[count]], items.rows[item]
+    if items.columns.position[last_row] > items.columns.position[row] then
+      tracks.columns.items_sorted[track_row] = false
+    end
+  end
+  update_item_count(project, track_row, 1)
+  project.selected_items = nil
+  return item
+end
+
+local function project_add_take(project, item, values)
+  local items = project.items
+  local item_row = items.rows[item]
+  if not item_row then return nil end
+  values = values or {}
+  values.item = item
+  local take = store_insert(project.takes, nil, values)
+  local first = items.columns.first_take[item_row]
+  if not first then
+    items.columns.first_take[item_row] = take
+    items.columns.active_take[item_row] = take
+  else
+    local takes = project.takes
+    local last = first
+    while takes.columns.next_take[takes.rows[last]] do
+      last = takes.columns.next_take[takes.rows[last]]
+    end
+    takes.columns.next_take[takes.rows[last]] = take
+  end
+  items.columns.take_count[item_row] = items.columns.take_count[item_row] + 1
+  return take
+end
+
+local function item_take_at(project, item, index)
+  local item_row = project.items.rows[item]
+  if not item_row then return nil end
+  local takes = project.takes
+  local take = project.items.columns.first_take[item_row]
+  while take and index > 0 do
+    take = takes.columns.next_take[takes.rows[take]]
+    index = index - 1
+  end
+  return take or nil
+end
+
+-- Index of an item in its track's list: binary search on (position,
+-- creation order) when the list is sorted, a scan otherwise
+local function item_list_index(project, track_row, item)
+  local list = project.tracks.columns.items[track_row]
+  if not list then return nil end
+  if project.tracks.columns.items_sorted[track_row] then
+    local items = project.items
+    local rows, position, serial = items.rows, items.columns.position, items.columns.serial
+    local row = rows[item]
+    local p, s = position[row], serial[row]
+    local lo, hi = 1, #list
+    while lo <= hi do
+      local mid = math.floor((lo + hi) / 2)
+      local mid_row = rows[list[mid]]
+      local mp, ms = position[mid_row], serial[mid_row]
+      if mp == p and ms == s then return mid end
+      if mp < p or (mp == p and ms < s) then lo = mid + 1 else hi = mid - 1 end
+    end
+  end
+  for i = #list, 1, -1 do
+    if list[i] == item then return i end
+  end
+  return nil
+end
+
+local function detach_item_from_track(project, item)
+  local items, tracks = project.items, project.tracks
+  local item_row = items.rows[item]
+  local track_row = tracks.rows[items.columns.track[item_row]]
+  if not track_row then return end
+  local index = item_list_index(project, track_row, item)
+  if index then
+    table.remove(tracks.columns.items[track_row], index)
+    update_item_count(project, track_row, -1)
+  end
+end
+
+local function project_delete_item(project, item)
+  local items = project.items
+  local item_row = items.rows[item]
+  if not item_row then return false end
+  local takes = project.takes
+  local take = items.columns.first_take[item_row]
+  while take do
+    local next_take = takes.columns.next_take[takes.rows[take]]
+    store_remove(takes, take)
+    take = next_take
+  end
+  detach_item_from_track(project, item)
+  store_remove(items, item)
+  project.selected_items = nil
+  return true
+end
+
+local function project_delete_track(project, track)
+  local tracks = project.tracks
+  local track_row = tracks.rows[track]
+  if not track_row then return false end
+  local pending = tracks.columns.items_pending[track_row]
+  if pending then
+    -- Never loaded, so there are no handles to invalidate
+    project.pending_item_count = project.pending_item_count - pending.count
+  end
+  local list = tracks.columns.items[track_row]
+  if list then
+    for i = #list, 1, -1 do project_delete_item(project, list[i]) end
+  end
+  store_remove(tracks, track, true)
+  invalidate_track_order(project)
+  return true
+end
+
+-- Move an item on the timeline or to another track, keeping lists valid
+local function project_move_item(project, item, position, track)
+  local items, tracks = project.items, project.tracks
+  local item_row = items.rows[item]
+  if not item_row then return false end
+  if track and track ~= items.columns.track[item_row] then
+    local track_row = tracks.rows[track]
+    if not track_row then return false end
+    ensure_track_items(project, track_row)
+    detach_item_from_track(project, item)
+    items.columns.track[item_row] = track
+    local list = tracks.columns.items[track_row] or {}
+    tracks.columns.items[track_row] = list
+    list[#list + 1] = item
+    tracks.columns.items_sorted[track_row] = false
+    update_item_count(project, track_row, 1)
+  end
+  if position and position ~= items.columns.position[item_row] then
+    items.columns.position[item_row] = position
+    local track_row = tracks.rows[items.columns.track[item_row]]
+    tracks.columns.items_sorted[track_row] = false
+  end
+  project.selected_items = nil
+  return true
+end
+
+local function project_item_at(project, index)
+  local items = project.items
+  if type(index) ~= "number" or index < 0 or index >= project_item_count(project) then return nil end
+  local track_row, offset = find_item_row(project, index + 1)
+  local list = track_item_list(project, track_row)
+  return list and list[offset] or nil
+end
+
+local function project_selected_tracks(project)
+  if not project.selected_tracks then
+    local tracks = project.tracks
+    local selected, list = tracks.columns.selected, {}
+    for row = 1, tracks.count do
+      if selected[row] then list[#list + 1] = tracks.handles[row] end
+    end
+    project.selected_tracks = list
+  end
+  return project.selected_tracks
+end
+
+local function project_selected_items(project)
+  if not project.selected_items then
+    local tracks, items = project.tracks, project.items
+    local selected, list = items.columns.selected, {}
+    for track_row = 1, tracks.count do
+      local track_items = track_item_list(project, track_row)
+      if track_items then
+        for i = 1, #track_items do
+          if selected[items.rows[track_items[i]]] then list[#list + 1] = track_items[i] end
+        end
+      end
+    end
+    project.selected_items = list
+  end
+  return project.selected_items
+end
+
+-- ==================== MARKERS AND REGIONS ====================
+-- Markers and regions share one array in enumeration order (position, then
+-- markers before regions, then number). Lookups by time use derived arrays
+-- rebuilt lazily after edits: marker rows by position, and a max-end segment
+-- tree over regions sorted by start, which answers "which region contains
+-- t" in O(log n).
+
+local function new_marker_store()
+  return {
+    list = {},               -- entries in enumeration order
+    numbers = {[false] = {}, [true] = {}}, -- isrgn -> number -> entry
+    free_number = {[false] = 1, [true] = 1}, -- no free number below this
+    num_markers = 0,
+    num_regions = 0,
+    index_dirty = true,
+    marker_rows = {},        -- enumeration indexes of markers
+    marker_pos = {},
+    region_rows = {},        -- enumeration indexes of regions
+    region_start = {},
+    region_tree = {},        -- max region end per segment tree node
+    tree_size = 1
+  }
+end
+
+local function project_markers(project)
+  if not project.markers then project.markers = new_marker_store() end
+  return project.markers
+end
+
+local function marker_before(a, b)
+  if a.pos ~= b.pos then return a.pos < b.pos end
+  if a.isrgn ~= b.isrgn then return not a.isrgn end
+  return a.number < b.number
+end
+
+-- Enumeration index of an entry, or where it would be inserted
+local function marker_slot(store, entry)
+  local list = store.list
+  local lo, hi = 1, #list
+  while lo <= hi do
+    local mid = math.floor((lo + hi) / 2)
+    if marker_before(list[mid], entry) then lo = mid + 1 else hi = mid - 1 end
+  end
+  return lo
+end
+
+local function take_marker_number(store, isrgn, wanted)
+  local used = store.numbers[isrgn]
+  if wanted and wanted > 0 and not used[wanted] then return wanted end
+  local number = store.free_number[isrgn]
+  while used[number] do number = number + 1 end
+  store.free_number[isrgn] = number + 1
+  return number
+end
+
+local function marker_insert(store, entry)
+  entry.number = take_marker_number(store, entry.isrgn, entry.number)
+  store.numbers[entry.isrgn][entry.number] = entry
+  table.insert(store.list, marker_slot(store, entry), entry)
+  if entry.isrgn then
+    store.num_regions = store.num_regions + 1
+  else
+    store.num_markers = store.num_markers + 1
+  end
+  store.index_dirty = true
+  return entry.number
+end
+
+local function marker_remove(store, entry)
+  local index = marker_slot(store, entry)
+  if store.list[index] ~= entry then return false end
+  table.remove(store.list, index)
+  store.numbers[entry.isrgn][entry.number] = nil
+  if entry.number < store.free_number[entry.isrgn] then
+    store.free_number[entry.isrgn] = entry.number
+  end
+  if entry.isrgn then
+    store.num_regions = store.num_regions - 1
+  else
+    store.num_markers = store.num_markers - 1
+  end
+  store.index_dirty = true
+  return true
+end
+
+local function rebuild_marker_index(store)
+  local marker_rows, marker_pos, region_rows, region_start = {}, {}, {}, {}
+  local ends = {}
+  for i, entry in ipairs(store.list) do
+    if entry.isrgn then
+      local n = #region_rows + 1
+      region_rows[n], region_start[n], ends[n] = i, entry.pos, entry.rgnend
+    else
+      local n = #marker_rows + 1
+      marker_rows[n], marker_pos[n] = i, entry.pos
+    end
+  end
+  local size = 1
+  while size < #region_rows do size = size * 2 end
+  local tree = {}
+  for i = 1, size do tree[size + i - 1] = ends[i] or -math.huge end
+  for node = size - 1, 1, -1 do
+    tree[node] = math.max(tree[node * 2], tree[node * 2 + 1])
+  end
+  store.marker_rows, store.marker_pos = marker_rows, marker_pos
+  store.region_rows, store.region_start = region_rows, region_start
+  store.region_tree, store.tree_size = tree, size
+  store.index_dirty = false
+end
+
+-- Number of sorted values <= t
+local function count_at_or_before(values, t)
+  local lo, hi = 1, #values
+  while lo <= hi do
+    local mid = math.floor((lo + hi) / 2)
+    if values[mid] <= t then lo = mid + 1 else hi = mid - 1 end
+  end
+  return lo - 1
+end
+
+-- Rightmost region among the first `limit` (by start) that ends after t
+local function find_region_ending_after(store, node, lo, hi, limit, t)
+  if lo > limit or store.region_tree[node] <= t then return nil end
+  if lo == hi then return lo end
+  local mid = math.floor((lo + hi) / 2)
+  return find_region_ending_after(store, node * 2 + 1, mid + 1, hi, limit, t)
+      or find_region_ending_after(store, node * 2, lo, mid, limit, t)
+end
+
+-- Enumeration indexes (0-based, -1 for none) of the last marker at or
+-- before t and of the latest-starting region containing t
+local function marker_lookup(store, t)
+  if store.index_dirty then rebuild_marker_index(store) end
+  local marker = count_at_or_before(store.marker_pos, t)
+  local marker_index = marker > 0 and store.marker_rows[marker] - 1 or -1
+  local region_index = -1
+  local limit = count_at_or_before(store.region_start, t)
+  if limit > 0 then
+    local region = find_region_ending_after(store, 1, 1, store.tree_size, limit, t)
+    if region then region_index = store.region_rows[region] - 1 end
+  end
+  return marker_index, region_index
+end
+
+local function enum_marker(store, index)
+  local entry = store.list[(index or -1) + 1]
+  if not entry then return 0, false, 0.0, 0.0, "", 0, 0 end
+  return index + 1, entry.isrgn, entry.pos, entry.rgnend, entry.name, entry.number, entry.color
+end
+
+local function add_marker(store, isrgn, pos, rgnend, name, wantidx, color)
+  isrgn = isrgn and true or false
+  pos = pos or 0.0
+  return marker_insert(store, {
+    isrgn = isrgn,
+    pos = pos,
+    rgnend = isrgn and math.max(pos, rgnend or pos) or pos,
+    name = name or "",
+    number = wantidx,
+    color = color or 0
+  })
+end
+
+local function set_marker(store, markrgnindexnumber, isrgn, pos, rgnend, name, color)
+  local entry = store.numbers[isrgn and true or false][markrgnindexnumber]
+  if not entry then return false end
+  marker_remove(store, entry)
+  entry.pos = pos or entry.pos
+  entry.rgnend = entry.isrgn and math.max(entry.pos, rgnend or entry.rgnend) or entry.pos
+  if name and name ~= "" then entry.name = name end
+  if color then entry.color = color end
+  marker_insert(store, entry)
+  return true
+end
+
+-- The small project every fresh environment starts with
+local function new_default_project()
+  local project = new_project()
+  for i = 1, 8 do
+    project_add_track(project, nil, {name = "Track " .. i, selected = (i == 1)})
+  end
+  for i = 0, 3 do
+    local track = project.tracks.handles[(i % 3) + 1]
+    local item = project_add_item(project, track, {position = i * 30.0, length = 25.0, selected = (i == 0)})
+    project_add_take(project, item, {name = "Take " .. (i + 1)})
+  end
+  local markers = project_markers(project)
+  marker_insert(markers, {isrgn = false, pos = 10.0, rgnend = 0.0, name = "Intro", number = 1, color = 0})
+  marker_insert(markers, {isrgn = false, pos = 60.0, rgnend = 0.0, name = "Verse", number = 2, color = 0})
+  marker_insert(markers, {isrgn = false, pos = 120.0, rgnend = 0.0, name = "Chorus", number = 3, color = 0})
+  return project
+end
+
+VirtualState.project = new_default_project()
+
+local function current_project()
+  return VirtualState.project
+end
+
+-- ==================== MIDI STORAGE ====================
+-- Each MIDI take owns parallel arrays for notes, CCs and text/sysex events,
+-- kept sorted by PPQ position. Inserts binary-search their slot unless the
+-- caller asked for noSort, in which case sorting waits for MIDI_Sort.
+
+local PPQ_PER_QUARTER = 960
+
+local NOTE_COLUMNS = {"start", "stop", "chan", "pitch", "vel", "sel", "mute"}
+local CC_COLUMNS = {"ppq", "chanmsg", "chan", "msg2", "msg3", "sel", "mute"}
+local TEXT_COLUMNS = {"ppq", "type", "msg", "sel", "mute"}
+
+local function new_event_list(columns, key)
+  local list = {count = 0, sorted = true, key = key, names = columns}
+  for _, name in ipairs(columns) do list[name] = {} end
+  return list
+end
+
+local function new_midi_store()
+  return {
+    notes = new_event_list(NOTE_COLUMNS, "start"),
+    ccs = new_event_list(CC_COLUMNS, "ppq"),
+    texts = new_event_list(TEXT_COLUMNS, "ppq"),
+    sort_disabled = false
+  }
+end
+
+-- First index whose key is > ppq (upper bound), by binary search
+local function event_upper_bound(list, ppq)
+  local keys = list[list.key]
+  local lo, hi = 1, list.count
+  while lo <= hi do
+    local mid = math.floor((lo + hi) / 2)
+    if keys[mid] <= ppq then lo = mid + 1 else hi = mid - 1 end
+  end
+  return lo
+end
+
+-- First index whose key is >= ppq (lower bound), by binary search
+local function event_lower_bound(list, ppq)
+  local keys = list[list.key]
+  local lo, hi = 1, list.count
+  while lo <= hi do
+    local mid = math.floor((lo + hi) / 2)
+    if keys[mid] < ppq then lo = mid + 1 else hi = mid - 1 end
+  end
+  return lo
+end
+
+-- Reorder every column of a list by its sort key (stable on ties)
+local function sort_event_list(list)
+  if list.sorted then return end
+  local n, keys = list.count, list[list.key]
+  local order = {}
+  for i = 1, n do order[i] = i end
+  table.sort(order, function(a, b)
+    if keys[a] ~= keys[b] then return keys[a] < keys[b] end
+    return a < b
+  end)
+  for _, name in ipairs(list.names) do
+    local column, sorted = list[name], {}
+    for i = 1, n do sorted[i] = column[order[i]] end
+    list[name] = sorted
+  end
+  list.sorted = true
+end
+
+-- Append a row, or insert it at its sorted slot when sorting is allowed
+local function insert_event(list, values, no_sort)
+  local n = list.count + 1
+  local key = values[1] -- the sort key is always the first column
+  local row = n
+  if no_sort then
+    if list.sorted and n > 1 and list[list.key][n - 1] > key then list.sorted = false end
+  else
+    sort_event_list(list)
+    row = event_upper_bound(list, key)
+  end
+  for i, name in ipairs(list.names) do
+    if row == n then list[name][n] = values[i] else table.insert(list[name], row, values[i]) end
+  end
+  list.count = n
+  return row
+end
+
+local function delete_event(list, row)
+  if row < 1 or row > list.count then return false end
+  for _, name in ipairs(list.names) do table.remove(list[name], row) end
+  list.count = list.count - 1
+  return true
+end
+
+local function sort_midi(midi)
+  sort_event_list(midi.notes)
+  sort_event_list(midi.ccs)
+  sort_event_list(midi.texts)
+end
+
+local function event_flags(sel, mute)
+  return (sel and 1 or 0) + (mute and 2 or 0)
+end
+
+-- Encode a take as REAPER's packed event buffer: for each event an int32
+-- tick offset from the previous event, a flag byte and an int32-prefixed
+-- message. Note-offs, CCs, text events and note-ons are merged by PPQ.
+local function encode_midi_events(midi)
+  sort_midi(midi)
+  local notes, ccs, texts = midi.notes, midi.ccs, midi.texts
+  local pack = string.pack
+  local char = string.char
+
+  -- Note-offs in end order, via a single permutation array
+  local off_order = {}
+  for i = 1, notes.count do off_order[i] = i end
+  local stops = notes.stop
+  table.sort(off_order, function(a, b)
+    if stops[a] ~= stops[b] then return stops[a] < stops[b] end
+    return a < b
+  end)
+
+  local out, n = {}, 0
+  local last_ppq = 0
+  local on_i, off_i, cc_i, text_i = 1, 1, 1, 1
+  local note_count, cc_count, text_count = notes.count, ccs.count, texts.count
+  local huge = math.huge
+  while true do
+    local off_ppq = off_i <= note_count and stops[off_order[off_i]] or huge
+    local cc_ppq = cc_i <= cc_count and ccs.ppq[cc_i] or huge
+    local text_ppq = text_i <= text_count and texts.ppq[text_i] or huge
+    local on_ppq = on_i <= note_count and notes.start[on_i] or huge
+    local ppq = math.min(off_ppq, cc_ppq, text_ppq, on_ppq)
+    if ppq == huge then break end
+    local flags, msg
+    -- A note-off goes first on ties, unless its own note-on is still due
+    if off_ppq == ppq and off_order[off_i] < on_i then
+      local i = off_order[off_i]
+      off_i = off_i + 1
+      flags = event_flags(notes.sel[i], notes.mute[i])
+      msg = char(0x80 + notes.chan[i], notes.pitch[i], 0)
+    elseif cc_ppq == ppq then
+      local i = cc_i
+      cc_i = cc_i + 1
+      flags = event_flags(ccs.sel[i], ccs.mute[i])
+      local status = ccs.chanmsg[i] + ccs.chan[i]
+      if ccs.chanmsg[i] == 0xC0 or ccs.chanmsg[i] == 0xD0 then
+        msg = char(status, ccs.msg2[i])
+      else
+        msg = char(status, ccs.msg2[i], ccs.msg3[i])
+      end
+    elseif text_ppq == ppq then
+      local i = text_i
+      text_i = text_i + 1
+      flags = event_flags(texts.sel[i], texts.mute[i])
+      if texts.type[i] == -1 then
+        msg = char(0xF0) .. texts.msg[i] .. char(0xF7)
+      else
+        msg = char(0xFF, texts.type[i]) .. texts.msg[i]
+      end
+    else
+      local i = on_i
+      on_i = on_i + 1
+      flags = event_flags(notes.sel[i], notes.mute[i])
+      msg = char(0x90 + notes.chan[i], notes.pitch[i], notes.vel[i])
+    end
+    n = n + 1
+    out[n] = pack("<i4Bs4", math.floor(ppq - last_ppq), flags, msg)
+    last_ppq = ppq
+  end
+  return table.concat(out)
+end
+
+-- Decode a packed event buffer straight into the column arrays
+local function decode_midi_events(buf)
+  local midi = new_midi_store()
+  local notes, ccs, texts = midi.notes, midi.ccs, midi.texts
+  local unpack, byte = string.unpack, string.byte
+  local pending = {} -- chan * 128 + pitch -> open note rows, oldest first
+  local pos, len, ppq = 1, #buf, 0
+  local note_n, cc_n, text_n = 0, 0, 0
+  while pos <= len do
+    local offset, flags, msg
+    offset, flags, msg, pos = unpack("<i4Bs4", buf, pos)
+    if offset < 0 then
+      notes.sorted, ccs.sorted, texts.sorted = false, false, false
+    end
+    ppq = ppq + offset
+    local sel, mute = flags % 2 == 1, flags % 4 >= 2
+    local status, data1, data2 = byte(msg, 1, 3)
+    if status then
+      local kind, chan = status - status % 16, status % 16
+      if kind == 0x90 and (data2 or 0) > 0 then
+        note_n = note_n + 1
+        notes.start[note_n], notes.stop[note_n] = ppq, ppq
+        notes.chan[note_n], notes.pitch[note_n], notes.vel[note_n] = chan, data1, data2
+        notes.sel[note_n], notes.mute[note_n] = sel, mute
+        local key = chan * 128 + data1
+        local open = pending[key]
+        if not open then
+          open = {}
+          pending[key] = open
+        end
+        open[#open + 1] = note_n
+      elseif kind == 0x80 or kind == 0x90 then
+        local open = pending[chan * 128 + (data1 or 0)]
+        if open and #open > 0 then
+          notes.stop[table.remove(open, 1)] = ppq
+        end
+      elseif status == 0xF0 then
+        text_n = text_n + 1
+        texts.ppq[text_n], texts.type[text_n] = ppq, -1
+        texts.msg[text_n] = msg:sub(2, msg:sub(-1) == "\247" and -2 or -1)
+        texts.sel[text_n], texts.mute[text_n] = sel, mute
+      elseif status == 0xFF then
+        text_n = text_n + 1
+        texts.ppq[text_n], texts.type[text_n], texts.msg[text_n] = ppq, data1 or 1, msg:sub(3)
+        texts.sel[text_n], texts.mute[text_n] = sel, mute
+      elseif kind >= 0xA0 and kind <= 0xE0 then
+        cc_n = cc_n + 1
+        ccs.ppq[cc_n], ccs.chanmsg[cc_n], ccs.chan[cc_n] = ppq, kind, chan
+        ccs.msg2[cc_n], ccs.msg3[cc_n] = data1 or 0, data2 or 0
+        ccs.sel[cc_n], ccs.mute[cc_n] = sel, mute
+      end
+    end
+  end
+  -- Notes still open at the end of the buffer last until the final event
+  for _, open in pairs(pending) do
+    for _, row in ipairs(open) do notes.stop[row] = ppq end
+  end
+  notes.count, ccs.count, texts.count = note_n, cc_n, text_n
+  return midi
+end
+
+local function take_midi(take)
+  local project = current_project()
+  local row = project.takes.rows[take]
+  if not row or not project.takes.columns.is_midi[row] then return nil end
+  local midi = project.takes.columns.midi[row]
+  if not midi then
+    midi = new_midi_store()
+    project.takes.columns.midi[row] = midi
+  elseif type(midi) == "string" then
+    -- Packed events from a fixture, decoded on first use
+    midi = decode_midi_events(midi)
+    sort_midi(midi)
+    project.takes.columns.midi[row] = midi
+  end
+  return midi
+end
+
+-- ==================== PROJECT FIXTURES ====================
+-- A fixture is a single file written by `envireament fixtures`: a first line
+-- giving the header size, a Lua header chunk with project settings, markers
+-- and track headers, then one Lua chunk per track holding its items as
+-- columns. Only the header is read up front. A track's chunk is read the
+-- first time its items are touched, and MIDI stays packed until a script
+-- reads the take. Since v2 string literals keep their bytes as they are
+-- (v1 escaped every unprintable byte); both are plain Lua, so both load.
+
+local FIXTURE_VERSION = 2
+
+-- Evaluate a data-only chunk with an empty environment
+local function load_data_chunk(source, name)
+  local chunk, err
+  if setfenv then
+    chunk, err = loadstring(source, name)
+    if chunk then setfenv(chunk, {}) end
+  else
+    chunk, err = load(source, name, "t", {})
+  end
+  if not chunk then error(err, 0) end
+  return chunk()
+end
+
+local function read_fixture_range(fixture, offset, size)
+  local file = assert(io.open(fixture.path, "rb"))
+  file:seek("set", fixture.body_start + offset)
+  local data = file:read(size)
+  file:close()
+  if not data or #data ~= size then error("truncated fixture: " .. fixture.path, 0) end
+  return data
+end
+
+load_track_items = function(project, track_row, pending)
+  local source = read_fixture_range(project.fixture, pending.offset, pending.size)
+  local chunk = load_data_chunk(source, "=fixture track " .. track_row)
+  VirtualState.stats.fixture_chunks_loaded = VirtualState.stats.fixture_chunks_loaded + 1
+  local track = project.tracks.handles[track_row]
+  local items = project.items
+  for i = 1, chunk.count do
+    local item = project_add_item(project, track, {
+      position = chunk.position[i],
+      length = chunk.length[i],
+      mute = chunk.mute[i],
+      selected = chunk.selected[i]
+    })
+    local takes = chunk.takes[i]
+    for t = 1, #takes do
+      local info = takes[t]
+      local take = project_add_take(project, item, {
+        name = info.name or "",
+        source = info.source or "",
+        is_midi = info.midi ~= nil,
+        midi = info.midi or false
+      })
+      if t == chunk.active_take[i] then
+        items.columns.active_take[items.rows[item]] = take
+      end
+    end
+  end
+end
+
+-- Build a project from a fixture file, reading only its header
+local function load_fixture_project(path)
+  local file, err = io.open(path, "rb")
+  if not file then return nil, err end
+  local first = file:read("*l") or ""
+  local version, header_size = first:match("^%-%- EnviREAment fixture v(%d+) header=(%d+)")
+  if not version then
+    file:close()
+    return nil, "not an EnviREAment fixture: " .. path
+  end
+  if tonumber(version) > FIXTURE_VERSION then
+    file:close()
+    return nil, "fixture v" .. version .. " is newer than this mock (v" .. FIXTURE_VERSION .. "): " .. path
+  end
+  header_size = tonumber(header_size)
+  local source = file:read(header_size)
+  file:close()
+  local ok, header = pcall(load_data_chunk, source or "", "=fixture header")
+  if not ok then return nil, header end
+
+  local project = new_project()
+  project.tempo = header.tempo or project.tempo
+  project.fixture = {path = path, body_start = #first + 1 + header_size}
+  for _, info in ipairs(header.tracks or {}) do
+    local count = info.items or 0
+    local track = project_add_track(project, nil, {
+      name = info.name,
+      volume = info.volume,
+      pan = info.pan,
+      color = info.color,
+      mute = info.mute,
+      solo = info.solo,
+      selected = info.selected,
+      folder_depth = info.folder_depth,
+      items_pending = count > 0 and {offset = info.offset, size = info.size, count = count} or false
+    })
+    if info.fx then
+      local fx = {}
+      for i, entry in ipairs(info.fx) do
+        fx[i] = {name = entry.name or "Unknown FX", enabled = entry.enabled ~= false,
+                 preset = entry.preset or "Default", params = {}}
+      end
+      track.fx = fx
+    end
+    project.pending_item_count = project.pending_item_count + count
+  end
+  local markers = project_markers(project)
+  for _, m in ipairs(header.markers or {}) do
+    marker_insert(markers, {
+      isrgn = m.isrgn and true or false,
+      pos = m.pos or 0.0,
+      rgnend = m.rgnend or m.pos or 0.0,
+      name = m.name or "",
+      number = m.number,
+      color = m.color or 0
+    })
+  end
+  return project
+end
+
+-- ==================== INPUT EVENTS ====================
+-- While a scenario plays (see SCENARIO PLAYBACK), each frame's widget
+-- events sit in one table keyed by target, and every widget looks itself
+-- up there when it is called: by its full ID path ("Window/row 3/Load"),
+-- by its ID ("Load##3") or by its visible label ("Load"). A widget pays
+-- three hash lookups, and nothing at all when no scenario is playing.
+
+-- The scenario being played, nil otherwise
+local playback = nil
+
+-- Dear ImGui key codes (ImGuiKey), as ReaImGui's ImGui_Key_* return them
+local KEY_CODES = {
+  Tab = 512, LeftArrow = 513, RightArrow = 514, UpArrow = 515, DownArrow = 516,
+  PageUp = 517, PageDown = 518, Home = 519, End = 520, Insert = 521, Delete = 522,
+  Backspace = 523, Space = 524, Enter = 525, Escape = 526,
+  LeftCtrl = 527, LeftShift = 528, LeftAlt = 529, LeftSuper = 530,
+  RightCtrl = 531, RightShift = 532, RightAlt = 533, RightSuper = 534, Menu = 535,
+}
+for i = 0, 9 do KEY_CODES[tostring(i)] = 536 + i end
+for i = 0, 25 do KEY_CODES[string.char(65 + i)] = 546 + i end
+for i = 1, 12 do KEY_CODES["F" .. i] = 571 + i end
+
+-- "Save##row3" shows "Save" and is identified by the whole label;
+-- "Save###row3" is identified by "###row3" alone
+local function split_label(label)
+  label = tostring(label or "")
+  local hash = label:find("##", 1, true)
+  if not hash then return label, label end
+  local triple = label:find("###", 1, true)
+  return label:sub(1, hash - 1), triple and label:sub(triple) or label
+end
+
+-- Windows, children, open tree nodes, tab bars, menus, tables and PushID
+-- each add a segment; ids[n] is the path prefix at depth n
+local function id_push(ctx, segment)
+  if not playback or not ctx then return end
+  local ids = ctx.ids
+  if not ids then
+    ids = {n = 0}
+    ctx.ids = ids
+  end
+  local _, id = split_label(segment)
+  ids.n = ids.n + 1
+  ids[ids.n] = (ids[ids.n - 1] or "") .. id .. "/"
+end
+
+local function id_pop(ctx)
+  local ids = ctx and ctx.ids
+  if ids and ids.n > 0 then ids.n = ids.n - 1 end
+end
+
+-- The event this frame holds for the widget being submitted, if any. It
+-- is also remembered as the context's last item for the IsItem* queries.
+local function item_event(ctx, label, widget)
+  if not playback or not ctx then return nil end
+  local events = playback.events
+  local event = nil
+  if events then
+    local visible, id = split_label(label)
+    local ids = ctx.ids
+    event = events[(ids and ids[ids.n] or "") .. id] or events[id] or events[visible]
+    if event then
+      if event.widget then
+        event = nil -- the first widget with this label took it
+      else
+        event.widget = widget
+      end
+    end
+  end
+  ctx.last_item = event
+  return event
+end
+
+-- A left click on the widget this frame
+local function item_clicked(ctx, label, widget)
+  local event = item_event(ctx, label, widget)
+  return event ~= nil and event.kind == "click" and (event.button or 0) == 0
+end
+
+-- changed, value: a "set" event replaces the widget's value
+local function item_value(ctx, label, widget, value)
+  local event = item_event(ctx, label, widget)
+  if event and event.kind == "set" then
+    event.edited = true
+    return true, event.value
+  end
+  return false, value
+end
+
+-- changed, value for widgets a click flips (Checkbox, Selectable)
+local function item_toggle(ctx, label, widget, value)
+  local event = item_event(ctx, label, widget)
+  if not event or event.kind == "hover" or (event.button or 0) ~= 0 then return false, value end
+  event.edited = true
+  if event.kind == "set" then return true, event.value end
+  return true, not value
+end
+
+-- Tree nodes remember being toggled by a click, as ImGui stores open state
+local function tree_node_open(ctx, label, flags)
+  local open = math.floor((flags or 0) / 32) % 2 == 1 -- DefaultOpen
+  if not playback or not ctx then return open end
+  local event = item_event(ctx, label, "TreeNode")
+  local ids = ctx.ids
+  local key = (ids and ids[ids.n] or "") .. select(2, split_label(label))
+  ctx.toggled_nodes = ctx.toggled_nodes or {}
+  if event and event.kind == "click" then
+    ctx.toggled_nodes[key] = not ctx.toggled_nodes[key]
+  end
+  if ctx.toggled_nodes[key] then open = not open end
+  return open
+end
+
+local function key_code(key)
+  return type(key) == "number" and key or KEY_CODES[key]
+end
+
+-- Keyboard and mouse state, shared by every context
+local function new_input()
+  return {keys_down = {}, pressed = {}, released = {}, mouse_x = nil, mouse_y = nil,
+          mouse_down = {}, clicked = {}, mouse_released = {}, tapped = {}}
+end
+
+local function input_state()
+  return playback and playback.input
+end
+
+-- ==================== LAYOUT ====================
+-- Item rects, text size and scrolling (envireament_layout.lua), and
+-- ImGui_ListClipper on top of them (envireament_clipper.lua)
+
+local layout = require_engine("envireament_layout").new({
+  state = VirtualState, log_warning = log_warning, split_label = split_label,
+  playback = function() return playback end,
+})
+local list_clipper = require_engine("envireament_clipper").new({layout = layout})
+
+-- ==================== DRAW LISTS ====================
+-- Each window's draw commands, recorded into flat arrays and exported per
+-- frame with ENVIREAMENT_DRAWLIST set (envireament_drawlist.lua)
+
+local draw_lists = require_engine("envireament_drawlist").new({
+  state = VirtualState, log_warning = log_warning, layout = layout, frame_end_hooks = frame_end_hooks,
+})
+write_draw_lists = draw_lists.write
+
+if os.getenv("ENVIREAMENT_DRAWLIST") then
+  draw_lists.start(os.getenv("ENVIREAMENT_DRAWLIST"))
+end
+
+-- ==================== VIRTUAL FILESYSTEM ====================
+-- Directory trees mounted at a path answer EnumerateFiles,
+-- EnumerateSubdirectories, file_exists and io.open (envireament_vfs.lua)
+
+-- vfs.lookup(path) and vfs.enumerate(path, index, dirs), used by the API
+local vfs = require_engine("envireament_vfs").new()
+
 -- ==================== COMPREHENSIVE MOCK REAPER API ====================
 
-local mock_reaper = {
+-- Declared first so API functions can call each other through it
+local mock_reaper
+mock_reaper = {
   -- ==================== REAPER CORE FUNCTIONS ====================
   
   -- Console and messaging (must be first as it's used by other functions)
   ShowConsoleMsg = function(msg)
+    log_api_call("ShowConsoleMsg", msg)
     if msg then
       io.write(msg)
       io.flush()
@@ -106,6 +1662,7 @@ local mock_reaper = {
   end,
   
   ShowMessageBox = function(msg, title, type)
+    log_api_call("ShowMessageBox", msg, title, type)
     print("📋 [Virtual] Message Box: " .. (title or "Message"))
     print("   " .. (msg or "No message"))
     print("   Type: " .. (type or 0))
@@ -113,17 +1670,19 @@ local mock_reaper = {
   end,
   
   -- Version and system info
-  GetAppVersion = function() return "7.0" end,
-  GetOS = function() return "OSX64" end,
-  GetNumAudioInputs = function() return 2 end,
-  GetNumAudioOutputs = function() return 2 end,
+  GetAppVersion = function() log_api_call("GetAppVersion"); return "7.0" end,
+  GetOS = function() log_api_call("GetOS"); return "OSX64" end,
+  GetNumAudioInputs = function() log_api_call("GetNumAudioInputs"); return 2 end,
+  GetNumAudioOutputs = function() log_api_call("GetNumAudioOutputs"); return 2 end,
   
   -- File system operations
   GetResourcePath = function()
+    log_api_call("GetResourcePath")
     return "/Users/test/Library/Application Support/REAPER"
   end,
   
   GetPathSeparator = function()
+    log_api_call("GetPathSeparator")
     return package.config:sub(1,1) -- Returns OS-appropriate path separator
   end,
   
@@ -131,6 +1690,8 @@ local mock_reaper = {
   file_exists = function(filepath)
     log_api_call("file_exists", filepath)
     if not filepath or filepath == "" then return false end
+    local node, mounted = vfs.lookup(filepath)
+    if mounted then return node ~= nil and type(node) ~= "table" end
     local f = io.open(filepath, "r")
     if f then
       f:close()
@@ -142,6 +1703,8 @@ local mock_reaper = {
   EnumerateFiles = function(path, index)
     log_api_call("EnumerateFiles", path, index)
     if not path or path == "" then return nil end
+    local name, mounted = vfs.enumerate(path, index, false)
+    if mounted then return name end
     
     -- Mock file enumeration - returns some common file types for testing
     local mock_files = {
@@ -158,6 +1721,8 @@ local mock_reaper = {
   EnumerateSubdirectories = function(path, index)
     log_api_call("EnumerateSubdirectories", path, index)
     if not path or path == "" then return nil end
+    local name, mounted = vfs.enumerate(path, index, true)
+    if mounted then return name end
     
     -- Mock subdirectory enumeration
     local mock_dirs = {
@@ -181,50 +1746,152 @@ local mock_reaper = {
   -- Track management functions
   GetNumTracks = function()
     log_api_call("GetNumTracks")
-    return 8 -- Mock project with 8 tracks
+    return current_project().tracks.count
+  end,
+  
+  CountTracks = function(proj)
+    log_api_call("CountTracks", proj)
+    return current_project().tracks.count
   end,
   
   GetTrack = function(proj, track_index)
     log_api_call("GetTrack", proj, track_index)
-    if track_index >= 0 and track_index < 8 then
-      return {
-        id = track_index,
-        name = "Track " .. (track_index + 1),
-        volume = 1.0,
-        pan = 0.0
-      }
-    end
-    return nil
+    if type(track_index) ~= "number" then return nil end
+    return current_project().tracks.handles[track_index + 1]
+  end,
+  
+  GetMasterTrack = function(proj)
+    log_api_call("GetMasterTrack", proj)
+    return current_project().master
+  end,
+  
+  CSurf_TrackToID = function(track, mcp_view)
+    log_api_call("CSurf_TrackToID", track, mcp_view)
+    local project = current_project()
+    if track == project.master then return 0 end
+    return project.tracks.rows[track] or -1
+  end,
+  
+  CSurf_TrackFromID = function(idx, mcp_view)
+    log_api_call("CSurf_TrackFromID", idx, mcp_view)
+    local project = current_project()
+    if idx == 0 then return project.master end
+    return project.tracks.handles[idx]
   end,
   
   CountSelectedTracks = function(proj)
     log_api_call("CountSelectedTracks", proj)
-    return 1 -- Mock one selected track
+    return #project_selected_tracks(current_project())
   end,
   
   GetSelectedTrack = function(proj, track_index)
     log_api_call("GetSelectedTrack", proj, track_index)
-    if track_index == 0 then
-      return {id = 0, name = "Selected Track", volume = 1.0, pan = 0.0}
+    if type(track_index) ~= "number" then return nil end
+    return project_selected_tracks(current_project())[track_index + 1]
+  end,
+  
+  SetTrackSelected = function(track, selected)
+    log_api_call("SetTrackSelected", track, selected)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    if row then
+      project.tracks.columns.selected[row] = selected and true or false
+      project.selected_tracks = nil
     end
-    return nil
+  end,
+  
+  IsTrackSelected = function(track)
+    log_api_call("IsTrackSelected", track)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    return row ~= nil and project.tracks.columns.selected[row]
   end,
   
   InsertTrackAtIndex = function(track_index, want_defaults)
     log_api_call("InsertTrackAtIndex", track_index, want_defaults)
-    print("🎼 [Virtual] Track inserted at index " .. (track_index or 0))
+    local project = current_project()
+    local index = math.max(0, math.min(track_index or 0, project.tracks.count))
+    project_add_track(project, index)
   end,
   
   DeleteTrack = function(track)
     log_api_call("DeleteTrack", track)
-    print("🗑️ [Virtual] Track deleted")
+    project_delete_track(current_project(), track)
+  end,
+  
+  GetMediaTrackInfo_Value = function(track, param_name)
+    log_api_call("GetMediaTrackInfo_Value", track, param_name)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    if not row then return 0.0 end
+    local columns = project.tracks.columns
+    if param_name == "IP_TRACKNUMBER" then return row
+    elseif param_name == "D_VOL" then return columns.volume[row]
+    elseif param_name == "D_PAN" then return columns.pan[row]
+    elseif param_name == "B_MUTE" then return columns.mute[row] and 1.0 or 0.0
+    elseif param_name == "I_SOLO" then return columns.solo[row]
+    elseif param_name == "I_SELECTED" then return columns.selected[row] and 1.0 or 0.0
+    elseif param_name == "I_CUSTOMCOLOR" then return columns.color[row]
+    elseif param_name == "I_FOLDERDEPTH" then return columns.folder_depth[row]
+    end
+    return 0.0
+  end,
+  
+  SetMediaTrackInfo_Value = function(track, param_name, value)
+    log_api_call("SetMediaTrackInfo_Value", track, param_name, value)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    if not row then return false end
+    local columns = project.tracks.columns
+    if param_name == "D_VOL" then columns.volume[row] = value
+    elseif param_name == "D_PAN" then columns.pan[row] = value
+    elseif param_name == "B_MUTE" then columns.mute[row] = (value ~= 0)
+    elseif param_name == "I_SOLO" then columns.solo[row] = value
+    elseif param_name == "I_SELECTED" then
+      columns.selected[row] = (value ~= 0)
+      project.selected_tracks = nil
+    elseif param_name == "I_CUSTOMCOLOR" then columns.color[row] = value
+    elseif param_name == "I_FOLDERDEPTH" then columns.folder_depth[row] = value
+    else
+      return false
+    end
+    return true
+  end,
+  
+  GetSetMediaTrackInfo_String = function(track, param_name, value, set_new_value)
+    log_api_call("GetSetMediaTrackInfo_String", track, param_name, value, set_new_value)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    if not row or param_name ~= "P_NAME" then return false, "" end
+    if set_new_value then project.tracks.columns.name[row] = value or "" end
+    return true, project.tracks.columns.name[row]
+  end,
+  
+  ValidatePtr = function(pointer, ctypename)
+    log_api_call("ValidatePtr", pointer, ctypename)
+    local project = current_project()
+    if ctypename == "MediaTrack*" then
+      return pointer == project.master or project.tracks.rows[pointer] ~= nil
+    elseif ctypename == "MediaItem*" then
+      return project.items.rows[pointer] ~= nil
+    elseif ctypename == "MediaItem_Take*" then
+      return project.takes.rows[pointer] ~= nil
+    end
+    return pointer ~= nil
+  end,
+  
+  ValidatePtr2 = function(proj, pointer, ctypename)
+    log_api_call("ValidatePtr2", proj, pointer, ctypename)
+    return mock_reaper.ValidatePtr(pointer, ctypename)
   end,
   
   -- Track property functions
   GetTrackName = function(track)
     log_api_call("GetTrackName", track)
-    if not track then return "" end
-    return track.name or ("Track " .. (track.id + 1))
+    if not track or not track.id then return "" end
+    local name = track.name
+    if name == nil or name == "" then return "Track " .. (track.id + 1) end
+    return name
   end,
   
   SetTrackName = function(track, name)
@@ -355,88 +2022,421 @@ local mock_reaper = {
     return true, track.fx[fx_idx + 1].name or "Unknown FX"
   end,
   
-  TrackFX_SetEnabled = function(track, fx_idx, enabled)
-    log_api_call("TrackFX_SetEnabled", track, fx_idx, enabled)
-    if not track or not track.fx or not track.fx[fx_idx + 1] then return false end
-    track.fx[fx_idx + 1].enabled = enabled
+  TrackFX_SetEnabled = function(track, fx_idx, enabled)
+    log_api_call("TrackFX_SetEnabled", track, fx_idx, enabled)
+    if not track or not track.fx or not track.fx[fx_idx + 1] then return false end
+    track.fx[fx_idx + 1].enabled = enabled
+    return true
+  end,
+  
+  TrackFX_GetEnabled = function(track, fx_idx)
+    log_api_call("TrackFX_GetEnabled", track, fx_idx)
+    if not track or not track.fx or not track.fx[fx_idx + 1] then return false end
+    return track.fx[fx_idx + 1].enabled or false
+  end,
+  
+  TrackFX_GetParam = function(track, fx_idx, param_idx)
+    log_api_call("TrackFX_GetParam", track, fx_idx, param_idx)
+    if not track or not track.fx or not track.fx[fx_idx + 1] then return 0.0 end
+    local fx = track.fx[fx_idx + 1]
+    fx.params = fx.params or {}
+    return fx.params[param_idx] or 0.5 -- Default parameter value
+  end,
+  
+  TrackFX_SetParam = function(track, fx_idx, param_idx, value)
+    log_api_call("TrackFX_SetParam", track, fx_idx, param_idx, value)
+    if not track or not track.fx or not track.fx[fx_idx + 1] then return false end
+    local fx = track.fx[fx_idx + 1]
+    fx.params = fx.params or {}
+    fx.params[param_idx] = value
+    return true
+  end,
+  
+  -- Media item functions
+  CountMediaItems = function(proj)
+    log_api_call("CountMediaItems", proj)
+    return project_item_count(current_project())
+  end,
+  
+  GetMediaItem = function(proj, item_index)
+    log_api_call("GetMediaItem", proj, item_index)
+    return project_item_at(current_project(), item_index)
+  end,
+  
+  CountTrackMediaItems = function(track)
+    log_api_call("CountTrackMediaItems", track)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    if not row then return 0 end
+    local pending = project.tracks.columns.items_pending[row]
+    if pending then return pending.count end
+    local list = project.tracks.columns.items[row]
+    return list and #list or 0
+  end,
+  
+  GetTrackMediaItem = function(track, item_index)
+    log_api_call("GetTrackMediaItem", track, item_index)
+    local project = current_project()
+    local row = project.tracks.rows[track]
+    if not row or type(item_index) ~= "number" then return nil end
+    local list = track_item_list(project, row)
+    return list and list[item_index + 1] or nil
+  end,
+  
+  AddMediaItemToTrack = function(track)
+    log_api_call("AddMediaItemToTrack", track)
+    return project_add_item(current_project(), track)
+  end,
+  
+  DeleteTrackMediaItem = function(track, item)
+    log_api_call("DeleteTrackMediaItem", track, item)
+    local project = current_project()
+    local row = project.items.rows[item]
+    if not row or project.items.columns.track[row] ~= track then return false end
+    return project_delete_item(project, item)
+  end,
+  
+  GetMediaItem_Track = function(item)
+    log_api_call("GetMediaItem_Track", item)
+    local project = current_project()
+    local row = project.items.rows[item]
+    return row and project.items.columns.track[row] or nil
+  end,
+  
+  MoveMediaItemToTrack = function(item, track)
+    log_api_call("MoveMediaItemToTrack", item, track)
+    return project_move_item(current_project(), item, nil, track)
+  end,
+  
+  GetMediaItemInfo_Value = function(item, param_name)
+    log_api_call("GetMediaItemInfo_Value", item, param_name)
+    local project = current_project()
+    local row = project.items.rows[item]
+    if not row then return 0.0 end
+    local columns = project.items.columns
+    if param_name == "D_POSITION" then return columns.position[row]
+    elseif param_name == "D_LENGTH" then return columns.length[row]
+    elseif param_name == "B_MUTE" then return columns.mute[row] and 1.0 or 0.0
+    elseif param_name == "B_UISEL" then return columns.selected[row] and 1.0 or 0.0
+    elseif param_name == "I_CURTAKE" then
+      local active, take, index = columns.active_take[row], columns.first_take[row], 0
+      while take and take ~= active do
+        take = project.takes.columns.next_take[project.takes.rows[take]]
+        index = index + 1
+      end
+      return index
+    elseif param_name == "IP_ITEMNUMBER" then
+      local track_row = project.tracks.rows[columns.track[row]]
+      track_item_list(project, track_row)
+      return (item_list_index(project, track_row, item) or 0) - 1
+    end
+    return 0.0
+  end,
+  
+  SetMediaItemInfo_Value = function(item, param_name, value)
+    log_api_call("SetMediaItemInfo_Value", item, param_name, value)
+    local project = current_project()
+    local row = project.items.rows[item]
+    if not row then return false end
+    local columns = project.items.columns
+    if param_name == "D_POSITION" then return project_move_item(project, item, value)
+    elseif param_name == "D_LENGTH" then columns.length[row] = math.max(0, value or 0)
+    elseif param_name == "B_MUTE" then columns.mute[row] = (value ~= 0)
+    elseif param_name == "B_UISEL" then
+      columns.selected[row] = (value ~= 0)
+      project.selected_items = nil
+    elseif param_name == "I_CURTAKE" then
+      local take = item_take_at(project, item, value or 0)
+      if not take then return false end
+      columns.active_take[row] = take
+    else
+      return false
+    end
+    return true
+  end,
+  
+  SetMediaItemPosition = function(item, position, refresh_ui)
+    log_api_call("SetMediaItemPosition", item, position, refresh_ui)
+    return project_move_item(current_project(), item, position)
+  end,
+  
+  SetMediaItemLength = function(item, length, refresh_ui)
+    log_api_call("SetMediaItemLength", item, length, refresh_ui)
+    return mock_reaper.SetMediaItemInfo_Value(item, "D_LENGTH", length)
+  end,
+  
+  SetMediaItemSelected = function(item, selected)
+    log_api_call("SetMediaItemSelected", item, selected)
+    mock_reaper.SetMediaItemInfo_Value(item, "B_UISEL", selected and 1 or 0)
+  end,
+  
+  IsMediaItemSelected = function(item)
+    log_api_call("IsMediaItemSelected", item)
+    local project = current_project()
+    local row = project.items.rows[item]
+    return row ~= nil and project.items.columns.selected[row]
+  end,
+  
+  CountSelectedMediaItems = function(proj)
+    log_api_call("CountSelectedMediaItems", proj)
+    return #project_selected_items(current_project())
+  end,
+  
+  GetSelectedMediaItem = function(proj, item_index)
+    log_api_call("GetSelectedMediaItem", proj, item_index)
+    if type(item_index) ~= "number" then return nil end
+    return project_selected_items(current_project())[item_index + 1]
+  end,
+  
+  UpdateArrange = function()
+    log_api_call("UpdateArrange")
+  end,
+  
+  -- Take functions
+  CountTakes = function(item)
+    log_api_call("CountTakes", item)
+    local project = current_project()
+    local row = project.items.rows[item]
+    return row and project.items.columns.take_count[row] or 0
+  end,
+  
+  GetTake = function(item, take_index)
+    log_api_call("GetTake", item, take_index)
+    if type(take_index) ~= "number" or take_index < 0 then return nil end
+    return item_take_at(current_project(), item, take_index)
+  end,
+  
+  GetActiveTake = function(item)
+    log_api_call("GetActiveTake", item)
+    local project = current_project()
+    local row = project.items.rows[item]
+    return row and project.items.columns.active_take[row] or nil
+  end,
+  
+  SetActiveTake = function(take)
+    log_api_call("SetActiveTake", take)
+    local project = current_project()
+    local row = project.takes.rows[take]
+    if not row then return end
+    local item = project.takes.columns.item[row]
+    project.items.columns.active_take[project.items.rows[item]] = take
+  end,
+  
+  AddTakeToMediaItem = function(item)
+    log_api_call("AddTakeToMediaItem", item)
+    return project_add_take(current_project(), item)
+  end,
+  
+  GetMediaItemTake_Item = function(take)
+    log_api_call("GetMediaItemTake_Item", take)
+    local project = current_project()
+    local row = project.takes.rows[take]
+    return row and project.takes.columns.item[row] or nil
+  end,
+  
+  GetTakeName = function(take)
+    log_api_call("GetTakeName", take)
+    local project = current_project()
+    local row = project.takes.rows[take]
+    return row and project.takes.columns.name[row] or ""
+  end,
+  
+  GetSetMediaItemTakeInfo_String = function(take, param_name, value, set_new_value)
+    log_api_call("GetSetMediaItemTakeInfo_String", take, param_name, value, set_new_value)
+    local project = current_project()
+    local row = project.takes.rows[take]
+    if not row or param_name ~= "P_NAME" then return false, "" end
+    if set_new_value then project.takes.columns.name[row] = value or "" end
+    return true, project.takes.columns.name[row]
+  end,
+  
+  TakeIsMIDI = function(take)
+    log_api_call("TakeIsMIDI", take)
+    local project = current_project()
+    local row = project.takes.rows[take]
+    return row ~= nil and project.takes.columns.is_midi[row]
+  end,
+  
+  CreateNewMIDIItemInProj = function(track, starttime, endtime, qnout)
+    log_api_call("CreateNewMIDIItemInProj", track, starttime, endtime, qnout)
+    local project = current_project()
+    local position = starttime or 0
+    local item = project_add_item(project, track, {
+      position = position,
+      length = math.max(0, (endtime or position + 1) - position)
+    })
+    if not item then return nil end
+    project_add_take(project, item, {is_midi = true, name = "MIDI"})
+    return item
+  end,
+  
+  -- MIDI functions
+  MIDI_CountEvts = function(take)
+    log_api_call("MIDI_CountEvts", take)
+    local midi = take_midi(take)
+    if not midi then return 0, 0, 0, 0 end
+    local notes, ccs, texts = midi.notes.count, midi.ccs.count, midi.texts.count
+    return notes + ccs + texts, notes, ccs, texts
+  end,
+  
+  MIDI_GetNote = function(take, noteidx)
+    log_api_call("MIDI_GetNote", take, noteidx)
+    local midi = take_midi(take)
+    local notes = midi and midi.notes
+    local i = (noteidx or -1) + 1
+    if not notes or i < 1 or i > notes.count then return false end
+    return true, notes.sel[i], notes.mute[i], notes.start[i], notes.stop[i],
+           notes.chan[i], notes.pitch[i], notes.vel[i]
+  end,
+  
+  MIDI_InsertNote = function(take, selected, muted, startppqpos, endppqpos, chan, pitch, vel, noSortIn)
+    log_api_call("MIDI_InsertNote", take, selected, muted, startppqpos, endppqpos, chan, pitch, vel, noSortIn)
+    local midi = take_midi(take)
+    if not midi or not startppqpos or not endppqpos then return false end
+    insert_event(midi.notes, {
+      startppqpos, math.max(startppqpos, endppqpos), chan or 0, pitch or 60, vel or 100,
+      selected and true or false, muted and true or false
+    }, noSortIn or midi.sort_disabled)
+    return true
+  end,
+  
+  MIDI_SetNote = function(take, noteidx, selectedIn, mutedIn, startppqposIn, endppqposIn, chanIn, pitchIn, velIn, noSortIn)
+    log_api_call("MIDI_SetNote", take, noteidx, selectedIn, mutedIn, startppqposIn, endppqposIn)
+    local midi = take_midi(take)
+    local notes = midi and midi.notes
+    local i = (noteidx or -1) + 1
+    if not notes or i < 1 or i > notes.count then return false end
+    if selectedIn ~= nil then notes.sel[i] = selectedIn end
+    if mutedIn ~= nil then notes.mute[i] = mutedIn end
+    if endppqposIn then notes.stop[i] = endppqposIn end
+    if chanIn then notes.chan[i] = chanIn end
+    if pitchIn then notes.pitch[i] = pitchIn end
+    if velIn then notes.vel[i] = velIn end
+    if startppqposIn and startppqposIn ~= notes.start[i] then
+      notes.start[i] = startppqposIn
+      notes.sorted = false
+      if not (noSortIn or midi.sort_disabled) then sort_event_list(notes) end
+    end
+    return true
+  end,
+  
+  MIDI_DeleteNote = function(take, noteidx)
+    log_api_call("MIDI_DeleteNote", take, noteidx)
+    local midi = take_midi(take)
+    return midi ~= nil and delete_event(midi.notes, (noteidx or -1) + 1)
+  end,
+  
+  MIDI_EnumSelNotes = function(take, noteidx)
+    log_api_call("MIDI_EnumSelNotes", take, noteidx)
+    local midi = take_midi(take)
+    if not midi then return -1 end
+    local notes = midi.notes
+    for i = (noteidx or -1) + 2, notes.count do
+      if notes.sel[i] then return i - 1 end
+    end
+    return -1
+  end,
+  
+  MIDI_GetCC = function(take, ccidx)
+    log_api_call("MIDI_GetCC", take, ccidx)
+    local midi = take_midi(take)
+    local ccs = midi and midi.ccs
+    local i = (ccidx or -1) + 1
+    if not ccs or i < 1 or i > ccs.count then return false end
+    return true, ccs.sel[i], ccs.mute[i], ccs.ppq[i], ccs.chanmsg[i],
+           ccs.chan[i], ccs.msg2[i], ccs.msg3[i]
+  end,
+  
+  MIDI_InsertCC = function(take, selected, muted, ppqpos, chanmsg, chan, msg2, msg3)
+    log_api_call("MIDI_InsertCC", take, selected, muted, ppqpos, chanmsg, chan, msg2, msg3)
+    local midi = take_midi(take)
+    if not midi or not ppqpos then return false end
+    insert_event(midi.ccs, {
+      ppqpos, chanmsg or 0xB0, chan or 0, msg2 or 0, msg3 or 0,
+      selected and true or false, muted and true or false
+    }, midi.sort_disabled)
     return true
   end,
   
-  TrackFX_GetEnabled = function(track, fx_idx)
-    log_api_call("TrackFX_GetEnabled", track, fx_idx)
-    if not track or not track.fx or not track.fx[fx_idx + 1] then return false end
-    return track.fx[fx_idx + 1].enabled or false
+  MIDI_DeleteCC = function(take, ccidx)
+    log_api_call("MIDI_DeleteCC", take, ccidx)
+    local midi = take_midi(take)
+    return midi ~= nil and delete_event(midi.ccs, (ccidx or -1) + 1)
   end,
   
-  TrackFX_GetParam = function(track, fx_idx, param_idx)
-    log_api_call("TrackFX_GetParam", track, fx_idx, param_idx)
-    if not track or not track.fx or not track.fx[fx_idx + 1] then return 0.0 end
-    local fx = track.fx[fx_idx + 1]
-    fx.params = fx.params or {}
-    return fx.params[param_idx] or 0.5 -- Default parameter value
+  MIDI_GetTextSysexEvt = function(take, textsyxevtidx)
+    log_api_call("MIDI_GetTextSysexEvt", take, textsyxevtidx)
+    local midi = take_midi(take)
+    local texts = midi and midi.texts
+    local i = (textsyxevtidx or -1) + 1
+    if not texts or i < 1 or i > texts.count then return false end
+    return true, texts.sel[i], texts.mute[i], texts.ppq[i], texts.type[i], texts.msg[i]
   end,
   
-  TrackFX_SetParam = function(track, fx_idx, param_idx, value)
-    log_api_call("TrackFX_SetParam", track, fx_idx, param_idx, value)
-    if not track or not track.fx or not track.fx[fx_idx + 1] then return false end
-    local fx = track.fx[fx_idx + 1]
-    fx.params = fx.params or {}
-    fx.params[param_idx] = value
+  MIDI_InsertTextSysexEvt = function(take, selected, muted, ppqpos, type, bytestr)
+    log_api_call("MIDI_InsertTextSysexEvt", take, selected, muted, ppqpos, type, bytestr)
+    local midi = take_midi(take)
+    if not midi or not ppqpos then return false end
+    insert_event(midi.texts, {
+      ppqpos, type or 1, bytestr or "", selected and true or false, muted and true or false
+    }, midi.sort_disabled)
     return true
   end,
   
-  -- Media item functions
-  CountMediaItems = function(proj)
-    log_api_call("CountMediaItems", proj)
-    return 4 -- Mock project with 4 media items
-  end,
-  
-  GetMediaItem = function(proj, item_index)
-    log_api_call("GetMediaItem", proj, item_index)
-    if item_index >= 0 and item_index < 4 then
-      return {
-        id = item_index,
-        position = item_index * 30.0,
-        length = 25.0,
-        track = item_index % 3
-      }
-    end
-    return nil
+  MIDI_DisableSort = function(take)
+    log_api_call("MIDI_DisableSort", take)
+    local midi = take_midi(take)
+    if midi then midi.sort_disabled = true end
   end,
   
-  GetSelectedMediaItem = function(proj, item_index)
-    log_api_call("GetSelectedMediaItem", proj, item_index)
-    if item_index == 0 then
-      return {id = 0, position = 0.0, length = 25.0, track = 0}
+  MIDI_Sort = function(take)
+    log_api_call("MIDI_Sort", take)
+    local midi = take_midi(take)
+    if midi then
+      sort_midi(midi)
+      midi.sort_disabled = false
     end
-    return nil
   end,
   
-  CreateNewMIDIItemInProj = function(track, starttime, endtime, qnout)
-    log_api_call("CreateNewMIDIItemInProj", track, starttime, endtime, qnout)
-    print("🎹 [Virtual] MIDI item created from " .. (starttime or 0) .. " to " .. (endtime or 1))
-    return {id = 999, position = starttime, length = (endtime or 1) - (starttime or 0)}
+  MIDI_GetAllEvts = function(take)
+    log_api_call("MIDI_GetAllEvts", take)
+    local midi = take_midi(take)
+    if not midi then return false, "" end
+    return true, encode_midi_events(midi)
   end,
   
-  -- MIDI functions
-  MIDI_GetNote = function(take, noteidx)
-    log_api_call("MIDI_GetNote", take, noteidx)
-    -- Mock MIDI note data
-    if noteidx >= 0 and noteidx < 10 then
-      return true, false, false, 1000 + noteidx * 480, 1000 + (noteidx + 1) * 480, 0, 60 + noteidx, 100
+  MIDI_SetAllEvts = function(take, buf)
+    log_api_call("MIDI_SetAllEvts", take, "...")
+    local project = current_project()
+    local row = project.takes.rows[take]
+    if not row or not project.takes.columns.is_midi[row] or type(buf) ~= "string" then return false end
+    local ok, midi = pcall(decode_midi_events, buf)
+    if not ok then
+      log_warning("MIDI_SetAllEvts: malformed event buffer")
+      return false
     end
-    return false
+    sort_midi(midi)
+    project.takes.columns.midi[row] = midi
+    return true
   end,
   
-  MIDI_InsertNote = function(take, selected, muted, startppqpos, endppqpos, chan, pitch, vel, noSortIn)
-    log_api_call("MIDI_InsertNote", take, selected, muted, startppqpos, endppqpos, chan, pitch, vel, noSortIn)
-    print("🎵 [Virtual] MIDI note inserted: pitch " .. (pitch or 60) .. " vel " .. (vel or 100))
-    return true
+  MIDI_GetPPQPosFromProjTime = function(take, projtime)
+    log_api_call("MIDI_GetPPQPosFromProjTime", take, projtime)
+    local project = current_project()
+    local take_row = project.takes.rows[take]
+    if not take_row then return 0 end
+    local item_row = project.items.rows[project.takes.columns.item[take_row]]
+    local seconds = (projtime or 0) - project.items.columns.position[item_row]
+    return seconds * project.tempo / 60 * PPQ_PER_QUARTER
   end,
   
-  MIDI_CountEvts = function(take)
-    log_api_call("MIDI_CountEvts", take)
-    return 10, 0, 0 -- notes, ccs, sysex
+  MIDI_GetProjTimeFromPPQPos = function(take, ppqpos)
+    log_api_call("MIDI_GetProjTimeFromPPQPos", take, ppqpos)
+    local project = current_project()
+    local take_row = project.takes.rows[take]
+    if not take_row then return 0 end
+    local item_row = project.items.rows[project.takes.columns.item[take_row]]
+    return project.items.columns.position[item_row] + (ppqpos or 0) / PPQ_PER_QUARTER * 60 / project.tempo
   end,
   
   -- Undo functions
@@ -513,36 +2513,106 @@ local mock_reaper = {
   -- Extension functions (commonly used with SWS/JS extensions)
   GetExtState = function(section, key)
     log_api_call("GetExtState", section, key)
-    -- Mock extension state storage for testing
-    VirtualState.ext_state = VirtualState.ext_state or {}
-    local section_data = VirtualState.ext_state[section] or {}
-    return section_data[key] or ""
+    local section_data = VirtualState.ext_state[section]
+    return section_data and section_data[key] or ""
+  end,
+  
+  HasExtState = function(section, key)
+    log_api_call("HasExtState", section, key)
+    local section_data = VirtualState.ext_state[section]
+    return section_data ~= nil and section_data[key] ~= nil
   end,
   
   SetExtState = function(section, key, value, persist)
     log_api_call("SetExtState", section, key, value, persist)
-    -- Mock extension state storage for testing
-    VirtualState.ext_state = VirtualState.ext_state or {}
-    VirtualState.ext_state[section] = VirtualState.ext_state[section] or {}
-    VirtualState.ext_state[section][key] = value
+    if not section or not key then return end
+    value = tostring(value or "")
+    VirtualState.stats.ext_state_sets = VirtualState.stats.ext_state_sets + 1
+    local section_data = VirtualState.ext_state[section]
+    if not section_data then
+      section_data = {}
+      VirtualState.ext_state[section] = section_data
+    end
+    section_data[key] = value
+    if persist then
+      local persisted = VirtualState.ext_state_persist[section]
+      if not persisted then
+        persisted = {}
+        VirtualState.ext_state_persist[section] = persisted
+      end
+      -- Rewriting an unchanged value does not dirty the ini file
+      if persisted[key] ~= value then
+        persisted[key] = value
+        VirtualState.ext_state_dirty[section] = true
+        mark_ext_state_dirty()
+      end
+    end
+  end,
+  
+  DeleteExtState = function(section, key, persist)
+    log_api_call("DeleteExtState", section, key, persist)
+    local section_data = VirtualState.ext_state[section]
+    if section_data then
+      section_data[key] = nil
+    end
+    local persisted = VirtualState.ext_state_persist[section]
+    if persist and persisted and persisted[key] ~= nil then
+      persisted[key] = nil
+      VirtualState.ext_state_dirty[section] = true
+      mark_ext_state_dirty()
+    end
   end,
   
   GetProjExtState = function(proj, section, key)
     log_api_call("GetProjExtState", proj, section, key)
-    -- Mock project extension state
-    return ""
+    local section_data = VirtualState.proj_ext_state[section]
+    local value = section_data and section_data[key] or ""
+    return #value, value
   end,
   
   SetProjExtState = function(proj, section, key, value)
     log_api_call("SetProjExtState", proj, section, key, value)
-    -- Mock project extension state storage
-  end,
-  
-  DeleteExtState = function(section, key, persist)
-    log_api_call("DeleteExtState", section, key, persist)
-    if VirtualState.ext_state and VirtualState.ext_state[section] then
-      VirtualState.ext_state[section][key] = nil
+    if not section then return 0 end
+    VirtualState.stats.ext_state_sets = VirtualState.stats.ext_state_sets + 1
+    local section_data = VirtualState.proj_ext_state[section] or {}
+    VirtualState.proj_ext_state[section] = section_data
+    if not key or key == "" then
+      -- An empty key clears the whole section
+      section_data = {}
+      VirtualState.proj_ext_state[section] = section_data
+    elseif not value or value == "" then
+      section_data[key] = nil
+    elseif section_data[key] ~= tostring(value) then
+      section_data[key] = tostring(value)
+    else
+      return #section_data[key]
     end
+    VirtualState.proj_ext_state_dirty = true
+    mark_ext_state_dirty()
+    local size = 0
+    for k, v in pairs(section_data) do size = size + #k + #v end
+    return size
+  end,
+  
+  EnumProjExtState = function(proj, section, idx)
+    log_api_call("EnumProjExtState", proj, section, idx)
+    local section_data = VirtualState.proj_ext_state[section]
+    if not section_data then return false, "", "" end
+    local keys = {}
+    for k in pairs(section_data) do keys[#keys + 1] = k end
+    table.sort(keys)
+    local key = keys[(idx or 0) + 1]
+    if not key then return false, "", "" end
+    return true, key, section_data[key]
+  end,
+  
+  -- Exit handlers run (and pending ExtState is flushed) when the script ends
+  atexit = function(func)
+    log_api_call("atexit", func)
+    if type(func) ~= "function" then return false end
+    VirtualState.atexit_handlers = VirtualState.atexit_handlers or {}
+    table.insert(VirtualState.atexit_handlers, func)
+    return true
   end,
   
   -- Command and action functions
@@ -610,12 +2680,33 @@ local mock_reaper = {
 
   -- Defer system for UI loops
   defer = function(func) 
+    log_api_call("defer")
     if type(func) == "function" then
-      -- In testing mode, we can choose to call immediately or simulate delay
+      if deferred then
+        deferred[#deferred + 1] = func -- the soak loop runs it next frame
+        return
+      end
+      -- Deferring ends the current frame; the callback runs as the next one
+      end_frame()
       func()
     end
   end,
   
+  -- Virtual clock (frames advance it) plus the time spent so far in the
+  -- current frame, so a script that budgets its work by time_precise sees
+  -- that work take time. os.clock is process CPU time, but the mock runs
+  -- on one thread, so within a frame it follows the real elapsed time.
+  time_precise = function()
+    log_api_call("time_precise")
+    local now = os.clock()
+    local started = VirtualState.frame_started
+    if not started then
+      VirtualState.frame_started, started = now, now
+    end
+    VirtualState.clock_read = VirtualState.clock + (now - started)
+    return VirtualState.clock_read
+  end,
+  
   -- Project and timeline functions
   GetProjectLength = function(proj)
     log_api_call("GetProjectLength", proj)
@@ -653,33 +2744,71 @@ local mock_reaper = {
   end,
   
   -- Marker and region functions
-  AddProjectMarker = function(proj, isregion, pos, rgnend, name, wantidx)
-    log_api_call("AddProjectMarker", proj, isregion, pos, rgnend, name, wantidx)
-    print("📍 [Virtual] Marker added: " .. (name or "Marker") .. " at " .. (pos or 0))
-    return wantidx or 1
+  AddProjectMarker = function(proj, isrgn, pos, rgnend, name, wantidx)
+    log_api_call("AddProjectMarker", proj, isrgn, pos, rgnend, name, wantidx)
+    return add_marker(project_markers(current_project()), isrgn, pos, rgnend, name, wantidx)
+  end,
+  
+  AddProjectMarker2 = function(proj, isrgn, pos, rgnend, name, wantidx, color)
+    log_api_call("AddProjectMarker2", proj, isrgn, pos, rgnend, name, wantidx, color)
+    return add_marker(project_markers(current_project()), isrgn, pos, rgnend, name, wantidx, color)
+  end,
+  
+  CountProjectMarkers = function(proj)
+    log_api_call("CountProjectMarkers", proj)
+    local store = project_markers(current_project())
+    return store.num_markers + store.num_regions, store.num_markers, store.num_regions
   end,
   
   EnumProjectMarkers = function(idx)
     log_api_call("EnumProjectMarkers", idx)
-    -- Mock some project markers
-    if idx == 0 then
-      return true, false, 10.0, 0.0, "Intro", 1
-    elseif idx == 1 then
-      return true, false, 60.0, 0.0, "Verse", 2
-    elseif idx == 2 then
-      return true, false, 120.0, 0.0, "Chorus", 3
-    end
-    return false
+    local retval, isrgn, pos, rgnend, name, number = enum_marker(project_markers(current_project()), idx)
+    return retval, isrgn, pos, rgnend, name, number
+  end,
+  
+  EnumProjectMarkers2 = function(proj, idx)
+    log_api_call("EnumProjectMarkers2", proj, idx)
+    local retval, isrgn, pos, rgnend, name, number = enum_marker(project_markers(current_project()), idx)
+    return retval, isrgn, pos, rgnend, name, number
+  end,
+  
+  EnumProjectMarkers3 = function(proj, idx)
+    log_api_call("EnumProjectMarkers3", proj, idx)
+    return enum_marker(project_markers(current_project()), idx)
+  end,
+  
+  GetLastMarkerAndCurRegion = function(proj, time)
+    log_api_call("GetLastMarkerAndCurRegion", proj, time)
+    return marker_lookup(project_markers(current_project()), time or 0.0)
   end,
   
   DeleteProjectMarker = function(proj, markrgnindexnumber, isrgn)
     log_api_call("DeleteProjectMarker", proj, markrgnindexnumber, isrgn)
-    print("🗑️ [Virtual] Marker deleted: " .. (markrgnindexnumber or 0))
+    local store = project_markers(current_project())
+    local entry = store.numbers[isrgn and true or false][markrgnindexnumber]
+    return entry ~= nil and marker_remove(store, entry)
   end,
   
-  SetProjectMarker = function(markrgnidx, isrgn, pos, rgnend, name)
-    log_api_call("SetProjectMarker", markrgnidx, isrgn, pos, rgnend, name)
-    print("📝 [Virtual] Marker updated: " .. (name or "Marker"))
+  DeleteProjectMarkerByIndex = function(proj, markrgnidx)
+    log_api_call("DeleteProjectMarkerByIndex", proj, markrgnidx)
+    local store = project_markers(current_project())
+    local entry = store.list[(markrgnidx or -1) + 1]
+    return entry ~= nil and marker_remove(store, entry)
+  end,
+  
+  SetProjectMarker = function(markrgnindexnumber, isrgn, pos, rgnend, name)
+    log_api_call("SetProjectMarker", markrgnindexnumber, isrgn, pos, rgnend, name)
+    return set_marker(project_markers(current_project()), markrgnindexnumber, isrgn, pos, rgnend, name)
+  end,
+  
+  SetProjectMarker2 = function(proj, markrgnindexnumber, isrgn, pos, rgnend, name)
+    log_api_call("SetProjectMarker2", proj, markrgnindexnumber, isrgn, pos, rgnend, name)
+    return set_marker(project_markers(current_project()), markrgnindexnumber, isrgn, pos, rgnend, name)
+  end,
+  
+  SetProjectMarker3 = function(proj, markrgnindexnumber, isrgn, pos, rgnend, name, color)
+    log_api_call("SetProjectMarker3", proj, markrgnindexnumber, isrgn, pos, rgnend, name, color)
+    return set_marker(project_markers(current_project()), markrgnindexnumber, isrgn, pos, rgnend, name, color)
   end,
   
   -- ==================== ENHANCED IMGUI CONTEXT MANAGEMENT ====================
@@ -772,8 +2901,11 @@ local mock_reaper = {
       collapsed = false
     }
     
+    layout.begin_window(ctx, window)
     table.insert(ctx.window_stack, window)
     table.insert(VirtualState.window_stack, window)
+    open_scope(ctx, "Window")
+    id_push(ctx, name)
     
     log_api_call("ImGui_Begin", ctx, name, open, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
@@ -788,32 +2920,307 @@ local mock_reaper = {
     end
     
     local window = table.remove(ctx.window_stack)
+    if window then layout.end_window(ctx, window) end
     table.remove(VirtualState.window_stack)
-    
-    if window then
-      log_api_call("ImGui_End", ctx)
-    else
-      log_warning("ImGui_End called without matching ImGui_Begin")
+    log_api_call("ImGui_End", ctx)
+    close_scope(ctx, "Window", "ImGui_End")
+    id_pop(ctx)
+  end,
+  
+  -- Child windows: EndChild is required whatever BeginChild returned
+  ImGui_BeginChild = function(ctx, str_id, size_w, size_h, child_flags, window_flags)
+    log_api_call("ImGui_BeginChild", ctx, str_id, size_w, size_h, child_flags)
+    local child = layout.begin_child(ctx, str_id, size_w, size_h, child_flags)
+    if child then table.insert(ctx.window_stack, child) end
+    open_scope(ctx, "Child")
+    id_push(ctx, str_id)
+    return true
+  end,
+  
+  ImGui_EndChild = function(ctx)
+    log_api_call("ImGui_EndChild", ctx)
+    local child = layout.current(ctx)
+    if child and child.child then
+      table.remove(ctx.window_stack)
+      layout.end_window(ctx, child)
+      layout.end_child(ctx, child)
     end
+    close_scope(ctx, "Child", "ImGui_EndChild")
+    id_pop(ctx)
   end,
   
   -- Window properties
   ImGui_SetNextWindowSize = function(ctx, width, height, cond)
     log_api_call("ImGui_SetNextWindowSize", ctx, width, height, cond)
+    if ctx then layout.set_next_window(ctx, "size", width, height, cond) end
   end,
   
   ImGui_SetNextWindowPos = function(ctx, x, y, cond, pivot_x, pivot_y)
     log_api_call("ImGui_SetNextWindowPos", ctx, x, y, cond)
+    if ctx then layout.set_next_window(ctx, "pos", x, y, cond) end
   end,
   
+  -- Outside any window, the window queries answer for a default one
   ImGui_GetWindowSize = function(ctx)
     log_api_call("ImGui_GetWindowSize", ctx)
-    return 400, 300 -- Default size
+    local window = layout.current(ctx)
+    if not window then return 400, 300 end
+    return window.size.w, window.size.h
   end,
   
   ImGui_GetWindowPos = function(ctx)
     log_api_call("ImGui_GetWindowPos", ctx)
-    return 100, 100 -- Default position
+    local window = layout.current(ctx)
+    if not window then return 100, 100 end
+    return window.pos.x, window.pos.y
+  end,
+  
+  ImGui_GetWindowWidth = function(ctx)
+    log_api_call("ImGui_GetWindowWidth", ctx)
+    local window = layout.current(ctx)
+    return window and window.size.w or 400
+  end,
+  
+  ImGui_GetWindowHeight = function(ctx)
+    log_api_call("ImGui_GetWindowHeight", ctx)
+    local window = layout.current(ctx)
+    return window and window.size.h or 300
+  end,
+  
+  -- ==================== CURSOR AND ITEM RECTS ====================
+  -- Positions come from the layout pass (see LAYOUT); "Pos" is relative
+  -- to the window, "ScreenPos" absolute. Outside a window they are 0.
+  
+  ImGui_GetCursorPos = function(ctx)
+    log_api_call("ImGui_GetCursorPos", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.cursor_x - window.pos.x, window.cursor_y - window.pos.y
+  end,
+  
+  ImGui_GetCursorPosX = function(ctx)
+    log_api_call("ImGui_GetCursorPosX", ctx)
+    local window = layout.current(ctx)
+    return window and window.cursor_x - window.pos.x or 0
+  end,
+  
+  ImGui_GetCursorPosY = function(ctx)
+    log_api_call("ImGui_GetCursorPosY", ctx)
+    local window = layout.current(ctx)
+    return window and window.cursor_y - window.pos.y or 0
+  end,
+  
+  ImGui_SetCursorPos = function(ctx, local_pos_x, local_pos_y)
+    log_api_call("ImGui_SetCursorPos", ctx, local_pos_x, local_pos_y)
+    local window = layout.current(ctx)
+    if not window then return end
+    layout.set_cursor(window, window.pos.x + local_pos_x, window.pos.y + local_pos_y)
+  end,
+  
+  ImGui_SetCursorPosX = function(ctx, local_x)
+    log_api_call("ImGui_SetCursorPosX", ctx, local_x)
+    local window = layout.current(ctx)
+    if not window then return end
+    layout.set_cursor(window, window.pos.x + local_x, window.cursor_y)
+  end,
+  
+  ImGui_SetCursorPosY = function(ctx, local_y)
+    log_api_call("ImGui_SetCursorPosY", ctx, local_y)
+    local window = layout.current(ctx)
+    if not window then return end
+    layout.set_cursor(window, window.cursor_x, window.pos.y + local_y)
+  end,
+  
+  ImGui_GetCursorScreenPos = function(ctx)
+    log_api_call("ImGui_GetCursorScreenPos", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.cursor_x, window.cursor_y
+  end,
+  
+  ImGui_SetCursorScreenPos = function(ctx, pos_x, pos_y)
+    log_api_call("ImGui_SetCursorScreenPos", ctx, pos_x, pos_y)
+    local window = layout.current(ctx)
+    if window then layout.set_cursor(window, pos_x, pos_y) end
+  end,
+  
+  ImGui_GetCursorStartPos = function(ctx)
+    log_api_call("ImGui_GetCursorStartPos", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.start_x - window.pos.x, window.start_y - window.pos.y
+  end,
+  
+  ImGui_GetContentRegionAvail = function(ctx)
+    log_api_call("ImGui_GetContentRegionAvail", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.content_max_x - window.cursor_x, window.content_max_y - window.cursor_y
+  end,
+  
+  ImGui_GetContentRegionMax = function(ctx)
+    log_api_call("ImGui_GetContentRegionMax", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.content_max_x - window.pos.x, window.content_max_y - window.pos.y
+  end,
+  
+  ImGui_GetWindowContentRegionMin = function(ctx)
+    log_api_call("ImGui_GetWindowContentRegionMin", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.content_min_x - window.pos.x, window.content_min_y - window.pos.y
+  end,
+  
+  ImGui_GetWindowContentRegionMax = function(ctx)
+    log_api_call("ImGui_GetWindowContentRegionMax", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.content_max_x - window.pos.x, window.content_max_y - window.pos.y
+  end,
+  
+  ImGui_GetItemRectMin = function(ctx)
+    log_api_call("ImGui_GetItemRectMin", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.item_x0, window.item_y0
+  end,
+  
+  ImGui_GetItemRectMax = function(ctx)
+    log_api_call("ImGui_GetItemRectMax", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.item_x1, window.item_y1
+  end,
+  
+  ImGui_GetItemRectSize = function(ctx)
+    log_api_call("ImGui_GetItemRectSize", ctx)
+    local window = layout.current(ctx)
+    if not window then return 0, 0 end
+    return window.item_x1 - window.item_x0, window.item_y1 - window.item_y0
+  end,
+  
+  -- ==================== SCROLLING ====================
+  -- A window's scroll applies as it next begins, as ImGui's scroll target
+  -- does; the maximum is its content height at its last End.
+  
+  ImGui_GetScrollY = function(ctx)
+    log_api_call("ImGui_GetScrollY", ctx)
+    return (layout.scroll(ctx))
+  end,
+  
+  ImGui_GetScrollMaxY = function(ctx)
+    log_api_call("ImGui_GetScrollMaxY", ctx)
+    return select(2, layout.scroll(ctx))
+  end,
+  
+  ImGui_SetScrollY = function(ctx, scroll_y)
+    log_api_call("ImGui_SetScrollY", ctx, scroll_y)
+    layout.set_scroll(ctx, scroll_y or 0)
+  end,
+  
+  ImGui_SetScrollHereY = function(ctx, center_y_ratio)
+    log_api_call("ImGui_SetScrollHereY", ctx, center_y_ratio)
+    local window = layout.current(ctx)
+    if not window then return end
+    local ratio = center_y_ratio or 0.5
+    local line_y = window.prev_y - window.start_y + window.pad_y
+    local view_h = window.size.h - window.top
+    layout.set_scroll(ctx, line_y + window.prev_line_h * ratio - view_h * ratio)
+  end,
+  
+  -- ==================== LIST CLIPPER ====================
+  -- Clippers belong to a context and hand out the visible range of a long
+  -- list (see LAYOUT); display ranges are 0-based, the end exclusive.
+  
+  ImGui_ValidatePtr = function(pointer, ctypename)
+    log_api_call("ImGui_ValidatePtr", nil, pointer, ctypename)
+    if ctypename == "ImGui_ListClipper*" then
+      return type(pointer) == "table" and pointer.type == "ImGui_ListClipper"
+    end
+    return pointer ~= nil
+  end,
+  
+  ImGui_CreateListClipper = function(ctx)
+    log_api_call("ImGui_CreateListClipper", ctx)
+    if not ctx then
+      log_error("ImGui_CreateListClipper called with nil context")
+      return nil
+    end
+    return {type = "ImGui_ListClipper", ctx = ctx, count = 0, state = 3, display_start = 0, display_end = 0}
+  end,
+  
+  ImGui_ListClipper_Begin = function(clipper, items_count, items_height)
+    log_api_call("ImGui_ListClipper_Begin", clipper and clipper.ctx, items_count, items_height)
+    if not clipper then
+      log_error("ImGui_ListClipper_Begin called with nil clipper")
+      return
+    end
+    list_clipper.begin(clipper, items_count, items_height)
+  end,
+  
+  ImGui_ListClipper_Step = function(clipper)
+    log_api_call("ImGui_ListClipper_Step", clipper and clipper.ctx)
+    if not clipper then return false end
+    return list_clipper.step(clipper)
+  end,
+  
+  ImGui_ListClipper_GetDisplayRange = function(clipper)
+    log_api_call("ImGui_ListClipper_GetDisplayRange", clipper and clipper.ctx)
+    if not clipper then return 0, 0 end
+    return clipper.display_start, clipper.display_end
+  end,
+  
+  ImGui_ListClipper_IncludeItemByIndex = function(clipper, item_index)
+    log_api_call("ImGui_ListClipper_IncludeItemByIndex", clipper and clipper.ctx, item_index)
+    if clipper then list_clipper.include(clipper, item_index, item_index + 1) end
+  end,
+  
+  ImGui_ListClipper_IncludeItemsByIndex = function(clipper, item_begin, item_end)
+    log_api_call("ImGui_ListClipper_IncludeItemsByIndex", clipper and clipper.ctx, item_begin, item_end)
+    if clipper then list_clipper.include(clipper, item_begin, item_end) end
+  end,
+  
+  ImGui_ListClipper_End = function(clipper)
+    log_api_call("ImGui_ListClipper_End", clipper and clipper.ctx)
+    if clipper then list_clipper.finish(clipper) end
+  end,
+  
+  -- ==================== TEXT METRICS ====================
+  
+  -- Label text after "##" only hides when asked to, as in ReaImGui
+  ImGui_CalcTextSize = function(ctx, text, w, h, hide_text_after_double_hash, wrap_width)
+    log_api_call("ImGui_CalcTextSize", ctx, text, hide_text_after_double_hash, wrap_width)
+    if not ctx then return 0, 0 end
+    if hide_text_after_double_hash then text = (split_label(text)) end
+    return layout.text_size(ctx, text, wrap_width)
+  end,
+  
+  ImGui_GetFontSize = function(ctx)
+    log_api_call("ImGui_GetFontSize", ctx)
+    return ctx and layout.font_size(ctx) or 13
+  end,
+  
+  ImGui_GetTextLineHeight = function(ctx)
+    log_api_call("ImGui_GetTextLineHeight", ctx)
+    return ctx and layout.font_size(ctx) or 13
+  end,
+  
+  ImGui_GetTextLineHeightWithSpacing = function(ctx)
+    log_api_call("ImGui_GetTextLineHeightWithSpacing", ctx)
+    if not ctx then return 17 end
+    return layout.font_size(ctx) + layout.style(ctx, 13)[2]
+  end,
+  
+  ImGui_GetFrameHeight = function(ctx)
+    log_api_call("ImGui_GetFrameHeight", ctx)
+    return ctx and layout.frame_height(ctx) or 19
+  end,
+  
+  ImGui_GetFrameHeightWithSpacing = function(ctx)
+    log_api_call("ImGui_GetFrameHeightWithSpacing", ctx)
+    if not ctx then return 23 end
+    return layout.frame_height(ctx) + layout.style(ctx, 13)[2]
   end,
   
   -- ==================== MENU SYSTEM ====================
@@ -821,28 +3228,37 @@ local mock_reaper = {
   ImGui_BeginMenuBar = function(ctx)
     table.insert(VirtualState.menu_stack, "MenuBar")
     log_api_call("ImGui_BeginMenuBar", ctx)
+    open_scope(ctx, "MenuBar")
     return true
   end,
   
   ImGui_EndMenuBar = function(ctx)
     table.remove(VirtualState.menu_stack)
     log_api_call("ImGui_EndMenuBar", ctx)
+    close_scope(ctx, "MenuBar", "ImGui_EndMenuBar")
   end,
   
   ImGui_BeginMenu = function(ctx, label, enabled)
     table.insert(VirtualState.menu_stack, label)
     log_api_call("ImGui_BeginMenu", ctx, label, enabled)
-    return enabled ~= false
+    item_event(ctx, label, "Menu")
+    if enabled == false then return false end
+    open_scope(ctx, "Menu")
+    id_push(ctx, label)
+    return true
   end,
   
   ImGui_EndMenu = function(ctx)
     local menu = table.remove(VirtualState.menu_stack)
     log_api_call("ImGui_EndMenu", ctx)
+    close_scope(ctx, "Menu", "ImGui_EndMenu")
+    id_pop(ctx)
   end,
   
   ImGui_MenuItem = function(ctx, label, shortcut, selected, enabled)
     log_api_call("ImGui_MenuItem", ctx, label, shortcut, selected, enabled)
-    return false -- Never clicked in virtual mode
+    if not playback then return false end -- only a scenario clicks widgets
+    return item_clicked(ctx, label, "MenuItem") and enabled ~= false
   end,
   
   -- ==================== TAB SYSTEM ====================
@@ -850,21 +3266,31 @@ local mock_reaper = {
   ImGui_BeginTabBar = function(ctx, str_id, flags)
     table.insert(VirtualState.tab_stack, str_id)
     log_api_call("ImGui_BeginTabBar", ctx, str_id, flags)
+    layout.bar(ctx)
+    open_scope(ctx, "TabBar")
+    id_push(ctx, str_id)
     return true
   end,
   
   ImGui_EndTabBar = function(ctx)
     local tab_bar = table.remove(VirtualState.tab_stack)
     log_api_call("ImGui_EndTabBar", ctx)
+    close_scope(ctx, "TabBar", "ImGui_EndTabBar")
+    id_pop(ctx)
   end,
   
   ImGui_BeginTabItem = function(ctx, label, open, flags)
     log_api_call("ImGui_BeginTabItem", ctx, label, open, flags)
+    item_event(ctx, label, "TabItem")
+    open_scope(ctx, "TabItem")
+    id_push(ctx, label)
     return true, open
   end,
   
   ImGui_EndTabItem = function(ctx)
     log_api_call("ImGui_EndTabItem", ctx)
+    close_scope(ctx, "TabItem", "ImGui_EndTabItem")
+    id_pop(ctx)
   end,
   
   -- ==================== WIDGETS ====================
@@ -873,111 +3299,154 @@ local mock_reaper = {
   ImGui_Text = function(ctx, text)
     log_api_call("ImGui_Text", ctx, text)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.text(ctx, text)
+    item_event(ctx, text, "Text")
   end,
   
   ImGui_TextColored = function(ctx, col, text)
     log_api_call("ImGui_TextColored", ctx, col, text)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.text(ctx, text)
+    item_event(ctx, text, "TextColored")
   end,
   
   ImGui_TextDisabled = function(ctx, text)
     log_api_call("ImGui_TextDisabled", ctx, text)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.text(ctx, text)
+    item_event(ctx, text, "TextDisabled")
   end,
   
   ImGui_TextWrapped = function(ctx, text)
     log_api_call("ImGui_TextWrapped", ctx, text)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.text(ctx, text, true)
+    item_event(ctx, text, "TextWrapped")
   end,
   
   ImGui_LabelText = function(ctx, label, text)
     log_api_call("ImGui_LabelText", ctx, label, text)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.frame(ctx, label, 0)
+    item_event(ctx, label, "LabelText")
   end,
   
   ImGui_BulletText = function(ctx, text)
     log_api_call("ImGui_BulletText", ctx, text)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.bullet_text(ctx, text)
+    item_event(ctx, text, "BulletText")
   end,
   
   -- Button widgets
   ImGui_Button = function(ctx, label, size_w, size_h)
     log_api_call("ImGui_Button", ctx, label, size_w, size_h)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false -- Never clicked in virtual mode
+    layout.button(ctx, label, size_w, size_h)
+    if not playback then return false end
+    return item_clicked(ctx, label, "Button")
   end,
   
   ImGui_SmallButton = function(ctx, label)
     log_api_call("ImGui_SmallButton", ctx, label)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false
+    layout.button(ctx, label, nil, nil, true)
+    if not playback then return false end
+    return item_clicked(ctx, label, "SmallButton")
   end,
   
   ImGui_InvisibleButton = function(ctx, str_id, size_w, size_h, flags)
     log_api_call("ImGui_InvisibleButton", ctx, str_id, size_w, size_h, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false
+    layout.sized_item(ctx, size_w, size_h)
+    if not playback then return false end
+    return item_clicked(ctx, str_id, "InvisibleButton")
   end,
   
   ImGui_ArrowButton = function(ctx, str_id, dir)
     log_api_call("ImGui_ArrowButton", ctx, str_id, dir)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false
+    layout.square(ctx)
+    if not playback then return false end
+    return item_clicked(ctx, str_id, "ArrowButton")
   end,
   
   -- Input widgets
   ImGui_InputText = function(ctx, label, buf, buf_sz, flags, callback, user_data)
     log_api_call("ImGui_InputText", ctx, label, tostring(buf):sub(1,20).."...", buf_sz, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, buf -- No change in virtual mode
+    layout.frame(ctx, label)
+    if not playback then return false, buf end -- only a scenario edits values
+    return item_value(ctx, label, "InputText", buf)
   end,
   
   ImGui_InputTextMultiline = function(ctx, label, buf, buf_sz, size_w, size_h, flags, callback, user_data)
     log_api_call("ImGui_InputTextMultiline", ctx, label, "...", buf_sz, size_w, size_h, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, buf
+    layout.list_frame(ctx, label, size_w, size_h, 8)
+    if not playback then return false, buf end
+    return item_value(ctx, label, "InputTextMultiline", buf)
   end,
   
   ImGui_InputTextWithHint = function(ctx, label, hint, buf, buf_sz, flags, callback, user_data)
     log_api_call("ImGui_InputTextWithHint", ctx, label, hint, "...", buf_sz, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, buf
+    layout.frame(ctx, label)
+    if not playback then return false, buf end
+    return item_value(ctx, label, "InputTextWithHint", buf)
   end,
   
   ImGui_InputInt = function(ctx, label, v, step, step_fast, flags)
     log_api_call("ImGui_InputInt", ctx, label, v, step, step_fast, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    layout.frame(ctx, label)
+    if not playback then return false, v end
+    return item_value(ctx, label, "InputInt", v)
   end,
   
   ImGui_InputDouble = function(ctx, label, v, step, step_fast, format, flags)
     log_api_call("ImGui_InputDouble", ctx, label, v, step, step_fast, format, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    layout.frame(ctx, label)
+    if not playback then return false, v end
+    return item_value(ctx, label, "InputDouble", v)
   end,
   
   -- Checkbox and radio
   ImGui_Checkbox = function(ctx, label, v)
     log_api_call("ImGui_Checkbox", ctx, label, v)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    layout.check(ctx, label)
+    if not playback then return false, v end
+    return item_toggle(ctx, label, "Checkbox", v)
   end,
   
   ImGui_CheckboxFlags = function(ctx, label, flags, flags_value)
     log_api_call("ImGui_CheckboxFlags", ctx, label, flags, flags_value)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, flags
+    layout.check(ctx, label)
+    local changed, checked = item_toggle(ctx, label, "CheckboxFlags",
+                                         math.floor(flags / flags_value) % 2 == 1)
+    if not changed then return false, flags end
+    local set = math.floor(flags / flags_value) % 2 == 1 -- flags_value is a single bit
+    if checked and not set then return true, flags + flags_value end
+    if set and not checked then return true, flags - flags_value end
+    return true, flags
   end,
   
   ImGui_RadioButton = function(ctx, label, active)
     log_api_call("ImGui_RadioButton", ctx, label, active)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false
+    layout.check(ctx, label)
+    if not playback then return false end
+    return item_clicked(ctx, label, "RadioButton")
   end,
   
   ImGui_RadioButtonEx = function(ctx, label, v, v_button)
     log_api_call("ImGui_RadioButtonEx", ctx, label, v, v_button)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.check(ctx, label)
+    if item_clicked(ctx, label, "RadioButtonEx") then return v ~= v_button, v_button end
     return false, v
   end,
   
@@ -985,108 +3454,295 @@ local mock_reaper = {
   ImGui_BeginCombo = function(ctx, label, preview_value, flags)
     log_api_call("ImGui_BeginCombo", ctx, label, preview_value, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false -- Never open in virtual mode
+    layout.frame(ctx, label)
+    -- Open only in a frame where the scenario clicks it
+    if not item_clicked(ctx, label, "Combo") then return false end
+    open_scope(ctx, "Combo")
+    id_push(ctx, label)
+    return true
   end,
   
   ImGui_EndCombo = function(ctx)
     log_api_call("ImGui_EndCombo", ctx)
+    close_scope(ctx, "Combo", "ImGui_EndCombo")
+    id_pop(ctx)
   end,
   
   ImGui_Combo = function(ctx, label, current_item, items, popup_max_height_in_items)
     log_api_call("ImGui_Combo", ctx, label, current_item, "...", popup_max_height_in_items)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, current_item
+    layout.frame(ctx, label)
+    if not playback then return false, current_item end
+    return item_value(ctx, label, "Combo", current_item)
   end,
   
   ImGui_BeginListBox = function(ctx, label, size_w, size_h)
     log_api_call("ImGui_BeginListBox", ctx, label, size_w, size_h)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false
+    layout.list_frame(ctx, label, size_w, size_h, 7.25)
+    if not item_clicked(ctx, label, "ListBox") then return false end
+    open_scope(ctx, "ListBox")
+    id_push(ctx, label)
+    return true
   end,
   
   ImGui_EndListBox = function(ctx)
     log_api_call("ImGui_EndListBox", ctx)
+    close_scope(ctx, "ListBox", "ImGui_EndListBox")
+    id_pop(ctx)
   end,
   
   ImGui_ListBox = function(ctx, label, current_item, items, height_in_items)
     log_api_call("ImGui_ListBox", ctx, label, current_item, "...", height_in_items)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, current_item
+    layout.list_frame(ctx, label, nil, nil, (height_in_items or 7) + 0.25)
+    if not playback then return false, current_item end
+    return item_value(ctx, label, "ListBox", current_item)
   end,
   
   ImGui_Selectable = function(ctx, label, selected, flags, size_w, size_h)
     log_api_call("ImGui_Selectable", ctx, label, selected, flags, size_w, size_h)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, selected
+    layout.selectable(ctx, label, size_w, size_h)
+    if not playback then return false, selected end
+    return item_toggle(ctx, label, "Selectable", selected)
   end,
   
   -- Sliders and drags
   ImGui_SliderDouble = function(ctx, label, v, v_min, v_max, format, flags)
     log_api_call("ImGui_SliderDouble", ctx, label, v, v_min, v_max, format, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    layout.frame(ctx, label)
+    if not playback then return false, v end
+    return item_value(ctx, label, "SliderDouble", v)
   end,
   
   ImGui_SliderInt = function(ctx, label, v, v_min, v_max, format, flags)
     log_api_call("ImGui_SliderInt", ctx, label, v, v_min, v_max, format, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    layout.frame(ctx, label)
+    if not playback then return false, v end
+    return item_value(ctx, label, "SliderInt", v)
   end,
   
   ImGui_DragDouble = function(ctx, label, v, v_speed, v_min, v_max, format, flags)
     log_api_call("ImGui_DragDouble", ctx, label, v, v_speed, v_min, v_max, format, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    layout.frame(ctx, label)
+    if not playback then return false, v end
+    return item_value(ctx, label, "DragDouble", v)
+  end,
+  
+  ImGui_DragInt = function(ctx, label, v, v_speed, v_min, v_max, format, flags)
+    log_api_call("ImGui_DragInt", ctx, label, v, v_speed, v_min, v_max, format, flags)
+    VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.frame(ctx, label)
+    if not playback then return false, v end
+    return item_value(ctx, label, "DragInt", v)
+  end,
+  
+  -- ==================== LAYOUT AND SPACING ====================
+  
+  ImGui_Separator = function(ctx)
+    log_api_call("ImGui_Separator", ctx)
+    VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.separator(ctx)
+  end,
+  
+  ImGui_SeparatorText = function(ctx, text)
+    log_api_call("ImGui_SeparatorText", ctx, text)
+    VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.separator(ctx, text)
+  end,
+  
+  ImGui_SameLine = function(ctx, offset_from_start_x, spacing)
+    log_api_call("ImGui_SameLine", ctx, offset_from_start_x, spacing)
+    layout.same_line(ctx, offset_from_start_x, spacing)
+  end,
+  
+  ImGui_NewLine = function(ctx)
+    log_api_call("ImGui_NewLine", ctx)
+    layout.new_line(ctx)
+  end,
+  
+  ImGui_Spacing = function(ctx)
+    log_api_call("ImGui_Spacing", ctx)
+    layout.spacing(ctx)
+  end,
+  
+  ImGui_ProgressBar = function(ctx, fraction, size_arg_w, size_arg_h, overlay)
+    log_api_call("ImGui_ProgressBar", ctx, fraction, size_arg_w, size_arg_h, overlay)
+    VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.progress_bar(ctx, size_arg_w, size_arg_h)
+  end,
+  
+  ImGui_Dummy = function(ctx, size_w, size_h)
+    log_api_call("ImGui_Dummy", ctx, size_w, size_h)
+    layout.sized_item(ctx, size_w, size_h)
+  end,
+  
+  ImGui_Indent = function(ctx, indent_w)
+    log_api_call("ImGui_Indent", ctx, indent_w)
+    layout.indent(ctx, indent_w, 1)
+  end,
+  
+  ImGui_Unindent = function(ctx, indent_w)
+    log_api_call("ImGui_Unindent", ctx, indent_w)
+    layout.indent(ctx, indent_w, -1)
+  end,
+  
+  ImGui_BeginGroup = function(ctx)
+    log_api_call("ImGui_BeginGroup", ctx)
+    layout.begin_group(ctx)
+    open_scope(ctx, "Group")
+  end,
+  
+  ImGui_EndGroup = function(ctx)
+    log_api_call("ImGui_EndGroup", ctx)
+    layout.end_group(ctx)
+    close_scope(ctx, "Group", "ImGui_EndGroup")
+  end,
+  
+  ImGui_PushItemWidth = function(ctx, item_width)
+    log_api_call("ImGui_PushItemWidth", ctx, item_width)
+    push_scope(ctx, "ItemWidth", "ImGui_PushItemWidth")
+    layout.push_item_width(ctx, item_width)
+  end,
+  
+  ImGui_PopItemWidth = function(ctx)
+    log_api_call("ImGui_PopItemWidth", ctx)
+    pop_scope(ctx, "ItemWidth", "ImGui_PopItemWidth")
+    layout.pop_item_width(ctx)
+  end,
+  
+  ImGui_PushTextWrapPos = function(ctx, wrap_local_pos_x)
+    log_api_call("ImGui_PushTextWrapPos", ctx, wrap_local_pos_x)
+    push_scope(ctx, "TextWrapPos", "ImGui_PushTextWrapPos")
+    if ctx then layout.push_wrap_pos(ctx, wrap_local_pos_x) end
+  end,
+  
+  ImGui_PopTextWrapPos = function(ctx)
+    log_api_call("ImGui_PopTextWrapPos", ctx)
+    pop_scope(ctx, "TextWrapPos", "ImGui_PopTextWrapPos")
+    if ctx then layout.pop_wrap_pos(ctx) end
+  end,
+  
+  ImGui_SetNextItemWidth = function(ctx, item_width)
+    log_api_call("ImGui_SetNextItemWidth", ctx, item_width)
+    layout.set_next_item_width(ctx, item_width)
+  end,
+  
+  ImGui_CalcItemWidth = function(ctx)
+    log_api_call("ImGui_CalcItemWidth", ctx)
+    return layout.item_width(ctx)
+  end,
+  
+  ImGui_PushID = function(ctx, str_id)
+    log_api_call("ImGui_PushID", ctx, str_id)
+    push_scope(ctx, "ID", "ImGui_PushID")
+    id_push(ctx, str_id)
+  end,
+  
+  ImGui_PopID = function(ctx)
+    log_api_call("ImGui_PopID", ctx)
+    pop_scope(ctx, "ID", "ImGui_PopID")
+    id_pop(ctx)
+  end,
+  
+  -- ==================== TREES ====================
+  
+  -- Nodes start closed unless flagged DefaultOpen; only an open node needs TreePop
+  ImGui_TreeNode = function(ctx, label, flags)
+    log_api_call("ImGui_TreeNode", ctx, label, flags)
+    VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.tree_node(ctx, label, flags)
+    if not tree_node_open(ctx, label, flags) then return false end
+    layout.indent(ctx, nil, 1)
+    open_scope(ctx, "Tree", "ImGui_TreeNode")
+    id_push(ctx, label)
+    return true
   end,
   
-  ImGui_DragInt = function(ctx, label, v, v_speed, v_min, v_max, format, flags)
-    log_api_call("ImGui_DragInt", ctx, label, v, v_speed, v_min, v_max, format, flags)
+  -- A framed tree node that neither indents nor pushes an ID
+  ImGui_CollapsingHeader = function(ctx, label, p_visible, flags)
+    log_api_call("ImGui_CollapsingHeader", ctx, label, p_visible, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
-    return false, v
+    flags = flags or 0
+    if math.floor(flags / 2) % 2 == 0 then flags = flags + 2 end -- TreeNodeFlags_Framed
+    layout.tree_node(ctx, label, flags)
+    return tree_node_open(ctx, label, flags), p_visible
   end,
   
-  -- ==================== LAYOUT AND SPACING ====================
-  
-  ImGui_Separator = function(ctx)
-    log_api_call("ImGui_Separator", ctx)
+  ImGui_TreeNodeEx = function(ctx, str_id, label, flags)
+    log_api_call("ImGui_TreeNodeEx", ctx, str_id, label, flags)
     VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+    layout.tree_node(ctx, label or str_id, flags)
+    if not tree_node_open(ctx, str_id, flags) then return false end
+    layout.indent(ctx, nil, 1)
+    open_scope(ctx, "Tree", "ImGui_TreeNodeEx")
+    id_push(ctx, str_id)
+    return true
   end,
   
-  ImGui_SeparatorText = function(ctx, text)
-    log_api_call("ImGui_SeparatorText", ctx, text)
-    VirtualState.stats.widgets_drawn = VirtualState.stats.widgets_drawn + 1
+  ImGui_TreePush = function(ctx, str_id)
+    log_api_call("ImGui_TreePush", ctx, str_id)
+    layout.indent(ctx, nil, 1)
+    open_scope(ctx, "Tree", "ImGui_TreePush")
+    id_push(ctx, str_id)
   end,
   
-  ImGui_SameLine = function(ctx, offset_from_start_x, spacing)
-    log_api_call("ImGui_SameLine", ctx, offset_from_start_x, spacing)
+  ImGui_TreePop = function(ctx)
+    log_api_call("ImGui_TreePop", ctx)
+    layout.indent(ctx, nil, -1)
+    close_scope(ctx, "Tree", "ImGui_TreePop")
+    id_pop(ctx)
   end,
   
-  ImGui_NewLine = function(ctx)
-    log_api_call("ImGui_NewLine", ctx)
+  -- ==================== TABLES ====================
+  
+  ImGui_BeginTable = function(ctx, str_id, column, flags, outer_size_w, outer_size_h, inner_width)
+    log_api_call("ImGui_BeginTable", ctx, str_id, column, flags)
+    if not column or column < 1 then
+      log_error("ImGui_BeginTable needs at least one column")
+      return false
+    end
+    layout.begin_table(ctx, column, outer_size_w)
+    open_scope(ctx, "Table")
+    id_push(ctx, str_id)
+    return true
   end,
   
-  ImGui_Spacing = function(ctx)
-    log_api_call("ImGui_Spacing", ctx)
+  ImGui_EndTable = function(ctx)
+    log_api_call("ImGui_EndTable", ctx)
+    layout.end_table(ctx)
+    close_scope(ctx, "Table", "ImGui_EndTable")
+    id_pop(ctx)
   end,
   
-  ImGui_Dummy = function(ctx, size_w, size_h)
-    log_api_call("ImGui_Dummy", ctx, size_w, size_h)
+  ImGui_TableSetupColumn = function(ctx, label, flags, init_width_or_weight, user_id)
+    log_api_call("ImGui_TableSetupColumn", ctx, label, flags, init_width_or_weight)
   end,
   
-  ImGui_Indent = function(ctx, indent_w)
-    log_api_call("ImGui_Indent", ctx, indent_w)
+  ImGui_TableHeadersRow = function(ctx)
+    log_api_call("ImGui_TableHeadersRow", ctx)
+    layout.table_headers_row(ctx)
   end,
   
-  ImGui_Unindent = function(ctx, indent_w)
-    log_api_call("ImGui_Unindent", ctx, indent_w)
+  ImGui_TableNextRow = function(ctx, row_flags, min_row_height)
+    log_api_call("ImGui_TableNextRow", ctx, row_flags, min_row_height)
+    layout.table_next_row(ctx, min_row_height)
   end,
   
-  ImGui_BeginGroup = function(ctx)
-    log_api_call("ImGui_BeginGroup", ctx)
+  ImGui_TableNextColumn = function(ctx)
+    log_api_call("ImGui_TableNextColumn", ctx)
+    layout.table_column(ctx)
+    return true
   end,
   
-  ImGui_EndGroup = function(ctx)
-    log_api_call("ImGui_EndGroup", ctx)
+  ImGui_TableSetColumnIndex = function(ctx, column_n)
+    log_api_call("ImGui_TableSetColumnIndex", ctx, column_n)
+    layout.table_column(ctx, (column_n or 0) + 1)
+    return true
   end,
   
   -- ==================== STYLE MANAGEMENT ====================
@@ -1108,6 +3764,7 @@ local mock_reaper = {
   
   ImGui_PushStyleColor = function(ctx, idx, col)
     log_api_call("ImGui_PushStyleColor", ctx, idx, col)
+    push_scope(ctx, "StyleColor", "ImGui_PushStyleColor")
     if ctx then
       table.insert(ctx.color_stack, {idx = idx, old_col = ctx.style_colors[idx]})
       ctx.style_colors[idx] = col
@@ -1117,6 +3774,7 @@ local mock_reaper = {
   ImGui_PopStyleColor = function(ctx, count)
     count = count or 1
     log_api_call("ImGui_PopStyleColor", ctx, count)
+    pop_scope(ctx, "StyleColor", "ImGui_PopStyleColor", count)
     if ctx then
       for i = 1, count do
         local entry = table.remove(ctx.color_stack)
@@ -1129,6 +3787,7 @@ local mock_reaper = {
   
   ImGui_PushStyleVar = function(ctx, idx, val, val2)
     log_api_call("ImGui_PushStyleVar", ctx, idx, val, val2)
+    push_scope(ctx, "StyleVar", "ImGui_PushStyleVar")
     if ctx then
       table.insert(ctx.var_stack, {idx = idx, old_val = ctx.style_vars[idx]})
       ctx.style_vars[idx] = val2 and {val, val2} or val
@@ -1138,6 +3797,7 @@ local mock_reaper = {
   ImGui_PopStyleVar = function(ctx, count)
     count = count or 1
     log_api_call("ImGui_PopStyleVar", ctx, count)
+    pop_scope(ctx, "StyleVar", "ImGui_PopStyleVar", count)
     if ctx then
       for i = 1, count do
         local entry = table.remove(ctx.var_stack)
@@ -1170,6 +3830,7 @@ local mock_reaper = {
   
   ImGui_PushFont = function(ctx, font)
     log_api_call("ImGui_PushFont", ctx, font and font.name)
+    push_scope(ctx, "Font", "ImGui_PushFont")
     if ctx and font then
       table.insert(ctx.font_stack, font)
     end
@@ -1177,6 +3838,7 @@ local mock_reaper = {
   
   ImGui_PopFont = function(ctx)
     log_api_call("ImGui_PopFont", ctx)
+    pop_scope(ctx, "Font", "ImGui_PopFont")
     if ctx then
       table.remove(ctx.font_stack)
     end
@@ -1186,11 +3848,13 @@ local mock_reaper = {
   
   ImGui_BeginTooltip = function(ctx)
     log_api_call("ImGui_BeginTooltip", ctx)
+    open_scope(ctx, "Tooltip")
     return true
   end,
   
   ImGui_EndTooltip = function(ctx)
     log_api_call("ImGui_EndTooltip", ctx)
+    close_scope(ctx, "Tooltip", "ImGui_EndTooltip")
   end,
   
   ImGui_SetTooltip = function(ctx, text)
@@ -1203,24 +3867,28 @@ local mock_reaper = {
   
   -- ==================== ITEM/WIDGET QUERY ====================
   
+  -- The last submitted item answers for the scenario event it consumed
   ImGui_IsItemHovered = function(ctx, flags)
     log_api_call("ImGui_IsItemHovered", ctx, flags)
-    return false -- Never hovered in virtual mode
+    return ctx ~= nil and ctx.last_item ~= nil
   end,
   
   ImGui_IsItemActive = function(ctx)
     log_api_call("ImGui_IsItemActive", ctx)
-    return false
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.kind ~= "hover"
   end,
   
   ImGui_IsItemFocused = function(ctx)
     log_api_call("ImGui_IsItemFocused", ctx)
-    return false
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.kind ~= "hover"
   end,
   
   ImGui_IsItemClicked = function(ctx, mouse_button)
     log_api_call("ImGui_IsItemClicked", ctx, mouse_button)
-    return false
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.kind == "click" and (event.button or 0) == (mouse_button or 0)
   end,
   
   ImGui_IsItemVisible = function(ctx)
@@ -1230,24 +3898,233 @@ local mock_reaper = {
   
   ImGui_IsItemEdited = function(ctx)
     log_api_call("ImGui_IsItemEdited", ctx)
-    return false
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.edited == true
   end,
   
   ImGui_IsItemActivated = function(ctx)
     log_api_call("ImGui_IsItemActivated", ctx)
-    return false
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.kind ~= "hover"
   end,
   
   ImGui_IsItemDeactivated = function(ctx)
     log_api_call("ImGui_IsItemDeactivated", ctx)
-    return false
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.kind ~= "hover"
   end,
   
   ImGui_IsItemDeactivatedAfterEdit = function(ctx)
     log_api_call("ImGui_IsItemDeactivatedAfterEdit", ctx)
+    local event = ctx and ctx.last_item
+    return event ~= nil and event.edited == true
+  end,
+  
+  -- ==================== KEYBOARD AND MOUSE ====================
+  
+  -- Scenario key and mouse events drive these; without one nothing is pressed
+  ImGui_IsKeyDown = function(ctx, key)
+    log_api_call("ImGui_IsKeyDown", ctx, key)
+    local input = input_state()
+    return input ~= nil and input.keys_down[key] == true
+  end,
+  
+  ImGui_IsKeyPressed = function(ctx, key, allow_repeat)
+    log_api_call("ImGui_IsKeyPressed", ctx, key, allow_repeat)
+    local input = input_state()
+    return input ~= nil and input.pressed[key] == true
+  end,
+  
+  ImGui_IsKeyReleased = function(ctx, key)
+    log_api_call("ImGui_IsKeyReleased", ctx, key)
+    local input = input_state()
+    return input ~= nil and input.released[key] == true
+  end,
+  
+  ImGui_IsMouseDown = function(ctx, button)
+    log_api_call("ImGui_IsMouseDown", ctx, button)
+    local input = input_state()
+    return input ~= nil and input.mouse_down[button or 0] == true
+  end,
+  
+  ImGui_IsMouseClicked = function(ctx, button, allow_repeat)
+    log_api_call("ImGui_IsMouseClicked", ctx, button, allow_repeat)
+    local input = input_state()
+    return input ~= nil and input.clicked[button or 0] == true
+  end,
+  
+  -- Scenarios click once a frame, so there are no double clicks
+  ImGui_IsMouseDoubleClicked = function(ctx, button)
+    log_api_call("ImGui_IsMouseDoubleClicked", ctx, button)
     return false
   end,
   
+  ImGui_IsMouseReleased = function(ctx, button)
+    log_api_call("ImGui_IsMouseReleased", ctx, button)
+    local input = input_state()
+    return input ~= nil and input.mouse_released[button or 0] == true
+  end,
+  
+  ImGui_GetMousePos = function(ctx)
+    log_api_call("ImGui_GetMousePos", ctx)
+    local input = input_state()
+    if input and input.mouse_x then return input.mouse_x, input.mouse_y end
+    return ctx.mouse_pos.x, ctx.mouse_pos.y
+  end,
+  
+  -- ==================== DRAW LISTS ====================
+  -- Commands are recorded per window (see DRAW LISTS above the API)
+  
+  ImGui_GetWindowDrawList = function(ctx)
+    log_api_call("ImGui_GetWindowDrawList", ctx)
+    return ctx and draw_lists.get(ctx)
+  end,
+  
+  ImGui_GetForegroundDrawList = function(ctx)
+    log_api_call("ImGui_GetForegroundDrawList", ctx)
+    return ctx and draw_lists.get(ctx, "##Foreground")
+  end,
+  
+  ImGui_GetBackgroundDrawList = function(ctx)
+    log_api_call("ImGui_GetBackgroundDrawList", ctx)
+    return ctx and draw_lists.get(ctx, "##Background")
+  end,
+  
+  ImGui_DrawList_AddLine = function(draw_list, p1_x, p1_y, p2_x, p2_y, col_rgba, thickness)
+    log_api_call("ImGui_DrawList_AddLine", nil, p1_x, p1_y, p2_x, p2_y, col_rgba, thickness)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.LINE, col_rgba, p1_x, p1_y, p2_x, p2_y, thickness or 1)
+  end,
+  
+  ImGui_DrawList_AddRect = function(draw_list, p_min_x, p_min_y, p_max_x, p_max_y, col_rgba, rounding, flags, thickness)
+    log_api_call("ImGui_DrawList_AddRect", nil, p_min_x, p_min_y, p_max_x, p_max_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.RECT, col_rgba, p_min_x, p_min_y, p_max_x, p_max_y,
+                      rounding, thickness or 1, flags)
+  end,
+  
+  ImGui_DrawList_AddRectFilled = function(draw_list, p_min_x, p_min_y, p_max_x, p_max_y, col_rgba, rounding, flags)
+    log_api_call("ImGui_DrawList_AddRectFilled", nil, p_min_x, p_min_y, p_max_x, p_max_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.RECT_FILLED, col_rgba, p_min_x, p_min_y, p_max_x, p_max_y,
+                      rounding, flags)
+  end,
+  
+  ImGui_DrawList_AddCircle = function(draw_list, center_x, center_y, radius, col_rgba, num_segments, thickness)
+    log_api_call("ImGui_DrawList_AddCircle", nil, center_x, center_y, radius, col_rgba)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.CIRCLE, col_rgba, center_x, center_y, radius,
+                      num_segments, thickness or 1)
+  end,
+  
+  ImGui_DrawList_AddCircleFilled = function(draw_list, center_x, center_y, radius, col_rgba, num_segments)
+    log_api_call("ImGui_DrawList_AddCircleFilled", nil, center_x, center_y, radius, col_rgba)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.CIRCLE_FILLED, col_rgba, center_x, center_y, radius, num_segments)
+  end,
+  
+  ImGui_DrawList_AddTriangle = function(draw_list, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, col_rgba, thickness)
+    log_api_call("ImGui_DrawList_AddTriangle", nil, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.TRIANGLE, col_rgba, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y,
+                      thickness or 1)
+  end,
+  
+  ImGui_DrawList_AddTriangleFilled = function(draw_list, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, col_rgba)
+    log_api_call("ImGui_DrawList_AddTriangleFilled", nil, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.TRIANGLE_FILLED, col_rgba, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y)
+  end,
+  
+  -- Quads record as a closed polyline or a convex fill of their 4 points
+  ImGui_DrawList_AddQuad = function(draw_list, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y, col_rgba, thickness)
+    log_api_call("ImGui_DrawList_AddQuad", nil, p1_x, p1_y, p4_x, p4_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.poly(draw_list, draw_lists.OP.POLYLINE, col_rgba,
+                    {p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y}, thickness or 1, 1)
+  end,
+  
+  ImGui_DrawList_AddQuadFilled = function(draw_list, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y, col_rgba)
+    log_api_call("ImGui_DrawList_AddQuadFilled", nil, p1_x, p1_y, p4_x, p4_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.poly(draw_list, draw_lists.OP.CONVEX_POLY_FILLED, col_rgba,
+                    {p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y})
+  end,
+  
+  ImGui_DrawList_AddPolyline = function(draw_list, points, col_rgba, flags, thickness)
+    log_api_call("ImGui_DrawList_AddPolyline", nil, col_rgba, flags, thickness)
+    if not draw_list then return end
+    draw_lists.poly(draw_list, draw_lists.OP.POLYLINE, col_rgba, points, thickness or 1,
+                    (flags or 0) % 2) -- DrawFlags_Closed
+  end,
+  
+  ImGui_DrawList_AddConvexPolyFilled = function(draw_list, points, col_rgba)
+    log_api_call("ImGui_DrawList_AddConvexPolyFilled", nil, col_rgba)
+    if not draw_list then return end
+    draw_lists.poly(draw_list, draw_lists.OP.CONVEX_POLY_FILLED, col_rgba, points)
+  end,
+  
+  ImGui_DrawList_AddBezierCubic = function(draw_list, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y, col_rgba,
+                                           thickness, num_segments)
+    log_api_call("ImGui_DrawList_AddBezierCubic", nil, p1_x, p1_y, p4_x, p4_y, col_rgba)
+    if not draw_list then return end
+    draw_lists.poly(draw_list, draw_lists.OP.BEZIER_CUBIC, col_rgba,
+                    {p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y}, thickness or 1, num_segments)
+  end,
+  
+  ImGui_DrawList_AddText = function(draw_list, x, y, col_rgba, text)
+    log_api_call("ImGui_DrawList_AddText", nil, x, y, col_rgba, text)
+    if not draw_list then return end
+    draw_lists.text(draw_list, x, y, col_rgba, text)
+  end,
+  
+  ImGui_DrawList_AddTextEx = function(draw_list, font, font_size, pos_x, pos_y, col_rgba, text, wrap_width)
+    log_api_call("ImGui_DrawList_AddTextEx", nil, font_size, pos_x, pos_y, col_rgba, text)
+    if not draw_list then return end
+    draw_lists.text(draw_list, pos_x, pos_y, col_rgba, text, font_size)
+  end,
+  
+  ImGui_DrawList_PushClipRect = function(draw_list, clip_rect_min_x, clip_rect_min_y, clip_rect_max_x,
+                                         clip_rect_max_y, intersect_with_current_clip_rect)
+    log_api_call("ImGui_DrawList_PushClipRect", nil, clip_rect_min_x, clip_rect_min_y, clip_rect_max_x, clip_rect_max_y)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.PUSH_CLIP, 0, clip_rect_min_x, clip_rect_min_y,
+                      clip_rect_max_x, clip_rect_max_y, intersect_with_current_clip_rect and 1 or 0)
+  end,
+  
+  ImGui_DrawList_PopClipRect = function(draw_list)
+    log_api_call("ImGui_DrawList_PopClipRect", nil)
+    if not draw_list then return end
+    draw_lists.record(draw_list, draw_lists.OP.POP_CLIP, 0)
+  end,
+  
+  ImGui_DrawList_PathClear = function(draw_list)
+    log_api_call("ImGui_DrawList_PathClear", nil)
+    if draw_list then draw_lists.path_clear(draw_list) end
+  end,
+  
+  ImGui_DrawList_PathLineTo = function(draw_list, pos_x, pos_y)
+    log_api_call("ImGui_DrawList_PathLineTo", nil, pos_x, pos_y)
+    if draw_list then draw_lists.path_to(draw_list, pos_x, pos_y) end
+  end,
+  
+  ImGui_DrawList_PathArcTo = function(draw_list, center_x, center_y, radius, a_min, a_max, num_segments)
+    log_api_call("ImGui_DrawList_PathArcTo", nil, center_x, center_y, radius, a_min, a_max)
+    if draw_list then draw_lists.path_arc(draw_list, center_x, center_y, radius, a_min, a_max, num_segments) end
+  end,
+  
+  ImGui_DrawList_PathStroke = function(draw_list, col_rgba, flags, thickness)
+    log_api_call("ImGui_DrawList_PathStroke", nil, col_rgba, flags, thickness)
+    if draw_list then
+      draw_lists.path_end(draw_list, draw_lists.OP.POLYLINE, col_rgba, thickness or 1, (flags or 0) % 2)
+    end
+  end,
+  
+  ImGui_DrawList_PathFillConvex = function(draw_list, col_rgba)
+    log_api_call("ImGui_DrawList_PathFillConvex", nil, col_rgba)
+    if draw_list then draw_lists.path_end(draw_list, draw_lists.OP.CONVEX_POLY_FILLED, col_rgba) end
+  end,
+  
   -- ==================== CONSTANTS AS FUNCTIONS ====================
   
   -- Window flags
@@ -1342,9 +4219,116 @@ local mock_reaper = {
   ImGui_TabItemFlags_NoTooltip = function() return 16 end,
   ImGui_TabItemFlags_NoReorder = function() return 32 end,
   ImGui_TabItemFlags_Leading = function() return 64 end,
-  ImGui_TabItemFlags_Trailing = function() return 128 end
+  ImGui_TabItemFlags_Trailing = function() return 128 end,
+  
+  -- Tree node flags
+  ImGui_TreeNodeFlags_None = function() return 0 end,
+  ImGui_TreeNodeFlags_Framed = function() return 2 end,
+  ImGui_TreeNodeFlags_DefaultOpen = function() return 32 end,
+  
+  -- Draw flags
+  ImGui_DrawFlags_None = function() return 0 end,
+  ImGui_DrawFlags_Closed = function() return 1 end,
+  
+  -- Child flags
+  ImGui_ChildFlags_None = function() return 0 end,
+  ImGui_ChildFlags_Border = function() return 1 end,
+  
+  -- Conditions for SetNextWindow*
+  ImGui_Cond_Always = function() return 1 end,
+  ImGui_Cond_Once = function() return 2 end,
+  ImGui_Cond_FirstUseEver = function() return 4 end,
+  ImGui_Cond_Appearing = function() return 8 end,
+  
+  -- Mouse buttons
+  ImGui_MouseButton_Left = function() return 0 end,
+  ImGui_MouseButton_Right = function() return 1 end,
+  ImGui_MouseButton_Middle = function() return 2 end
 }
 
+-- Keys: ImGui_Key_Enter, ImGui_Key_A, ImGui_Key_F1, ...
+for name, code in pairs(KEY_CODES) do
+  mock_reaper["ImGui_Key_" .. name] = function() return code end
+end
+
+-- ==================== COVERAGE AND PROFILER ====================
+-- API coverage, line coverage and the CPU profiler (envireament_coverage.lua)
+
+local instrumentation = require_engine("envireament_coverage").new({
+  reaper = mock_reaper, api_ids = api_ids, api_hits = api_hits, log_warning = log_warning,
+  mock_sources = mock_sources,
+})
+write_api_coverage = instrumentation.write_api_coverage
+write_coverage = instrumentation.write_coverage
+write_profile = instrumentation.write_profile
+
+if os.getenv("ENVIREAMENT_COVERAGE") then
+  instrumentation.start_coverage(os.getenv("ENVIREAMENT_COVERAGE_MODE"), os.getenv("ENVIREAMENT_COVERAGE_INTERVAL"))
+end
+if os.getenv("ENVIREAMENT_PROFILE") then
+  instrumentation.start_profile(os.getenv("ENVIREAMENT_PROFILE_INTERVAL"),
+                                os.getenv("ENVIREAMENT_PROFILE_DETAIL") == "1")
+end
+
+-- ==================== FRAME TIMING ====================
+-- Per-frame CPU cost split into script, mock and GC time, against a frame
+-- budget (envireament_timing.lua)
+
+frame_timer = require_engine("envireament_timing").new({
+  reaper = mock_reaper, state = VirtualState,
+  set_active = function(timing) frame_timing = timing end,
+})
+
+-- ==================== SOAK MODE ====================
+-- Memory growth over many frames (envireament_soak.lua, loaded the first
+-- time a soak run starts)
+
+local function run_soak(script_path, options)
+  local ok, engine = pcall(require_engine, "envireament_soak")
+  if not ok then return false, engine end
+  return engine.run({
+    reaper = mock_reaper, module = EnhancedVirtualReaper, state = VirtualState,
+    mock_sources = mock_sources, log_warning = log_warning, drive_frames = drive_frames,
+    untimed = frame_timer.untimed, deferred = function() return deferred end,
+    set_api_window = function(calls) api_window = calls end,
+  }, script_path, options)
+end
+
+-- ==================== SCENARIO PLAYBACK ====================
+-- Scripted input replayed frame by frame (envireament_scenario.lua, loaded
+-- the first time a scenario plays): the scenario format, event
+-- compilation, input state and the per-step report
+
+local function run_scenario(script_path, source, options)
+  local ok, engine = pcall(require_engine, "envireament_scenario")
+  if not ok then return false, engine end
+  return engine.run({
+    key_code = key_code, load_data = load_data_chunk, new_input = new_input,
+    drive_frames = drive_frames, log_warning = log_warning, state = VirtualState,
+    set_playback = function(value) playback = value end,
+  }, script_path, source, options)
+end
+
+-- ==================== SESSIONS ====================
+-- Many scripts side by side in one VM, each with its own state, globals,
+-- modules and deferred queue (envireament_sessions.lua, loaded the first
+-- time sessions run)
+
+local function run_sessions(paths, options)
+  return require_engine("envireament_sessions").run({
+    state = VirtualState, reaper = mock_reaper, module = EnhancedVirtualReaper,
+    end_frame = end_frame, finish_script = finish_script,
+    new_state = function()
+      local state = new_virtual_state()
+      state.stats = new_statistics()
+      state.project = new_default_project()
+      return state
+    end,
+    deferred = function() return deferred end,
+    set_deferred = function(callbacks) deferred = callbacks end,
+  }, paths, options)
+end
+
 -- ==================== VIRTUAL TESTING FRAMEWORK ====================
 
 function EnhancedVirtualReaper.create_environment()
@@ -1354,6 +4338,8 @@ function EnhancedVirtualReaper.create_environment()
   -- Setup virtual environment
   VirtualState.time = os.time()
   VirtualState.frame_count = 0
+  VirtualState.frame_started = nil
+  VirtualState.project = new_default_project()
   
   print("🚀 Enhanced Virtual REAPER Environment Initialized")
   print("📊 Features: Comprehensive ImGui API, State Management, Performance Tracking")
@@ -1370,8 +4356,29 @@ function EnhancedVirtualReaper.run_test_script(script_path)
   -- Create environment
   EnhancedVirtualReaper.create_environment()
   
-  -- Load and run script
-  local success, result = pcall(dofile, script_path)
+  -- Time every frame against a budget (ENVIREAMENT_FRAME_BUDGET, in ms)
+  local budget = os.getenv("ENVIREAMENT_FRAME_BUDGET")
+  if budget then frame_timer.start_frame_timing(budget) end
+  
+  -- Load and run script; soak and scenario runs drive its deferred frames too
+  local success, result
+  local soak_output = os.getenv("ENVIREAMENT_SOAK")
+  if soak_output then
+    success, result = run_soak(script_path, {
+      frames = os.getenv("ENVIREAMENT_SOAK_FRAMES"), every = os.getenv("ENVIREAMENT_SOAK_EVERY"),
+      warmup = os.getenv("ENVIREAMENT_SOAK_WARMUP"), limit_kb = os.getenv("ENVIREAMENT_SOAK_LIMIT_KB"),
+      output = soak_output,
+    })
+    if success then result = nil end -- the soak summary is already printed
+  elseif os.getenv("ENVIREAMENT_SCENARIO") then
+    success, result = run_scenario(script_path, os.getenv("ENVIREAMENT_SCENARIO"), {
+      settle = os.getenv("ENVIREAMENT_SCENARIO_SETTLE"),
+      allow_missed = os.getenv("ENVIREAMENT_SCENARIO_ALLOW_MISSED") == "1",
+    })
+    if success then result = nil end -- so is the scenario report
+  else
+    success, result = pcall(dofile, script_path)
+  end
   
   if success then
     print("✅ Script executed successfully")
@@ -1383,6 +4390,22 @@ function EnhancedVirtualReaper.run_test_script(script_path)
     VirtualState.stats.errors = VirtualState.stats.errors + 1
   end
   
+  -- Script exit: atexit handlers, then the final ExtState flush
+  run_exit_handlers()
+  
+  if budget then
+    frame_timer.stop_frame_timing()
+    local report = frame_timer.frame_timing_report()
+    frame_timer.print_frame_timing(report)
+    -- Fails on the chosen percentile, so a rare GC spike alone does not
+    local limit = "p" .. (os.getenv("ENVIREAMENT_FRAME_PERCENTILE") or "99")
+    local within, message = frame_timer.check_frame_budget(report, {[limit] = report.budget})
+    if not within then
+      print("❌ " .. message)
+      success = false
+    end
+  end
+  
   -- Print statistics
   EnhancedVirtualReaper.print_statistics()
   
@@ -1393,38 +4416,154 @@ function EnhancedVirtualReaper.validate_ui_structure(script_path)
   print("🔍 Validating UI structure for: " .. script_path)
   print("----------------------------------------")
   
-  local original_begin = mock_reaper.ImGui_Begin
-  local original_end = mock_reaper.ImGui_End
-  local begin_count = 0
-  local end_count = 0
-  
-  -- Hook Begin/End calls
-  mock_reaper.ImGui_Begin = function(...)
-    begin_count = begin_count + 1
-    return original_begin(...)
-  end
-  
-  mock_reaper.ImGui_End = function(...)
-    end_count = end_count + 1
-    return original_end(...)
-  end
-  
-  -- Run script
+  -- The mock checks scope balance itself; count what this run adds
+  local before = #VirtualState.scope_violations
   local success, result = EnhancedVirtualReaper.run_test_script(script_path)
+  local found = #VirtualState.scope_violations - before
   
-  -- Restore original functions
-  mock_reaper.ImGui_Begin = original_begin
-  mock_reaper.ImGui_End = original_end
-  
-  -- Validate stack balance
-  if begin_count == end_count then
-    print("✅ UI stack is balanced: " .. begin_count .. " Begin/End pairs")
+  if found == 0 then
+    print("✅ UI stack is balanced")
   else
-    print("⚠️  UI stack imbalance: " .. begin_count .. " Begin calls, " .. end_count .. " End calls")
-    VirtualState.stats.warnings = VirtualState.stats.warnings + 1
+    print("⚠️  UI stack imbalance: " .. found .. " violation(s)")
+    for i = before + 1, #VirtualState.scope_violations do
+      print("   " .. VirtualState.scope_violations[i].message)
+    end
   end
   
-  return success and (begin_count == end_count)
+  return success and found == 0
+end
+
+-- Names of the API functions called so far in this process, sorted
+function EnhancedVirtualReaper.get_api_coverage()
+  local names = {}
+  for id, name in ipairs(instrumentation.api_names) do
+    if api_hits[id] then names[#names + 1] = name end
+  end
+  return names, #instrumentation.api_names
+end
+
+-- Write the exercised-API bitset to directory (default: $ENVIREAMENT_API_COVERAGE);
+-- returns the run file and catalog paths
+function EnhancedVirtualReaper.write_api_coverage(directory)
+  return write_api_coverage(directory)
+end
+
+-- Line coverage of scripts run from now on: mode "exact" or "sampled"
+-- (one sample per interval VM instructions)
+function EnhancedVirtualReaper.start_coverage(mode, interval)
+  instrumentation.start_coverage(mode, interval)
+end
+
+-- Stop recording; what was recorded is kept for write_coverage()
+function EnhancedVirtualReaper.stop_coverage()
+  instrumentation.stop_coverage()
+end
+
+-- Write recorded line coverage to directory (default: $ENVIREAMENT_COVERAGE)
+function EnhancedVirtualReaper.write_coverage(directory)
+  return write_coverage(directory)
+end
+
+-- Sample the Lua stack every interval VM instructions; detail keeps the
+-- mock's internal frames instead of collapsing them into the API called
+function EnhancedVirtualReaper.start_profile(interval, detail)
+  instrumentation.start_profile(interval, detail)
+end
+
+function EnhancedVirtualReaper.stop_profile()
+  instrumentation.stop_profile()
+end
+
+-- Write collapsed stacks to path (default: $ENVIREAMENT_PROFILE);
+-- returns the path and the number of samples
+function EnhancedVirtualReaper.write_profile(path)
+  return write_profile(path)
+end
+
+-- Append every frame's draw lists to path as they end (see DRAW LISTS)
+function EnhancedVirtualReaper.record_draw_lists(path)
+  return draw_lists.start(path)
+end
+
+-- Write the current frame's draw lists and close the file
+function EnhancedVirtualReaper.write_draw_lists()
+  return write_draw_lists()
+end
+
+-- Serve tree (subdirectories are tables, files strings or functions
+-- returning the content) at root to EnumerateFiles, EnumerateSubdirectories,
+-- file_exists and io.open (see VIRTUAL FILESYSTEM)
+function EnhancedVirtualReaper.mount_files(root, tree)
+  vfs.mount(root, tree)
+end
+
+-- Unmount root, or every tree when root is nil
+function EnhancedVirtualReaper.unmount_files(root)
+  vfs.unmount(root)
+end
+
+-- Items submitted and visible per frame, by window path, or for one path:
+-- {frames, submitted, visible, max_submitted, max_visible, listed,
+--  last_submitted, last_visible, last_listed}. listed counts the items of
+-- the lists a clipper covered; a clipped list submits O(visible) of them.
+function EnhancedVirtualReaper.item_counts(path)
+  if path then return VirtualState.item_counts[path] end
+  return VirtualState.item_counts
+end
+
+-- Time each frame (script, mock and GC time) against budget_ms (default 1000/60)
+function EnhancedVirtualReaper.start_frame_timing(budget_ms)
+  frame_timer.start_frame_timing(budget_ms)
+end
+
+function EnhancedVirtualReaper.stop_frame_timing()
+  frame_timer.stop_frame_timing()
+  return frame_timer.frame_timing_report()
+end
+
+-- Percentiles (p50/p95/p99/max/total, in ms) of frame, script, mock and gc
+-- time, and the frames that went over budget; nil before timing starts
+function EnhancedVirtualReaper.get_frame_timing()
+  return frame_timer.frame_timing_report()
+end
+
+function EnhancedVirtualReaper.print_frame_timing()
+  local report = frame_timer.frame_timing_report()
+  if report then frame_timer.print_frame_timing(report) end
+end
+
+-- Raises unless the frames so far stay within limits, e.g.
+-- assert_frame_budget({p95 = 16.6, max = 33, gc_p99 = 2, over_budget = 0})
+function EnhancedVirtualReaper.assert_frame_budget(limits)
+  local report = frame_timer.frame_timing_report()
+  local ok, message = frame_timer.check_frame_budget(report, limits or {p99 = report and report.budget or 0})
+  if not ok then error(message, 2) end
+  return report
+end
+
+-- Drive a deferred script for many frames and check that memory levels off.
+-- options: frames, every (sample interval), warmup, limit_kb, output (series file)
+function EnhancedVirtualReaper.soak(script_path, options)
+  return run_soak(script_path, options)
+end
+
+-- Replay a scenario (a table of steps or a scenario file) against a deferred
+-- script. options: settle (frames after the last step), allow_missed
+function EnhancedVirtualReaper.play_scenario(script_path, scenario, options)
+  return run_scenario(script_path, scenario, options)
+end
+
+-- Run many deferred scripts side by side in this VM, each in its own
+-- session (state, globals, modules and deferred queue). options: frames
+-- (per script, default 10000), timeout (CPU seconds per script), verbose.
+-- Returns one result per script.
+function EnhancedVirtualReaper.run_sessions(paths, options)
+  return run_sessions(paths, options)
+end
+
+-- Begin/End and Push/Pop imbalances found so far, oldest first
+function EnhancedVirtualReaper.get_scope_violations()
+  return VirtualState.scope_violations
 end
 
 function EnhancedVirtualReaper.print_statistics()
@@ -1437,44 +4576,184 @@ function EnhancedVirtualReaper.print_statistics()
   print("   Widgets drawn: " .. VirtualState.stats.widgets_drawn)
   print("   Errors: " .. VirtualState.stats.errors)
   print("   Warnings: " .. VirtualState.stats.warnings)
+  print("   ExtState: " .. VirtualState.stats.ext_state_sets .. " sets, " ..
+        VirtualState.stats.ext_state_flushes .. " file writes")
   print("   Memory: " .. collectgarbage("count") .. " KB")
   print("----------------------------------------")
 end
 
+function EnhancedVirtualReaper.get_statistics()
+  return VirtualState.stats
+end
+
+local function copy_plain(value)
+  if type(value) ~= "table" then return value end
+  local copy = {}
+  for k, v in pairs(value) do copy[k] = copy_plain(v) end
+  return copy
+end
+
+-- Snapshot part of the virtual state as plain data, for tools that drive
+-- the mock from outside (see envireament_host.lua). Handles are included
+-- as-is so callers can pass them back to the API.
+function EnhancedVirtualReaper.query_state(kind)
+  local project = current_project()
+  local tracks, items = project.tracks, project.items
+  if kind == "tracks" then
+    local rows, c = {}, tracks.columns
+    for row = 1, tracks.count do
+      local pending = c.items_pending[row]
+      rows[row] = {
+        handle = tracks.handles[row], index = row - 1, name = c.name[row],
+        volume = c.volume[row], pan = c.pan[row], mute = c.mute[row], solo = c.solo[row],
+        selected = c.selected[row], color = c.color[row], folder_depth = c.folder_depth[row],
+        item_count = pending and pending.count or (c.items[row] and #c.items[row] or 0)
+      }
+    end
+    return rows
+  elseif kind == "items" then
+    local rows, c = {}, items.columns
+    for track_row = 1, tracks.count do
+      local list = track_item_list(project, track_row)
+      for i = 1, list and #list or 0 do
+        local row = items.rows[list[i]]
+        local take = c.active_take[row]
+        rows[#rows + 1] = {
+          handle = list[i], track = track_row - 1, position = c.position[row],
+          length = c.length[row], mute = c.mute[row], selected = c.selected[row],
+          take_count = c.take_count[row],
+          take_name = take and project.takes.columns.name[project.takes.rows[take]] or ""
+        }
+      end
+    end
+    return rows
+  elseif kind == "markers" then
+    local rows = {}
+    for i, entry in ipairs(project_markers(project).list) do
+      rows[i] = {
+        index = i - 1, isrgn = entry.isrgn, pos = entry.pos, rgnend = entry.rgnend,
+        name = entry.name, number = entry.number, color = entry.color
+      }
+    end
+    return rows
+  elseif kind == "stats" then
+    return copy_plain(VirtualState.stats)
+  elseif kind == "ext_state" then
+    return copy_plain(VirtualState.ext_state)
+  elseif kind == nil or kind == "summary" then
+    local markers = project_markers(project)
+    return {
+      frame_count = VirtualState.frame_count,
+      track_count = tracks.count,
+      item_count = project_item_count(project),
+      marker_count = markers.num_markers,
+      region_count = markers.num_regions,
+      contexts = #VirtualState.contexts,
+      stats = copy_plain(VirtualState.stats)
+    }
+  end
+  return nil
+end
+
+-- ==================== EXTSTATE PERSISTENCE ====================
+
+-- Back persistent ExtState with an ini file (emulates reaper-extstate.ini).
+-- Like starting REAPER, in-memory ExtState is replaced by the file contents.
+function EnhancedVirtualReaper.set_ext_state_file(path)
+  VirtualState.ext_state_file = path
+  VirtualState.ext_state = {}
+  VirtualState.ext_state_persist = {}
+  VirtualState.ext_state_text = {}
+  VirtualState.ext_state_dirty = {}
+  local sections = path and parse_ini(path) or {}
+  for section, values in pairs(sections) do
+    VirtualState.ext_state_persist[section] = values
+    local section_data = {}
+    for key, value in pairs(values) do section_data[key] = value end
+    VirtualState.ext_state[section] = section_data
+  end
+end
+
+-- Save the current project's ext state to an ini file (loaded immediately)
+function EnhancedVirtualReaper.set_proj_ext_state_file(path)
+  VirtualState.proj_ext_state_file = path
+  VirtualState.proj_ext_state = path and parse_ini(path) or {}
+  VirtualState.proj_ext_state_dirty = false
+end
+
+-- Number of frames changes are batched for before being written out
+function EnhancedVirtualReaper.set_ext_state_flush_interval(frames)
+  VirtualState.ext_state_flush_frames = math.max(0, frames or 0)
+end
+
+-- Write all pending ExtState changes now; returns the number of file writes
+function EnhancedVirtualReaper.flush_ext_state()
+  return flush_ext_state()
+end
+
+-- Close the current frame (deferred callbacks do this automatically)
+function EnhancedVirtualReaper.end_frame()
+  end_frame()
+end
+
+-- Simulate script exit: atexit handlers and the final ExtState flush
+function EnhancedVirtualReaper.shutdown()
+  run_exit_handlers()
+end
+
+-- Replace the current project with one backed by a fixture file. Track
+-- headers load now; items and MIDI load when a script first touches them.
+function EnhancedVirtualReaper.load_fixture(path)
+  local project, err = load_fixture_project(path)
+  if not project then
+    log_error("Could not load fixture: " .. tostring(err))
+    return false, err
+  end
+  VirtualState.project = project
+  return true, project.tracks.count
+end
+
+-- Index of the first note starting at or after ppq in a MIDI take, or -1
+function EnhancedVirtualReaper.midi_find_note(take, ppq)
+  local midi = take_midi(take)
+  if not midi then return -1 end
+  sort_event_list(midi.notes)
+  local row = event_lower_bound(midi.notes, ppq)
+  if row > midi.notes.count then return -1 end
+  return row - 1
+end
+
 function EnhancedVirtualReaper.set_verbose_logging(enabled)
   VirtualState.verbose_logging = enabled
   print("🔊 Verbose logging " .. (enabled and "enabled" or "disabled"))
 end
 
 function EnhancedVirtualReaper.reset_statistics()
-  VirtualState.stats = {
-    windows_created = 0,
-    widgets_drawn = 0,
-    api_calls = 0,
-    errors = 0,
-    warnings = 0,
-    start_time = os.time()
-  }
+  VirtualState.stats = new_statistics()
   print("📊 Statistics reset")
 end
 
--- ==================== COMMAND LINE INTERFACE ====================
+-- The API as loaded, so functions a script replaces can be put back
+local pristine_api = {}
+for name, fn in pairs(mock_reaper) do pristine_api[name] = fn end
 
-if arg and arg[0] then
-  -- Running as standalone script
-  if arg[1] == "--test" and arg[2] then
-    EnhancedVirtualReaper.run_test_script(arg[2])
-  elseif arg[1] == "--validate" and arg[2] then
-    EnhancedVirtualReaper.validate_ui_structure(arg[2])
-  elseif arg[1] == "--help" then
-    print("Enhanced Virtual REAPER Environment")
-    print("Usage:")
-    print("  lua enhanced_virtual_reaper.lua --test <script.lua>      Run script in virtual environment")
-    print("  lua enhanced_virtual_reaper.lua --validate <script.lua> Validate UI structure")
-    print("  lua enhanced_virtual_reaper.lua --help                  Show this help")  else
-    -- Create environment for interactive use
-    EnhancedVirtualReaper.create_environment()
+-- Return to a freshly loaded state without reloading this file, so a
+-- long-lived worker can run the next script as if in a new process
+function EnhancedVirtualReaper.reset_state()
+  local verbose = VirtualState.verbose_logging
+  local fresh = new_virtual_state()
+  for key in pairs(VirtualState) do VirtualState[key] = nil end
+  for key, value in pairs(fresh) do VirtualState[key] = value end
+  VirtualState.verbose_logging = verbose
+  VirtualState.stats = new_statistics()
+  VirtualState.project = new_default_project()
+  for name in pairs(mock_reaper) do
+    if pristine_api[name] == nil then mock_reaper[name] = nil end
   end
+  for name, fn in pairs(pristine_api) do mock_reaper[name] = fn end
+  playback = nil
+  draw_lists.reset()
+  vfs.unmount()
 end
 
 -- Add init function to initialize the virtual environment
@@ -1516,4 +4795,58 @@ function EnhancedVirtualReaper.mock_imgui_funcs()
   return true
 end
 
+-- ==================== COMMAND LINE INTERFACE ====================
+-- Only the outermost load acts on the command line. Scripts run with --test
+-- often require or dofile this file again, which must not re-run them.
+
+if arg and arg[0] and not rawget(_G, "__envireament_cli") then
+  rawset(_G, "__envireament_cli", true)
+  -- A nested require gets this instance instead of a fresh copy
+  package.loaded["enhanced_virtual_reaper"] = package.loaded["enhanced_virtual_reaper"] or EnhancedVirtualReaper
+  -- Running as standalone script
+  if arg[1] == "--test" and arg[2] then
+    local success = EnhancedVirtualReaper.run_test_script(arg[2])
+    os.exit(success and 0 or 1)
+  elseif arg[1] == "--sessions" then
+    -- One VM for many scripts: a block of output per script, in order
+    local paths, frames, timeout = {}, nil, nil
+    local i = 2
+    while arg[i] do
+      if arg[i] == "--frames" then
+        frames, i = arg[i + 1], i + 2
+      elseif arg[i] == "--timeout" then
+        timeout, i = arg[i + 1], i + 2
+      else
+        paths[#paths + 1], i = arg[i], i + 1
+      end
+    end
+    local all_ok = true
+    for index, result in ipairs(run_sessions(paths, {frames = frames, timeout = timeout})) do
+      local status = result.timed_out and "timeout" or result.ok and "passed" or "failed"
+      print(string.format("envireament-session %d %s %.4f %s", index, status, result.seconds, result.path))
+      if result.output ~= "" then print(result.output) end
+      print("envireament-session-end " .. index)
+      all_ok = all_ok and result.ok
+    end
+    write_api_coverage()
+    write_coverage()
+    write_profile()
+    write_draw_lists()
+    os.exit(all_ok and 0 or 1)
+  elseif arg[1] == "--validate" and arg[2] then
+    EnhancedVirtualReaper.validate_ui_structure(arg[2])
+  elseif arg[1] == "--help" then
+    print("Enhanced Virtual REAPER Environment")
+    print("Usage:")
+    print("  lua enhanced_virtual_reaper.lua --test <script.lua>      Run script in virtual environment")
+    print("  lua enhanced_virtual_reaper.lua --sessions [--frames N] [--timeout S] <script.lua>...")
+    print("                                                          Run many scripts in one VM")
+    print("  lua enhanced_virtual_reaper.lua --validate <script.lua> Validate UI structure")
+    print("  lua enhanced_virtual_reaper.lua --help                  Show this help")
+  else
+    -- Create environment for interactive use
+    EnhancedVirtualReaper.create_environment()
+  end
+end
+
 return EnhancedVirtualReaper
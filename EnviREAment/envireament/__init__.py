@@ -55,8 +55,11 @@ class EnviREAment:
         if verbose:
             cmd.append("--verbose")
             
+        # PWD tells coverage files which directory script paths are relative to
+        env = dict(os.environ, PWD=str(self.package_dir))
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.package_dir)
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.package_dir,
+                                    env=env)
             print(result.stdout)
             if result.stderr:
                 print("STDERR:", result.stderr, file=sys.stderr)
@@ -82,6 +85,11 @@ class EnviREAment:
             print("Error: Lua interpreter not found. Please install Lua to use EnviREAment.")
             return False
             
+    def connect(self, lua="lua", verbose=False):
+        """Start a long-lived Lua host and return a JSON-RPC Session."""
+        from .session import Session
+        return Session(lua=lua, package_dir=self.package_dir, verbose=verbose)
+        
     def get_virtual_reaper_path(self):
         """Get the path to the virtual REAPER environment script."""
         return str(self.virtual_reaper_path)
@@ -107,6 +115,10 @@ def run_demo():
     """Run the EnviREAment demo application."""
     return _instance.run_demo()
 
+def connect(lua="lua", verbose=False):
+    """Start a long-lived Lua host and return a JSON-RPC Session."""
+    return _instance.connect(lua=lua, verbose=verbose)
+
 def get_virtual_reaper_path():
     """Get the path to the virtual REAPER environment script."""
     return _instance.get_virtual_reaper_path()
@@ -126,6 +138,14 @@ def get_version():
     return __version__
 
 
+# Project fixtures
+from .fixtures import FixtureWriter
+from .rpp import convert_rpp
+
+# Scripted sessions
+from .session import Handle, Session, SessionError
+
+
 # Main functionality access
 VirtualREAPER = _instance
 TestRunner = _instance
@@ -133,5 +153,7 @@ TestRunner = _instance
 __all__ = [
     'EnviREAment', 'VirtualREAPER', 'TestRunner',
     'run_tests', 'run_demo', 'get_virtual_reaper_path', 
-    'get_examples_dir', 'get_docs_dir', 'get_version'
+    'get_examples_dir', 'get_docs_dir', 'get_version',
+    'FixtureWriter', 'convert_rpp',
+    'connect', 'Session', 'SessionError', 'Handle'
 ]
@@ -0,0 +1,164 @@
+"""
+Which mock API functions the test suites actually call.
+
+When ``ENVIREAMENT_API_COVERAGE`` names a directory, every Lua process
+writes one ``run-*.apicov`` file there at exit. The file holds a bitset
+with one bit per API function, plus a ``<digest>.apis`` catalog that maps
+bit positions to names. Sharded or parallel runs each write their own run
+files, and merging them is a bitwise OR. Catalogs are resolved per file,
+so runs made against different versions of the mock still merge by name.
+
+The report groups the mock's current functions by the ``-- ====`` section
+they are defined in. Functions no run has ever called show up as candidates
+for removal.
+"""
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from .cache import DEFAULT_CACHE_DIR
+from .impact import MOCK_SCRIPT, outline
+
+ENV_VAR = "ENVIREAMENT_API_COVERAGE"
+DEFAULT_API_COVERAGE_DIR = DEFAULT_CACHE_DIR.parent / "api-coverage"
+
+_SECTION_RE = re.compile(r"^\s*--\s*=+\s*(.+?)\s*=+\s*$")
+
+
+class CoverageError(ValueError):
+    """A run or catalog file that cannot be read."""
+
+
+def read_run(path):
+    """(catalog digest, API count, bitset bytes) of one run file."""
+    lines = Path(path).read_text(encoding="utf-8").split("\n")
+    if not lines or not lines[0].startswith("envireament-api-coverage "):
+        raise CoverageError(f"{path}: not an API coverage file")
+    fields = dict(line.split(" ", 1) for line in lines[1:] if " " in line)
+    try:
+        digest, count = fields["catalog"].split()
+        bits = bytes.fromhex(fields["bits"].strip())
+    except (KeyError, ValueError):
+        raise CoverageError(f"{path}: malformed API coverage file")
+    if len(bits) * 8 < int(count):
+        raise CoverageError(f"{path}: bitset shorter than its catalog")
+    return digest, int(count), bits
+
+
+def merge_runs(directories):
+    """OR every run's bitset together, by name.
+
+    Returns (exercised names, number of runs merged).
+    """
+    catalogs = {}
+    merged = {}  # digest -> (count, OR of bitsets as an int)
+    runs = 0
+    for directory in directories:
+        directory = Path(directory)
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.glob("run-*.apicov")):
+            digest, count, bits = read_run(path)
+            if digest not in catalogs:
+                catalog = directory / f"{digest}.apis"
+                if not catalog.is_file():
+                    raise CoverageError(f"{path}: catalog {catalog.name} is missing")
+                catalogs[digest] = catalog.read_text(encoding="utf-8").split()
+            if len(catalogs[digest]) != count:
+                raise CoverageError(f"{path}: catalog {digest} lists "
+                                    f"{len(catalogs[digest])} functions, not {count}")
+            previous = merged.get(digest, (count, 0))[1]
+            merged[digest] = (count, previous | int.from_bytes(bits, "little"))
+            runs += 1
+    names = set()
+    for digest, (count, value) in merged.items():
+        catalog = catalogs[digest]
+        names.update(catalog[i] for i in range(count) if value >> i & 1)
+    return names, runs
+
+
+def api_categories(package_dir):
+    """{section title: [API names]} in the order the mock defines them."""
+    source = (Path(package_dir) / MOCK_SCRIPT).read_text(encoding="utf-8", errors="replace")
+    sections = []  # (line, title)
+    for number, line in enumerate(source.splitlines(), 1):
+        match = _SECTION_RE.match(line)
+        if match and line.startswith("  "):  # headers inside the mock_reaper table
+            sections.append((number, match.group(1)))
+    categories = {}
+    index = -1
+    for definition in outline(source):
+        if not definition.entry:
+            continue
+        while index + 1 < len(sections) and sections[index + 1][0] < definition.first:
+            index += 1
+        title = sections[index][1] if index >= 0 else "Other"
+        categories.setdefault(title, []).append(definition.name)
+    return categories
+
+
+def coverage_report(directories, package_dir):
+    """Exercised and never-exercised mock functions per category."""
+    exercised, runs = merge_runs(directories)
+    categories = {}
+    total = hit = 0
+    for title, names in api_categories(package_dir).items():
+        used = [name for name in names if name in exercised]
+        categories[title] = {
+            "exercised": used,
+            "unused": [name for name in names if name not in exercised],
+        }
+        total += len(names)
+        hit += len(used)
+    return {"runs": runs, "total": total, "exercised": hit, "categories": categories}
+
+
+def print_report(report, stream=None, show_unused=True):
+    stream = stream or sys.stdout
+    if not report["runs"]:
+        print(f"No API coverage runs found (set {ENV_VAR} or use envireament test "
+              f"--api-coverage)", file=stream)
+        return
+    width = max(len(title) for title in report["categories"])
+    for title, entry in report["categories"].items():
+        used, total = len(entry["exercised"]), len(entry["exercised"]) + len(entry["unused"])
+        print(f"{title:<{width}}  {used:4}/{total:<4} {100.0 * used / total:5.1f}%", file=stream)
+    percent = 100.0 * report["exercised"] / report["total"] if report["total"] else 0.0
+    print(f"{report['exercised']}/{report['total']} mock functions exercised ({percent:.1f}%) "
+          f"across {report['runs']} run(s)", file=stream)
+    if show_unused:
+        for title, entry in report["categories"].items():
+            if entry["unused"]:
+                print(f"\nNever exercised in {title}:", file=stream)
+                for name in entry["unused"]:
+                    print(f"    {name}", file=stream)
+
+
+def api_coverage_paths(directories, package_dir, as_json=False, show_unused=True, stream=None):
+    """Merge the run files in directories and print the report.
+
+    Returns False when the files cannot be read or no run was found.
+    """
+    stream = stream or sys.stdout
+    try:
+        report = coverage_report(directories or [DEFAULT_API_COVERAGE_DIR], package_dir)
+    except (CoverageError, OSError) as exc:
+        print(f"Cannot read API coverage: {exc}", file=stream)
+        return False
+    if as_json:
+        json.dump(report, stream, indent=2)
+        print(file=stream)
+    else:
+        print_report(report, stream, show_unused)
+    return report["runs"] > 0
+
+
+def enable(directory):
+    """Make Lua processes started from now on record into directory."""
+    directory = Path(directory).resolve()
+    directory.mkdir(parents=True, exist_ok=True)
+    os.environ[ENV_VAR] = str(directory)
+    return directory
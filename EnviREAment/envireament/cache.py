@@ -0,0 +1,60 @@
+"""
+Local cache of Lua test results.
+
+A result is stored under a key made from the test's dependency closure
+hash (see deps.py) and the hash of the harness: the mock, the modules it
+requires and the runner (runner.harness_hash). When neither changes,
+the cached result is replayed instead of running the test again. Only
+passed and failed results are cached (the runner decides); timeouts and
+launch errors always run again.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = Path(".envireament") / "cache"
+
+
+class ResultCache:
+    """One small JSON file per cached result, named by its key."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else DEFAULT_CACHE_DIR
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, test_path, closure_hash, mock_hash, timeout):
+        parts = [str(CACHE_VERSION), str(Path(test_path).resolve()), closure_hash, mock_hash,
+                 str(timeout)]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / (key + ".json")
+
+    def get(self, key):
+        """The stored result fields for key, or None."""
+        try:
+            with open(str(self._path(key)), "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, result):
+        """Store a TestResult's status, duration, output and exit code."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(str(tmp), "w", encoding="utf-8") as handle:
+            json.dump({
+                "status": result.status,
+                "duration": result.duration,
+                "output": result.output,
+                "returncode": result.returncode,
+            }, handle)
+        os.replace(str(tmp), str(path))
@@ -6,7 +6,20 @@ Provides CLI commands for running tests, demos, and accessing EnviREAment functi
 
 import argparse
 import sys
-from . import run_tests, run_demo, get_version, get_examples_dir, get_docs_dir
+from . import PACKAGE_DIR, run_tests, run_demo, get_version, get_examples_dir, get_docs_dir
+from .apicov import DEFAULT_API_COVERAGE_DIR, api_coverage_paths, enable as enable_api_coverage
+from .coverage import DEFAULT_COVERAGE_DIR, MODES, coverage_paths, enable as enable_coverage
+from .dataset import (DEFAULT_BANDS, DEFAULT_NUM_PERM, DEFAULT_ROOTS, DEFAULT_SHINGLE,
+                      DEFAULT_THRESHOLD, DEDUPE_MAP_NAME, dedupe_datasets)
+from .drawlist import drawlist_paths, record_draw_lists
+from .runner import DEFAULT_FRAME_BUDGET, DEFAULT_TIMEOUT, run_test_paths
+from .generate import generate_fixture
+from .lint import lint_paths
+from .profile import DEFAULT_INTERVAL as DEFAULT_PROFILE_INTERVAL, profile_cpu
+from .rpp import convert_rpp
+from .scenario import DEFAULT_SETTLE, play_scenario
+from .soak import DEFAULT_EVERY, DEFAULT_FRAMES, DEFAULT_LIMIT_KB, soak_paths, soak_script
+from .watch import DEFAULT_INTERVAL, watch
 
 
 def run_tests_cli():
@@ -37,9 +50,167 @@ def main():
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
     
     # Test command
-    test_parser = subparsers.add_parser("test", help="Run test suite")
+    test_parser = subparsers.add_parser(
+        "test", help="Run the test suite, or Lua test files found under the given paths")
+    test_parser.add_argument("paths", nargs="*",
+                           help="Test files or directories (test_*.lua, *_test.lua)")
     test_parser.add_argument("--verbose", "-v", action="store_true", 
                            help="Enable verbose output")
+    test_parser.add_argument("--jobs", "-j", type=int, default=None,
+                           help="Parallel workers (default: CPU count)")
+    test_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                           help=f"Per-file timeout in seconds (default: {DEFAULT_TIMEOUT})")
+    test_parser.add_argument("--sessions", type=int, metavar="N",
+                           help="Run up to N files from a directory in one Lua process")
+    test_parser.add_argument("--junit", metavar="PATH",
+                           help="Write a JUnit XML report")
+    test_parser.add_argument("--no-cache", action="store_true",
+                           help="Run every test even if its dependencies are unchanged")
+    test_parser.add_argument("--cache-dir", metavar="DIR",
+                           help="Result cache location (default: .envireament/cache)")
+    test_parser.add_argument("--affected", action="store_true",
+                           help="Only run tests the current changes can affect")
+    test_parser.add_argument("--base", default="HEAD",
+                           help="Git revision to diff against with --affected (default: HEAD)")
+    test_parser.add_argument("--changed", nargs="+", metavar="FILE",
+                           help="Changed files for --affected, instead of asking git")
+    test_parser.add_argument("--api-coverage", nargs="?", const=str(DEFAULT_API_COVERAGE_DIR),
+                           metavar="DIR",
+                           help="Record which mock functions each run calls "
+                                f"(default DIR: {DEFAULT_API_COVERAGE_DIR})")
+    test_parser.add_argument("--coverage", nargs="?", const=str(DEFAULT_COVERAGE_DIR),
+                           metavar="DIR",
+                           help=f"Record line coverage (default DIR: {DEFAULT_COVERAGE_DIR})")
+    test_parser.add_argument("--coverage-mode", choices=MODES, default="sampled",
+                           help="exact hooks every line; sampled (default) is cheaper")
+    test_parser.add_argument("--coverage-interval", type=int, metavar="N",
+                           help="VM instructions between samples (default: 1000)")
+    test_parser.add_argument("--frame-budget", nargs="?", type=float,
+                           const=round(DEFAULT_FRAME_BUDGET, 1), metavar="MS",
+                           help="Time every frame and fail tests over budget "
+                                f"(default MS: {DEFAULT_FRAME_BUDGET:.1f})")
+    test_parser.add_argument("--frame-percentile", type=int, default=99, choices=(50, 95, 99),
+                           help="Frame cost percentile held to the budget (default: 99)")
+    
+    # Watch command
+    watch_parser = subparsers.add_parser(
+        "watch", help="Re-run affected Lua tests whenever files are saved")
+    watch_parser.add_argument("paths", nargs="*", default=["."],
+                              help="Directories or files to watch (default: .)")
+    watch_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                              help=f"Seconds between scans (default: {DEFAULT_INTERVAL})")
+    watch_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                              help=f"Per-file timeout in seconds (default: {DEFAULT_TIMEOUT})")
+    watch_parser.add_argument("--run-first", action="store_true",
+                              help="Run every test once before waiting for changes")
+    watch_parser.add_argument("--verbose", "-v", action="store_true",
+                              help="Show output and the reason each test was picked")
+    
+    # Lint command
+    lint_parser = subparsers.add_parser(
+        "lint", help="Check REAPER scripts for Push/Pop balance, missing and deprecated APIs")
+    lint_parser.add_argument("paths", nargs="*", default=["."],
+                             help="Lua files or directories (default: .)")
+    lint_parser.add_argument("--jobs", "-j", type=int, default=None,
+                             help="Parallel workers (default: CPU count)")
+    lint_parser.add_argument("--json", action="store_true",
+                             help="Print findings as JSON")
+    lint_parser.add_argument("--no-cache", action="store_true",
+                             help="Lint every file even if it is unchanged")
+    
+    # API coverage command
+    apicov_parser = subparsers.add_parser(
+        "api-coverage", help="Merge recorded API coverage and list unexercised mock functions")
+    apicov_parser.add_argument("dirs", nargs="*",
+                               help="Coverage directories from one or more shards "
+                                    f"(default: {DEFAULT_API_COVERAGE_DIR})")
+    apicov_parser.add_argument("--json", action="store_true",
+                               help="Print the merged report as JSON")
+    apicov_parser.add_argument("--summary", action="store_true",
+                               help="Only print per-category totals")
+    
+    # Coverage command
+    coverage_parser = subparsers.add_parser(
+        "coverage", help="Merge recorded line coverage and write lcov/Cobertura reports")
+    coverage_parser.add_argument("dirs", nargs="*",
+                                 help="Coverage directories from one or more workers "
+                                      f"(default: {DEFAULT_COVERAGE_DIR})")
+    coverage_parser.add_argument("--lcov", metavar="PATH", help="Write an lcov tracefile")
+    coverage_parser.add_argument("--cobertura", metavar="PATH",
+                                 help="Write a Cobertura XML report")
+    
+    # Profile command
+    profile_parser = subparsers.add_parser(
+        "profile", help="Profile a script and write collapsed stacks for flamegraphs")
+    profile_parser.add_argument("script", help="Lua script to run in the virtual environment")
+    profile_parser.add_argument("--cpu", action="store_true",
+                                help="Sample the Lua call stack (CPU time)")
+    profile_parser.add_argument("--interval", type=int, default=DEFAULT_PROFILE_INTERVAL,
+                                metavar="N",
+                                help=f"VM instructions between samples "
+                                     f"(default: {DEFAULT_PROFILE_INTERVAL})")
+    profile_parser.add_argument("--output", "-o",
+                                help="Collapsed stack file (default: script path with .folded)")
+    profile_parser.add_argument("--mock-detail", action="store_true",
+                                help="Keep the mock's internal frames")
+    profile_parser.add_argument("--script-only", action="store_true",
+                                help="Drop mock frames; their time counts as the caller's")
+    profile_parser.add_argument("--top", type=int, default=10,
+                                help="Hottest frames to list (default: 10)")
+    profile_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                                help=f"Seconds before the script is stopped "
+                                     f"(default: {DEFAULT_TIMEOUT})")
+    
+    # Soak command
+    soak_parser = subparsers.add_parser(
+        "soak", help="Run a deferred script for many frames and fail if memory keeps growing")
+    soak_parser.add_argument("target",
+                             help="Lua script to soak, or a series file to summarize again")
+    soak_parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES,
+                             help=f"Frames to run (default: {DEFAULT_FRAMES})")
+    soak_parser.add_argument("--every", type=int, default=DEFAULT_EVERY, metavar="K",
+                             help=f"Sample memory every K frames (default: {DEFAULT_EVERY})")
+    soak_parser.add_argument("--warmup", type=int, metavar="FRAMES",
+                             help="Frames left out of the trend (default: a tenth of --frames)")
+    soak_parser.add_argument("--limit-kb", type=float, default=DEFAULT_LIMIT_KB,
+                             help=f"Fitted growth that fails the run (default: {DEFAULT_LIMIT_KB})")
+    soak_parser.add_argument("--output", "-o",
+                             help="Series file (default: script path with .soak)")
+    soak_parser.add_argument("--plot", metavar="SVG", help="Draw the series as an SVG chart")
+    soak_parser.add_argument("--top", type=int, default=10,
+                             help="Tables and API calls to list (default: 10)")
+    soak_parser.add_argument("--timeout", type=float,
+                             help="Seconds before the script is stopped (default: no limit)")
+    
+    # Scenario command
+    scenario_parser = subparsers.add_parser(
+        "scenario", help="Replay clicks, typed values and key presses against a deferred script")
+    scenario_parser.add_argument("script", help="Lua script to drive")
+    scenario_parser.add_argument("scenario", help="Scenario file (.lua or .json)")
+    scenario_parser.add_argument("--settle", type=int, default=DEFAULT_SETTLE, metavar="FRAMES",
+                                 help=f"Frames to run after the last step "
+                                      f"(default: {DEFAULT_SETTLE})")
+    scenario_parser.add_argument("--allow-missed", action="store_true",
+                                 help="Pass even when an event matched no widget")
+    scenario_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                                 help=f"Seconds before the script is stopped "
+                                      f"(default: {DEFAULT_TIMEOUT})")
+    
+    # Draw-list command
+    drawlist_parser = subparsers.add_parser(
+        "drawlist", help="Record what a script draws with ImGui_DrawList_* and summarize it")
+    drawlist_parser.add_argument("target",
+                                 help="Lua script to record, or a recording to summarize again")
+    drawlist_parser.add_argument("--output", "-o",
+                                 help="Recording file (default: script path with .evdl)")
+    drawlist_parser.add_argument("--png", metavar="PATH", help="Rasterize one frame to a PNG")
+    drawlist_parser.add_argument("--frame", type=int, metavar="N",
+                                 help="Frame to rasterize (default: the last one drawn)")
+    drawlist_parser.add_argument("--size", metavar="WxH",
+                                 help="Canvas size (default: large enough for every shape)")
+    drawlist_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                                 help=f"Seconds before the script is stopped "
+                                      f"(default: {DEFAULT_TIMEOUT})")
     
     # Demo command
     demo_parser = subparsers.add_parser("demo", help="Run demo application")
@@ -47,10 +218,136 @@ def main():
     # Info command
     info_parser = subparsers.add_parser("info", help="Show package information")
     
+    # Fixtures command
+    fixtures_parser = subparsers.add_parser("fixtures", help="Create project fixtures")
+    fixtures_commands = fixtures_parser.add_subparsers(dest="fixtures_command")
+    convert_parser = fixtures_commands.add_parser(
+        "convert", help="Convert an .RPP project into a lazily loaded fixture")
+    convert_parser.add_argument("project", help="Path to the .RPP file")
+    convert_parser.add_argument("--output", "-o",
+                                help="Fixture path (default: project path with .envfx)")
+    generate_parser = fixtures_commands.add_parser(
+        "generate", help="Synthesize a large project fixture from a seed")
+    generate_parser.add_argument("output", help="Fixture path (.envfx)")
+    generate_parser.add_argument("--seed", type=int, default=0,
+                                 help="Same seed and settings, same fixture (default: 0)")
+    generate_parser.add_argument("--tracks", type=int, default=1000,
+                                 help="Number of tracks (default: 1000)")
+    generate_parser.add_argument("--items", type=int, default=20,
+                                 help="Average items per non-folder track (default: 20)")
+    generate_parser.add_argument("--takes", type=int, default=2,
+                                 help="Most takes per item (default: 2)")
+    generate_parser.add_argument("--fx", type=int, default=2,
+                                 help="Average FX per track (default: 2)")
+    generate_parser.add_argument("--markers", type=int, default=100,
+                                 help="Number of markers (default: 100)")
+    generate_parser.add_argument("--regions", type=int, default=16,
+                                 help="Number of regions (default: 16)")
+    generate_parser.add_argument("--folder-depth", type=int, default=4,
+                                 help="Deepest folder nesting (default: 4)")
+    generate_parser.add_argument("--midi-ratio", type=float, default=0.25,
+                                 help="Share of tracks holding MIDI (default: 0.25)")
+    generate_parser.add_argument("--notes-per-second", type=float, default=8.0,
+                                 help="MIDI note density per take (default: 8)")
+    generate_parser.add_argument("--length", type=float, default=600.0,
+                                 help="Project length in seconds (default: 600)")
+    generate_parser.add_argument("--tempo", type=float, default=120.0,
+                                 help="Project tempo (default: 120)")
+    
+    # Dataset command
+    dataset_parser = subparsers.add_parser("dataset", help="Maintain the song datasets")
+    dataset_commands = dataset_parser.add_subparsers(dest="dataset_command")
+    dedupe_parser = dataset_commands.add_parser(
+        "dedupe", help="Find exact and near-duplicate songs and write the browser's dedupe map")
+    dedupe_parser.add_argument("songbase", help="Songbase folder holding the dataset roots")
+    dedupe_parser.add_argument("--roots", nargs="+", default=list(DEFAULT_ROOTS), metavar="DIR",
+                               help="Folders to scan, earliest preferred "
+                                    f"(default: {' '.join(DEFAULT_ROOTS)})")
+    dedupe_parser.add_argument("--output", "-o",
+                               help=f"Dedupe map path (default: songbase/{DEDUPE_MAP_NAME})")
+    dedupe_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                               help="Estimated chord-progression similarity that counts as a "
+                                    f"near duplicate (default: {DEFAULT_THRESHOLD})")
+    dedupe_parser.add_argument("--shingle", type=int, default=DEFAULT_SHINGLE,
+                               help=f"Chords per shingle (default: {DEFAULT_SHINGLE})")
+    dedupe_parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM,
+                               help=f"MinHash slots per song (default: {DEFAULT_NUM_PERM})")
+    dedupe_parser.add_argument("--bands", type=int, default=DEFAULT_BANDS,
+                               help=f"LSH bands; must divide --num-perm "
+                                    f"(default: {DEFAULT_BANDS})")
+    dedupe_parser.add_argument("--jobs", "-j", type=int, default=None,
+                               help="Parallel workers (default: CPU count)")
+    dedupe_parser.add_argument("--json", action="store_true",
+                               help="Print the dedupe map as JSON")
+    
     args = parser.parse_args()
     
     if args.command == "test":
-        success = run_tests(verbose=args.verbose)
+        if args.paths or args.affected:
+            success = run_test_paths(args.paths or ["."], PACKAGE_DIR, jobs=args.jobs,
+                                     timeout=args.timeout, junit=args.junit,
+                                     verbose=args.verbose, use_cache=not args.no_cache,
+                                     cache_dir=args.cache_dir, affected=args.affected,
+                                     changed=args.changed, base=args.base,
+                                     api_coverage=args.api_coverage,
+                                     line_coverage=args.coverage,
+                                     coverage_mode=args.coverage_mode,
+                                     coverage_interval=args.coverage_interval,
+                                     frame_budget=args.frame_budget,
+                                     frame_percentile=args.frame_percentile,
+                                     sessions=args.sessions)
+        else:
+            if args.api_coverage:
+                enable_api_coverage(args.api_coverage)
+            if args.coverage:
+                enable_coverage(args.coverage, args.coverage_mode, args.coverage_interval)
+            success = run_tests(verbose=args.verbose)
+        sys.exit(0 if success else 1)
+    elif args.command == "watch":
+        watch(args.paths, PACKAGE_DIR, interval=args.interval, timeout=args.timeout,
+              verbose=args.verbose, run_first=args.run_first)
+    elif args.command == "lint":
+        success = lint_paths(args.paths, PACKAGE_DIR, jobs=args.jobs,
+                             use_cache=not args.no_cache, as_json=args.json)
+        sys.exit(0 if success else 1)
+    elif args.command == "api-coverage":
+        success = api_coverage_paths(args.dirs, PACKAGE_DIR, as_json=args.json,
+                                     show_unused=not args.summary)
+        sys.exit(0 if success else 1)
+    elif args.command == "coverage":
+        success = coverage_paths(args.dirs, lcov=args.lcov, cobertura=args.cobertura)
+        sys.exit(0 if success else 1)
+    elif args.command == "profile":
+        if not args.cpu:
+            profile_parser.error("choose what to profile: --cpu")
+        success = profile_cpu(args.script, PACKAGE_DIR, output=args.output,
+                              interval=args.interval, detail=args.mock_detail,
+                              script_only=args.script_only, timeout=args.timeout, top=args.top)
+        sys.exit(0 if success else 1)
+    elif args.command == "soak":
+        if args.target.endswith(".lua"):
+            success = soak_script(args.target, PACKAGE_DIR, frames=args.frames, every=args.every,
+                                  warmup=args.warmup, limit_kb=args.limit_kb, output=args.output,
+                                  timeout=args.timeout, top=args.top, plot=args.plot)
+        else:
+            success = soak_paths(args.target, top=args.top, plot=args.plot)
+        sys.exit(0 if success else 1)
+    elif args.command == "scenario":
+        success = play_scenario(args.script, args.scenario, PACKAGE_DIR, settle=args.settle,
+                                allow_missed=args.allow_missed, timeout=args.timeout)
+        sys.exit(0 if success else 1)
+    elif args.command == "drawlist":
+        size = None
+        if args.size:
+            width, _, height = args.size.lower().partition("x")
+            if not (width.isdigit() and height.isdigit()):
+                drawlist_parser.error("--size takes WIDTHxHEIGHT, e.g. 800x600")
+            size = (int(width), int(height))
+        if args.target.endswith(".lua"):
+            success = record_draw_lists(args.target, PACKAGE_DIR, output=args.output, png=args.png,
+                                        frame=args.frame, size=size, timeout=args.timeout)
+        else:
+            success = drawlist_paths(args.target, png=args.png, frame=args.frame, size=size)
         sys.exit(0 if success else 1)
     elif args.command == "demo":
         success = run_demo()
@@ -59,6 +356,40 @@ def main():
         print(f"EnviREAment v{get_version()}")
         print(f"Examples directory: {get_examples_dir()}")
         print(f"Documentation directory: {get_docs_dir()}")
+    elif args.command == "fixtures":
+        if args.fixtures_command == "convert":
+            summary = convert_rpp(args.project, args.output)
+            print(f"Wrote {summary['fixture']}: {summary['tracks']} tracks, "
+                  f"{summary['items']} items, {summary['markers']} markers, "
+                  f"{summary['midi_events']} MIDI events")
+        elif args.fixtures_command == "generate":
+            summary = generate_fixture(
+                args.output, seed=args.seed, tracks=args.tracks, items=args.items,
+                takes=args.takes, fx=args.fx, markers=args.markers, regions=args.regions,
+                folder_depth=args.folder_depth, midi_ratio=args.midi_ratio,
+                notes_per_second=args.notes_per_second, length=args.length, tempo=args.tempo,
+                progress=lambda done: print(f"\r{done}/{args.tracks} tracks", end="",
+                                            file=sys.stderr, flush=True))
+            print(f"\rWrote {summary['fixture']}: {summary['tracks']} tracks "
+                  f"({summary['folders']} folders, {summary['deepest']} deep), "
+                  f"{summary['items']} items, {summary['takes']} takes, {summary['fx']} FX, "
+                  f"{summary['markers']} markers, {summary['midi_events']} MIDI events, "
+                  f"{summary['bytes'] / 1e6:.1f} MB in {summary['seconds']:.1f}s")
+        else:
+            fixtures_parser.print_help()
+    elif args.command == "dataset":
+        if args.dataset_command == "dedupe":
+            if args.num_perm < 1 or args.bands < 1 or args.num_perm % args.bands:
+                dedupe_parser.error("--bands must divide --num-perm")
+            if args.shingle < 1:
+                dedupe_parser.error("--shingle must be at least 1")
+            success = dedupe_datasets(args.songbase, args.roots, output=args.output,
+                                      threshold=args.threshold, shingle=args.shingle,
+                                      num_perm=args.num_perm, bands=args.bands, jobs=args.jobs,
+                                      as_json=args.json)
+            sys.exit(0 if success else 1)
+        else:
+            dataset_parser.print_help()
     else:
         parser.print_help()
 
@@ -0,0 +1,286 @@
+"""
+Line coverage for scripts run under the virtual environment.
+
+When ``ENVIREAMENT_COVERAGE`` names a directory, the mock hooks the Lua VM
+and each process writes one ``cov-*.txt`` file there when it exits. Two
+modes are available (``ENVIREAMENT_COVERAGE_MODE``):
+
+``sampled`` (default)
+    A count hook records the running line every
+    ``ENVIREAMENT_COVERAGE_INTERVAL`` VM instructions (default 1000). The
+    overhead goes down as the interval goes up. Hit counts are sample
+    counts, and a line that runs only briefly can be missed.
+``exact``
+    A line hook counts every executed line. Use it for small files.
+
+Executable lines come from the VM (``activelines``) for every function
+that ran. Functions that never ran are estimated from the source, so they
+show up as uncovered rather than disappearing. The merged result can be
+written as lcov and Cobertura XML.
+"""
+
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from . import lualex
+from .cache import DEFAULT_CACHE_DIR
+
+ENV_VAR = "ENVIREAMENT_COVERAGE"
+MODE_VAR = "ENVIREAMENT_COVERAGE_MODE"
+INTERVAL_VAR = "ENVIREAMENT_COVERAGE_INTERVAL"
+DEFAULT_COVERAGE_DIR = DEFAULT_CACHE_DIR.parent / "coverage"
+MODES = ("sampled", "exact")
+
+# A line whose first token is one of these carries no instruction of its own
+_NOT_STATEMENTS = frozenset(("end", "else", "until", ")", "}", "]", ","))
+
+
+class CoverageError(ValueError):
+    """A coverage file that cannot be read."""
+
+
+class FileCoverage:
+    """Executable lines of one file and how often each was hit."""
+
+    __slots__ = ("lines", "hits")
+
+    def __init__(self):
+        self.lines = set()
+        self.hits = {}
+
+    def add(self, lines, hits):
+        self.lines.update(lines)
+        for line, count in hits.items():
+            self.hits[line] = self.hits.get(line, 0) + count
+
+    @property
+    def covered(self):
+        return sum(1 for line in self.lines if self.hits.get(line))
+
+
+def read_run(path):
+    """(mode, {absolute path: (lines, hits)}) of one coverage file."""
+    files = {}
+    mode = root = current = None
+    with open(str(path), encoding="utf-8") as handle:
+        if not handle.readline().startswith("envireament-coverage "):
+            raise CoverageError(f"{path}: not a coverage file")
+        for line in handle:
+            key, _, value = line.rstrip("\n").partition(" ")
+            try:
+                if key == "mode":
+                    mode = value.split()[0]
+                elif key == "root":
+                    root = value
+                elif key == "file":
+                    current = (Path(root or path.parent) / value).resolve()
+                    files[current] = (set(), {})
+                elif key == "lines" and current is not None:
+                    files[current][0].update(int(n) for n in value.split(",") if n)
+                elif key == "hits" and current is not None:
+                    for pair in value.split(","):
+                        if pair:
+                            line_number, count = pair.split(":")
+                            files[current][1][int(line_number)] = int(count)
+            except ValueError:
+                raise CoverageError(f"{path}: malformed {key} line")
+    return mode, files
+
+
+def merge_runs(directories):
+    """Sum every coverage file in directories.
+
+    Returns ({path: FileCoverage}, modes seen, number of runs merged).
+    """
+    merged = {}
+    modes = set()
+    runs = 0
+    for directory in directories:
+        directory = Path(directory)
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.glob("cov-*.txt")):
+            mode, files = read_run(path)
+            modes.add(mode)
+            runs += 1
+            for source, (lines, hits) in files.items():
+                merged.setdefault(source, FileCoverage()).add(lines, hits)
+    return merged, modes, runs
+
+
+def unexecuted_lines(source, known):
+    """Statement lines of functions with no line in known.
+
+    The VM only reports executable lines for functions that ran; for the
+    rest, every line starting a statement is taken to be executable.
+    """
+    tokens = lualex.tokenize(source)
+    spans = []
+    opens = []  # (is function, first line)
+    for i, token in enumerate(tokens):
+        if token.kind != lualex.KEYWORD:
+            continue
+        value = token.value
+        if value == "function":
+            opens.append((True, token.line))
+        elif value in ("do", "then", "repeat"):
+            # `while .. do` / `for .. do` / `if .. then` open one block;
+            # elseif .. then continues the block `if` opened
+            if value == "then" and _opened_by_elseif(tokens, i):
+                continue
+            opens.append((False, token.line))
+        elif value in ("end", "until") and opens:
+            is_function, first = opens.pop()
+            if is_function:
+                spans.append((first, token.line))
+    starts = {}
+    previous = None
+    for token in tokens:
+        if previous is None or token.line > previous.line:
+            starts[token.line] = token.value
+        previous = token
+    lines = set()
+    for first, last in spans:
+        if any(first < line < last for line in known):
+            continue
+        lines.update(line for line in range(first + 1, last)
+                     if line in starts and starts[line] not in _NOT_STATEMENTS)
+    return lines - known
+
+
+def _opened_by_elseif(tokens, i):
+    """True when the `then` at i closes an elseif condition."""
+    for j in range(i - 1, -1, -1):
+        value = tokens[j].value
+        if tokens[j].kind == lualex.KEYWORD and value in ("if", "elseif"):
+            return value == "elseif"
+    return False
+
+
+def complete(merged):
+    """Add the lines of functions that never ran to each file."""
+    for path, cov in merged.items():
+        try:
+            source = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        cov.lines.update(unexecuted_lines(source, cov.lines))
+    return merged
+
+
+def _display_path(path, root):
+    try:
+        return os.path.relpath(str(path), str(root))
+    except ValueError:
+        return str(path)
+
+
+def write_lcov(merged, output, root=None):
+    root = root or Path.cwd()
+    out = []
+    for path in sorted(merged):
+        cov = merged[path]
+        out.append("TN:")
+        out.append(f"SF:{_display_path(path, root)}")
+        for line in sorted(cov.lines):
+            out.append(f"DA:{line},{cov.hits.get(line, 0)}")
+        out.append(f"LF:{len(cov.lines)}")
+        out.append(f"LH:{cov.covered}")
+        out.append("end_of_record")
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text("\n".join(out) + "\n", encoding="utf-8")
+
+
+def _rate(hit, found):
+    return f"{hit / found:.4f}" if found else "1.0"
+
+
+def write_cobertura(merged, output, root=None):
+    root = root or Path.cwd()
+    total = sum(len(cov.lines) for cov in merged.values())
+    covered = sum(cov.covered for cov in merged.values())
+    top = ET.Element("coverage", {
+        "line-rate": _rate(covered, total), "branch-rate": "0", "lines-covered": str(covered),
+        "lines-valid": str(total), "branches-covered": "0", "branches-valid": "0",
+        "complexity": "0", "version": "envireament", "timestamp": str(int(time.time())),
+    })
+    ET.SubElement(ET.SubElement(top, "sources"), "source").text = str(root)
+    packages = ET.SubElement(top, "packages")
+    by_directory = {}
+    for path in sorted(merged):
+        name = _display_path(path, root)
+        by_directory.setdefault(os.path.dirname(name) or ".", []).append((name, merged[path]))
+    for directory, files in sorted(by_directory.items()):
+        found = sum(len(cov.lines) for _, cov in files)
+        hit = sum(cov.covered for _, cov in files)
+        package = ET.SubElement(packages, "package", {
+            "name": directory.replace(os.sep, "."), "line-rate": _rate(hit, found),
+            "branch-rate": "0", "complexity": "0",
+        })
+        classes = ET.SubElement(package, "classes")
+        for name, cov in files:
+            cls = ET.SubElement(classes, "class", {
+                "name": os.path.basename(name), "filename": name,
+                "line-rate": _rate(cov.covered, len(cov.lines)), "branch-rate": "0",
+                "complexity": "0",
+            })
+            ET.SubElement(cls, "methods")
+            lines = ET.SubElement(cls, "lines")
+            for line in sorted(cov.lines):
+                ET.SubElement(lines, "line", {"number": str(line),
+                                              "hits": str(cov.hits.get(line, 0))})
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(top).write(str(output), encoding="utf-8", xml_declaration=True)
+
+
+def coverage_paths(directories, lcov=None, cobertura=None, stream=None):
+    """Merge coverage files, print a per-file summary and write reports.
+
+    Returns False when the files cannot be read or no run was found.
+    """
+    stream = stream or sys.stdout
+    try:
+        merged, modes, runs = merge_runs(directories or [DEFAULT_COVERAGE_DIR])
+    except (CoverageError, OSError) as exc:
+        print(f"Cannot read coverage: {exc}", file=stream)
+        return False
+    if not runs:
+        print(f"No coverage runs found (set {ENV_VAR} or use envireament test --coverage)",
+              file=stream)
+        return False
+    complete(merged)
+    root = Path.cwd()
+    names = {path: _display_path(path, root) for path in merged}
+    width = max([len(name) for name in names.values()] + [4])
+    for path in sorted(merged, key=names.get):
+        cov = merged[path]
+        percent = 100.0 * cov.covered / len(cov.lines) if cov.lines else 100.0
+        print(f"{names[path]:<{width}}  {cov.covered:5}/{len(cov.lines):<5} {percent:5.1f}%",
+              file=stream)
+    total = sum(len(cov.lines) for cov in merged.values())
+    covered = sum(cov.covered for cov in merged.values())
+    percent = 100.0 * covered / total if total else 100.0
+    note = " (sampled: lines that ran briefly may be missed)" if "sampled" in modes else ""
+    print(f"{covered}/{total} lines covered ({percent:.1f}%) across {runs} run(s){note}",
+          file=stream)
+    if lcov:
+        write_lcov(merged, lcov, root)
+        print(f"lcov report written to {lcov}", file=stream)
+    if cobertura:
+        write_cobertura(merged, cobertura, root)
+        print(f"Cobertura report written to {cobertura}", file=stream)
+    return True
+
+
+def enable(directory, mode="sampled", interval=None):
+    """Make Lua processes started from now on record line coverage into directory."""
+    directory = Path(directory).resolve()
+    directory.mkdir(parents=True, exist_ok=True)
+    os.environ[ENV_VAR] = str(directory)
+    os.environ[MODE_VAR] = mode
+    if interval:
+        os.environ[INTERVAL_VAR] = str(interval)
+    return directory
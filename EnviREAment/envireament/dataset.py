@@ -0,0 +1,432 @@
+"""
+Duplicate detection across JCRD song datasets.
+
+The song browser scans ``datasets``, ``examples`` and ``jcrddatasets``
+under the songbase folder, and the same song often sits in more than one
+of them. ``dedupe_datasets()`` finds those copies in two passes:
+
+* Exact duplicates. Worker processes parse every file and hash its
+  normalized content: title, artist, key and chord symbols, with case,
+  whitespace, field order and chord spelling (``Cmin7`` / ``C-7`` /
+  ``Cm7``) evened out. A song with no title is titled by its file name,
+  as the song browser shows it. Files with the same digest are one song.
+  Files with no chords and no title, artist or key hold nothing to
+  compare; they are listed as ``empty`` and never matched.
+* Near duplicates. Each song's chord progression is turned into shingles
+  of ``shingle`` consecutive chords, written as root movements and
+  qualities so a transposed copy shingles the same. MinHash sketches
+  each set, and LSH banding over the sketches proposes candidate pairs.
+  A pair is kept when its sketches agree on at least ``threshold`` of
+  their slots, the MinHash estimate of Jaccard similarity.
+
+Both passes cost time linear in the number of files, and only sketches
+(4 bytes per slot) stay in memory, so the tool scales to hundreds of
+thousands of files. The result is a dedupe map, written as
+``songbase_dedupe.json`` in the songbase folder by default::
+
+    {"version": 1, "roots": ["datasets", ...], "files": 120000,
+     "duplicates": {"examples/a.jcrd": {"of": "datasets/a.jcrd",
+                                        "kind": "exact", "similarity": 1.0}, ...},
+     "empty": ["datasets/blank.jcrd", ...], "unreadable": {...}}
+
+Paths are relative to the songbase folder, with ``/`` separators. Each
+group keeps the copy in the earliest root (then the first path) and maps
+the others to it; ``load_songs`` skips mapped files whose canonical copy
+it found and lists them on the canonical song instead.
+"""
+
+import array
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+DEDUPE_VERSION = 1
+DEDUPE_MAP_NAME = "songbase_dedupe.json"
+DEFAULT_ROOTS = ("datasets", "examples", "jcrddatasets")
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_SHINGLE = 4
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+# Within one LSH bucket each song is compared with at most this many of
+# the songs before it, so a bucket of common progressions stays linear
+MAX_BUCKET_NEIGHBOURS = 32
+MAX_GROUPS_LISTED = 10
+
+# What the song browser loads, and the support files it leaves alone
+SONG_EXTENSIONS = (".jcrd", ".json")
+SKIP_PREFIXES = ("songbase_", "user_", "recent_", "manifest_", "config_")
+
+_NOTES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_CHORD = re.compile(r"^([A-Ga-g])([#b]*)(.*?)(?:/([A-Ga-g][#b]*))?$")
+# Whole-quality spellings that mean the same chord
+_QUALITY_ALIASES = {"": "", "M": "", "maj": "", "major": "",
+                    "m": "m", "mi": "m", "min": "m", "minor": "m", "-": "m"}
+# Quality prefixes spelled several ways, longest first; canonical ones map to themselves
+_QUALITY_PREFIXES = (("major", "maj"), ("maj", "maj"), ("ma", "maj"), ("^", "maj"), ("M", "maj"),
+                     ("minor", "m"), ("min", "m"), ("mi", "m"), ("-", "m"), ("+", "aug"),
+                     ("o", "dim"))
+_PRIME = (1 << 61) - 1
+_U32 = 0xFFFFFFFF
+
+
+class DedupeError(ValueError):
+    """The songbase folder or its roots cannot be scanned."""
+
+
+def _fold(text):
+    return " ".join(str(text or "").split()).casefold()
+
+
+def normalize_chord(symbol):
+    """(root pitch class or None, quality) for a chord symbol.
+
+    ``Cmin7``, ``C-7`` and ``cm7`` all give ``(0, "m7")``. A slash bass is
+    kept in the quality as an interval above the root. Symbols that are not
+    chords (``N``, ``X``) come back with no root and the symbol folded.
+    """
+    text = "".join(str(symbol).split()).replace("♯", "#").replace("♭", "b")
+    match = _CHORD.match(text)
+    if not match:
+        return None, text.casefold()
+    letter, accidentals, quality, bass = match.groups()
+    root = (_NOTES[letter.upper()] + accidentals.count("#") - accidentals.count("b")) % 12
+    if quality in _QUALITY_ALIASES:
+        quality = _QUALITY_ALIASES[quality]
+    else:
+        for prefix, spelled in _QUALITY_PREFIXES:
+            if quality.startswith(prefix):
+                quality = spelled + quality[len(prefix):]
+                break
+    if bass:
+        interval = (_NOTES[bass[0].upper()] + bass.count("#") - bass.count("b") - root) % 12
+        quality += f"/{interval}"
+    return root, quality
+
+
+def song_chords(data):
+    """Chord symbols of a parsed song, in order, as the song browser reads them."""
+    chords = []
+    for section in data.get("sections") or []:
+        if not isinstance(section, dict):
+            continue
+        for chord in section.get("chords") or []:
+            symbol = chord.get("symbol") if isinstance(chord, dict) else chord
+            if isinstance(symbol, str) and symbol.strip():
+                chords.append(symbol)
+    return chords
+
+
+def song_metadata(data):
+    """(title, artist, key) of a parsed song, folded; empty strings when missing."""
+    return (_fold(data.get("title") or data.get("name")),
+            _fold(data.get("artist") or data.get("performer")),
+            _fold(data.get("key")))
+
+
+def content_digest(data, chords, stem=""):
+    """SHA-256 of a song's folded title, artist and key and its normalized chords.
+
+    stem, the file name without its extension, stands in for a missing
+    title, so untitled songs only match copies of the same file.
+    """
+    title, artist, key = song_metadata(data)
+    normalized = [title or _fold(stem), artist, key, [list(chord) for chord in chords]]
+    text = json.dumps(normalized, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def shingles(chords, size=DEFAULT_SHINGLE):
+    """Set of progression shingles of ``size`` normalized chords.
+
+    Each chord is written as its root movement from the chord before and
+    its quality, so a transposed copy gives the same set. Repeated chords
+    count once.
+    """
+    steps, previous = [], None
+    for root, quality in chords:
+        if root is None:
+            step = quality
+        else:
+            step = ("" if previous is None else str((root - previous) % 12)) + ":" + quality
+            previous = root
+        if not steps or step != steps[-1]:
+            steps.append(step)
+    if len(steps) < size:
+        return set()
+    # A shingle's first movement depends on the chord before it, so it is
+    # dropped and the shingle reads the same wherever the progression starts
+    return {"|".join([steps[i].rpartition(":")[2]] + steps[i + 1:i + size])
+            for i in range(len(steps) - size + 1)}
+
+
+@functools.lru_cache(maxsize=None)
+def _permutations(num_perm):
+    """Fixed (a, b) pairs of the hash functions ``(a * x + b) mod 2**61 - 1``."""
+    rng = random.Random(num_perm)
+    return tuple((rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(num_perm))
+
+
+def minhash(items, num_perm=DEFAULT_NUM_PERM):
+    """MinHash of a set of strings: ``num_perm`` 32-bit minimums, or None for an empty set.
+
+    Each item is hashed once with BLAKE2b, and ``num_perm`` universal hash
+    functions of that value stand in for random permutations.
+    """
+    if not items:
+        return None
+    values = [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(),
+                             "little") for item in items]
+    return array.array("I", [min((a * value + b) % _PRIME for value in values) & _U32
+                             for a, b in _permutations(num_perm)])
+
+
+def similarity(a, b):
+    """Share of slots two sketches agree on: their estimated Jaccard similarity."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def discover_songs(root, names=DEFAULT_ROOTS):
+    """[(relative path, absolute path)] of every song file under root/names, in scan order.
+
+    Roots that do not exist are skipped. Raises DedupeError when none does.
+    """
+    root = Path(root)
+    found, scanned = [], 0
+    for name in names:
+        base = root / name
+        if not base.is_dir():
+            continue
+        scanned += 1
+        stack = [str(base)]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+            except OSError:
+                continue
+            subdirectories = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif (entry.name.endswith(SONG_EXTENSIONS)
+                      and not entry.name.startswith(SKIP_PREFIXES)):
+                    relative = os.path.relpath(entry.path, str(root)).replace(os.sep, "/")
+                    found.append((relative, entry.path))
+            stack.extend(reversed(subdirectories))
+    if not scanned:
+        raise DedupeError(f"None of {', '.join(names)} exists under {root}")
+    return found
+
+
+# Worker processes take their sketch settings once, from the parent
+_worker_settings = (DEFAULT_SHINGLE, DEFAULT_NUM_PERM)
+
+
+def _init_worker(shingle, num_perm):
+    global _worker_settings
+    _worker_settings = (shingle, num_perm)
+
+
+def _sketch_worker(path):
+    """(digest, sketch bytes or None) for one file, (None, reason) when it cannot
+    be read, or (None, None) when it has no chords and no metadata."""
+    shingle, num_perm = _worker_settings
+    try:
+        with open(path, "rb") as handle:
+            data = json.loads(handle.read().decode("utf-8-sig"))
+    except (OSError, ValueError) as error:
+        return None, str(error)
+    if not isinstance(data, dict):
+        return None, "not a song object"
+    chords = [normalize_chord(symbol) for symbol in song_chords(data)]
+    if not chords and not any(song_metadata(data)):
+        return None, None
+    sketch = minhash(shingles(chords, shingle), num_perm)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return content_digest(data, chords, stem), sketch.tobytes() if sketch is not None else None
+
+
+def _sketch_files(paths, jobs, shingle, num_perm):
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 64 * jobs:
+        # Not worth starting processes for
+        _init_worker(shingle, num_perm)
+        return [_sketch_worker(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(shingle, num_perm)) as pool:
+        return list(pool.map(_sketch_worker, paths,
+                             chunksize=max(1, min(512, len(paths) // (jobs * 8)))))
+
+
+class _Groups:
+    """Union-find over song indexes; the smallest index (first scanned) leads a group."""
+
+    def __init__(self, count):
+        self.parent = list(range(count))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def _join_near(groups, sketches, bands, threshold):
+    """Join the groups of sketched songs that LSH pairs up and that reach threshold.
+
+    sketches maps a song index to its sketch bytes. Each band's slots
+    bucket the songs; songs sharing a bucket in any band are candidates.
+    Returns the number of candidate pairs checked.
+    """
+    views = {index: memoryview(sketch).cast("I") for index, sketch in sketches.items()}
+    width = len(next(iter(sketches.values()))) // bands
+    checked = 0
+    for band in range(bands):
+        start = band * width
+        buckets = {}
+        for index, sketch in sketches.items():
+            buckets.setdefault(sketch[start:start + width], []).append(index)
+        for members in buckets.values():
+            for position in range(1, len(members)):
+                j = members[position]
+                for i in members[max(0, position - MAX_BUCKET_NEIGHBOURS):position]:
+                    if groups.find(i) == groups.find(j):
+                        continue
+                    checked += 1
+                    if similarity(views[i], views[j]) >= threshold:
+                        groups.union(i, j)
+    return checked
+
+
+def find_duplicates(root, names=DEFAULT_ROOTS, threshold=DEFAULT_THRESHOLD,
+                    shingle=DEFAULT_SHINGLE, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                    jobs=None):
+    """The dedupe map for the songs under root/names, as a dict (see the module docstring).
+
+    Its ``unreadable`` entry lists files that could not be parsed, with why,
+    and ``empty`` those with nothing to compare.
+    """
+    if num_perm % bands:
+        raise DedupeError(f"{bands} bands do not divide {num_perm} slots")
+    if not 0 < threshold <= 1:
+        raise DedupeError(f"threshold {threshold} is not in (0, 1]")
+    songs = discover_songs(root, names)
+    results = _sketch_files([path for _, path in songs], jobs, shingle, num_perm)
+    groups = _Groups(len(songs))
+    first_by_digest, sketches, unreadable, empty = {}, {}, {}, []
+    for index, (digest, sketch) in enumerate(results):
+        if digest is None:
+            if sketch is None:
+                empty.append(songs[index][0])
+            else:
+                unreadable[songs[index][0]] = sketch
+            continue
+        first = first_by_digest.setdefault(digest, index)
+        if first != index:
+            groups.union(first, index)
+        elif sketch is not None:
+            sketches[index] = sketch
+    checked = _join_near(groups, sketches, bands, threshold) if sketches else 0
+    duplicates = {}
+    for index, (digest, sketch) in enumerate(results):
+        if digest is None:
+            continue
+        leader = groups.find(index)
+        if leader == index:
+            continue
+        if digest == results[leader][0]:
+            kind, score = "exact", 1.0
+        else:
+            own = sketches.get(first_by_digest[digest])
+            score = similarity(memoryview(own).cast("I"), memoryview(sketches[leader]).cast("I"))
+            kind = "near"
+        duplicates[songs[index][0]] = {"of": songs[leader][0], "kind": kind,
+                                       "similarity": round(score, 3)}
+    return {
+        "version": DEDUPE_VERSION,
+        "roots": [name for name in names if (Path(root) / name).is_dir()],
+        "files": len(songs),
+        "settings": {"threshold": threshold, "shingle": shingle, "num_perm": num_perm,
+                     "bands": bands},
+        "candidates_checked": checked,
+        "duplicates": duplicates,
+        "empty": empty,
+        "unreadable": unreadable,
+    }
+
+
+def write_dedupe_map(dedupe_map, path):
+    """Write a dedupe map as JSON, replacing any previous one atomically."""
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(dedupe_map, handle, indent=1, sort_keys=True)
+        handle.write("\n")
+    os.replace(temporary, path)
+    return path
+
+
+def summarize(dedupe_map, stream=None):
+    """Print duplicate counts and the largest groups of a dedupe map."""
+    stream = stream or sys.stdout
+    duplicates = dedupe_map["duplicates"]
+    groups = {}
+    for path, entry in duplicates.items():
+        groups.setdefault(entry["of"], []).append((path, entry))
+    exact = sum(1 for entry in duplicates.values() if entry["kind"] == "exact")
+    settings = dedupe_map["settings"]
+    print(f"{dedupe_map['files']} file(s) in {', '.join(dedupe_map['roots'])}: "
+          f"{len(dedupe_map['unreadable'])} unreadable, {len(dedupe_map['empty'])} empty",
+          file=stream)
+    print(f"  exact duplicates: {exact}", file=stream)
+    print(f"  near duplicates:  {len(duplicates) - exact} (similarity >= "
+          f"{settings['threshold']:.2f}, {dedupe_map['candidates_checked']} candidate pair(s) "
+          f"checked)", file=stream)
+    print(f"  {len(duplicates)} file(s) collapse into {len(groups)} song(s)", file=stream)
+    largest = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))
+    for canonical, members in largest[:MAX_GROUPS_LISTED]:
+        print(f"  {canonical}", file=stream)
+        for path, entry in sorted(members)[:MAX_GROUPS_LISTED]:
+            print(f"    = {path} ({entry['kind']}, {entry['similarity']:.2f})", file=stream)
+        if len(members) > MAX_GROUPS_LISTED:
+            print(f"    ... {len(members) - MAX_GROUPS_LISTED} more", file=stream)
+    for path, reason in sorted(dedupe_map["unreadable"].items())[:MAX_GROUPS_LISTED]:
+        print(f"  unreadable: {path}: {reason}", file=stream)
+
+
+def dedupe_datasets(root, names=DEFAULT_ROOTS, output=None, threshold=DEFAULT_THRESHOLD,
+                    shingle=DEFAULT_SHINGLE, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                    jobs=None, as_json=False, stream=None):
+    """Find duplicate songs under the songbase folder root and write the dedupe map.
+
+    The map goes to output (default: root/songbase_dedupe.json). Returns
+    False when the folder cannot be scanned.
+    """
+    stream = stream or sys.stdout
+    started = time.perf_counter()
+    try:
+        dedupe_map = find_duplicates(root, names, threshold, shingle, num_perm, bands, jobs)
+    except DedupeError as error:
+        print(f"Cannot dedupe: {error}", file=stream)
+        return False
+    path = write_dedupe_map(dedupe_map, output or Path(root) / DEDUPE_MAP_NAME)
+    if as_json:
+        json.dump(dedupe_map, stream, indent=2, sort_keys=True)
+        print(file=stream)
+    else:
+        summarize(dedupe_map, stream)
+        print(f"Wrote {path} in {time.perf_counter() - started:.1f}s", file=stream)
+    return True
@@ -0,0 +1,275 @@
+"""
+Static dependency closures for Lua scripts.
+
+A script's closure is every file it can load: ``require`` targets resolved
+against the search path, ``dofile``/``loadfile`` paths, and whatever those
+files load in turn. ``package.path`` additions are followed too. Literal
+parts are used as-is, and a dynamic base such as ``script_path`` or
+``debug.getinfo(1).source`` is taken to be the script's own directory.
+
+When a script calls ``require`` with a computed name, the closure also
+includes every module in the directories on its search path and is
+marked dynamic. Test selection uses it as is; the result cache does not
+trust it and always runs such scripts.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+from . import lualex
+
+# Searched before any package.path additions, like LUA_PATH in runner.py
+DEFAULT_TEMPLATES = ("?.lua", "?/init.lua")
+
+
+def stat_key(path):
+    """(mtime_ns, size) of a file, or None when it is missing."""
+    try:
+        st = os.stat(str(path))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FileDeps:
+    """What one file loads, as written in its source."""
+
+    __slots__ = ("requires", "dofiles", "templates", "dynamic")
+
+    def __init__(self):
+        self.requires = []   # module names
+        self.dofiles = []    # paths given to dofile/loadfile
+        self.templates = []  # package.path additions, "/" separated
+        self.dynamic = False # require() with a computed name
+
+
+class Closure:
+    """The files a script depends on, plus modules that could not be found."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.files = set()
+        self.missing = set()
+        self.dynamic = False
+
+
+def _string_at(tokens, i):
+    if i < len(tokens) and tokens[i].kind == lualex.STRING:
+        return tokens[i].value
+    return None
+
+
+def _skip_group(tokens, i):
+    """Index just past the bracket group opening at i."""
+    depth = 0
+    while i < len(tokens):
+        value = tokens[i].value
+        if tokens[i].kind == lualex.OP and value in ("(", "[", "{"):
+            depth += 1
+        elif tokens[i].kind == lualex.OP and value in (")", "]", "}"):
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _operand_end(tokens, i):
+    """Index past a prefix expression starting with the name at i
+    (a.b, a:b(...), a[...], f(...))."""
+    n = len(tokens)
+    i += 1
+    while i < n:
+        token = tokens[i]
+        if token.kind == lualex.OP and token.value in (".", ":") \
+                and i + 1 < n and tokens[i + 1].kind == lualex.NAME:
+            i += 2
+        elif token.kind == lualex.OP and token.value in ("(", "["):
+            i = _skip_group(tokens, i)
+        else:
+            break
+    return i
+
+
+def _path_expression(tokens, i, literals):
+    """Read a `a .. "b" .. package.path` expression into template strings."""
+    parts = []
+    n = len(tokens)
+    while i < n:
+        token = tokens[i]
+        if token.kind == lualex.STRING:
+            parts.append(token.value)
+            i += 1
+        elif token.kind == lualex.NAME:
+            end = _operand_end(tokens, i)
+            words = [t.value for t in tokens[i:end]]
+            if words == ["package", ".", "path"]:
+                parts.append(";")
+            elif len(words) == 1 and words[0] in literals:
+                parts.append(literals[words[0]])
+            else:
+                parts.append("\0")  # dynamic base: the script's directory
+            i = end
+        else:
+            break
+        if i < n and tokens[i].kind == lualex.OP and tokens[i].value == "..":
+            i += 1
+        else:
+            break
+    templates = []
+    for entry in "".join(parts).split(";"):
+        if "?" in entry:
+            templates.append(entry.replace("\\", "/"))
+    return templates
+
+
+def scan_source(source):
+    """Find require/dofile/loadfile calls and package.path additions."""
+    tokens = lualex.tokenize(source)
+    deps = FileDeps()
+    literals = {}
+    n = len(tokens)
+    for i, token in enumerate(tokens):
+        if token.kind != lualex.NAME:
+            continue
+        value = token.value
+        prev = tokens[i - 1].value if i > 0 else None
+        if prev in (".", ":"):
+            if value == "path" and i >= 2 and tokens[i - 2].value == "package" \
+                    and i + 1 < n and tokens[i + 1].value == "=":
+                deps.templates.extend(_path_expression(tokens, i + 2, literals))
+            continue
+        if value == "require":
+            nxt = tokens[i + 1].value if i + 1 < n else None
+            name = None
+            if nxt in ("(", ","):
+                name = _string_at(tokens, i + 2)
+                if name is None and nxt == "(":
+                    deps.dynamic = True
+            elif i + 1 < n and tokens[i + 1].kind == lualex.STRING:
+                name = tokens[i + 1].value
+            if name:
+                deps.requires.append(name)
+        elif value in ("dofile", "loadfile"):
+            if i + 1 < n and tokens[i + 1].value == "(":
+                path = _string_at(tokens, i + 2)
+                if path and i + 3 < n and tokens[i + 3].value == ")":
+                    deps.dofiles.append(path)
+            elif i + 1 < n and tokens[i + 1].kind == lualex.STRING:
+                deps.dofiles.append(tokens[i + 1].value)
+        elif i + 2 < n and tokens[i + 1].value == "=" and tokens[i + 2].kind == lualex.STRING \
+                and (i + 3 >= n or tokens[i + 3].value != ".."):
+            # local x = "literal" (used to expand package.path additions)
+            literals[value] = tokens[i + 2].value
+    return deps
+
+
+class DependencyScanner:
+    """Resolves closures, caching per-file scans and digests by mtime/size."""
+
+    def __init__(self, package_dir=None):
+        self.package_dir = Path(package_dir) if package_dir else Path(__file__).parent.parent
+        self._scans = {}
+        self._digests = {}
+
+    def scan(self, path):
+        """FileDeps for a file, rescanned only when it changes."""
+        path = Path(path)
+        key = stat_key(path)
+        cached = self._scans.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            source = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            source = ""
+        deps = scan_source(source)
+        self._scans[path] = (key, deps)
+        return deps
+
+    def digest(self, path):
+        """sha256 of a file's contents, cached by mtime/size."""
+        path = Path(path)
+        key = stat_key(path)
+        cached = self._digests.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            value = hashlib.sha256(path.read_bytes()).hexdigest()
+        except OSError:
+            value = "missing"
+        self._digests[path] = (key, value)
+        return value
+
+    def _search_dirs(self, root, templates):
+        """(directory, template tail) pairs, e.g. (root/ui, "?.lua")."""
+        pairs = []
+        for template in templates:
+            template = template.replace("\0", str(root) + "/")
+            head, _, tail = template.rpartition("/")
+            base = Path(head) if head else root
+            if not base.is_absolute():
+                base = root / base
+            pairs.append((base, tail))
+        return pairs
+
+    def resolve_module(self, name, root, templates):
+        relative = name.replace(".", "/")
+        for base, tail in self._search_dirs(root, templates):
+            candidate = base / tail.replace("?", relative)
+            if candidate.is_file():
+                return candidate.resolve()
+        return None
+
+    def closure(self, script):
+        """Every file script can load, resolved from its own directory."""
+        script = Path(script).resolve()
+        root = script.parent
+        result = Closure(root)
+        templates = list(DEFAULT_TEMPLATES) + [str(self.package_dir) + "/?.lua"]
+        queue = [script]
+        expanded = False
+        while queue:
+            path = queue.pop()
+            if path not in result.files:
+                result.files.add(path)
+                deps = self.scan(path)
+                for template in deps.templates:
+                    if template not in templates:
+                        templates.append(template)
+                result.dynamic = result.dynamic or deps.dynamic
+                for name in deps.requires:
+                    found = self.resolve_module(name, root, templates)
+                    if found:
+                        queue.append(found)
+                    else:
+                        result.missing.add(name)
+                for name in deps.dofiles:
+                    candidate = Path(name.replace("\\", "/"))
+                    if not candidate.is_absolute():
+                        candidate = root / candidate
+                    if candidate.is_file():
+                        queue.append(candidate.resolve())
+                    else:
+                        result.missing.add(name)
+            if not queue and result.dynamic and not expanded:
+                # Computed module names: any module on the search path may load
+                expanded = True
+                for base, tail in self._search_dirs(root, templates):
+                    if tail == "?.lua" and base.is_dir() and base != self.package_dir:
+                        queue.extend(candidate.resolve() for candidate in sorted(base.glob("*.lua")))
+        return result
+
+    def closure_hash(self, closure):
+        """Stable hash of a closure's file contents and unresolved names."""
+        digest = hashlib.sha256()
+        for path in sorted(closure.files):
+            try:
+                label = os.path.relpath(str(path), str(closure.root))
+            except ValueError:
+                label = str(path)
+            digest.update(f"{label}\0{self.digest(path)}\n".encode("utf-8"))
+        for name in sorted(closure.missing):
+            digest.update(f"missing\0{name}\n".encode("utf-8"))
+        return digest.hexdigest()
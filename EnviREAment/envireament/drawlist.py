@@ -0,0 +1,511 @@
+"""
+Draw-list recordings: what each window drew, frame by frame.
+
+``record_draw_lists()`` runs a script the way ``envireament test`` does,
+with ``ENVIREAMENT_DRAWLIST`` naming an output file. The mock records
+every ``ImGui_DrawList_*`` call into flat numeric arrays per window and,
+as each frame ends, appends that frame's lists to the file as
+little-endian binary::
+
+    "EVDL" u16 version u16 stride
+    per frame: "FRME" u32 frame u32 lists
+      per list: u16 name length, name, u32 commands, u32 points, u32 text bytes,
+                u8 opcode[commands], u32 color[commands] (0xRRGGBBAA),
+                f32 args[commands * stride], f32 xy[points * 2], text bytes
+
+``read_draw_lists()`` decodes a recording into ``Frame`` objects whose
+arrays are ``array`` views, or NumPy views when NumPy is installed, so
+tests can assert on coordinates and colors directly. ``rasterize()``
+draws a frame into RGB pixels and ``write_png()`` saves them; corners are
+square and text shows as its measured box, which is enough to see what a
+meter or piano roll drew.
+"""
+
+import array
+import math
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+from .runner import DEFAULT_TIMEOUT, run_test_file
+
+try:
+    import numpy
+except ImportError:  # array views are used instead
+    numpy = None
+
+ENV_VAR = "ENVIREAMENT_DRAWLIST"
+MAGIC = b"EVDL"
+FRAME_MAGIC = b"FRME"
+VERSION = 1
+MAX_FRAMES_LISTED = 20
+MAX_CANVAS = 4096
+
+# Opcodes, as the mock's DRAW LISTS section numbers them
+OPS = {
+    1: "line",
+    2: "rect",
+    3: "rect_filled",
+    4: "circle",
+    5: "circle_filled",
+    6: "triangle",
+    7: "triangle_filled",
+    8: "polyline",
+    9: "convex_poly_filled",
+    10: "bezier_cubic",
+    11: "text",
+    12: "push_clip",
+    13: "pop_clip",
+}
+OPCODES = {name: code for code, name in OPS.items()}
+
+_U32 = "I" if array.array("I").itemsize == 4 else "L"
+_TYPECODES = {"u8": "B", "u32": _U32, "f32": "f"}
+_DTYPES = {"u8": "u1", "u32": "<u4", "f32": "<f4"}
+_SIZES = {"u8": 1, "u32": 4, "f32": 4}
+
+
+class DrawListError(ValueError):
+    """A recording that cannot be read."""
+
+
+class DrawList:
+    """One window's commands in one frame.
+
+    ``ops``, ``colors`` and ``args`` hold one entry (``args``: ``stride``
+    entries) per command; ``points`` holds x, y pairs for polylines,
+    convex fills and curves.
+    """
+
+    __slots__ = ("name", "stride", "ops", "colors", "args", "points", "text")
+
+    def __init__(self, name, stride, ops, colors, args, points, text):
+        self.name = name
+        self.stride = stride
+        self.ops = ops
+        self.colors = colors
+        self.args = args
+        self.points = points
+        self.text = text
+
+    def __len__(self):
+        return len(self.ops)
+
+    def op(self, index):
+        return OPS.get(int(self.ops[index]), "unknown")
+
+    def arguments(self, index):
+        """The command's arguments as floats, zero-padded to the stride."""
+        start = index * self.stride
+        return [float(value) for value in self.args[start:start + self.stride]]
+
+    def polygon(self, index):
+        """(x, y) points of a polyline, convex fill or curve command."""
+        first, count = (int(value) for value in self.arguments(index)[:2])
+        return [(float(self.points[2 * i]), float(self.points[2 * i + 1]))
+                for i in range(first, first + count)]
+
+    def text_of(self, index):
+        """The string a text command drew."""
+        args = self.arguments(index)
+        offset, length = int(args[4]), int(args[5])
+        return self.text[offset:offset + length].decode("utf-8", "replace")
+
+    def commands(self):
+        """(op name, 0xRRGGBBAA color, arguments) per command."""
+        for index in range(len(self)):
+            yield self.op(index), int(self.colors[index]), self.arguments(index)
+
+    def counts(self):
+        """{op name: commands}"""
+        counts = {}
+        if numpy is not None and isinstance(self.ops, numpy.ndarray):
+            for code, count in enumerate(numpy.bincount(self.ops)):
+                if count:
+                    counts[OPS.get(code, "unknown")] = int(count)
+            return counts
+        for code in self.ops:
+            name = OPS.get(code, "unknown")
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+class Frame:
+    """Every draw list one frame drew to, in the order they were first used."""
+
+    __slots__ = ("frame", "lists")
+
+    def __init__(self, frame, lists):
+        self.frame = frame
+        self.lists = lists
+
+    def list(self, name):
+        return next((draw_list for draw_list in self.lists if draw_list.name == name), None)
+
+    def counts(self):
+        """{op name: commands} over all lists."""
+        counts = {}
+        for draw_list in self.lists:
+            for name, count in draw_list.counts().items():
+                counts[name] = counts.get(name, 0) + count
+        return counts
+
+    def commands(self):
+        return sum(len(draw_list) for draw_list in self.lists)
+
+
+def _view(data, offset, kind, count, use_numpy):
+    end = offset + _SIZES[kind] * count
+    if end > len(data):
+        raise DrawListError("recording is truncated")
+    if use_numpy:
+        return numpy.frombuffer(data, dtype=_DTYPES[kind], count=count, offset=offset), end
+    values = array.array(_TYPECODES[kind])
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "big" and kind != "u8":
+        values.byteswap()
+    return values, end
+
+
+def read_draw_lists(path, use_numpy=None):
+    """[Frame, ...] from a recording; NumPy views unless use_numpy is False."""
+    use_numpy = numpy is not None if use_numpy is None else use_numpy and numpy is not None
+    data = Path(path).read_bytes()
+    if data[:4] != MAGIC:
+        raise DrawListError(f"{path}: not a draw-list recording")
+    version, stride = struct.unpack_from("<HH", data, 4)
+    if version != VERSION:
+        raise DrawListError(f"{path}: unsupported version {version}")
+    frames = []
+    offset = 8
+    try:
+        while offset < len(data):
+            tag, number, count = struct.unpack_from("<4sII", data, offset)
+            if tag != FRAME_MAGIC:
+                raise DrawListError(f"{path}: bad frame header at byte {offset}")
+            offset += 12
+            lists = []
+            for _ in range(count):
+                (length,) = struct.unpack_from("<H", data, offset)
+                name = data[offset + 2:offset + 2 + length].decode("utf-8", "replace")
+                offset += 2 + length
+                commands, points, text_bytes = struct.unpack_from("<III", data, offset)
+                offset += 12
+                ops, offset = _view(data, offset, "u8", commands, use_numpy)
+                colors, offset = _view(data, offset, "u32", commands, use_numpy)
+                args, offset = _view(data, offset, "f32", commands * stride, use_numpy)
+                xy, offset = _view(data, offset, "f32", points * 2, use_numpy)
+                text = data[offset:offset + text_bytes]
+                offset += text_bytes
+                lists.append(DrawList(name, stride, ops, colors, args, xy, text))
+            frames.append(Frame(number, lists))
+    except struct.error:
+        raise DrawListError(f"{path}: recording is truncated")
+    return frames
+
+
+# ---------------------------------------------------------------- rasterizing
+
+def _rgba(color):
+    return (color >> 24) & 255, (color >> 16) & 255, (color >> 8) & 255, color & 255
+
+
+def _thick_segment(x0, y0, x1, y1, thickness):
+    """A segment as the quad it covers at its thickness."""
+    dx, dy = x1 - x0, y1 - y0
+    length = math.hypot(dx, dy) or 1.0
+    nx, ny = -dy / length * thickness / 2, dx / length * thickness / 2
+    return [(x0 + nx, y0 + ny), (x1 + nx, y1 + ny), (x1 - nx, y1 - ny), (x0 - nx, y0 - ny)]
+
+
+def _stroke(points, thickness, closed):
+    segments = list(zip(points, points[1:]))
+    if closed and len(points) > 2:
+        segments.append((points[-1], points[0]))
+    return [("poly", _thick_segment(a[0], a[1], b[0], b[1], max(1.0, thickness)))
+            for a, b in segments]
+
+
+def _bezier(p, segments):
+    segments = segments if segments > 0 else 20
+    curve = []
+    for i in range(segments + 1):
+        t = i / segments
+        u = 1 - t
+        curve.append(tuple(u * u * u * p[0][k] + 3 * u * u * t * p[1][k] +
+                           3 * u * t * t * p[2][k] + t * t * t * p[3][k] for k in (0, 1)))
+    return curve
+
+
+def _shapes(draw_list):
+    """(color, shapes) per command: polygons, discs and rings, plus clip changes."""
+    for index in range(len(draw_list)):
+        op = draw_list.op(index)
+        color = int(draw_list.colors[index])
+        a = draw_list.arguments(index)
+        if op == "line":
+            shapes = _stroke([(a[0], a[1]), (a[2], a[3])], a[4], False)
+        elif op in ("rect", "rect_filled", "text"):
+            x0, y0, x1, y1 = (a[0], a[1], a[0] + a[2], a[1] + a[3]) if op == "text" else a[:4]
+            box = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+            if op == "rect":
+                shapes = _stroke(box, a[5], True)
+            else:
+                shapes = [("poly", box)]
+            if op == "text":  # text shows as its box, half as opaque
+                color = (color & 0xFFFFFF00) | ((color & 255) // 2)
+        elif op in ("circle", "circle_filled"):
+            thickness = max(1.0, a[4]) if op == "circle" else None
+            shapes = [("disc" if thickness is None else "ring", (a[0], a[1], a[2], thickness))]
+        elif op in ("triangle", "triangle_filled"):
+            points = [(a[0], a[1]), (a[2], a[3]), (a[4], a[5])]
+            shapes = _stroke(points, a[6], True) if op == "triangle" else [("poly", points)]
+        elif op == "polyline":
+            shapes = _stroke(draw_list.polygon(index), a[2], a[3] != 0)
+        elif op == "convex_poly_filled":
+            shapes = [("poly", draw_list.polygon(index))]
+        elif op == "bezier_cubic":
+            shapes = _stroke(_bezier(draw_list.polygon(index), int(a[3])), a[2], False)
+        elif op == "push_clip":
+            shapes = [("clip", (a[0], a[1], a[2], a[3], a[4] != 0))]
+        elif op == "pop_clip":
+            shapes = [("unclip", None)]
+        else:
+            continue
+        yield color, shapes
+
+
+def _extent(shapes):
+    right = bottom = 0.0
+    for kind, data in shapes:
+        if kind == "poly":
+            for x, y in data:
+                right, bottom = max(right, x), max(bottom, y)
+        elif kind in ("disc", "ring"):
+            right, bottom = max(right, data[0] + data[2]), max(bottom, data[1] + data[2])
+    return right, bottom
+
+
+class _Canvas:
+    def __init__(self, width, height, background):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+        self.clips = [(0, 0, width, height)]
+
+    def span(self, y, left, right, rgba):
+        """Pixels of row y whose centers lie in [left, right)."""
+        cx0, cy0, cx1, cy1 = self.clips[-1]
+        if y < cy0 or y >= cy1:
+            return
+        x0 = max(int(math.ceil(left - 0.5)), int(cx0))
+        x1 = min(int(math.ceil(right - 0.5)), int(cx1))
+        if x1 <= x0:
+            return
+        r, g, b, a = rgba
+        start, end = (y * self.width + x0) * 3, (y * self.width + x1) * 3
+        if a == 255:
+            self.pixels[start:end] = bytes((r, g, b)) * (x1 - x0)
+        elif a:
+            pixels, keep = self.pixels, 255 - a
+            for i in range(start, end, 3):
+                pixels[i] = (r * a + pixels[i] * keep) // 255
+                pixels[i + 1] = (g * a + pixels[i + 1] * keep) // 255
+                pixels[i + 2] = (b * a + pixels[i + 2] * keep) // 255
+
+    def rows(self, top, bottom):
+        cy0, cy1 = self.clips[-1][1], self.clips[-1][3]
+        return range(max(int(math.floor(top)), int(cy0), 0),
+                     min(int(math.ceil(bottom)), int(cy1), self.height))
+
+    def polygon(self, points, rgba):
+        """Even-odd scanline fill, sampled at pixel centers."""
+        if len(points) < 3:
+            return
+        ys = [y for _, y in points]
+        for y in self.rows(min(ys), max(ys)):
+            cy = y + 0.5
+            crossings = []
+            for i, (x0, y0) in enumerate(points):
+                x1, y1 = points[i - 1]
+                if (y0 <= cy) != (y1 <= cy):
+                    crossings.append(x0 + (cy - y0) * (x1 - x0) / (y1 - y0))
+            crossings.sort()
+            for left, right in zip(crossings[0::2], crossings[1::2]):
+                self.span(y, left, right, rgba)
+
+    def disc(self, x, y, radius, thickness, rgba):
+        outer = radius + (thickness / 2 if thickness else 0)
+        inner = radius - thickness / 2 if thickness else -1
+        for row in self.rows(y - outer, y + outer):
+            dy = row + 0.5 - y
+            if abs(dy) >= outer:
+                continue
+            half = math.sqrt(outer * outer - dy * dy)
+            if inner > 0 and abs(dy) < inner:
+                hole = math.sqrt(inner * inner - dy * dy)
+                self.span(row, x - half, x - hole, rgba)
+                self.span(row, x + hole, x + half, rgba)
+            else:
+                self.span(row, x - half, x + half, rgba)
+
+    def push_clip(self, x0, y0, x1, y1, intersect):
+        if intersect:
+            cx0, cy0, cx1, cy1 = self.clips[-1]
+            x0, y0, x1, y1 = max(x0, cx0), max(y0, cy0), min(x1, cx1), min(y1, cy1)
+        self.clips.append((max(0, x0), max(0, y0), min(self.width, x1), min(self.height, y1)))
+
+    def pop_clip(self):
+        if len(self.clips) > 1:
+            self.clips.pop()
+
+
+def _list_order(draw_list):
+    """Background first and foreground last, as ImGui composites them."""
+    return {"##Background": 0, "##Foreground": 2}.get(draw_list.name, 1)
+
+
+def rasterize(frame, width=None, height=None, background=(0, 0, 0)):
+    """(width, height, RGB bytearray) of a frame's draw lists.
+
+    Without a size the canvas reaches the right- and bottom-most shape.
+    """
+    commands = [(color, shapes)
+                for draw_list in sorted(frame.lists, key=_list_order)
+                for color, shapes in _shapes(draw_list)]
+    if not width or not height:
+        right = bottom = 1.0
+        for _, shapes in commands:
+            r, b = _extent(shapes)
+            right, bottom = max(right, r), max(bottom, b)
+        width = width or min(MAX_CANVAS, int(math.ceil(right)) + 1)
+        height = height or min(MAX_CANVAS, int(math.ceil(bottom)) + 1)
+    canvas = _Canvas(width, height, background)
+    for color, shapes in commands:
+        rgba = _rgba(color)
+        for kind, data in shapes:
+            if kind == "poly":
+                canvas.polygon(data, rgba)
+            elif kind == "disc":
+                canvas.disc(data[0], data[1], data[2], None, rgba)
+            elif kind == "ring":
+                canvas.disc(data[0], data[1], data[2], data[3], rgba)
+            elif kind == "clip":
+                canvas.push_clip(*data)
+            else:
+                canvas.pop_clip()
+    return width, height, canvas.pixels
+
+
+def write_png(path, width, height, pixels):
+    """An 8-bit RGB PNG, written with zlib alone."""
+    stride = width * 3
+    raw = b"".join(b"\x00" + bytes(pixels[y * stride:(y + 1) * stride]) for y in range(height))
+
+    def chunk(tag, body):
+        return (struct.pack(">I", len(body)) + tag + body +
+                struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF))
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_bytes(b"\x89PNG\r\n\x1a\n" +
+                           chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+                           chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+
+# ------------------------------------------------------------------ reports
+
+def _format_counts(counts):
+    return ", ".join(f"{name} {count}" for name, count in
+                     sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+def summarize(frames, stream=None):
+    """Print commands per frame, per op and per list."""
+    stream = stream or sys.stdout
+    if not frames:
+        print("No frames recorded", file=stream)
+        return
+    per_frame = [frame.commands() for frame in frames]
+    totals, lists = {}, {}
+    for frame in frames:
+        for draw_list in frame.lists:
+            lists[draw_list.name] = lists.get(draw_list.name, 0) + len(draw_list)
+            for name, count in draw_list.counts().items():
+                totals[name] = totals.get(name, 0) + count
+    print(f"{len(frames)} frames, {sum(per_frame)} commands in {len(lists)} draw lists "
+          f"(per frame: min {min(per_frame)}, mean {sum(per_frame) / len(frames):.1f}, "
+          f"max {max(per_frame)})", file=stream)
+    if totals:
+        print(f"  by op:   {_format_counts(totals)}", file=stream)
+        print(f"  by list: {_format_counts(lists)}", file=stream)
+    if len(frames) <= MAX_FRAMES_LISTED:
+        for frame in frames:
+            print(f"  frame {frame.frame:5}: {frame.commands():6} commands  "
+                  f"{_format_counts(frame.counts())}", file=stream)
+
+
+def _pick_frame(frames, number):
+    if number is None:
+        drawn = [frame for frame in frames if frame.lists]
+        return drawn[-1] if drawn else None
+    return next((frame for frame in frames if frame.frame == number), None)
+
+
+def drawlist_paths(path, png=None, frame=None, size=None, stream=None):
+    """Summarize a recording and optionally rasterize one frame (default: the last drawn).
+
+    Returns False when the recording cannot be read or the frame is missing.
+    """
+    stream = stream or sys.stdout
+    try:
+        frames = read_draw_lists(path)
+    except (OSError, DrawListError) as error:
+        print(f"Cannot read draw lists: {error}", file=stream)
+        return False
+    summarize(frames, stream)
+    if not png:
+        return True
+    chosen = _pick_frame(frames, frame)
+    if chosen is None:
+        print(f"No frame {frame if frame is not None else 'with draw lists'} to rasterize",
+              file=stream)
+        return False
+    width, height = size or (None, None)
+    width, height, pixels = rasterize(chosen, width, height)
+    write_png(png, width, height, pixels)
+    print(f"Frame {chosen.frame} rasterized to {png} ({width}x{height})", file=stream)
+    return True
+
+
+def record_draw_lists(script, package_dir, output=None, png=None, frame=None, size=None,
+                      lua="lua", timeout=DEFAULT_TIMEOUT, stream=None):
+    """Run one script with draw lists recorded, then summarize the recording.
+
+    Returns True when the script passed and the recording could be read.
+    """
+    stream = stream or sys.stdout
+    script = Path(script).resolve()
+    output = Path(output or script.with_suffix(".evdl")).resolve()
+    saved = os.environ.get(ENV_VAR)
+    os.environ[ENV_VAR] = str(output)
+    try:
+        if output.exists():
+            output.unlink()
+        result = run_test_file(script, package_dir, lua, timeout)
+    finally:
+        if saved is None:
+            os.environ.pop(ENV_VAR, None)
+        else:
+            os.environ[ENV_VAR] = saved
+    if not output.exists():
+        print(f"No draw lists written ({result.status})", file=stream)
+        print(result.output.rstrip(), file=stream)
+        return False
+    print(f"Script {result.status} in {result.duration:.2f}s", file=stream)
+    if not result.ok:
+        print(result.output.rstrip(), file=stream)
+    recorded = drawlist_paths(output, png=png, frame=frame, size=size, stream=stream)
+    print(f"\nDraw lists written to {output}", file=stream)
+    return result.ok and recorded
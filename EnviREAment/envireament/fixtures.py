@@ -0,0 +1,190 @@
+"""
+Project fixtures for the virtual REAPER environment.
+
+A fixture is one file the Lua mock can load lazily with
+``VirtualReaper.load_fixture(path)``:
+
+    -- EnviREAment fixture v2 header=<bytes>
+    <Lua header chunk: tempo, markers, track headers (with FX) and chunk offsets>
+    <one Lua chunk per track: that track's items as columns>
+
+Track chunks are written to disk as soon as a track is complete, so only
+the small header stays in memory while a fixture is produced. MIDI takes
+are stored as packed event buffers in the ``MIDI_GetAllEvts`` format.
+Chunks are Latin-1 text: string literals keep their bytes as they are and
+escape only what a quoted Lua string cannot hold, so packed MIDI stays
+close to its binary size. Version 1 escaped every unprintable byte; the
+mock still loads it.
+"""
+
+import math
+import os
+import shutil
+import struct
+import tempfile
+
+FIXTURE_VERSION = 2
+FIXTURE_MAGIC = f"-- EnviREAment fixture v{FIXTURE_VERSION}"
+FIXTURE_EXTENSION = ".envfx"
+
+# Event flags used in packed MIDI buffers
+MIDI_FLAG_SELECTED = 1
+MIDI_FLAG_MUTED = 2
+
+# Bytes a quoted Lua string cannot hold as they are; the backslash goes first
+_ESCAPES = [(bytes([byte]), b"\\%03d" % byte) for byte in b'\\"\n\r\0']
+
+
+def lua_string(value):
+    """Quote a str or bytes value as a Lua string literal (one char per byte)."""
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    for byte, escape in _ESCAPES:
+        if byte in value:
+            value = value.replace(byte, escape)
+    return '"' + value.decode("latin-1") + '"'
+
+
+def lua_literal(value):
+    """Serialize plain Python data (dict/list/str/number/bool/None) as Lua."""
+    if value is None:
+        return "nil"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            raise ValueError(f"Cannot write {value!r} to a fixture")
+        return repr(value)
+    if isinstance(value, (str, bytes)):
+        return lua_string(value)
+    if isinstance(value, dict):
+        return "{" + ",".join(
+            f"{key}={lua_literal(item)}" for key, item in value.items() if item is not None
+        ) + "}"
+    if isinstance(value, (list, tuple)):
+        return "{" + ",".join(lua_literal(item) for item in value) + "}"
+    raise TypeError(f"Cannot write {type(value).__name__} to a fixture")
+
+
+def pack_midi_event(offset, flags, message):
+    """Pack one event as <int32 tick offset><flag byte><int32 length><bytes>."""
+    return struct.pack("<iBi", offset, flags, len(message)) + bytes(message)
+
+
+def _items_to_columns(items):
+    return {
+        "position": [float(item.get("position", 0.0)) for item in items],
+        "length": [float(item.get("length", 1.0)) for item in items],
+        "mute": [bool(item.get("mute", False)) for item in items],
+        "selected": [bool(item.get("selected", False)) for item in items],
+        "active_take": [int(item.get("active_take", 1)) for item in items],
+        "takes": [
+            [
+                {"name": take.get("name", ""), "source": take.get("source", ""),
+                 "midi": take.get("midi")}
+                for take in item.get("takes", ())
+            ]
+            for item in items
+        ],
+    }
+
+
+def _booleans(values):
+    return ",".join("true" if value else "false" for value in values)
+
+
+def _columns_chunk(columns):
+    """One track's item columns as a Lua chunk; whole columns are joined at once."""
+    parts = [
+        f"count={len(columns['position'])}",
+        "position={" + ",".join(map(repr, columns["position"])) + "}",
+        "length={" + ",".join(map(repr, columns["length"])) + "}",
+        "mute={" + _booleans(columns["mute"]) + "}",
+        "selected={" + _booleans(columns["selected"]) + "}",
+        "active_take={" + ",".join(map(str, columns["active_take"])) + "}",
+        "takes=" + lua_literal(columns["takes"]),
+    ]
+    return ("return {" + ",".join(parts) + "}\n").encode("latin-1")
+
+
+class FixtureWriter:
+    """Stream a project fixture to disk one track at a time."""
+
+    def __init__(self, path, tempo=120.0):
+        self.path = str(path)
+        self.tempo = float(tempo)
+        self.tracks = []
+        self.markers = []
+        self.item_count = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        self._body = tempfile.TemporaryFile(dir=directory)
+        self._offset = 0
+
+    def add_marker(self, pos, name="", isrgn=False, rgnend=None, number=None, color=0):
+        """Add a marker, or a region when isrgn is set."""
+        self.markers.append({
+            "isrgn": bool(isrgn),
+            "pos": float(pos),
+            "rgnend": float(rgnend if rgnend is not None else pos),
+            "name": name,
+            "number": number,
+            "color": int(color),
+        })
+
+    def add_track(self, header, items=()):
+        """Write one track. header holds track fields; items are dicts with
+        position/length/mute/selected/active_take and a list of takes
+        (name, source, and midi bytes for MIDI takes)."""
+        self.add_track_columns(header, _items_to_columns(list(items)))
+
+    def add_track_columns(self, header, columns):
+        """Write one track whose items are already columns: equal-length
+        position, length, mute, selected and active_take lists, and takes
+        (one list of take dicts per item). header may list the track's
+        FX as {"name": ..., "enabled": ...} dicts under "fx"."""
+        count = len(columns["position"])
+        track = dict(header)
+        track["items"] = count
+        if count:
+            chunk = _columns_chunk(columns)
+            self._body.write(chunk)
+            track["offset"] = self._offset
+            track["size"] = len(chunk)
+            self._offset += len(chunk)
+        self.tracks.append(track)
+        self.item_count += count
+
+    def close(self):
+        """Write the header followed by the track chunks."""
+        if self._body is None:
+            return
+        header = ("return " + lua_literal({
+            "version": FIXTURE_VERSION,
+            "tempo": self.tempo,
+            "item_count": self.item_count,
+            "tracks": self.tracks,
+            "markers": self.markers,
+        }) + "\n").encode("latin-1")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(f"{FIXTURE_MAGIC} header={len(header)}\n".encode("ascii"))
+            out.write(header)
+            self._body.seek(0)
+            shutil.copyfileobj(self._body, out)
+        os.replace(tmp_path, self.path)
+        self._body.close()
+        self._body = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._body is not None:
+            self._body.close()
+            self._body = None
@@ -0,0 +1,198 @@
+"""
+Synthetic project fixtures for stress tests.
+
+``generate_fixture`` builds a large project from a seed and streams it
+through a FixtureWriter, one track at a time, so the size of the scenario
+is bounded by disk rather than memory. The same seed and settings always
+produce the same file.
+
+Two random streams keep the layout stable when only the content changes:
+one seeded by the seed alone decides the folder hierarchy and markers, and
+one per track (seed and track number) fills in that track's FX, items,
+takes and MIDI. Item properties are produced as whole columns, and each
+MIDI take is packed with one pass of a precompiled struct over its event
+columns.
+"""
+
+import os
+import random
+import struct
+import time
+from pathlib import Path
+
+from .fixtures import MIDI_FLAG_SELECTED, FixtureWriter
+from .rpp import CUSTOM_COLOR_FLAG, MOCK_PPQ
+
+# <int32 tick offset><flag byte><int32 length = 3><status><data1><data2>
+_SHORT_EVENT = struct.Struct("<iBiBBB")
+
+_FX_NAMES = (
+    "VST: ReaEQ (Cockos)", "VST: ReaComp (Cockos)", "VST: ReaDelay (Cockos)",
+    "VST: ReaVerbate (Cockos)", "VST: ReaGate (Cockos)", "VST: ReaLimit (Cockos)",
+    "VST: ReaXcomp (Cockos)", "VST: ReaPitch (Cockos)", "JS: Saturation",
+    "JS: Stereo Width", "VSTi: ReaSynth (Cockos)", "VSTi: ReaSamplOmatic5000 (Cockos)",
+)
+_REGION_NAMES = ("Intro", "Verse", "Pre-Chorus", "Chorus", "Bridge", "Solo", "Outro")
+
+# Chance that a track opens a folder, and that a track inside one closes it
+FOLDER_OPEN_CHANCE = 0.15
+FOLDER_CLOSE_CHANCE = 0.3
+
+
+def folder_depths(rng, tracks, max_depth):
+    """I_FOLDERDEPTH of each track: 1 opens a folder, -n closes n levels.
+
+    Yields (depth change, nesting level of the track) one track at a time.
+    """
+    depth = 0
+    for index in range(tracks):
+        if index == tracks - 1:
+            change = -depth
+        elif depth < max_depth and rng.random() < FOLDER_OPEN_CHANCE:
+            change = 1
+        elif depth > 0 and rng.random() < FOLDER_CLOSE_CHANCE:
+            change = -rng.randint(1, depth)
+        else:
+            change = 0
+        yield change, depth
+        depth += change
+
+
+def _markers(rng, writer, markers, regions, length):
+    positions = sorted(rng.random() * length for _ in range(markers))
+    for number, pos in enumerate(positions, 1):
+        writer.add_marker(round(pos, 6), f"Marker {number}", number=number)
+    if regions:
+        span = length / regions
+        for index in range(regions):
+            start = index * span + rng.random() * span * 0.1
+            end = start + span * (0.6 + rng.random() * 0.3)
+            name = f"{_REGION_NAMES[index % len(_REGION_NAMES)]} {index // len(_REGION_NAMES) + 1}"
+            writer.add_marker(round(start, 6), name, True, round(end, 6), markers + index + 1,
+                              CUSTOM_COLOR_FLAG | rng.randrange(0x1000000))
+
+
+def pack_midi_take(rng, seconds, tempo, notes_per_second):
+    """A packed MIDI buffer of random notes and mod wheel CCs over seconds.
+
+    Returns (buffer, event count).
+    """
+    span = max(1, int(seconds * tempo / 60.0 * MOCK_PPQ))
+    notes = max(1, int(notes_per_second * seconds))
+    ccs = notes // 2
+    random_ = rng.random
+    starts = [int(random_() * span) for _ in range(notes)]
+    lengths = [MOCK_PPQ // 8 + int(random_() * MOCK_PPQ) for _ in range(notes)]
+    pitches = [36 + int(random_() * 60) for _ in range(notes)]
+    velocities = [40 + int(random_() * 87) for _ in range(notes)]
+    # (tick, order, status, data1, data2): note-offs sort before note-ons on the same tick
+    events = [(start, 1, 0x90, pitch, velocity)
+              for start, pitch, velocity in zip(starts, pitches, velocities)]
+    events += [(min(span, start + length), 0, 0x80, pitch, 0)
+               for start, length, pitch in zip(starts, lengths, pitches)]
+    events += [(int(random_() * span), 2, 0xB0, 1, int(random_() * 128)) for _ in range(ccs)]
+    events.sort()
+    ticks = [event[0] for event in events]
+    deltas = [ticks[0]] + [b - a for a, b in zip(ticks, ticks[1:])]
+    flags = [MIDI_FLAG_SELECTED if random_() < 0.05 else 0 for _ in events]
+    buffer = b"".join(map(_SHORT_EVENT.pack, deltas, flags, [3] * len(events),
+                          [event[2] for event in events], [event[3] for event in events],
+                          [event[4] for event in events]))
+    return buffer, len(events)
+
+
+def _track(seed, index, change, settings):
+    """Header and item columns of one track, from its own random stream."""
+    rng = random.Random(seed * 1000003 + index)
+    is_folder = change == 1
+    is_midi = not is_folder and rng.random() < settings["midi_ratio"]
+    kind = "Bus" if is_folder else "Synth" if is_midi else "Audio"
+    fx_count = rng.randint(0, 2 * settings["fx"]) if settings["fx"] else 0
+    header = {
+        "name": f"{kind} {index + 1}",
+        "volume": round(0.2 + rng.random() * 0.8, 4),
+        "pan": round(rng.random() * 2.0 - 1.0, 4),
+        "color": CUSTOM_COLOR_FLAG | rng.randrange(0x1000000),
+        "mute": rng.random() < 0.05,
+        "solo": 0,
+        "selected": rng.random() < 0.02,
+        "folder_depth": change,
+        "fx": [{"name": rng.choice(_FX_NAMES), "enabled": rng.random() > 0.1}
+               for _ in range(fx_count)] or None,
+    }
+    target = 0 if is_folder else settings["items"]
+    count = rng.randint(target // 2, target + target // 2) if target else 0
+    if not count:
+        return header, {"position": []}, 0, 0
+    random_ = rng.random
+    slot = settings["length"] / count
+    gaps = [random_() * slot * 0.3 for _ in range(count)]
+    lengths = [round(slot * (0.35 + random_() * 0.35), 6) for _ in range(count)]
+    positions = [round(n * slot + gap, 6) for n, gap in enumerate(gaps)]
+    take_counts = [rng.randint(1, settings["takes"]) for _ in range(count)]
+    takes = []
+    midi_events = 0
+    for item, (take_count, seconds) in enumerate(zip(take_counts, lengths), 1):
+        item_takes = []
+        for take in range(1, take_count + 1):
+            name = f"{header['name']} #{item}.{take}"
+            if is_midi:
+                buffer, events = pack_midi_take(rng, seconds, settings["tempo"],
+                                                settings["notes_per_second"])
+                midi_events += events
+                item_takes.append({"name": name, "source": "MIDI", "midi": buffer})
+            else:
+                item_takes.append({"name": name, "source": "WAVE"})
+        takes.append(item_takes)
+    columns = {
+        "position": positions,
+        "length": lengths,
+        "mute": [random_() < 0.03 for _ in range(count)],
+        "selected": [random_() < 0.01 for _ in range(count)],
+        "active_take": [rng.randint(1, n) for n in take_counts],
+        "takes": takes,
+    }
+    return header, columns, sum(take_counts), midi_events
+
+
+def generate_fixture(path, seed=0, tracks=1000, items=20, takes=2, fx=2, markers=100,
+                     regions=16, folder_depth=4, midi_ratio=0.25, notes_per_second=8.0,
+                     length=600.0, tempo=120.0, progress=None):
+    """Write a synthetic project fixture and return a summary.
+
+    items, fx and takes are per-track averages (takes: at most per item);
+    length is the project length in seconds. progress, when given, is
+    called with the number of tracks written so far.
+    """
+    started = time.time()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    settings = {"items": items, "takes": max(1, takes), "fx": fx, "midi_ratio": midi_ratio,
+                "notes_per_second": notes_per_second, "length": float(length),
+                "tempo": float(tempo)}
+    layout = random.Random(seed)
+    counts = {"takes": 0, "midi_events": 0, "fx": 0, "folders": 0, "deepest": 0}
+    with FixtureWriter(path, tempo) as writer:
+        _markers(layout, writer, markers, regions, float(length))
+        for index, (change, level) in enumerate(folder_depths(layout, tracks, folder_depth)):
+            header, columns, take_count, midi_events = _track(seed, index, change, settings)
+            writer.add_track_columns(header, columns)
+            counts["takes"] += take_count
+            counts["midi_events"] += midi_events
+            counts["fx"] += len(header["fx"] or ())
+            counts["folders"] += change == 1
+            counts["deepest"] = max(counts["deepest"], level + (change == 1))
+            if progress and (index + 1) % 100 == 0:
+                progress(index + 1)
+    return {
+        "fixture": str(path),
+        "tracks": len(writer.tracks),
+        "folders": counts["folders"],
+        "deepest": counts["deepest"],
+        "items": writer.item_count,
+        "takes": counts["takes"],
+        "fx": counts["fx"],
+        "markers": len(writer.markers),
+        "midi_events": counts["midi_events"],
+        "bytes": os.path.getsize(str(path)),
+        "seconds": time.time() - started,
+    }
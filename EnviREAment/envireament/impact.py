@@ -0,0 +1,437 @@
+"""
+Change-impact test selection.
+
+Given the files that changed (from ``git diff`` or named explicitly), pick
+the test scripts that could be affected and skip the rest. A test is
+affected when:
+
+* a file in its require/dofile closure changed (deps.py), or
+* ``enhanced_virtual_reaper.lua`` changed in a way that reaches an API the
+  test, or anything in its closure, mentions.
+
+Edits to the mock are narrowed by diff hunks. Each changed line is mapped
+to the ``mock_reaper`` entry or top-level definition containing it. The
+change then spreads through everything that references those names, so
+editing a helper such as ``insert_event`` reaches every MIDI API that calls
+it. Edits that reach top-level code (the command-line block) or shared
+state (a top-level table or value such as ``VirtualState``, built when the
+mock loads and read by any API) cannot be narrowed and select every test, as do edits to a package module
+the mock requires or loads as an engine (the ``envireament_*.lua`` files
+beside it, such as ``envireament_scenario.lua``).
+"""
+
+import re
+import subprocess
+from pathlib import Path
+
+from . import lualex
+from .deps import DependencyScanner, stat_key
+
+MOCK_SCRIPT = "enhanced_virtual_reaper.lua"
+
+# Block openers and closers; `while`/`for` open with their `do`
+_BLOCK_OPEN = frozenset(("function", "if", "do", "repeat"))
+_BLOCK_CLOSE = frozenset(("end", "until"))
+_CONTINUES = frozenset(("(", "[", "{", ",", "=", "..", "+", "-", "*", "/", "%", "^",
+                        "==", "~=", "<", ">", "<=", ">=", "and", "or", "not"))
+
+# What `lua enhanced_virtual_reaper.lua --test` calls for every test
+TEST_ENTRY_POINTS = frozenset(("run_test_script", "create_environment"))
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", re.M)
+
+
+class Definition:
+    """A top-level statement or ``mock_reaper`` entry and the names it uses."""
+
+    __slots__ = ("name", "first", "last", "refs", "entry", "exported", "shared")
+
+    def __init__(self, name, first, entry=False, exported=False, shared=False):
+        self.name = name          # None for anonymous top-level code
+        self.first = first
+        self.last = first
+        self.refs = set()
+        self.entry = entry        # a mock_reaper field
+        self.exported = exported  # function Module.name(...)
+        self.shared = shared      # a top-level value other than a function
+
+    def __repr__(self):
+        return f"<Definition {self.name or '<top level>'} {self.first}-{self.last}>"
+
+
+def _statement_name(tokens, i):
+    """(name defined by the top-level statement at i or None, exported, shared).
+
+    shared is True for ``name = value`` where the value is not a function.
+    """
+    n = len(tokens)
+    words = []
+    j = i
+    if tokens[j].value == "local":
+        j += 1
+    if j < n and tokens[j].value == "function":
+        j += 1
+    while j < n and tokens[j].kind == lualex.NAME:
+        words.append(tokens[j].value)
+        if j + 1 < n and tokens[j + 1].value in (".", ":"):
+            j += 2
+        else:
+            j += 1
+            break
+    if not words:
+        return None, False, False
+    if tokens[i].value == "function":
+        return words[-1], len(words) > 1, False
+    if tokens[i].value == "local" and tokens[i + 1].value == "function":
+        return words[-1], False, False
+    # Assignment: `local name = ...`, `name = ...` or `a.b = ...`
+    while j < n and tokens[j].value == "," or j < n and tokens[j].kind == lualex.NAME \
+            and tokens[j - 1].value == ",":
+        j += 1
+    if j < n and tokens[j].value == "=":
+        return words[-1], False, not (j + 1 < n and tokens[j + 1].value == "function")
+    if tokens[i].value == "local":
+        return words[-1], False, False  # forward declaration
+    return None, False, False
+
+
+def outline(source):
+    """Split a Lua file into top-level definitions and ``mock_reaper`` entries.
+
+    Each definition runs from its first line up to the line before the next
+    one, so comments and blank lines belong to the definition above them.
+    """
+    tokens = lualex.tokenize(source)
+    definitions = []
+    current = None
+    block = bracket = 0
+    table = None  # bracket depth of the open mock_reaper table
+    for i, token in enumerate(tokens):
+        value = token.value
+        prev = tokens[i - 1] if i else None
+        starts_line = prev is None or prev.line < token.line
+        if block == 0 and bracket == 0 and starts_line and not (
+                prev is not None and prev.value in _CONTINUES):
+            table = None
+            name, exported, shared = _statement_name(tokens, i)
+            current = Definition(name, token.line, exported=exported, shared=shared)
+            definitions.append(current)
+        elif table is not None and bracket == table and block == 0 \
+                and token.kind == lualex.NAME and prev.value in ("{", ",") \
+                and i + 1 < len(tokens) and tokens[i + 1].value == "=":
+            current = Definition(value, token.line, entry=True)
+            definitions.append(current)
+        if token.kind == lualex.KEYWORD:
+            if value in _BLOCK_OPEN:
+                block += 1
+            elif value in _BLOCK_CLOSE:
+                block -= 1
+        elif token.kind == lualex.OP:
+            if value in ("(", "[", "{"):
+                bracket += 1
+                if value == "{" and block == 0 and bracket == 1 and current is not None \
+                        and current.name == "mock_reaper" and not current.entry:
+                    table = bracket
+            elif value in (")", "]", "}"):
+                bracket -= 1
+        if current is not None and (token.kind == lualex.NAME or
+                                    token.kind == lualex.STRING and not current.shared):
+            # Strings in a shared table are data, not references
+            current.refs.add(value)
+    for definition, following in zip(definitions, definitions[1:]):
+        definition.last = max(definition.first, following.first - 1)
+    if definitions:
+        definitions[-1].last = max(definitions[-1].first, source.count("\n") + 1)
+    return definitions
+
+
+def changed_definitions(definitions, lines):
+    """Definitions overlapping any of the given (first, last) line ranges."""
+    hit = []
+    for definition in definitions:
+        for first, last in lines:
+            if first <= definition.last and last >= definition.first:
+                hit.append(definition)
+                break
+    return hit
+
+
+class MockImpact:
+    """What an edit to the mock reaches: API/module names, or everything."""
+
+    def __init__(self, names=(), everything=False, reason=""):
+        self.names = set(names)
+        self.everything = everything
+        self.reason = reason
+
+    def __bool__(self):
+        return self.everything or bool(self.names)
+
+
+def spread(definitions, changed):
+    """Follow references from changed definitions to everything they reach.
+
+    Exported module functions are entry points: top-level code that calls
+    them (the command-line block) is not followed, since tests call them by
+    name and are selected that way.
+    """
+    users = {}
+    for definition in definitions:
+        for name in definition.refs:
+            users.setdefault(name, []).append(definition)
+    reached = {}
+    queue = list(changed)
+    while queue:
+        definition = queue.pop()
+        if id(definition) in reached:
+            continue
+        reached[id(definition)] = definition
+        if definition.name is None:
+            continue
+        for user in users.get(definition.name, ()):
+            if user.name is not None or not definition.exported:
+                queue.append(user)
+    return list(reached.values())
+
+
+def mock_impact(old_source, new_source, old_lines, new_lines):
+    """Narrow a mock diff to the API names it can affect.
+
+    old_lines/new_lines are changed (first, last) ranges on each side of
+    the diff, as parsed by parse_hunks().
+    """
+    changed = []
+    for source, lines in ((old_source, old_lines), (new_source, new_lines)):
+        if source is None or not lines:
+            continue
+        definitions = outline(source)
+        for definition in spread(definitions, changed_definitions(definitions, lines)):
+            if definition.name is None:
+                return MockImpact(everything=True, reason=f"top-level code at line {definition.first}")
+            if definition.shared:
+                return MockImpact(everything=True,
+                                  reason=f"shared {definition.name} at line {definition.first}")
+            if definition.name in TEST_ENTRY_POINTS:
+                return MockImpact(everything=True, reason=f"{definition.name} runs every test")
+            changed.append(definition.name)
+    return MockImpact(changed)
+
+
+def parse_hunks(diff_text):
+    """(old ranges, new ranges) of changed lines from a ``git diff -U0``."""
+    old, new = [], []
+    for match in _HUNK_RE.finditer(diff_text):
+        old_start, old_count = int(match.group(1)), int(match.group(2) or 1)
+        new_start, new_count = int(match.group(3)), int(match.group(4) or 1)
+        if old_count:
+            old.append((old_start, old_start + old_count - 1))
+        if new_count:
+            new.append((new_start, new_start + new_count - 1))
+    return old, new
+
+
+def _git(directory, *args):
+    completed = subprocess.run(
+        ["git"] + list(args), cwd=str(directory),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        universal_newlines=True, encoding="utf-8", errors="replace",
+    )
+    if completed.returncode != 0:
+        return None
+    return completed.stdout
+
+
+def git_changed_files(directory, base="HEAD"):
+    """Files changed in the working tree relative to base, plus untracked ones.
+
+    Returns absolute paths, or None when directory is not in a git checkout.
+    """
+    top = _git(directory, "rev-parse", "--show-toplevel")
+    if top is None:
+        return None
+    top = Path(top.strip())
+    names = _git(top, "diff", "--name-only", "--no-renames", base)
+    if names is None:
+        raise ValueError(f"Cannot diff against {base!r}")
+    untracked = _git(top, "ls-files", "--others", "--exclude-standard") or ""
+    return {(top / name).resolve() for name in (names + untracked).splitlines() if name}
+
+
+def git_mock_impact(mock_path, base="HEAD"):
+    """MockImpact of the mock's working-tree changes relative to base."""
+    mock_path = Path(mock_path).resolve()
+    top = _git(mock_path.parent, "rev-parse", "--show-toplevel")
+    if top is None:
+        return MockImpact(everything=True, reason="mock changed outside git")
+    top = Path(top.strip())
+    relative = mock_path.relative_to(top).as_posix()
+    diff = _git(top, "diff", "-U0", "--no-color", "--no-ext-diff", base, "--", relative)
+    old_source = _git(top, "show", f"{base}:{relative}")
+    if not diff or old_source is None:
+        return MockImpact(everything=True, reason="mock changed with no usable diff")
+    try:
+        new_source = mock_path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return MockImpact(everything=True, reason="mock deleted")
+    old_lines, new_lines = parse_hunks(diff)
+    return mock_impact(old_source, new_source, old_lines, new_lines)
+
+
+def _uses_any_api(tokens):
+    """reaper[expr] with a computed key could reach any API."""
+    for i in range(len(tokens) - 2):
+        if tokens[i].value == "reaper" and tokens[i + 1].value == "[" \
+                and tokens[i + 2].kind != lualex.STRING:
+            return True
+    return False
+
+
+# The mock loads its engines with require_engine("envireament_...") or
+# pcall(require_engine, "envireament_..."), which the dependency scanner
+# sees only as a require with a computed name
+ENGINE_LOADER = "require_engine"
+
+_engine_scans = {}  # mock path -> (stat key, engine module names)
+
+
+def _engine_names(path):
+    key = stat_key(path)
+    cached = _engine_scans.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        tokens = lualex.tokenize(path.read_text(encoding="utf-8", errors="replace"))
+    except OSError:
+        tokens = []
+    names = [tokens[i + 2].value for i in range(len(tokens) - 2)
+             if tokens[i].value == ENGINE_LOADER and tokens[i + 1].value in ("(", ",")
+             and tokens[i + 2].kind == lualex.STRING]
+    _engine_scans[path] = (key, names)
+    return names
+
+
+def mock_modules(scanner, package_dir):
+    """Package modules the mock requires or loads as engines, which every
+    test runs under."""
+    package_dir = Path(package_dir)
+    mock = package_dir / MOCK_SCRIPT
+    modules = []
+    for name in scanner.scan(mock).requires + _engine_names(mock):
+        found = scanner.resolve_module(name, package_dir, [str(package_dir) + "/?.lua"])
+        if found and found not in modules:
+            modules.append(found)
+    return modules
+
+
+class ImpactGraph:
+    """Reverse dependency graph from changed files and APIs to tests."""
+
+    def __init__(self, package_dir, scanner=None):
+        self.package_dir = Path(package_dir).resolve()
+        self.mock_path = self.package_dir / MOCK_SCRIPT
+        self.scanner = scanner or DependencyScanner(self.package_dir)
+        self._names = {}
+        self.clear()
+
+    def clear(self):
+        """Drop every edge; file scans stay cached for the next build()."""
+        self.dependents = {}   # file -> tests whose closure includes it
+        self.api_users = {}    # identifier -> tests that mention it
+        self.any_api = set()   # tests that index reaper dynamically
+        self.missing = {}      # unresolved module/path -> tests
+
+    def build(self, tests):
+        self.clear()
+        for test in tests:
+            self.add_test(test)
+        return self
+
+    def _file_names(self, path):
+        """(identifiers and strings in path, uses reaper[expr]), by mtime/size."""
+        key = stat_key(path)
+        cached = self._names.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            source = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            source = ""
+        tokens = lualex.tokenize(source)
+        names = {t.value for t in tokens if t.kind in (lualex.NAME, lualex.STRING)}
+        value = (names, _uses_any_api(tokens))
+        self._names[path] = (key, value)
+        return value
+
+    def add_test(self, test):
+        test = Path(test).resolve()
+        closure = self.scanner.closure(test)
+        for path in closure.files:
+            self.dependents.setdefault(path, set()).add(test)
+            if path == self.mock_path:
+                continue
+            names, dynamic = self._file_names(path)
+            for name in names:
+                self.api_users.setdefault(name, set()).add(test)
+            if dynamic:
+                self.any_api.add(test)
+        for name in closure.missing:
+            # A missing dependency may be a file that was just deleted
+            key = name.replace("\\", "/")
+            if not key.endswith(".lua"):
+                key = key.replace(".", "/") + ".lua"
+            self.missing.setdefault(key.lstrip("./"), set()).add(test)
+
+    def affected(self, tests, changed, impact=None):
+        """Map each affected test to the reason it was selected."""
+        tests = [Path(t).resolve() for t in tests]
+        reasons = {}
+        modules = mock_modules(self.scanner, self.package_dir)
+        for path in changed:
+            path = Path(path).resolve()
+            if path == self.mock_path:
+                continue
+            if path in modules:
+                for test in tests:
+                    reasons.setdefault(test, f"mock module {path.name} changed")
+                continue
+            for test in self.dependents.get(path, ()):
+                reasons.setdefault(test, f"depends on {path.name}")
+            posix = path.as_posix()
+            for key, users in self.missing.items():
+                if posix.endswith("/" + key):
+                    for test in users:
+                        reasons.setdefault(test, f"depends on missing {key}")
+        if impact:
+            if impact.everything:
+                for test in tests:
+                    reasons.setdefault(test, f"mock changed ({impact.reason})")
+            else:
+                for name in sorted(impact.names):
+                    for test in self.api_users.get(name, ()):
+                        reasons.setdefault(test, f"uses {name}")
+                for test in self.any_api:
+                    reasons.setdefault(test, "indexes reaper dynamically")
+        return {test: reasons[test] for test in tests if test in reasons}
+
+
+def select_affected(tests, package_dir, changed=None, base="HEAD", root=None, scanner=None):
+    """Pick the tests affected by a change.
+
+    With changed=None the changed files come from git, relative to base,
+    in the checkout containing root (default: the current directory).
+    Returns (selected tests, {test: reason}, changed files).
+    """
+    package_dir = Path(package_dir).resolve()
+    if changed is None:
+        changed = git_changed_files(root or Path.cwd(), base)
+        if changed is None:
+            raise ValueError("Not a git checkout; pass the changed files explicitly")
+    else:
+        changed = {Path(path).resolve() for path in changed}
+    graph = ImpactGraph(package_dir, scanner).build(tests)
+    impact = None
+    if graph.mock_path in changed:
+        impact = git_mock_impact(graph.mock_path, base)
+    reasons = graph.affected(tests, changed, impact)
+    selected = [test for test in tests if Path(test).resolve() in reasons]
+    return selected, reasons, changed
@@ -0,0 +1,534 @@
+"""
+Token-stream lint rules for REAPER scripts.
+
+Rules declare the token sequences they care about, such as
+``reaper . <name>``. The engine indexes those patterns by their first token
+and walks each file's tokens once (lualex.py). Each position is offered
+only to the rules whose patterns can start there, so adding rules does not
+add passes over the file.
+
+A finding that is deliberate can be silenced on its line with a comment,
+``-- envireament-lint: disable=push-pop-balance`` (several ids separated by
+commas, or ``all``). The rule then ignores what is on that line, so a
+deliberate unmatched Push is left out of the file's balance as well.
+Keywords on the line still reach it, so block structure stays intact.
+
+``lint_paths`` lints whole trees in worker processes and caches each
+file's findings. A cached entry is reused while the file's contents, the
+rule set and the mock's API are all unchanged.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from . import lualex
+from .cache import DEFAULT_CACHE_DIR
+from .deps import stat_key
+from .impact import MOCK_SCRIPT, outline
+from .runner import SKIP_DIRS
+
+LINT_VERSION = 3
+DEFAULT_LINT_CACHE = DEFAULT_CACHE_DIR.parent / "lint.json"
+
+ERROR = "error"
+WARNING = "warning"
+
+_SUPPRESS_RE = re.compile(r"--\s*envireament-lint:\s*disable=([\w,-]+)")
+
+# ReaImGui names removed or renamed upstream, and what to use instead
+DEPRECATED_IMGUI = {
+    "ImGui_BeginChildFrame": "ImGui_BeginChild with ImGui_ChildFlags_FrameStyle",
+    "ImGui_EndChildFrame": "ImGui_EndChild",
+    "ImGui_ListBoxHeader": "ImGui_BeginListBox",
+    "ImGui_ListBoxFooter": "ImGui_EndListBox",
+    "ImGui_CaptureKeyboardFromApp": "ImGui_SetNextFrameWantCaptureKeyboard",
+    "ImGui_CaptureMouseFromApp": "ImGui_SetNextFrameWantCaptureMouse",
+    "ImGui_PushAllowKeyboardFocus": "ImGui_PushTabStop",
+    "ImGui_PopAllowKeyboardFocus": "ImGui_PopTabStop",
+    "ImGui_GetWindowContentRegionWidth": "ImGui_GetContentRegionAvail",
+    "ImGui_CalcListClipping": "ImGui_ListClipper",
+    "ImGui_SetItemAllowOverlap": "ImGui_SetNextItemAllowOverlap",
+    "ImGui_IsItemDeactivatedAfterChange": "ImGui_IsItemDeactivatedAfterEdit",
+    "ImGui_TreeNodeFlags_AllowItemOverlap": "ImGui_TreeNodeFlags_AllowOverlap",
+    "ImGui_SelectableFlags_AllowItemOverlap": "ImGui_SelectableFlags_AllowOverlap",
+    "ImGui_WindowFlags_AlwaysUseWindowPadding": "ImGui_ChildFlags_AlwaysUseWindowPadding",
+    "ImGui_Key_ModCtrl": "ImGui_Mod_Ctrl",
+    "ImGui_Key_ModShift": "ImGui_Mod_Shift",
+    "ImGui_Key_ModAlt": "ImGui_Mod_Alt",
+    "ImGui_Key_ModSuper": "ImGui_Mod_Super",
+    "ImGui_ModFlags_None": "ImGui_Mod_None",
+    "ImGui_ModFlags_Ctrl": "ImGui_Mod_Ctrl",
+    "ImGui_ModFlags_Shift": "ImGui_Mod_Shift",
+    "ImGui_ModFlags_Alt": "ImGui_Mod_Alt",
+    "ImGui_ModFlags_Super": "ImGui_Mod_Super",
+}
+
+
+class Any:
+    """Pattern item matching any token of one kind."""
+
+    __slots__ = ("kind",)
+
+    def __init__(self, kind):
+        self.kind = kind
+
+
+ANY_NAME = Any(lualex.NAME)
+
+
+class Issue:
+    __slots__ = ("path", "line", "rule", "severity", "message")
+
+    def __init__(self, path, line, rule, severity, message):
+        self.path = path
+        self.line = line
+        self.rule = rule
+        self.severity = severity
+        self.message = message
+
+    def to_dict(self):
+        return {"line": self.line, "rule": self.rule, "severity": self.severity,
+                "message": self.message}
+
+    @classmethod
+    def from_dict(cls, path, data):
+        return cls(path, data["line"], data["rule"], data["severity"], data["message"])
+
+    def __str__(self):
+        return f"{self.path}:{self.line}: {self.severity} [{self.rule}] {self.message}"
+
+
+class Rule(ABC):
+    """A lint rule: token patterns plus callbacks.
+
+    ``match`` is called at every position where one of ``patterns`` matches,
+    with the per-file state from ``start``; ``finish`` runs after the last
+    token. ``report(line, message)`` records an issue for this rule, at
+    its ``severity`` unless another one is passed as a third argument.
+    """
+
+    id = None
+    severity = WARNING
+    patterns = ()
+
+    def start(self):
+        return None
+
+    @abstractmethod
+    def match(self, state, tokens, i, report):
+        """Handle the tokens matching one of ``patterns`` at i."""
+
+    def finish(self, state, report):
+        pass
+
+
+def _call_args(tokens, i):
+    """Top-level argument token slices of the call whose "(" is at i."""
+    args, current, depth = [], [], 0
+    for j in range(i, len(tokens)):
+        token = tokens[j]
+        if token.kind == lualex.OP and token.value in ("(", "[", "{"):
+            depth += 1
+            if depth == 1:
+                continue
+        elif token.kind == lualex.OP and token.value in (")", "]", "}"):
+            depth -= 1
+            if depth == 0:
+                if current:
+                    args.append(current)
+                return args
+        elif depth == 1 and token.kind == lualex.OP and token.value == ",":
+            args.append(current)
+            current = []
+            continue
+        current.append(token)
+    return args
+
+
+class PushPopBalance(Rule):
+    """Every ImGui_Push<X> needs a matching ImGui_Pop<X> in the same file.
+
+    Pop counts given as literals (PopStyleColor(ctx, 3)) are honoured; a
+    computed count makes the pair uncheckable and it is skipped.
+
+    Each branch of an ``if`` is counted on its own, so the file's balance
+    is a range over the paths through it. A PopID in both the ``then`` and
+    the ``else`` branch of one if is a single pop. A range that misses zero
+    is an error. One that holds zero but other values too only balances on
+    some branches (a Push and its Pop under separate ifs on the same
+    condition) and is a warning. Loops and functions count once.
+    """
+
+    id = "push-pop-balance"
+    severity = ERROR
+    patterns = (("reaper", ".", ANY_NAME, "("), ("function",), ("do",), ("repeat",), ("if",),
+                ("elseif",), ("else",), ("end",), ("until",))
+
+    def start(self):
+        # Each frame is one open block: {"if": is an if, "net": {kind: [lo, hi]},
+        # "branches": closed branch nets, "else": seen an else}
+        return {"stack": [{"if": False, "net": {}, "branches": [], "else": False}],
+                "kinds": {}}
+
+    @staticmethod
+    def _add(net, other):
+        for kind, (lo, hi) in other.items():
+            current = net.setdefault(kind, [0, 0])
+            current[0] += lo
+            current[1] += hi
+
+    def _close(self, state):
+        stack = state["stack"]
+        if len(stack) < 2:
+            return
+        frame = stack.pop()
+        net = frame["net"]
+        if frame["if"]:
+            branches = frame["branches"] + [net]
+            if not frame["else"]:
+                branches.append({})
+            net = {}
+            for kind in set().union(*branches):
+                los, his = zip(*(branch.get(kind, (0, 0)) for branch in branches))
+                net[kind] = [min(los), max(his)]
+        self._add(stack[-1]["net"], net)
+
+    def match(self, state, tokens, i, report):
+        token = tokens[i]
+        stack = state["stack"]
+        if token.kind == lualex.KEYWORD:
+            if token.value in ("function", "do", "repeat", "if"):
+                stack.append({"if": token.value == "if", "net": {}, "branches": [],
+                              "else": False})
+            elif token.value in ("elseif", "else") and stack[-1]["if"]:
+                stack[-1]["branches"].append(stack[-1]["net"])
+                stack[-1]["net"] = {}
+                stack[-1]["else"] = token.value == "else"
+            elif token.value in ("end", "until"):
+                self._close(state)
+            return
+        name = tokens[i + 2].value
+        if not name.startswith("ImGui_"):
+            return
+        name = name[6:]
+        if name.startswith("Push"):
+            kind, delta = name[4:], 1
+        elif name.startswith("Pop"):
+            kind, delta = name[3:], -1
+            args = _call_args(tokens, i + 3)
+            if len(args) >= 2:
+                count = args[1]
+                if len(count) == 1 and count[0].kind == lualex.NUMBER:
+                    delta = -int(float(count[0].value))
+                else:
+                    delta = None
+        else:
+            return
+        entry = state["kinds"].setdefault(kind, {"pushes": 0, "pops": 0, "push_line": 0,
+                                                 "pop_line": 0, "unknown": False})
+        if delta is None:
+            entry["unknown"] = True
+            return
+        if delta > 0:
+            entry["pushes"] += delta
+            entry["push_line"] = token.line
+        else:
+            entry["pops"] -= delta
+            entry["pop_line"] = token.line
+        self._add(stack[-1]["net"], {kind: (delta, delta)})
+
+    def finish(self, state, report):
+        while len(state["stack"]) > 1:
+            self._close(state)
+        net = state["stack"][0]["net"]
+        for kind, entry in sorted(state["kinds"].items()):
+            lo, hi = net.get(kind, (0, 0))
+            if entry["unknown"] or lo == hi == 0:
+                continue
+            line = entry["push_line"] if hi > 0 else entry["pop_line"]
+            if lo == hi and entry["pushes"] - entry["pops"] == lo:
+                report(line, f"{entry['pushes']} Push{kind} but {entry['pops']} Pop{kind}")
+            elif lo <= 0 <= hi:
+                report(line, f"Push{kind} and Pop{kind} balance only on some branches "
+                             f"(open: {lo:+d} to {hi:+d})", WARNING)
+            else:
+                report(line, f"Push{kind} and Pop{kind} balance on no branch "
+                             f"(open: {lo:+d} to {hi:+d})")
+
+
+class UnknownApi(Rule):
+    """Calls to reaper.<name> that the virtual REAPER does not provide.
+
+    Functions the script assigns itself, or guards with ``if reaper.X`` or
+    ``reaper.APIExists("X")``, are treated as optional and not reported.
+    """
+
+    id = "unknown-api"
+    severity = WARNING
+    patterns = (("reaper", ".", ANY_NAME),)
+
+    def __init__(self, api_names):
+        self.api_names = frozenset(api_names)
+
+    def start(self):
+        return {"calls": {}, "optional": set()}
+
+    def match(self, state, tokens, i, report):
+        name = tokens[i + 2].value
+        following = tokens[i + 3] if i + 3 < len(tokens) else None
+        if name == "APIExists" and following is not None and following.value == "(":
+            args = _call_args(tokens, i + 3)
+            if args and len(args[0]) == 1 and args[0][0].kind == lualex.STRING:
+                state["optional"].add(args[0][0].value)
+        if name in self.api_names:
+            return
+        if following is not None and (following.kind == lualex.STRING
+                                      or following.value in ("(", "{")):
+            state["calls"].setdefault(name, tokens[i].line)
+        else:
+            state["optional"].add(name)
+
+    def finish(self, state, report):
+        for name, line in sorted(state["calls"].items(), key=lambda item: item[1]):
+            if name not in state["optional"]:
+                report(line, f"reaper.{name} is not provided by the virtual REAPER")
+
+
+class DeprecatedImGui(Rule):
+    """ReaImGui names that were removed or renamed."""
+
+    id = "deprecated-imgui"
+    severity = WARNING
+    patterns = tuple((name,) for name in DEPRECATED_IMGUI)
+
+    def match(self, state, tokens, i, report):
+        name = tokens[i].value
+        report(tokens[i].line, f"{name} is deprecated; use {DEPRECATED_IMGUI[name]}")
+
+
+def suppressions(source):
+    """{line: rule ids} disabled by ``-- envireament-lint: disable=...`` comments."""
+    disabled = {}
+    for line, text in enumerate(source.splitlines(), 1):
+        if "envireament-lint" in text:
+            match = _SUPPRESS_RE.search(text)
+            if match:
+                disabled[line] = frozenset(filter(None, match.group(1).split(",")))
+    return disabled
+
+
+class LintEngine:
+    """Runs a set of rules over each file's tokens in a single pass."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._by_value = {}  # first token value -> [(rule index, pattern)]
+        self._by_kind = {}   # first token kind -> [(rule index, pattern)]
+        for index, rule in enumerate(self.rules):
+            for pattern in rule.patterns:
+                head = pattern[0]
+                if isinstance(head, Any):
+                    self._by_kind.setdefault(head.kind, []).append((index, pattern))
+                else:
+                    self._by_value.setdefault(head, []).append((index, pattern))
+
+    @staticmethod
+    def _matches(tokens, i, pattern):
+        if i + len(pattern) > len(tokens):
+            return False
+        for offset, item in enumerate(pattern):
+            token = tokens[i + offset]
+            if isinstance(item, Any):
+                if token.kind != item.kind:
+                    return False
+            elif token.value != item or token.kind == lualex.STRING:
+                return False
+        return True
+
+    def lint_source(self, source, path="<string>"):
+        tokens = lualex.tokenize(source)
+        issues = []
+        states = [rule.start() for rule in self.rules]
+        disabled = suppressions(source)
+        reporters = [self._reporter(issues, path, rule, disabled) for rule in self.rules]
+        by_value, by_kind = self._by_value, self._by_kind
+        for i, token in enumerate(tokens):
+            candidates = by_kind.get(token.kind, ())
+            if token.kind != lualex.STRING and token.value in by_value:
+                candidates = list(candidates) + by_value[token.value]
+            off = disabled.get(token.line) if token.kind != lualex.KEYWORD else None
+            for index, pattern in candidates:
+                if off and ("all" in off or self.rules[index].id in off):
+                    continue
+                if self._matches(tokens, i, pattern):
+                    self.rules[index].match(states[index], tokens, i, reporters[index])
+        for rule, state, report in zip(self.rules, states, reporters):
+            rule.finish(state, report)
+        issues.sort(key=lambda issue: issue.line)
+        return issues
+
+    @staticmethod
+    def _reporter(issues, path, rule, disabled):
+        def report(line, message, severity=None):
+            off = disabled.get(line)
+            if not off or not ("all" in off or rule.id in off):
+                issues.append(Issue(path, line, rule.id, severity or rule.severity, message))
+        return report
+
+
+def mock_api_names(package_dir=None):
+    """Names of every function and constant the mock's reaper table provides."""
+    package_dir = Path(package_dir) if package_dir else Path(__file__).parent.parent
+    source = (package_dir / MOCK_SCRIPT).read_text(encoding="utf-8", errors="replace")
+    return {definition.name for definition in outline(source) if definition.entry}
+
+
+def default_rules(api_names):
+    return [PushPopBalance(), UnknownApi(api_names), DeprecatedImGui()]
+
+
+def discover_scripts(paths):
+    """Every .lua file under paths, sorted."""
+    found = set()
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            found.add(path.resolve())
+            continue
+        for root, dirs, files in os.walk(str(path)):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+            for name in files:
+                if name.endswith(".lua"):
+                    found.add((Path(root) / name).resolve())
+    return sorted(found)
+
+
+class LintCache:
+    """Per-file findings in one JSON index, checked by mtime/size then content hash."""
+
+    def __init__(self, path=None, fingerprint=""):
+        self.path = Path(path) if path else DEFAULT_LINT_CACHE
+        self.fingerprint = fingerprint
+        self.files = {}
+        self.hits = 0
+        try:
+            with open(str(self.path), "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            if data.get("fingerprint") == fingerprint:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, path):
+        """Cached issue dicts for path, or None when it must be linted again."""
+        entry = self.files.get(str(path))
+        if entry is None:
+            return None
+        key = list(stat_key(path) or ())
+        if key != entry["stat"]:
+            # Touched but maybe not edited: hashing is far cheaper than linting
+            try:
+                digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+            except OSError:
+                return None
+            if digest != entry["sha256"]:
+                return None
+            entry["stat"] = key
+        self.hits += 1
+        return entry["issues"]
+
+    def put(self, path, digest, issues):
+        self.files[str(path)] = {
+            "stat": list(stat_key(path) or ()),
+            "sha256": digest,
+            "issues": [issue.to_dict() for issue in issues],
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(str(tmp), "w", encoding="utf-8") as handle:
+            json.dump({"fingerprint": self.fingerprint, "files": self.files}, handle)
+        os.replace(str(tmp), str(self.path))
+
+
+# Worker processes build their engine once, from the parent's API names
+_worker_engine = None
+
+
+def _init_worker(api_names):
+    global _worker_engine
+    _worker_engine = LintEngine(default_rules(api_names))
+
+
+def _lint_worker(path):
+    data = Path(path).read_bytes()
+    issues = _worker_engine.lint_source(data.decode("utf-8", "replace"), str(path))
+    return path, hashlib.sha256(data).hexdigest(), issues
+
+
+def lint_files(files, api_names, jobs=None, cache=None):
+    """{path: [Issue]} for files, using worker processes for uncached ones."""
+    results, pending = {}, []
+    for path in files:
+        cached = cache.lookup(path) if cache is not None else None
+        if cached is None:
+            pending.append(path)
+        else:
+            results[path] = [Issue.from_dict(str(path), item) for item in cached]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(pending) < 2 * jobs:
+        # Not worth starting processes for
+        _init_worker(api_names)
+        done = [_lint_worker(path) for path in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(frozenset(api_names),)) as pool:
+            done = list(pool.map(_lint_worker, pending,
+                                 chunksize=max(1, len(pending) // (jobs * 4))))
+    for path, digest, issues in done:
+        results[path] = issues
+        if cache is not None:
+            cache.put(path, digest, issues)
+    return results
+
+
+def lint_paths(paths, package_dir, jobs=None, use_cache=True, cache_path=None, as_json=False,
+               stream=None):
+    """Lint every .lua file under paths and print findings.
+
+    Returns True when no error-severity issue was found.
+    """
+    stream = stream or sys.stdout
+    files = discover_scripts(paths)
+    api_names = mock_api_names(package_dir)
+    fingerprint = hashlib.sha256(
+        "\0".join([str(LINT_VERSION)] + sorted(api_names)).encode("utf-8")).hexdigest()
+    cache = LintCache(cache_path, fingerprint) if use_cache else None
+    results = lint_files(files, api_names, jobs, cache)
+    if cache is not None:
+        cache.save()
+    issues = [issue for path in files for issue in results[path]]
+    root = Path.cwd()
+    for issue in issues:
+        try:
+            issue.path = os.path.relpath(issue.path, str(root))
+        except ValueError:
+            pass
+    errors = sum(1 for issue in issues if issue.severity == ERROR)
+    if as_json:
+        json.dump([dict(issue.to_dict(), path=issue.path) for issue in issues], stream, indent=2)
+        print(file=stream)
+    else:
+        for issue in issues:
+            print(issue, file=stream)
+        cached = f" ({cache.hits} cached)" if cache is not None else ""
+        print(f"{len(files)} file(s) linted{cached}: {errors} error(s), "
+              f"{len(issues) - errors} warning(s)", file=stream)
+    return errors == 0
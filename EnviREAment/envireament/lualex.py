@@ -0,0 +1,149 @@
+"""
+A small Lua tokenizer for static analysis of REAPER scripts.
+
+Produces a flat token list in one pass over the source. Comments are
+dropped and string literals are decoded, so analyses can match on token
+sequences (``require ( "x" )``, ``reaper . Name``) instead of regexes over
+raw text.
+"""
+
+import re
+
+NAME = "name"
+KEYWORD = "keyword"
+STRING = "string"
+NUMBER = "number"
+OP = "op"
+
+KEYWORDS = frozenset("""
+    and break do else elseif end false for function goto if in local nil not
+    or repeat return then true until while
+""".split())
+
+_SIMPLE_ESCAPES = {
+    "n": "\n", "t": "\t", "r": "\r", "a": "\a", "b": "\b", "f": "\f", "v": "\v",
+    "\\": "\\", '"': '"', "'": "'", "\n": "\n",
+}
+
+_NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_NUMBER_RE = re.compile(
+    r"0[xX][0-9a-fA-F]*(?:\.[0-9a-fA-F]*)?(?:[pP][+-]?\d+)?|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?"
+)
+_LONG_OPEN_RE = re.compile(r"\[(=*)\[")
+_OPS = ("...", "..", "==", "~=", "<=", ">=", "<<", ">>", "//", "::")
+
+
+class Token:
+    __slots__ = ("kind", "value", "line")
+
+    def __init__(self, kind, value, line):
+        self.kind = kind
+        self.value = value
+        self.line = line
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r}, line {self.line})"
+
+
+def _decode_escapes(body):
+    if "\\" not in body:
+        return body
+    out, i, n = [], 0, len(body)
+    while i < n:
+        char = body[i]
+        if char != "\\" or i + 1 >= n:
+            out.append(char)
+            i += 1
+            continue
+        nxt = body[i + 1]
+        if nxt in _SIMPLE_ESCAPES:
+            out.append(_SIMPLE_ESCAPES[nxt])
+            i += 2
+        elif nxt.isdigit():
+            j = i + 1
+            while j < n and j < i + 4 and body[j].isdigit():
+                j += 1
+            out.append(chr(int(body[i + 1:j]) % 256))
+            i = j
+        elif nxt == "x" and i + 3 < n + 1:
+            try:
+                out.append(chr(int(body[i + 2:i + 4], 16)))
+                i += 4
+            except ValueError:
+                out.append(nxt)
+                i += 2
+        elif nxt == "z":
+            i += 2
+            while i < n and body[i].isspace():
+                i += 1
+        else:
+            out.append(nxt)
+            i += 2
+    return "".join(out)
+
+
+# One match per token; leading whitespace is consumed by the same match and
+# line numbers are recovered by counting newlines between tokens
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<long>(?P<dashes>--)?\[(?P<level>=*)\[)
+  | (?P<comment>--[^\n]*)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>0[xX][0-9a-fA-F]*(?:\.[0-9a-fA-F]*)?(?:[pP][+-]?\d+)?
+              |\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"?|'(?:[^'\\\n]|\\.)*'?)
+  | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|<<|>>|//|::|\S)
+)""", re.X | re.S)
+
+
+def tokenize(source):
+    """Return the list of Tokens in source; comments are skipped.
+
+    Malformed input never raises: an unterminated string or long bracket
+    simply runs to the end of the source.
+    """
+    tokens = []
+    append = tokens.append
+    match_at = _TOKEN_RE.match
+    count = source.count
+    i, n, line, counted = 0, len(source), 1, 0
+    if source.startswith("#"):
+        # Shebang line
+        i = source.find("\n")
+        i = n if i < 0 else i
+    while i < n:
+        match = match_at(source, i)
+        if match is None:
+            break  # trailing whitespace
+        kind = match.lastgroup
+        start, i = match.span(kind)
+        line += count("\n", counted, start)
+        counted = start
+        if kind == "name":
+            word = match.group(kind)
+            append(Token(KEYWORD if word in KEYWORDS else NAME, word, line))
+        elif kind == "op":
+            append(Token(OP, match.group(kind), line))
+        elif kind == "string":
+            text = match.group(kind)
+            closed = len(text) > 1 and text[-1] == text[0] and not _escaped_end(text)
+            append(Token(STRING, _decode_escapes(text[1:-1] if closed else text[1:]), line))
+        elif kind == "number":
+            append(Token(NUMBER, match.group(kind), line))
+        elif kind == "long":
+            # Long bracket string or comment: [[...]], [==[...]==], --[[...]]
+            close = "]" + match.group("level") + "]"
+            body = i
+            if not match.group("dashes") and source.startswith("\n", body):
+                body += 1
+            stop = source.find(close, body)
+            stop = n if stop < 0 else stop
+            if not match.group("dashes"):
+                append(Token(STRING, source[body:stop], line))
+            i = min(n, stop + len(close))
+    return tokens
+
+
+def _escaped_end(text):
+    """True when the closing quote of text is itself escaped."""
+    backslashes = len(text) - 1 - len(text[:-1].rstrip("\\"))
+    return backslashes % 2 == 1
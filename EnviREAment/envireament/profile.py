@@ -0,0 +1,130 @@
+"""
+Sampling CPU profiles of scripts run under the virtual environment.
+
+``profile_cpu()`` runs a script the way ``envireament test`` does, with
+``ENVIREAMENT_PROFILE`` set. The mock then samples the Lua stack every N
+VM instructions and, at exit, writes collapsed stacks (one
+``frame;frame;frame count`` line per distinct stack), the input
+flamegraph.pl, inferno and speedscope take.
+
+Script frames read ``name (file:line)``. Mock frames start with
+``[mock]``, and unless ``detail`` is set each run of them is collapsed
+into the API function the script called, so the graph shows what the
+script asked for rather than how the mock implements it.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from .runner import DEFAULT_TIMEOUT, run_test_file
+
+ENV_VAR = "ENVIREAMENT_PROFILE"
+INTERVAL_VAR = "ENVIREAMENT_PROFILE_INTERVAL"
+DETAIL_VAR = "ENVIREAMENT_PROFILE_DETAIL"
+DEFAULT_INTERVAL = 1000
+MOCK_PREFIX = "[mock] "
+
+
+def read_collapsed(path):
+    """{(frame, ...): samples}, root first."""
+    stacks = {}
+    with open(str(path), encoding="utf-8") as handle:
+        for line in handle:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                frames = tuple(stack.split(";"))
+                stacks[frames] = stacks.get(frames, 0) + int(count)
+    return stacks
+
+
+def write_collapsed(stacks, path):
+    lines = sorted(";".join(frames) + f" {count}" for frames, count in stacks.items())
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def is_mock(frame):
+    return frame.startswith(MOCK_PREFIX)
+
+
+def without_mock(stacks):
+    """Stacks with mock frames removed: their samples count as the caller's."""
+    stripped = {}
+    for frames, count in stacks.items():
+        kept = tuple(frame for frame in frames if not is_mock(frame))
+        if kept:
+            stripped[kept] = stripped.get(kept, 0) + count
+    return stripped
+
+
+def summarize(stacks, top=10):
+    """Sample totals split by where the sample landed, and the hottest frames.
+
+    A sample belongs to the mock when its innermost non-C frame is a mock
+    frame, and to the script otherwise.
+    """
+    total = script = 0
+    self_time = {}
+    for frames, count in stacks.items():
+        total += count
+        owner = next((frame for frame in reversed(frames) if not frame.endswith(" [C]")),
+                     frames[-1])
+        if not is_mock(owner):
+            script += count
+        self_time[frames[-1]] = self_time.get(frames[-1], 0) + count
+    hottest = sorted(self_time.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        "samples": total,
+        "script": script,
+        "mock": total - script,
+        "script_top": [item for item in hottest if not is_mock(item[0])][:top],
+        "mock_top": [item for item in hottest if is_mock(item[0])][:top],
+    }
+
+
+def profile_cpu(script, package_dir, output=None, interval=DEFAULT_INTERVAL, detail=False,
+                script_only=False, lua="lua", timeout=DEFAULT_TIMEOUT, top=10, stream=None):
+    """Profile one script and print where its samples went.
+
+    Returns True when the script ran and a profile was written.
+    """
+    stream = stream or sys.stdout
+    script = Path(script).resolve()
+    output = Path(output or script.with_suffix(".folded")).resolve()
+    env = {ENV_VAR: str(output), INTERVAL_VAR: str(interval), DETAIL_VAR: "1" if detail else "0"}
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        if output.exists():
+            output.unlink()
+        result = run_test_file(script, package_dir, lua, timeout)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    if not output.exists():
+        print(f"No profile written ({result.status})", file=stream)
+        print(result.output.rstrip(), file=stream)
+        return False
+    stacks = read_collapsed(output)
+    if script_only:
+        stacks = without_mock(stacks)
+        write_collapsed(stacks, output)
+    summary = summarize(stacks, top)
+    samples = summary["samples"] or 1
+    print(f"{summary['samples']} samples every {interval} VM instructions "
+          f"({result.duration:.2f}s, script {result.status})", file=stream)
+    print(f"  script: {summary['script']:6} ({100.0 * summary['script'] / samples:5.1f}%)",
+          file=stream)
+    print(f"  mock:   {summary['mock']:6} ({100.0 * summary['mock'] / samples:5.1f}%)",
+          file=stream)
+    for title, key in (("Hottest script frames", "script_top"), ("Hottest mock calls", "mock_top")):
+        if summary[key]:
+            print(f"\n{title} (self samples):", file=stream)
+            for frame, count in summary[key]:
+                print(f"  {count:6} {100.0 * count / samples:5.1f}%  {frame}", file=stream)
+    print(f"\nCollapsed stacks written to {output}", file=stream)
+    return result.ok
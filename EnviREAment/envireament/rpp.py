@@ -0,0 +1,291 @@
+"""
+Streaming reader for REAPER project (.RPP) files.
+
+The reader walks a project line by line and never builds the chunk tree,
+so memory stays flat on very large sessions. ``convert_rpp`` feeds it into
+a FixtureWriter: each track is written out as soon as its chunk closes.
+"""
+
+import base64
+import binascii
+
+from .fixtures import (
+    FIXTURE_EXTENSION,
+    MIDI_FLAG_MUTED,
+    MIDI_FLAG_SELECTED,
+    FixtureWriter,
+    pack_midi_event,
+)
+
+# Ticks per quarter note used by the virtual MIDI store
+MOCK_PPQ = 960
+
+# REAPER sets this bit on PEAKCOL when a track has a custom color
+CUSTOM_COLOR_FLAG = 0x1000000
+
+_QUOTES = "\"'`"
+
+
+def tokenize_line(line):
+    """Split an RPP line into tokens, honouring "", '' and `` quoting."""
+    line = line.strip()
+    if not any(quote in line for quote in _QUOTES):
+        return line.split()
+    tokens = []
+    i, n = 0, len(line)
+    while i < n:
+        char = line[i]
+        if char.isspace():
+            i += 1
+        elif char in _QUOTES:
+            end = line.find(char, i + 1)
+            if end < 0:
+                end = n
+            tokens.append(line[i + 1:end])
+            i = end + 1
+        else:
+            end = i
+            while end < n and not line[end].isspace():
+                end += 1
+            tokens.append(line[i:end])
+            i = end
+    return tokens
+
+
+def iter_rpp(lines):
+    """Yield ("open", tokens), ("line", tokens) and ("close", None) events.
+
+    For "open" events the first token is the chunk tag without its "<".
+    """
+    for raw in lines:
+        stripped = raw.strip()
+        if not stripped:
+            continue
+        if stripped[0] == "<":
+            yield "open", tokenize_line(stripped[1:])
+        elif stripped == ">":
+            yield "close", None
+        else:
+            yield "line", tokenize_line(stripped)
+
+
+def _float(tokens, index, default=0.0):
+    try:
+        return float(tokens[index])
+    except (IndexError, ValueError):
+        return default
+
+
+def _int(tokens, index, default=0):
+    try:
+        return int(float(tokens[index]))
+    except (IndexError, ValueError):
+        return default
+
+
+class _MidiSource:
+    """Collects one MIDI source's events and converts ticks to MOCK_PPQ."""
+
+    def __init__(self):
+        self.ppq = MOCK_PPQ
+        self.ticks = 0
+        self.last_mock_ticks = 0
+        self.events = []
+        self.sysex = None
+
+    def add(self, delta, flags, message):
+        self.ticks += delta
+        mock_ticks = int(round(self.ticks * MOCK_PPQ / float(self.ppq)))
+        self.events.append((mock_ticks - self.last_mock_ticks, flags, message))
+        self.last_mock_ticks = mock_ticks
+
+    def packed(self):
+        events = self.events
+        # REAPER closes every source with an all-notes-off CC; the mock
+        # does not count it as an event
+        if events and len(events[-1][2]) == 3 and events[-1][2][0] & 0xF0 == 0xB0 \
+                and events[-1][2][1] == 123:
+            events = self.events = events[:-1]
+        return b"".join(pack_midi_event(*event) for event in events)
+
+
+def _event_flags(tag):
+    flags = 0
+    if tag[0].islower():
+        flags |= MIDI_FLAG_SELECTED
+    if tag[1:2] == "m":
+        flags |= MIDI_FLAG_MUTED
+    return flags
+
+
+class RPPConverter:
+    """Event-driven RPP to fixture conversion, one track in memory at a time."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.stack = []
+        self.track = None
+        self.items = None
+        self.item = None
+        self.take = None
+        self.midi = None
+        self.open_regions = {}
+        self.midi_events = 0
+
+    # Chunk handlers -------------------------------------------------
+
+    def open_chunk(self, tokens):
+        tag = tokens[0].upper() if tokens else ""
+        parent = self.stack[-1] if self.stack else None
+        self.stack.append(tag)
+        if tag == "TRACK" and parent == "REAPER_PROJECT":
+            self.track = {"name": "", "volume": 1.0, "pan": 0.0, "color": 0,
+                          "mute": False, "solo": 0, "selected": False, "folder_depth": 0}
+            self.items = []
+        elif tag == "ITEM" and parent == "TRACK":
+            self.take = {"name": "", "source": ""}
+            self.item = {"position": 0.0, "length": 1.0, "mute": False, "selected": False,
+                         "active_take": 1, "takes": [self.take]}
+        elif tag == "SOURCE" and self.take is not None and "SOURCE" not in self.stack[:-1]:
+            kind = tokens[1].upper() if len(tokens) > 1 else ""
+            if kind in ("MIDI", "MIDIPOOL"):
+                self.midi = _MidiSource()
+            elif kind:
+                self.take["source"] = kind
+        elif tag == "X" and self.midi is not None:
+            self.midi.sysex = (_int(tokens, 1), _event_flags(tokens[0]), [])
+
+    def close_chunk(self):
+        tag = self.stack.pop() if self.stack else None
+        if tag == "X" and self.midi is not None and self.midi.sysex:
+            delta, flags, parts = self.midi.sysex
+            self.midi.sysex = None
+            try:
+                message = base64.b64decode("".join(parts))
+            except (binascii.Error, ValueError):
+                message = b""
+            if message:
+                self.midi.add(delta, flags, message)
+        elif tag == "SOURCE" and self.midi is not None and "SOURCE" not in self.stack:
+            self.take["midi"] = self.midi.packed()
+            self.take["source"] = "MIDI"
+            self.midi_events += len(self.midi.events)
+            self.midi = None
+        elif tag == "ITEM" and self.item is not None:
+            self.items.append(self.item)
+            self.item = self.take = None
+        elif tag == "TRACK" and self.track is not None:
+            self.writer.add_track(self.track, self.items)
+            self.track = self.items = None
+
+    # Line handlers --------------------------------------------------
+
+    def line(self, tokens):
+        if not tokens or not self.stack:
+            return
+        tag = self.stack[-1]
+        if tag == "REAPER_PROJECT":
+            self.project_line(tokens)
+        elif tag == "TRACK" and self.track is not None:
+            self.track_line(tokens)
+        elif tag == "ITEM" and self.item is not None:
+            self.item_line(tokens)
+        elif tag == "SOURCE" and self.midi is not None:
+            self.midi_line(tokens)
+        elif tag == "X" and self.midi is not None and self.midi.sysex:
+            self.midi.sysex[2].append(tokens[0])
+
+    def project_line(self, tokens):
+        key = tokens[0]
+        if key == "TEMPO":
+            self.writer.tempo = _float(tokens, 1, 120.0)
+        elif key == "MARKER":
+            number = _int(tokens, 1)
+            pos = _float(tokens, 2)
+            flags = _int(tokens, 4)
+            if flags & 1:
+                region = self.open_regions.pop(number, None)
+                if region is None:
+                    self.open_regions[number] = (pos, tokens[3] if len(tokens) > 3 else "",
+                                                 _int(tokens, 5))
+                else:
+                    start, name, color = region
+                    self.writer.add_marker(start, name, True, pos, number, color)
+            else:
+                self.writer.add_marker(pos, tokens[3] if len(tokens) > 3 else "", False,
+                                       None, number, _int(tokens, 5))
+
+    def track_line(self, tokens):
+        key, track = tokens[0], self.track
+        if key == "NAME":
+            track["name"] = tokens[1] if len(tokens) > 1 else ""
+        elif key == "VOLPAN":
+            track["volume"] = _float(tokens, 1, 1.0)
+            track["pan"] = _float(tokens, 2)
+        elif key == "MUTESOLO":
+            track["mute"] = _int(tokens, 1) != 0
+            track["solo"] = _int(tokens, 2)
+        elif key == "PEAKCOL":
+            color = _int(tokens, 1)
+            track["color"] = color if color & CUSTOM_COLOR_FLAG else 0
+        elif key == "ISBUS":
+            track["folder_depth"] = _int(tokens, 2)
+        elif key == "SEL":
+            track["selected"] = _int(tokens, 1) != 0
+
+    def item_line(self, tokens):
+        key, item = tokens[0], self.item
+        if key == "POSITION":
+            item["position"] = _float(tokens, 1)
+        elif key == "LENGTH":
+            item["length"] = _float(tokens, 1, 1.0)
+        elif key == "MUTE":
+            item["mute"] = _int(tokens, 1) != 0
+        elif key == "SEL":
+            item["selected"] = _int(tokens, 1) != 0
+        elif key == "NAME":
+            self.take["name"] = tokens[1] if len(tokens) > 1 else ""
+        elif key == "TAKE":
+            self.take = {"name": "", "source": ""}
+            item["takes"].append(self.take)
+            if "SEL" in tokens[1:]:
+                item["active_take"] = len(item["takes"])
+
+    def midi_line(self, tokens):
+        key = tokens[0]
+        if key == "HASDATA":
+            self.midi.ppq = _int(tokens, 2, MOCK_PPQ) or MOCK_PPQ
+        elif key in ("E", "e", "Em", "em") and len(tokens) >= 3:
+            try:
+                message = bytes(int(value, 16) for value in tokens[2:])
+            except ValueError:
+                return
+            self.midi.add(_int(tokens, 1), _event_flags(key), message)
+
+    def feed(self, events):
+        for kind, tokens in events:
+            if kind == "line":
+                self.line(tokens)
+            elif kind == "open":
+                self.open_chunk(tokens)
+            else:
+                self.close_chunk()
+
+
+def convert_rpp(rpp_path, fixture_path=None):
+    """Convert an .RPP project into a fixture file and return a summary."""
+    rpp_path = str(rpp_path)
+    if fixture_path is None:
+        base = rpp_path[:-4] if rpp_path.lower().endswith(".rpp") else rpp_path
+        fixture_path = base + FIXTURE_EXTENSION
+    with open(rpp_path, "r", encoding="utf-8", errors="replace") as source, \
+            FixtureWriter(fixture_path) as writer:
+        converter = RPPConverter(writer)
+        converter.feed(iter_rpp(source))
+    return {
+        "fixture": str(fixture_path),
+        "tracks": len(writer.tracks),
+        "items": writer.item_count,
+        "markers": len(writer.markers),
+        "midi_events": converter.midi_events,
+    }
@@ -0,0 +1,419 @@
+"""
+Discover standalone Lua test scripts and run them in parallel.
+
+Each test file runs in its own ``lua enhanced_virtual_reaper.lua --test``
+process, started from the file's directory so relative ``dofile`` paths
+keep working. Workers enforce a per-file timeout, results are reported as
+they finish, and the run can be written out as JUnit XML. Results are
+cached by dependency closure and harness (cache.py), so unchanged tests
+replay, and
+``affected`` narrows a run to the tests a change can reach (impact.py).
+With ``sessions``, test files from the same directory share one Lua process
+and run side by side, each in its own session of the mock.
+"""
+
+import hashlib
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from . import apicov, coverage
+from .cache import ResultCache
+from .deps import DependencyScanner
+from .impact import MOCK_SCRIPT, mock_modules, select_affected
+
+# Same default as TestConfig.test_timeout in enhanced_test_runner.lua
+DEFAULT_TIMEOUT = 30
+
+# The mock times every frame against this many milliseconds when it is set
+FRAME_BUDGET_VAR = "ENVIREAMENT_FRAME_BUDGET"
+FRAME_PERCENTILE_VAR = "ENVIREAMENT_FRAME_PERCENTILE"
+DEFAULT_FRAME_BUDGET = 1000 / 60
+
+# Directories never searched during discovery
+SKIP_DIRS = {".git", "node_modules", "dist", "backups", "__pycache__", ".vscode"}
+
+PASSED = "passed"
+FAILED = "failed"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+# Block delimiters of enhanced_virtual_reaper.lua --sessions output
+SESSION_START = "envireament-session "
+SESSION_END = "envireament-session-end "
+
+_STATUS_ICONS = {PASSED: "✅", FAILED: "❌", TIMEOUT: "⏱️", ERROR: "💥"}
+
+
+class TestResult:
+    """Outcome of running one Lua test file."""
+
+    def __init__(self, path, status, duration=0.0, output="", returncode=None, cached=False):
+        self.path = Path(path)
+        self.status = status
+        self.duration = duration
+        self.output = output
+        self.returncode = returncode
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.status == PASSED
+
+    def __repr__(self):
+        return f"<TestResult {self.path.name} {self.status} {self.duration:.2f}s>"
+
+
+def is_test_file(name):
+    """test_*.lua and *_test.lua are test scripts."""
+    return name.endswith(".lua") and (name.startswith("test_") or name.endswith("_test.lua"))
+
+
+def discover_tests(paths):
+    """Expand files and directories into a sorted list of test files.
+
+    Files named explicitly are always included; directories are searched
+    recursively for test_*.lua and *_test.lua.
+    """
+    found = set()
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            found.add(path.resolve())
+            continue
+        for root, dirs, files in os.walk(str(path)):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+            for name in files:
+                if is_test_file(name):
+                    found.add((Path(root) / name).resolve())
+    return sorted(found)
+
+
+def _test_env(directory, package_dir):
+    env = dict(os.environ)
+    env["PWD"] = str(directory)  # lets coverage files name scripts relative to it
+    # Let tests require the mock and their neighbours from any directory
+    env["LUA_PATH"] = ";".join([
+        str(Path(package_dir) / "?.lua"),
+        str(Path(directory) / "?.lua"),
+        env.get("LUA_PATH", ";"),
+    ])
+    return env
+
+
+def run_test_file(path, package_dir, lua="lua", timeout=DEFAULT_TIMEOUT):
+    """Run one test file in a fresh Lua process and return a TestResult."""
+    path = Path(path)
+    cmd = [lua, str(Path(package_dir) / "enhanced_virtual_reaper.lua"), "--test", str(path)]
+    start = time.time()
+    try:
+        completed = subprocess.run(
+            cmd, cwd=str(path.parent), env=_test_env(path.parent, package_dir), timeout=timeout,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, encoding="utf-8", errors="replace",
+        )
+    except subprocess.TimeoutExpired as exc:
+        output = exc.output or ""
+        if isinstance(output, bytes):
+            output = output.decode("utf-8", "replace")
+        return TestResult(path, TIMEOUT, time.time() - start,
+                          output + f"\nTimed out after {timeout}s", None)
+    except OSError as exc:
+        return TestResult(path, ERROR, time.time() - start, str(exc), None)
+    status = PASSED if completed.returncode == 0 else FAILED
+    return TestResult(path, status, time.time() - start, completed.stdout, completed.returncode)
+
+
+def parse_sessions(output):
+    """{index: (status, seconds, output)} of each block in --sessions output."""
+    blocks = {}
+    current, lines = None, []
+    for line in output.splitlines():
+        if current is None:
+            if line.startswith(SESSION_START):
+                index, status, seconds, _ = line[len(SESSION_START):].split(" ", 3)
+                current, lines = (int(index), status, float(seconds)), []
+        elif line == f"{SESSION_END}{current[0]}":
+            blocks[current[0]] = (current[1], current[2], "\n".join(lines))
+            current = None
+        else:
+            lines.append(line)
+    return blocks
+
+
+def run_session_batch(paths, package_dir, lua="lua", timeout=DEFAULT_TIMEOUT):
+    """Run test files from one directory side by side in a single Lua process.
+
+    Each file gets its own session of the mock (state, globals, modules)
+    and the mock stops a session once it has used ``timeout`` seconds of
+    CPU time, so one hung file times out without holding up the rest. Files
+    the process did not report on, because it crashed, run again on their
+    own. Returns TestResults in the order of paths.
+    """
+    paths = [Path(path) for path in paths]
+    directory = paths[0].parent
+    cmd = [lua, str(Path(package_dir) / "enhanced_virtual_reaper.lua"), "--sessions",
+           "--timeout", str(timeout)]
+    cmd += [str(path) for path in paths]
+    blocks = {}
+    try:
+        completed = subprocess.run(
+            cmd, cwd=str(directory), env=_test_env(directory, package_dir),
+            # Only a hang the CPU-time deadline cannot see (a blocking read)
+            # gets this far
+            timeout=timeout * (len(paths) + 1), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, encoding="utf-8", errors="replace",
+        )
+        blocks = parse_sessions(completed.stdout)
+    except subprocess.TimeoutExpired:
+        pass
+    except OSError as exc:
+        return [TestResult(path, ERROR, 0.0, str(exc), None) for path in paths]
+    results = []
+    for index, path in enumerate(paths, 1):
+        if index not in blocks:
+            results.append(run_test_file(path, package_dir, lua, timeout))
+            continue
+        status, seconds, output = blocks[index]
+        if status == TIMEOUT:
+            results.append(TestResult(path, TIMEOUT, seconds,
+                                      output + f"\nTimed out after {timeout}s", None))
+            continue
+        passed = status == PASSED
+        results.append(TestResult(path, PASSED if passed else FAILED, seconds, output,
+                                  0 if passed else 1))
+    return results
+
+
+def session_batches(files, size):
+    """files grouped by directory, in order, at most size per batch."""
+    by_directory = {}
+    for path in files:
+        by_directory.setdefault(Path(path).parent, []).append(path)
+    batches = []
+    for paths in by_directory.values():
+        batches.extend(paths[start:start + size] for start in range(0, len(paths), size))
+    return batches
+
+
+def format_result(result, root=None):
+    """One progress line for a finished test."""
+    name = result.path
+    if root:
+        try:
+            name = result.path.relative_to(root)
+        except ValueError:
+            pass
+    note = " (cached)" if result.cached else ""
+    return f"{_STATUS_ICONS[result.status]} {result.status.upper():7} {name} ({result.duration:.2f}s){note}"
+
+
+def run_tests_parallel(files, package_dir, jobs=None, timeout=DEFAULT_TIMEOUT, lua="lua",
+                       on_result=None, sessions=None):
+    """Run files on a worker pool; on_result is called as each one finishes.
+
+    With sessions > 1, each worker runs up to that many files from one
+    directory in a single Lua process. Returns results in the order of
+    ``files``.
+    """
+    jobs = jobs or os.cpu_count() or 1
+
+    def run_batch(batch):
+        if len(batch) == 1:
+            return [run_test_file(batch[0], package_dir, lua, timeout)]
+        return run_session_batch(batch, package_dir, lua, timeout)
+
+    if sessions and sessions > 1:
+        batches = session_batches(files, sessions)
+    else:
+        batches = [[path] for path in files]
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for result in future.result():
+                results[result.path] = result
+                if on_result:
+                    on_result(result)
+    return [results[Path(path)] for path in files]
+
+
+def harness_hash(scanner, package_dir):
+    """Hash of what runs every test: the mock, the package modules it
+    requires and this runner. A change to any of them misses every key."""
+    package_dir = Path(package_dir)
+    files = [package_dir / MOCK_SCRIPT, Path(__file__).resolve()]
+    files += mock_modules(scanner, package_dir)
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(f"{path.name}\0{scanner.digest(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def execute_tests(files, package_dir, jobs=None, timeout=DEFAULT_TIMEOUT, lua="lua",
+                  on_result=None, cache=None, scanner=None, sessions=None):
+    """Run files, replaying cached results where the closure is unchanged.
+
+    Files that require a computed module name always run: their closure is
+    a guess. Returns results in the order of ``files``.
+    """
+    results = {}
+    keys = {}
+    to_run = list(files)
+    if cache is not None:
+        scanner = scanner or DependencyScanner(package_dir)
+        mock_hash = harness_hash(scanner, package_dir)
+        to_run = []
+        for path in files:
+            closure = scanner.closure(path)
+            if closure.dynamic:
+                to_run.append(path)
+                continue
+            keys[path] = cache.key(path, scanner.closure_hash(closure), mock_hash, timeout)
+            data = cache.get(keys[path])
+            if data is None:
+                to_run.append(path)
+                continue
+            result = TestResult(path, data["status"], data.get("duration", 0.0),
+                                data.get("output", ""), data.get("returncode"), cached=True)
+            results[path] = result
+            if on_result:
+                on_result(result)
+
+    def finished(result):
+        if result.path in keys and result.status in (PASSED, FAILED):
+            cache.put(keys[result.path], result)
+        if on_result:
+            on_result(result)
+
+    if to_run:
+        for path, result in zip(to_run, run_tests_parallel(
+                to_run, package_dir, jobs, timeout, lua, on_result=finished, sessions=sessions)):
+            results[path] = result
+    return [results[path] for path in files]
+
+
+def write_junit(results, path, suite_name="envireament", root=None):
+    """Write results as a JUnit XML report for CI dashboards."""
+    failures = sum(1 for r in results if r.status == FAILED)
+    errors = sum(1 for r in results if r.status in (TIMEOUT, ERROR))
+    suites = ET.Element("testsuites")
+    suite = ET.SubElement(suites, "testsuite", {
+        "name": suite_name,
+        "tests": str(len(results)),
+        "failures": str(failures),
+        "errors": str(errors),
+        "time": f"{sum(r.duration for r in results):.3f}",
+    })
+    for result in results:
+        relative = result.path
+        if root:
+            try:
+                relative = result.path.relative_to(root)
+            except ValueError:
+                pass
+        case = ET.SubElement(suite, "testcase", {
+            "classname": str(relative.parent).replace(os.sep, ".") or ".",
+            "name": relative.name,
+            "time": f"{result.duration:.3f}",
+        })
+        if result.status == FAILED:
+            failure = ET.SubElement(case, "failure", {
+                "message": f"exit code {result.returncode}",
+            })
+            failure.text = result.output
+        elif result.status in (TIMEOUT, ERROR):
+            error = ET.SubElement(case, "error", {"type": result.status})
+            error.text = result.output
+        out = ET.SubElement(case, "system-out")
+        out.text = result.output
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(suites).write(str(path), encoding="utf-8", xml_declaration=True)
+
+
+def run_test_paths(paths, package_dir, jobs=None, timeout=DEFAULT_TIMEOUT, junit=None,
+                   verbose=False, lua="lua", stream=None, use_cache=True, cache_dir=None,
+                   affected=False, changed=None, base="HEAD", api_coverage=None,
+                   line_coverage=None, coverage_mode="sampled", coverage_interval=None,
+                   frame_budget=None, frame_percentile=99, sessions=None):
+    """Discover, run and report. Returns True when every test passed.
+
+    With affected=True only tests reachable from the changed files run;
+    changed defaults to ``git diff --name-only base`` plus untracked files.
+    api_coverage names a directory each test writes its exercised-API
+    bitset to (apicov.py), and line_coverage one for line coverage
+    (coverage.py); cached results are not replayed with either.
+    With frame_budget (ms), each test also fails when its frame_percentile
+    frame cost is over budget. sessions > 1 runs up to that many files from
+    a directory in one Lua process; frame budgets need a process per file,
+    so they turn it off.
+    """
+    stream = stream or sys.stdout
+    files = discover_tests(paths)
+    if not files:
+        print("No test files found (looking for test_*.lua and *_test.lua)", file=stream)
+        return False
+    root = Path.cwd()
+    scanner = DependencyScanner(package_dir)
+    if affected:
+        try:
+            selected, reasons, changes = select_affected(
+                files, package_dir, changed=changed, base=base, root=root, scanner=scanner)
+        except ValueError as exc:
+            print(f"Cannot select affected tests: {exc}", file=stream)
+            return False
+        print(f"{len(changes)} changed file(s) affect {len(selected)} of {len(files)} test file(s)",
+              file=stream)
+        if verbose:
+            for path in selected:
+                print(f"    {path.name}: {reasons[path]}", file=stream)
+        if not selected:
+            return True
+        files = selected
+    print(f"Running {len(files)} test file(s) with {jobs or os.cpu_count() or 1} worker(s)",
+          file=stream)
+    start = time.time()
+
+    def report(result):
+        print(format_result(result, root), file=stream, flush=True)
+        if verbose or not result.ok:
+            for line in result.output.rstrip().splitlines()[-40 if not verbose else None:]:
+                print("    " + line, file=stream)
+
+    if api_coverage:
+        api_coverage = apicov.enable(api_coverage)
+        use_cache = False  # a replayed result exercises nothing
+    if line_coverage:
+        line_coverage = coverage.enable(line_coverage, coverage_mode, coverage_interval)
+        use_cache = False
+    if frame_budget:
+        os.environ[FRAME_BUDGET_VAR] = str(frame_budget)
+        os.environ[FRAME_PERCENTILE_VAR] = str(frame_percentile)
+        use_cache = False  # timings differ from run to run
+        sessions = None
+    cache = ResultCache(cache_dir) if use_cache else None
+    results = execute_tests(files, package_dir, jobs, timeout, lua, on_result=report, cache=cache,
+                            scanner=scanner, sessions=sessions)
+    passed = sum(1 for r in results if r.ok)
+    summary = f"\n{passed}/{len(results)} passed in {time.time() - start:.2f}s"
+    if cache is not None:
+        summary += f" ({cache.hits} cached)"
+    print(summary, file=stream)
+    if junit:
+        write_junit(results, junit, root=root)
+        print(f"JUnit report written to {junit}", file=stream)
+    if api_coverage:
+        try:
+            report = apicov.coverage_report([api_coverage], package_dir)
+            print(f"API coverage: {report['exercised']}/{report['total']} mock functions "
+                  f"exercised across {report['runs']} run(s) in {api_coverage}", file=stream)
+        except apicov.CoverageError as exc:
+            print(f"Cannot read API coverage: {exc}", file=stream)
+    if line_coverage:
+        print(f"Line coverage recorded in {line_coverage} "
+              f"(report: envireament coverage {line_coverage} --lcov lcov.info)", file=stream)
+    return passed == len(results)
@@ -0,0 +1,83 @@
+"""
+Input scenarios replayed against a deferred script.
+
+``play_scenario()`` runs a script the way ``envireament test`` does, with
+``ENVIREAMENT_SCENARIO`` naming a scenario file. The mock then drives the
+script's frames on the virtual clock and feeds each frame its clicks, typed
+values, key presses and mouse moves, addressed to widgets by label or ID.
+The format is described at the top of envireament_scenario.lua, the
+playback engine the mock loads; a scenario file is a Lua chunk returning the
+scenario table, or the same data as JSON.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from .fixtures import lua_literal
+from .runner import DEFAULT_TIMEOUT, run_test_file
+
+ENV_VAR = "ENVIREAMENT_SCENARIO"
+SETTLE_VAR = "ENVIREAMENT_SCENARIO_SETTLE"
+ALLOW_MISSED_VAR = "ENVIREAMENT_SCENARIO_ALLOW_MISSED"
+DEFAULT_SETTLE = 1
+
+
+class ScenarioError(ValueError):
+    """A scenario file that cannot be read."""
+
+
+def scenario_to_lua(data):
+    """Lua source of a scenario given as plain data (a list of steps or a dict)."""
+    try:
+        return "return " + lua_literal(data) + "\n"
+    except (TypeError, ValueError) as exc:
+        raise ScenarioError(f"cannot convert scenario: {exc}")
+
+
+def _json_scenario(path):
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except ValueError as exc:
+        raise ScenarioError(f"{path}: {exc}")
+    handle = tempfile.NamedTemporaryFile("w", suffix=".lua", delete=False, encoding="utf-8")
+    with handle:
+        handle.write(scenario_to_lua(data))
+    return Path(handle.name)
+
+
+def play_scenario(script, scenario, package_dir, settle=DEFAULT_SETTLE, allow_missed=False,
+                  lua="lua", timeout=DEFAULT_TIMEOUT, stream=None):
+    """Replay scenario against script and print the per-step frame costs.
+
+    Returns True when the script ran every step without error and every
+    widget event found its widget.
+    """
+    stream = stream or sys.stdout
+    script = Path(script).resolve()
+    scenario = Path(scenario).resolve()
+    try:
+        converted = _json_scenario(scenario) if scenario.suffix == ".json" else None
+    except (OSError, ScenarioError) as exc:
+        print(f"Cannot read scenario: {exc}", file=stream)
+        return False
+    env = {ENV_VAR: str(converted or scenario), SETTLE_VAR: str(settle),
+           ALLOW_MISSED_VAR: "1" if allow_missed else "0"}
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        result = run_test_file(script, package_dir, lua, timeout)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        if converted:
+            converted.unlink()
+    print(result.output.rstrip(), file=stream)
+    print(f"\nScenario {scenario.name} against {script.name}: {result.status} "
+          f"({result.duration:.2f}s)", file=stream)
+    return result.ok
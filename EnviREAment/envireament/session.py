@@ -0,0 +1,302 @@
+"""
+Drive the virtual REAPER from Python over a long-lived Lua host.
+
+``connect()`` starts ``envireament_host.lua`` and speaks JSON-RPC 2.0 to it,
+one JSON document per line over stdio. Requests are pipelined: they are
+written as soon as they are made and replies are matched by id on a reader
+thread, so many calls can be in flight at once. A batch sends many calls in
+a single line and gets all replies back in one.
+
+    with envireament.connect() as session:
+        track = session.reaper.GetTrack(0, 0)
+        session.reaper.SetMediaTrackInfo_Value(track, "D_VOL", 0.5)
+
+        with session.batch() as batch:
+            names = [batch.call("GetTrackName", session.reaper.GetTrack(0, i))
+                     for i in range(8)]
+        print([future.result() for future in names])
+
+        tracks = session.state("tracks")
+"""
+
+import asyncio
+import itertools
+import json
+import subprocess
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+HOST_SCRIPT = "envireament_host.lua"
+
+
+class SessionError(Exception):
+    """An error reply from the Lua host, or a lost connection."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class Handle:
+    """A Lua object (track, item, take, ImGui context...) held by the host."""
+
+    __slots__ = ("ref",)
+
+    def __init__(self, ref):
+        self.ref = ref
+
+    def __eq__(self, other):
+        return isinstance(other, Handle) and other.ref == self.ref
+
+    def __hash__(self):
+        return hash(("Handle", self.ref))
+
+    def __repr__(self):
+        return f"<Handle {self.ref}>"
+
+
+def _encode(value):
+    if isinstance(value, Handle):
+        return {"$ref": value.ref}
+    raise TypeError(f"Cannot send {type(value).__name__} to the virtual REAPER")
+
+
+def _decode(obj):
+    if len(obj) == 1 and "$ref" in obj:
+        return Handle(obj["$ref"])
+    return obj
+
+
+def _unwrap(values):
+    """Lua multiple returns: none -> None, one -> value, several -> tuple."""
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return tuple(values)
+
+
+class _Namespace:
+    """Attribute access sugar: session.reaper.GetTrack(0, 0)."""
+
+    def __init__(self, session, prefix):
+        self._session = session
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = self._prefix + name
+        return lambda *args: self._session.request(method, *args)
+
+
+class Batch:
+    """Collects calls and sends them as one JSON-RPC batch on exit."""
+
+    def __init__(self, session):
+        self._session = session
+        self._requests = []
+
+    def call(self, name, *args):
+        """Queue a REAPER API call; returns a Future for its result."""
+        return self.request("reaper." + name, *args)
+
+    def request(self, method, *args):
+        future = Future()
+        self._requests.append((method, args, future))
+        return future
+
+    def send(self):
+        requests, self._requests = self._requests, []
+        self._session._send_batch(requests)
+        return [future for _, _, future in requests]
+
+    def results(self):
+        """Send the batch and wait for every result, in call order."""
+        return [future.result() for future in self.send()]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self._requests:
+            self.send()
+
+
+class Session:
+    """A running Lua host with a pipelined JSON-RPC connection."""
+
+    def __init__(self, lua="lua", package_dir=None, verbose=False, timeout=30.0, cwd=None):
+        package_dir = Path(package_dir) if package_dir else Path(__file__).parent.parent
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        cmd = [lua, str(package_dir / HOST_SCRIPT)]
+        if verbose:
+            cmd.append("--verbose")
+        self._process = subprocess.Popen(
+            cmd,
+            cwd=str(cwd or package_dir),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.DEVNULL,
+            bufsize=1,
+            universal_newlines=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        ready = self._process.stdout.readline()
+        if not ready:
+            raise SessionError("Lua host exited during startup")
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+        self.reaper = _Namespace(self, "reaper.")
+        self.env = _Namespace(self, "env.")
+
+    # Transport ------------------------------------------------------
+
+    def _message(self, method, args, future):
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": list(args)}
+
+    def _write(self, payload):
+        line = json.dumps(payload, default=_encode, separators=(",", ":")) + "\n"
+        with self._lock:
+            try:
+                if self._closed:
+                    raise SessionError("Session is closed")
+                self._process.stdin.write(line)
+                self._process.stdin.flush()
+            except (OSError, ValueError, SessionError) as exc:
+                # Nothing was sent, so no reply will resolve these requests
+                for message in payload if isinstance(payload, list) else [payload]:
+                    self._pending.pop(message["id"], None)
+                if isinstance(exc, SessionError):
+                    raise
+                raise SessionError(f"Lua host is gone: {exc}") from exc
+
+    def _send_batch(self, requests):
+        if not requests:
+            return
+        with self._lock:
+            messages = [self._message(method, args, future) for method, args, future in requests]
+        self._write(messages)
+
+    def _resolve(self, reply):
+        future = self._pending.pop(reply.get("id"), None)
+        if future is None:
+            return
+        if "error" in reply:
+            error = reply["error"]
+            future.set_exception(SessionError(error.get("message"), error.get("code")))
+        else:
+            future.set_result(_unwrap(reply.get("result")))
+
+    def _read_replies(self):
+        for line in self._process.stdout:
+            try:
+                reply = json.loads(line, object_hook=_decode)
+            except ValueError:
+                continue
+            for item in reply if isinstance(reply, list) else [reply]:
+                self._resolve(item)
+        # Host gone: fail whatever is still waiting
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(SessionError("Lua host exited"))
+
+    # Calls ----------------------------------------------------------
+
+    def request_async(self, method, *args):
+        """Send any host method without waiting; returns a Future."""
+        future = Future()
+        with self._lock:
+            message = self._message(method, args, future)
+        self._write(message)
+        return future
+
+    def request(self, method, *args):
+        return self.request_async(method, *args).result(self.timeout)
+
+    def call(self, name, *args):
+        """Call a REAPER/ImGui API function and wait for its result."""
+        return self.request("reaper." + name, *args)
+
+    def call_async(self, name, *args):
+        """Call a REAPER/ImGui API function; returns a Future."""
+        return self.request_async("reaper." + name, *args)
+
+    async def acall(self, name, *args):
+        """Awaitable form of call() for asyncio test harnesses."""
+        return await asyncio.wrap_future(self.call_async(name, *args))
+
+    def batch(self):
+        """Start a batch; calls are sent together when the block exits."""
+        return Batch(self)
+
+    def call_many(self, calls):
+        """Run [(name, *args), ...] in one round-trip and return the results."""
+        batch = Batch(self)
+        for name, *args in calls:
+            batch.call(name, *args)
+        return [future.result(self.timeout) for future in batch.send()]
+
+    def state(self, kind="summary"):
+        """Bulk snapshot: summary, tracks, items, markers, stats or ext_state."""
+        return self.request("state", kind)
+
+    def reset(self):
+        """Start again from a fresh virtual environment."""
+        return self.request("reset")
+
+    def run_script(self, path):
+        """Run a Lua script inside the host's environment."""
+        return self.request("run_script", str(path))
+
+    def run_test(self, path):
+        """Run a test script from a clean state; returns (passed, output)."""
+        return self.request("run_test", str(path))
+
+    # Lifetime -------------------------------------------------------
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            self.request_async("shutdown").result(self.timeout)
+        except Exception:
+            pass
+        with self._lock:
+            self._closed = True
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self._process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+    def kill(self):
+        """Stop the host at once, e.g. when a script hangs."""
+        with self._lock:
+            self._closed = True
+        self._process.kill()
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def connect(**kwargs):
+    """Start a Lua host and return a connected Session."""
+    return Session(**kwargs)
@@ -0,0 +1,305 @@
+"""
+Soak runs: drive a deferred script for many frames and watch its memory.
+
+``soak_script()`` runs a script the way ``envireament test`` does, with
+``ENVIREAMENT_SOAK`` naming a series file. The mock then queues deferred
+callbacks and runs them frame by frame on its virtual clock instead of
+recursing. Every ``every`` frames it samples the heap, streams the sample
+to the series file, and at the end it fits a line through the live heap.
+When memory keeps growing the run fails.
+
+The series file is plain text::
+
+    envireament-soak 1
+    script <path>
+    frames <n> every <k> warmup <w> limit <kb>
+    sample <frame> <heap kb> <live kb> <gc cycles> <api calls>
+    apis <name>:<calls>,...            (API calls since the previous sample)
+    table <entries before> <entries after> <path>
+    trend <first fitted frame> <kb per 1000 frames> <r2> <growth kb> growing|stable
+
+``summarize_series()`` prints it back with a sparkline, the tables that
+grew and the API calls made in the frames where the live heap went up,
+and can draw the series as an SVG.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from .runner import run_test_file
+
+ENV_VAR = "ENVIREAMENT_SOAK"
+FRAMES_VAR = "ENVIREAMENT_SOAK_FRAMES"
+EVERY_VAR = "ENVIREAMENT_SOAK_EVERY"
+WARMUP_VAR = "ENVIREAMENT_SOAK_WARMUP"
+LIMIT_VAR = "ENVIREAMENT_SOAK_LIMIT_KB"
+
+# Same defaults as the mock's soak mode
+DEFAULT_FRAMES = 10000
+DEFAULT_EVERY = 100
+DEFAULT_LIMIT_KB = 64
+
+_SPARKS = "▁▂▃▄▅▆▇█"
+
+
+class SoakError(ValueError):
+    """A series file that cannot be read."""
+
+
+class Sample:
+    """One point of the series."""
+
+    __slots__ = ("frame", "heap", "live", "gc", "calls", "apis")
+
+    def __init__(self, frame, heap, live, gc, calls):
+        self.frame = frame
+        self.heap = heap
+        self.live = live
+        self.gc = gc
+        self.calls = calls
+        self.apis = {}
+
+
+def read_series(path):
+    """Everything in a series file as a dict."""
+    series = {"script": None, "frames": None, "every": None, "warmup": 0, "limit": None,
+              "samples": [], "tables": [], "trend": None, "error": None}
+    with open(str(path), encoding="utf-8") as handle:
+        if not handle.readline().startswith("envireament-soak "):
+            raise SoakError(f"{path}: not a soak series")
+        for line in handle:
+            key, _, value = line.rstrip("\n").partition(" ")
+            try:
+                if key == "script":
+                    series["script"] = value
+                elif key == "frames":
+                    fields = value.split()
+                    series["frames"], series["every"] = int(fields[0]), int(fields[2])
+                    series["warmup"], series["limit"] = int(fields[4]), float(fields[6])
+                elif key == "sample":
+                    frame, heap, live, gc, calls = value.split()
+                    series["samples"].append(
+                        Sample(int(frame), float(heap), float(live), int(gc), int(calls)))
+                elif key == "apis" and series["samples"]:
+                    apis = series["samples"][-1].apis
+                    for pair in value.split(","):
+                        name, _, count = pair.rpartition(":")
+                        apis[name] = int(count)
+                elif key == "table":
+                    before, after, table_path = value.split(" ", 2)
+                    series["tables"].append((int(before), int(after), table_path))
+                elif key == "trend":
+                    start, slope, r2, growth, verdict = value.split()
+                    series["trend"] = {"start": int(start), "slope_kb": float(slope),
+                                       "r2": float(r2), "growth_kb": float(growth),
+                                       "growing": verdict == "growing"}
+                elif key == "error":
+                    series["error"] = value
+            except (ValueError, IndexError):
+                raise SoakError(f"{path}: malformed {key} line")
+    return series
+
+
+def fit_trend(points):
+    """Least-squares slope and r² of [(x, y)]."""
+    n = len(points)
+    if n < 2:
+        return 0.0, 0.0
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    syy = sum((y - my) ** 2 for _, y in points)
+    sxy = sum((x - mx) * (y - my) for x, y in points)
+    if not sxx:
+        return 0.0, 0.0
+    return sxy / sxx, (sxy * sxy / (sxx * syy) if syy else 0.0)
+
+
+def growing_apis(series, top=10):
+    """API calls behind the windows where the live heap went up.
+
+    Returns (rows, contrasted). With windows that did not grow to compare
+    against, rows are (name, calls per growing window, calls per other
+    window) for the APIs called more often while memory grew. Otherwise
+    every window grew and rows list the calls made per window.
+    """
+    start = series["trend"]["start"] if series["trend"] else series["warmup"]
+    samples = [s for s in series["samples"] if s.frame >= start]
+    growing, other = [], []
+    for previous, sample in zip(samples, samples[1:]):
+        (growing if sample.live > previous.live else other).append(sample.apis)
+    if not growing:
+        return [], False
+
+    def per_window(windows):
+        totals = {}
+        for apis in windows:
+            for name, count in apis.items():
+                totals[name] = totals.get(name, 0) + count
+        return {name: count / len(windows) for name, count in totals.items()}
+
+    grew = per_window(growing)
+    if not other:
+        rows = sorted(((name, rate, None) for name, rate in grew.items()),
+                      key=lambda row: (-row[1], row[0]))
+        return rows[:top], False
+    rest = per_window(other)
+    rows = [(name, rate, rest.get(name, 0.0)) for name, rate in grew.items()
+            if rate - rest.get(name, 0.0) >= 1.0]
+    rows.sort(key=lambda row: (-(row[1] - row[2]), row[0]))
+    return rows[:top], True
+
+
+def sparkline(values, width=60):
+    """values squeezed into width block characters (bucket maxima)."""
+    if not values:
+        return ""
+    buckets = []
+    size = max(1, -(-len(values) // width))
+    for i in range(0, len(values), size):
+        buckets.append(max(values[i:i + size]))
+    low, high = min(buckets), max(buckets)
+    span = (high - low) or 1.0
+    return "".join(_SPARKS[int((value - low) / span * (len(_SPARKS) - 1))] for value in buckets)
+
+
+def write_svg(series, path, width=800, height=240):
+    """Heap and live heap against frame as a standalone SVG line chart."""
+    samples = series["samples"]
+    if not samples:
+        raise SoakError("no samples to plot")
+    pad = 40
+    first, last = samples[0].frame, samples[-1].frame
+    low = min(s.live for s in samples)
+    high = max(s.heap for s in samples)
+
+    def x(frame):
+        return pad + (frame - first) / ((last - first) or 1) * (width - 2 * pad)
+
+    def y(kb):
+        return height - pad - (kb - low) / ((high - low) or 1) * (height - 2 * pad)
+
+    def polyline(values, color):
+        points = " ".join(f"{x(s.frame):.1f},{y(v):.1f}" for s, v in zip(samples, values))
+        return f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{points}"/>'
+
+    trend = ""
+    if series["trend"]:
+        start = series["trend"]["start"]
+        fitted = [(s.frame, s.live) for s in samples if s.frame >= start]
+        if len(fitted) >= 2:
+            slope, _ = fit_trend(fitted)
+            mean_x = sum(f for f, _ in fitted) / len(fitted)
+            mean_y = sum(v for _, v in fitted) / len(fitted)
+            x0, x1 = fitted[0][0], fitted[-1][0]
+            trend = (f'<line x1="{x(x0):.1f}" y1="{y(mean_y + slope * (x0 - mean_x)):.1f}" '
+                     f'x2="{x(x1):.1f}" y2="{y(mean_y + slope * (x1 - mean_x)):.1f}" '
+                     f'stroke="#d62728" stroke-dasharray="6 4"/>')
+    title = os.path.basename(series["script"] or "soak")
+    svg = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{pad}" y="20">{title}: heap (grey) and live heap (blue), KB by frame</text>',
+        f'<text x="4" y="{y(high) + 4:.1f}">{high:.0f}</text>',
+        f'<text x="4" y="{y(low) + 4:.1f}">{low:.0f}</text>',
+        f'<text x="{pad}" y="{height - 12}">{first}</text>',
+        f'<text x="{width - pad}" y="{height - 12}" text-anchor="end">{last}</text>',
+        polyline([s.heap for s in samples], "#999999"),
+        polyline([s.live for s in samples], "#1f77b4"),
+        trend,
+        "</svg>",
+    ]
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text("\n".join(line for line in svg if line) + "\n", encoding="utf-8")
+
+
+def summarize_series(series, top=10, stream=None):
+    """Print a series: its shape, trend, the tables that grew and the API calls behind them."""
+    stream = stream or sys.stdout
+    samples = series["samples"]
+    if not samples:
+        print("No samples recorded", file=stream)
+        return
+    first, last = samples[0], samples[-1]
+    print(f"{series['script']}: {last.frame} frames, {len(samples)} samples every "
+          f"{series['every']} frames", file=stream)
+    print(f"  live heap {first.live:.1f} KB -> {last.live:.1f} KB  "
+          f"{sparkline([s.live for s in samples])}", file=stream)
+    print(f"  GC cycles {sum(s.gc for s in samples)}, API calls {sum(s.calls for s in samples)}",
+          file=stream)
+    trend = series["trend"]
+    if trend:
+        verdict = "GROWING" if trend["growing"] else "stable"
+        print(f"  trend after frame {trend['start']}: {trend['slope_kb']:+.2f} KB per 1000 frames, "
+              f"{trend['growth_kb']:+.1f} KB in total (r² {trend['r2']:.2f}): {verdict}",
+              file=stream)
+    if series["error"]:
+        print(f"  script error: {series['error']}", file=stream)
+    if series["tables"]:
+        print("\nTables that grew after the warm-up (entries):", file=stream)
+        grown = sorted(series["tables"], key=lambda t: (-(t[1] - t[0]), t[2]))
+        for before, after, path in grown[:top]:
+            print(f"  {after - before:+8}  {before} -> {after}  {path}", file=stream)
+    rows, contrasted = growing_apis(series, top)
+    if rows and contrasted:
+        print("\nAPI calls made more often while the live heap grew (per window):", file=stream)
+        for name, grew, rest in rows:
+            print(f"  {grew:9.1f} vs {rest:9.1f}  {name}", file=stream)
+    elif rows and trend and trend["growing"]:
+        print("\nEvery window grew; API calls per window:", file=stream)
+        for name, grew, _ in rows:
+            print(f"  {grew:9.1f}  {name}", file=stream)
+
+
+def soak_paths(series_path, top=10, plot=None, stream=None):
+    """Summarize an existing series file. Returns False when it cannot be read."""
+    stream = stream or sys.stdout
+    try:
+        series = read_series(series_path)
+        summarize_series(series, top, stream)
+        if plot:
+            write_svg(series, plot)
+            print(f"\nPlot written to {plot}", file=stream)
+    except (SoakError, OSError) as exc:
+        print(f"Cannot read soak series: {exc}", file=stream)
+        return False
+    return not (series["trend"] and series["trend"]["growing"]) and not series["error"]
+
+
+def soak_script(script, package_dir, frames=DEFAULT_FRAMES, every=DEFAULT_EVERY, warmup=None,
+                limit_kb=DEFAULT_LIMIT_KB, output=None, lua="lua", timeout=None, top=10,
+                plot=None, stream=None):
+    """Soak one script and summarize its series.
+
+    Returns True when the script ran all its frames (or stopped deferring)
+    without error and its memory levelled off.
+    """
+    stream = stream or sys.stdout
+    script = Path(script).resolve()
+    output = Path(output or script.with_suffix(".soak")).resolve()
+    env = {ENV_VAR: str(output), FRAMES_VAR: str(frames), EVERY_VAR: str(every),
+           LIMIT_VAR: str(limit_kb)}
+    if warmup is not None:
+        env[WARMUP_VAR] = str(warmup)
+    saved = {key: os.environ.get(key) for key in list(env) + [WARMUP_VAR]}
+    os.environ.pop(WARMUP_VAR, None)
+    os.environ.update(env)
+    try:
+        if output.exists():
+            output.unlink()
+        result = run_test_file(script, package_dir, lua, timeout)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    if not output.exists():
+        print(f"No soak series written ({result.status})", file=stream)
+        print(result.output.rstrip(), file=stream)
+        return False
+    soak_paths(output, top, plot, stream)
+    print(f"\nSeries written to {output} ({result.duration:.1f}s, {result.status})", file=stream)
+    return result.ok
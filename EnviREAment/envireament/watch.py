@@ -0,0 +1,223 @@
+"""
+Re-run affected Lua tests as files are saved.
+
+``watch()`` polls mtimes under the watched directories. When something
+changes, impact.py picks the tests the change can reach, and only those
+run. They run in warm workers: ``envireament_host.lua`` processes that
+already have the mock loaded and reset VirtualState between scripts, so a
+re-run costs the script itself rather than a fresh interpreter.
+
+Workers are started per test directory, so relative ``dofile`` paths work
+as they do with ``envireament test``. A script that exits the process or
+hangs loses its worker. The script is then re-run cold (or reported as
+timed out), and the worker restarts on the next run.
+"""
+
+import difflib
+import os
+import sys
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+
+from .deps import DependencyScanner
+from .impact import MOCK_SCRIPT, ImpactGraph, mock_impact
+from .runner import (DEFAULT_TIMEOUT, FAILED, PASSED, SKIP_DIRS, TIMEOUT, TestResult,
+                     format_result, is_test_file, run_test_file)
+from .session import Session, SessionError
+
+DEFAULT_INTERVAL = 0.2
+
+
+class TreeScanner:
+    """Stat-only snapshots of the Lua files under a set of roots.
+
+    Directory listings are reused while a directory's own mtime is
+    unchanged, so a poll over a large, quiet tree is one stat per file.
+    """
+
+    def __init__(self, roots, suffix=".lua"):
+        self.roots = [Path(root).resolve() for root in roots]
+        self.suffix = suffix
+        self._listings = {}  # directory -> (mtime_ns, files, subdirectories)
+
+    def _listing(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return (), ()
+        cached = self._listings.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        files, subdirs = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS and not entry.name.startswith("."):
+                            subdirs.append(entry.path)
+                    elif entry.name.endswith(self.suffix):
+                        files.append(entry.path)
+        except OSError:
+            pass
+        self._listings[directory] = (mtime, files, subdirs)
+        return files, subdirs
+
+    def scan(self):
+        """{path: (mtime_ns, size)} for every matching file."""
+        snapshot = {}
+        stack = []
+        for root in self.roots:
+            if root.is_file():
+                st = os.stat(str(root))
+                snapshot[root] = (st.st_mtime_ns, st.st_size)
+            else:
+                stack.append(str(root))
+        while stack:
+            files, subdirs = self._listing(stack.pop())
+            for path in files:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[Path(path)] = (st.st_mtime_ns, st.st_size)
+            stack.extend(subdirs)
+        return snapshot
+
+
+def changed_paths(old, new):
+    """Files added, removed or modified between two snapshots."""
+    changed = {path for path, key in new.items() if old.get(path) != key}
+    changed.update(path for path in old if path not in new)
+    return changed
+
+
+def line_changes(old_source, new_source):
+    """(old ranges, new ranges) of changed lines, like parse_hunks() on a diff."""
+    old_lines, new_lines = [], []
+    matcher = difflib.SequenceMatcher(None, old_source.splitlines(), new_source.splitlines(),
+                                      autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if i2 > i1:
+            old_lines.append((i1 + 1, i2))
+        if j2 > j1:
+            new_lines.append((j1 + 1, j2))
+    return old_lines, new_lines
+
+
+class WarmPool:
+    """One warm Lua host per test directory."""
+
+    def __init__(self, package_dir, lua="lua", timeout=DEFAULT_TIMEOUT):
+        self.package_dir = Path(package_dir)
+        self.lua = lua
+        self.timeout = timeout
+        self._workers = {}
+
+    def worker(self, directory):
+        session = self._workers.get(directory)
+        if session is None:
+            session = Session(lua=self.lua, package_dir=self.package_dir,
+                              timeout=self.timeout, cwd=directory)
+            self._workers[directory] = session
+        return session
+
+    def warm(self, tests):
+        """Start workers ahead of the first change."""
+        for directory in sorted({Path(test).parent for test in tests}):
+            self.worker(directory)
+
+    def discard(self, directory, kill=False):
+        session = self._workers.pop(directory, None)
+        if session is not None:
+            session.kill() if kill else session.close()
+
+    def run(self, path):
+        path = Path(path)
+        start = time.time()
+        try:
+            passed, output = self.worker(path.parent).run_test(path)
+        except FutureTimeout:
+            self.discard(path.parent, kill=True)
+            return TestResult(path, TIMEOUT, time.time() - start,
+                              f"Timed out after {self.timeout}s", None)
+        except SessionError:
+            # The script ended the process (os.exit) or crashed it: run it cold
+            self.discard(path.parent, kill=True)
+            return run_test_file(path, self.package_dir, self.lua, self.timeout)
+        return TestResult(path, PASSED if passed else FAILED, time.time() - start, output, None)
+
+    def close(self):
+        for directory in list(self._workers):
+            self.discard(directory)
+
+
+def watch(paths, package_dir, lua="lua", interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT,
+          verbose=False, run_first=False, stream=None):
+    """Watch paths and re-run affected tests on every save until interrupted."""
+    stream = stream or sys.stdout
+    package_dir = Path(package_dir).resolve()
+    mock_path = package_dir / MOCK_SCRIPT
+    tree = TreeScanner(list(paths) + [mock_path])
+    graph = ImpactGraph(package_dir, DependencyScanner(package_dir))
+    pool = WarmPool(package_dir, lua, timeout)
+    root = Path.cwd()
+
+    def tests_in(snapshot):
+        return sorted(path for path in snapshot if is_test_file(path.name) and path != mock_path)
+
+    def run(selected, reasons):
+        start = time.time()
+        results = []
+        for path in selected:
+            result = pool.run(path)
+            results.append(result)
+            print(format_result(result, root), file=stream, flush=True)
+            if verbose:
+                print(f"    ({reasons.get(path, 'requested')})", file=stream)
+            if verbose or not result.ok:
+                for line in result.output.rstrip().splitlines()[-40 if not verbose else None:]:
+                    print("    " + line, file=stream)
+        passed = sum(1 for r in results if r.ok)
+        print(f"{passed}/{len(results)} passed in {(time.time() - start) * 1000:.0f}ms",
+              file=stream, flush=True)
+
+    snapshot = tree.scan()
+    mock_source = mock_path.read_text(encoding="utf-8", errors="replace")
+    tests = tests_in(snapshot)
+    pool.warm(tests)
+    print(f"Watching {len(snapshot)} Lua file(s), {len(tests)} test file(s). Ctrl+C to stop.",
+          file=stream, flush=True)
+    if run_first and tests:
+        run(tests, {})
+    try:
+        while True:
+            time.sleep(interval)
+            current = tree.scan()
+            changed = changed_paths(snapshot, current)
+            if not changed:
+                continue
+            snapshot = current
+            impact = None
+            if mock_path in changed:
+                try:
+                    new_source = mock_path.read_text(encoding="utf-8", errors="replace")
+                except OSError:
+                    new_source = ""
+                impact = mock_impact(mock_source, new_source, *line_changes(mock_source, new_source))
+                mock_source = new_source
+                pool.close()  # workers hold the old mock
+            tests = tests_in(snapshot)
+            reasons = graph.build(tests).affected(tests, changed, impact)
+            names = ", ".join(sorted(path.name for path in changed)[:3])
+            more = f" and {len(changed) - 3} more" if len(changed) > 3 else ""
+            print(f"\n{names}{more} changed: {len(reasons)} of {len(tests)} test file(s) affected",
+                  file=stream, flush=True)
+            if reasons:
+                run([test for test in tests if test in reasons], reasons)
+    except KeyboardInterrupt:
+        print("\nStopped watching", file=stream)
+    finally:
+        pool.close()
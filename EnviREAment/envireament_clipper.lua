@@ -0,0 +1,77 @@
+-- envireament_clipper.lua
+-- ImGui_ListClipper for the Enhanced Virtual REAPER Environment. Items are
+-- clipper.height apart (given to Begin, or measured from item 0 as ImGui
+-- does); each Step hands out the items that fall in the window's clip
+-- rect, plus any included by index, and moves the cursor over those it
+-- skips, so a long list costs what shows. Includes widen the one range
+-- instead of adding ranges of their own.
+--
+-- The mock loads this file as it starts; the ImGui_ListClipper_* API calls
+-- the table ListClipper.new returns.
+
+local ListClipper = {}
+
+-- host: layout (the table envireament_layout.lua built), whose current
+-- window and seek this lays items out with
+function ListClipper.new(host)
+  local current, seek = host.layout.current, host.layout.seek
+  local ceil, max, min = math.ceil, math.max, math.min
+  local list_clipper = {}
+
+  function list_clipper.begin(clipper, count, height)
+    local window = current(clipper.ctx)
+    clipper.window, clipper.count = window, max(0, math.floor(count or 0))
+    clipper.height = height and height > 0 and height or nil
+    clipper.start_y = window and window.cursor_y or 0
+    clipper.state, clipper.display_start, clipper.display_end = 0, 0, 0
+    clipper.include_start, clipper.include_end = nil, nil
+    if window then window.items_listed = window.items_listed + clipper.count end
+  end
+
+  function list_clipper.include(clipper, first, last)
+    clipper.include_start = min(clipper.include_start or first, first)
+    clipper.include_end = max(clipper.include_end or last, last)
+  end
+
+  local function clipper_end(clipper)
+    local window, count = clipper.window, clipper.count
+    if clipper.state < 3 and window and clipper.height then
+      seek(window, clipper.ctx, clipper.start_y + count * clipper.height)
+    end
+    clipper.state, clipper.display_start, clipper.display_end = 3, count, count
+    return false
+  end
+  list_clipper.finish = clipper_end
+
+  function list_clipper.step(clipper)
+    local window, count, state = clipper.window, clipper.count, clipper.state
+    if state >= 2 or count == 0 then return clipper_end(clipper) end
+    if not window then
+      clipper.state, clipper.display_start, clipper.display_end = 2, 0, count
+      return true
+    end
+    local first = 0
+    if state == 1 then
+      clipper.height, first = window.cursor_y - clipper.start_y, 1
+      if clipper.height <= 0 then return clipper_end(clipper) end
+    elseif not clipper.height then
+      clipper.state, clipper.display_start, clipper.display_end = 1, 0, 1
+      return true
+    end
+    local height, start_y = clipper.height, clipper.start_y
+    local show_start = math.floor((window.clip_y0 - start_y) / height)
+    local show_end = ceil((window.clip_y1 - start_y) / height)
+    if clipper.include_start then
+      show_start, show_end = min(show_start, clipper.include_start), max(show_end, clipper.include_end)
+    end
+    show_start, show_end = max(first, show_start), min(count, show_end)
+    if show_start >= show_end then return clipper_end(clipper) end
+    seek(window, clipper.ctx, start_y + show_start * height)
+    clipper.state, clipper.display_start, clipper.display_end = 2, show_start, show_end
+    return true
+  end
+
+  return list_clipper
+end
+
+return ListClipper
@@ -0,0 +1,356 @@
+-- envireament_coverage.lua
+-- API coverage, line coverage and the CPU profiler of the Enhanced Virtual
+-- REAPER Environment. The mock loads this file as it starts and writes
+-- what was recorded at exit.
+
+local Coverage = {}
+
+-- host: reaper (the mock's API table), api_ids and api_hits (filled in by
+-- log_api_call), log_warning and mock_sources, the chunk sources that
+-- count as the mock's rather than the script's
+function Coverage.new(host)
+  local mock_reaper, api_ids, api_hits = host.reaper, host.api_ids, host.api_hits
+  local log_warning, mock_sources = host.log_warning, host.mock_sources
+
+  -- Every API function gets an id (its position in sorted name order), and
+  -- log_api_call() marks the id as exercised. Constants do not log, so each
+  -- is swapped for a closure that marks its id and returns the same value.
+  -- At script exit the marks are written as a bitset that envireament
+  -- merges across runs (envireament/apicov.py).
+
+  local api_names = {}
+  for name in pairs(mock_reaper) do api_names[#api_names + 1] = name end
+  table.sort(api_names)
+  for id, name in ipairs(api_names) do api_ids[name] = id end
+
+  local function is_constant(name)
+    return name:find("^ImGui_%w*Flags_") or name:find("^ImGui_Col_") or
+           name:find("^ImGui_StyleVar_") or name:find("^ImGui_Key_") or
+           name:find("^ImGui_MouseButton_") or name:find("^ImGui_Cond_")
+  end
+
+  for id, name in ipairs(api_names) do
+    if is_constant(name) then
+      local value = mock_reaper[name]()
+      mock_reaper[name] = function()
+        api_hits[id] = true
+        return value
+      end
+    end
+  end
+
+  -- Lets sharded runs check they were built from the same API list
+  local function catalog_digest()
+    local h = 0
+    local text = table.concat(api_names, "\n")
+    for i = 1, #text do
+      h = (h * 31 + text:byte(i)) % 2147483647
+    end
+    return string.format("%08x", h)
+  end
+
+  -- Bit id-1 of the hex string, least significant bit of each byte first
+  local function encode_api_hits()
+    local hex = {}
+    for base = 0, #api_names - 1, 8 do
+      local byte = 0
+      for bit = 0, 7 do
+        if api_hits[base + bit + 1] then byte = byte + 2 ^ bit end
+      end
+      hex[#hex + 1] = string.format("%02x", math.floor(byte))
+    end
+    return table.concat(hex)
+  end
+
+  local function write_text(path, text)
+    local f = io.open(path .. ".tmp", "wb")
+    if not f then return false end
+    f:write(text)
+    f:close()
+    os.remove(path)
+    return os.rename(path .. ".tmp", path)
+  end
+
+  -- One file per process, rewritten at each exit with everything seen so far
+  local api_run_id = string.format("%d-%s", os.time(), tostring(api_hits):match("(%x+)$") or "0")
+
+  local function write_api_coverage(directory)
+    directory = directory or os.getenv("ENVIREAMENT_API_COVERAGE")
+    if not directory or directory == "" then return nil end
+    local digest = catalog_digest()
+    local catalog = directory .. "/" .. digest .. ".apis"
+    local existing = io.open(catalog, "rb")
+    if existing then
+      existing:close()
+    elseif not write_text(catalog, table.concat(api_names, "\n") .. "\n") then
+      log_warning("Cannot write API coverage to " .. directory)
+      return nil
+    end
+    local path = directory .. "/run-" .. api_run_id .. ".apicov"
+    if not write_text(path, string.format("envireament-api-coverage 1\ncatalog %s %d\nbits %s\n",
+                                          digest, #api_names, encode_api_hits())) then
+      log_warning("Cannot write API coverage to " .. directory)
+      return nil
+    end
+    return path, catalog
+  end
+
+  -- ==================== VM HOOKS ====================
+
+  -- debug.sethook works per coroutine. Line coverage and the CPU profiler
+  -- each install one hook (only one can be active), and while it is active
+  -- coroutines the script creates get it too.
+
+  local raw_coroutine_create = coroutine.create
+  local raw_coroutine_wrap = coroutine.wrap
+  local vm_hook = nil -- {owner, fn, mask, count}
+
+  local function hooked_create(f)
+    local co = raw_coroutine_create(f)
+    if vm_hook then debug.sethook(co, vm_hook.fn, vm_hook.mask, vm_hook.count) end
+    return co
+  end
+
+  local function hooked_wrap(f)
+    local co = hooked_create(f)
+    return function(...)
+      local results = table.pack(coroutine.resume(co, ...))
+      if not results[1] then error(results[2], 0) end
+      return table.unpack(results, 2, results.n)
+    end
+  end
+
+  local function set_vm_hook(owner, fn, mask, count)
+    if vm_hook and vm_hook.owner ~= owner then
+      log_warning(owner .. " replaces the active " .. vm_hook.owner .. " hook")
+    end
+    vm_hook = {owner = owner, fn = fn, mask = mask, count = count or 0}
+    coroutine.create = hooked_create
+    coroutine.wrap = hooked_wrap
+    debug.sethook(fn, mask, count or 0)
+  end
+
+  local function clear_vm_hook(owner)
+    if not vm_hook or vm_hook.owner ~= owner then return end
+    vm_hook = nil
+    coroutine.create = raw_coroutine_create
+    coroutine.wrap = raw_coroutine_wrap
+    debug.sethook()
+  end
+
+  -- ==================== LINE COVERAGE ====================
+
+  -- Line coverage of the scripts run under the mock, kept in memory and
+  -- written once at exit. "exact" hooks every line and suits small files.
+  -- "sampled" uses a count hook: every N VM instructions it records the
+  -- line being run, so the overhead is set by N and a line's count is
+  -- the number of samples that landed on it. Either way, each function's
+  -- executable lines (activelines) are recorded the first time it is seen,
+  -- so lines that never ran are reported as zero. Coroutines are covered too.
+
+  local DEFAULT_COVERAGE_INTERVAL = 1000
+
+  local coverage = nil -- {mode, interval, hits = {source -> {line -> n}}, active = {...}}
+
+  local function coverage_function(info)
+    local source = info.source
+    if coverage.seen[info.func] then return end
+    coverage.seen[info.func] = true
+    if source:sub(1, 1) ~= "@" or mock_sources[source] then return end
+    local lines = debug.getinfo(info.func, "L").activelines
+    if not lines then return end
+    local active = coverage.active[source]
+    if not active then
+      active = {}
+      coverage.active[source] = active
+      coverage.hits[source] = {}
+    end
+    for line in pairs(lines) do active[line] = true end
+  end
+
+  local function record_line(source, line)
+    local hits = coverage.hits[source]
+    if hits then hits[line] = (hits[line] or 0) + 1 end
+  end
+
+  local function exact_hook(event, line)
+    if event == "line" then
+      record_line(debug.getinfo(2, "S").source, line)
+    else
+      coverage_function(debug.getinfo(2, "Sf"))
+    end
+  end
+
+  local function sampled_hook()
+    local info = debug.getinfo(2, "Slf")
+    if not info then return end
+    if not coverage.seen[info.func] then
+      -- Callers may never be sampled themselves (a script's main chunk)
+      local level = 2
+      repeat
+        coverage_function(info)
+        level = level + 1
+        info = debug.getinfo(level, "Sf")
+      until not info
+      info = debug.getinfo(2, "Sl")
+    end
+    record_line(info.source, info.currentline)
+  end
+
+  local function start_coverage(mode, interval)
+    coverage = {
+      mode = mode == "exact" and "exact" or "sampled",
+      interval = math.max(1, math.floor(tonumber(interval) or DEFAULT_COVERAGE_INTERVAL)),
+      hits = {}, active = {}, seen = setmetatable({}, {__mode = "k"})
+    }
+    if coverage.mode == "exact" then
+      set_vm_hook("line coverage", exact_hook, "cl")
+    else
+      set_vm_hook("line coverage", sampled_hook, "", coverage.interval)
+    end
+  end
+
+  local function stop_coverage()
+    clear_vm_hook("line coverage")
+  end
+
+  local coverage_run_id = string.format("%d-%s", os.time(), tostring(coverage_function):match("(%x+)$") or "0")
+
+  local function write_coverage(directory)
+    directory = directory or os.getenv("ENVIREAMENT_COVERAGE")
+    if not coverage or not directory or directory == "" then return nil end
+    local sources = {}
+    for source in pairs(coverage.active) do sources[#sources + 1] = source end
+    table.sort(sources)
+    local out = {
+      "envireament-coverage 1",
+      "mode " .. coverage.mode .. " " .. coverage.interval,
+      "root " .. (os.getenv("PWD") or "")
+    }
+    for _, source in ipairs(sources) do
+      local lines, hits = {}, {}
+      for line in pairs(coverage.active[source]) do lines[#lines + 1] = line end
+      table.sort(lines)
+      for i, line in ipairs(lines) do
+        local n = coverage.hits[source][line]
+        lines[i] = tostring(line)
+        if n then hits[#hits + 1] = line .. ":" .. n end
+      end
+      out[#out + 1] = "file " .. source:sub(2)
+      out[#out + 1] = "lines " .. table.concat(lines, ",")
+      out[#out + 1] = "hits " .. table.concat(hits, ",")
+    end
+    local path = directory .. "/cov-" .. coverage_run_id .. ".txt"
+    if not write_text(path, table.concat(out, "\n") .. "\n") then
+      log_warning("Cannot write line coverage to " .. directory)
+      return nil
+    end
+    return path
+  end
+
+  -- ==================== CPU PROFILER ====================
+
+  -- A count hook samples the Lua call stack every N VM instructions. Each
+  -- function is interned once as a frame string and a number, and a sample
+  -- is counted under its ";"-joined frame numbers, so a repeated stack costs
+  -- one table increment. Mock frames are labelled "[mock]". By default, a
+  -- run of them collapses into the API function the script called.
+  -- Frames below the script (the runner) are dropped. A deferred callback
+  -- is rooted at "[mock] defer", as REAPER would run it from an empty stack.
+
+  local DEFAULT_PROFILE_INTERVAL = 1000
+
+  local profile = nil
+
+  local function intern_frame(level, func)
+    local info = debug.getinfo(level + 1, "Sn")
+    local kind, name
+    if info.what == "C" then
+      kind, name = "C", (info.name or "?") .. " [C]"
+    elseif mock_sources[info.source] then
+      kind, name = "mock", "[mock] " .. (info.name or
+        (info.what == "main" and "main chunk" or ("line " .. info.linedefined)))
+    elseif info.what == "main" then
+      kind, name = "script", "main chunk (" .. info.short_src .. ")"
+    else
+      kind, name = "script", string.format("%s (%s:%d)", info.name or "?", info.short_src,
+                                           info.linedefined)
+    end
+    local id = #profile.names + 1
+    profile.names[id] = name:gsub(";", ":")
+    profile.kinds[id] = kind
+    profile.frames[func] = id
+    return id
+  end
+
+  local function profile_hook()
+    local p = profile
+    local stack, n, outermost_script = p.stack, 0, 0
+    local level = 2
+    while true do
+      local info = debug.getinfo(level, "f")
+      if not info then break end
+      local id = p.frames[info.func] or intern_frame(level, info.func)
+      local kind = p.kinds[id]
+      if kind == "mock" and not p.detail and n > 0 and p.kinds[stack[n]] == "mock" then
+        stack[n] = id -- keep the outermost frame of a run of mock frames
+      else
+        n = n + 1
+        stack[n] = id
+      end
+      if kind == "script" then outermost_script = n end
+      if info.func == p.boundary then
+        outermost_script = n
+        break
+      end
+      level = level + 1
+    end
+    if outermost_script > 0 then n = outermost_script end
+    -- Root first, as collapsed stacks are written
+    local key = p.key
+    for i = 1, n do key[i] = stack[n + 1 - i] end
+    key = table.concat(key, ";", 1, n)
+    p.counts[key] = (p.counts[key] or 0) + 1
+    p.samples = p.samples + 1
+  end
+
+  local function start_profile(interval, detail)
+    profile = {
+      interval = math.max(1, math.floor(tonumber(interval) or DEFAULT_PROFILE_INTERVAL)),
+      detail = detail and true or false,
+      frames = {}, names = {}, kinds = {}, counts = {}, samples = 0, stack = {}, key = {},
+      boundary = mock_reaper.defer
+    }
+    set_vm_hook("CPU profiler", profile_hook, "", profile.interval)
+  end
+
+  local function stop_profile()
+    clear_vm_hook("CPU profiler")
+  end
+
+  -- Collapsed stacks ("frame;frame;frame count" per line) for flamegraph tools
+  local function write_profile(path)
+    path = path or os.getenv("ENVIREAMENT_PROFILE")
+    if not profile or not path or path == "" then return nil end
+    local lines = {}
+    for key, count in pairs(profile.counts) do
+      local frames = {}
+      for id in key:gmatch("%d+") do frames[#frames + 1] = profile.names[tonumber(id)] end
+      lines[#lines + 1] = table.concat(frames, ";") .. " " .. count
+    end
+    table.sort(lines)
+    if not write_text(path, table.concat(lines, "\n") .. (#lines > 0 and "\n" or "")) then
+      log_warning("Cannot write CPU profile to " .. path)
+      return nil
+    end
+    return path, profile.samples
+  end
+
+  return {
+    api_names = api_names, write_api_coverage = write_api_coverage,
+    start_coverage = start_coverage, stop_coverage = stop_coverage, write_coverage = write_coverage,
+    start_profile = start_profile, stop_profile = stop_profile, write_profile = write_profile,
+  }
+end
+
+return Coverage
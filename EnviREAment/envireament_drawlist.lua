@@ -0,0 +1,237 @@
+-- envireament_drawlist.lua
+-- Draw lists for the Enhanced Virtual REAPER Environment. Every window's
+-- draw list records its commands into flat numeric arrays that are kept
+-- across frames and only grow: an opcode and a color per command and
+-- DRAW_STRIDE arguments, zero-padded. Polylines, quads and paths keep
+-- their points in a points array, and text goes to a list of strings. A
+-- list starts over the first time it is drawn to in a frame.
+--
+-- With ENVIREAMENT_DRAWLIST set, each frame's lists are appended to that
+-- file when the frame ends, as little-endian binary (envireament/drawlist.py
+-- reads it back):
+--
+--   "EVDL" u16 version u16 stride
+--   per frame: "FRME" u32 frame u32 lists
+--     per list: u16 name length, name, u32 commands, u32 points, u32 text bytes,
+--               u8 opcode[commands], u32 color[commands],
+--               f32 args[commands * stride], f32 xy[points * 2], text bytes
+--
+-- The mock loads this file as it starts; the ImGui_DrawList_* API records
+-- into the lists of the table DrawLists.new returns.
+
+local DrawLists = {}
+
+-- host: state (the mock's VirtualState), log_warning, layout (the table
+-- envireament_layout.lua built) and frame_end_hooks, which flush is added to
+function DrawLists.new(host)
+  local VirtualState, log_warning, layout = host.state, host.log_warning, host.layout
+  local draw_lists = {}
+
+  local DRAW_STRIDE = 8
+  local DRAW_VERSION = 1
+  local INITIAL_CAPACITY = 64
+  -- Opcodes, as envireament/drawlist.py names them
+  local OP = {
+    LINE = 1,              -- x1 y1 x2 y2 thickness
+    RECT = 2,              -- x1 y1 x2 y2 rounding thickness flags
+    RECT_FILLED = 3,       -- x1 y1 x2 y2 rounding flags
+    CIRCLE = 4,            -- x y radius segments thickness
+    CIRCLE_FILLED = 5,     -- x y radius segments
+    TRIANGLE = 6,          -- x1 y1 x2 y2 x3 y3 thickness
+    TRIANGLE_FILLED = 7,   -- x1 y1 x2 y2 x3 y3
+    POLYLINE = 8,          -- first point, count, thickness, closed
+    CONVEX_POLY_FILLED = 9, -- first point, count
+    BEZIER_CUBIC = 10,     -- first point, count (4 control points), thickness, segments
+    TEXT = 11,             -- x y w h text offset, length, font size
+    PUSH_CLIP = 12,        -- x1 y1 x2 y2 intersect
+    POP_CLIP = 13,
+  }
+  draw_lists.OP = OP
+
+  local unpack, pack = table.unpack, string.pack
+  local drawn = {}  -- lists drawn to this frame, in order
+  local output = nil -- the open export file
+
+  local function new_list(ctx, name)
+    return {ctx = ctx, name = name, frame = -1, n = 0, np = 0, capacity = 0, text_bytes = 0,
+            ops = {}, cols = {}, args = {}, points = {}, texts = {}, path = {}, path_n = 0}
+  end
+
+  -- Doubles the arrays, filling them so they stay sequences
+  local function grow(list)
+    local capacity = math.max(INITIAL_CAPACITY, list.capacity * 2)
+    local ops, cols, args = list.ops, list.cols, list.args
+    for i = list.capacity + 1, capacity do
+      ops[i], cols[i] = 0, 0
+    end
+    for i = list.capacity * DRAW_STRIDE + 1, capacity * DRAW_STRIDE do args[i] = 0 end
+    list.capacity = capacity
+  end
+
+  local function start_frame(list)
+    list.frame = VirtualState.frame_count
+    list.n, list.np, list.path_n, list.text_bytes = 0, 0, 0, 0
+    local texts = list.texts
+    for i = #texts, 1, -1 do texts[i] = nil end
+    drawn[#drawn + 1] = list
+  end
+
+  -- Appends one command; missing arguments record as 0
+  local function record(list, op, col, a1, a2, a3, a4, a5, a6, a7, a8)
+    if list.frame ~= VirtualState.frame_count then start_frame(list) end
+    local n = list.n + 1
+    if n > list.capacity then grow(list) end
+    list.n = n
+    list.ops[n], list.cols[n] = op, math.floor((col or 0) % 4294967296)
+    local args, base = list.args, (n - 1) * DRAW_STRIDE
+    args[base + 1], args[base + 2], args[base + 3], args[base + 4] = a1 or 0, a2 or 0, a3 or 0, a4 or 0
+    args[base + 5], args[base + 6], args[base + 7], args[base + 8] = a5 or 0, a6 or 0, a7 or 0, a8 or 0
+  end
+  draw_lists.record = record
+
+  -- Appends x, y pairs to the points array; returns the first point's index
+  local function add_points(list, values, count)
+    if list.frame ~= VirtualState.frame_count then start_frame(list) end
+    local points, first = list.points, list.np
+    local base = first * 2
+    for i = 1, count * 2 do points[base + i] = values[i] end
+    list.np = first + count
+    return first
+  end
+
+  -- Polylines and convex fills take ReaImGui arrays or plain {x1, y1, ...}
+  -- tables of coordinates
+  function draw_lists.poly(list, op, col, points, a3, a4)
+    if type(points) ~= "table" then return end
+    local values = points.table and points:table() or points
+    local count = math.floor(#values / 2)
+    record(list, op, col, add_points(list, values, count), count, a3, a4)
+  end
+
+  -- Text is measured with the window's font, scaled to font_size
+  function draw_lists.text(list, x, y, col, text, font_size)
+    if list.frame ~= VirtualState.frame_count then start_frame(list) end
+    text = tostring(text or "")
+    local w, h = layout.text_size(list.ctx, text)
+    local size = layout.font_size(list.ctx)
+    if font_size and font_size > 0 and font_size ~= size then
+      w, h, size = w * font_size / size, h * font_size / size, font_size
+    end
+    local texts = list.texts
+    texts[#texts + 1] = text
+    record(list, OP.TEXT, col, x, y, w, h, list.text_bytes, #text, size)
+    list.text_bytes = list.text_bytes + #text
+  end
+
+  -- Path building: points gather until a stroke or fill records them
+  function draw_lists.path_to(list, x, y)
+    local path = list.path
+    path[list.path_n * 2 + 1], path[list.path_n * 2 + 2] = x, y
+    list.path_n = list.path_n + 1
+  end
+
+  function draw_lists.path_arc(list, x, y, radius, a_min, a_max, segments)
+    segments = segments and segments > 0 and segments or 12
+    for i = 0, segments do
+      local a = a_min + (a_max - a_min) * i / segments
+      draw_lists.path_to(list, x + math.cos(a) * radius, y + math.sin(a) * radius)
+    end
+  end
+
+  function draw_lists.path_end(list, op, col, a3, a4)
+    local count = list.path_n
+    if count > 0 then
+      record(list, op, col, add_points(list, list.path, count), count, a3, a4)
+    end
+    list.path_n = 0
+  end
+
+  function draw_lists.path_clear(list)
+    list.path_n = 0
+  end
+
+  -- The current window's list; outside a window, ImGui's implicit one
+  function draw_lists.get(ctx, name)
+    local lists = ctx.draw_lists
+    if not lists then
+      lists = {}
+      ctx.draw_lists = lists
+    end
+    if not name then
+      local window = layout.current(ctx)
+      name = window and window.path or "Debug##Default"
+    end
+    local list = lists[name]
+    if not list then
+      list = new_list(ctx, name)
+      lists[name] = list
+    end
+    return list
+  end
+
+  -- Packs a numeric array in slices small enough for table.unpack
+  local function pack_numbers(parts, format, values, count)
+    local slice = 1024
+    for first = 1, count, slice do
+      local last = math.min(count, first + slice - 1)
+      parts[#parts + 1] = pack("<" .. format:rep(last - first + 1), unpack(values, first, last))
+    end
+  end
+
+  local function pack_list(parts, list)
+    local text = table.concat(list.texts)
+    parts[#parts + 1] = pack("<s2I4I4I4", list.name, list.n, list.np, #text)
+    pack_numbers(parts, "B", list.ops, list.n)
+    pack_numbers(parts, "I4", list.cols, list.n)
+    pack_numbers(parts, "f", list.args, list.n * DRAW_STRIDE)
+    pack_numbers(parts, "f", list.points, list.np * 2)
+    parts[#parts + 1] = text
+  end
+
+  -- Writes the lists drawn in frame to the export file and forgets them
+  local function flush(frame)
+    if output then
+      local parts, count = {}, 0
+      for i = 1, #drawn do
+        if drawn[i].frame == frame then
+          pack_list(parts, drawn[i])
+          count = count + 1
+        end
+      end
+      output:write(pack("<c4I4I4", "FRME", frame, count), table.concat(parts))
+    end
+    for i = #drawn, 1, -1 do drawn[i] = nil end
+  end
+
+  function draw_lists.reset()
+    for i = #drawn, 1, -1 do drawn[i] = nil end
+  end
+
+  function draw_lists.start(path)
+    if output then output:close() end
+    local handle, err = io.open(path, "wb")
+    if not handle then
+      log_warning("Cannot write draw lists to " .. path .. ": " .. tostring(err))
+      return false
+    end
+    handle:write(pack("<c4I2I2", "EVDL", DRAW_VERSION, DRAW_STRIDE))
+    output = handle
+    return true
+  end
+
+  -- A frame's lists are complete when the next frame begins
+  table.insert(host.frame_end_hooks, function(frame) flush(frame - 1) end)
+
+  -- At exit the last frame is written and the file closed
+  function draw_lists.write()
+    if not output then return nil end
+    flush(VirtualState.frame_count)
+    output:close()
+    output = nil
+    return true
+  end
+
+  return draw_lists
+end
+
+return DrawLists
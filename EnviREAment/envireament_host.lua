@@ -0,0 +1,440 @@
+#!/usr/bin/env lua
+-- envireament_host.lua
+-- Long-lived JSON-RPC 2.0 host for the Enhanced Virtual REAPER Environment.
+--
+-- Reads one request (or one batch array of requests) per line on stdin and
+-- writes one response line per request line on stdout. Requests are handled
+-- in order, so clients can pipeline without waiting for replies.
+--
+-- Methods:
+--   reaper.<Name>   call a mock REAPER/ImGui API function, params = args
+--   env.<name>      call an EnhancedVirtualReaper module function
+--   state           bulk snapshot: params = {kind} (tracks/items/markers/stats/ext_state)
+--   reset           fresh environment
+--   run_script      run a Lua file in the environment, params = {path}
+--   run_test        run a test script from a clean state, params = {path};
+--                   returns {passed, output}
+--   ping, shutdown
+--
+-- Tables returned by API calls are handed out as {"$ref": id} and resolved
+-- back to the same object when passed in again. Script output (print,
+-- io.write, ShowConsoleMsg) goes to stderr so stdout only carries protocol.
+
+local script_dir = (arg and arg[0] or ""):match("^(.*[/\\])") or "./"
+package.path = script_dir .. "?.lua;" .. package.path
+
+local protocol_out = io.stdout
+local stderr = io.stderr
+
+-- Keep the mock's chatter off the protocol channel
+print = function(...)
+  local parts = {}
+  for i = 1, select("#", ...) do parts[i] = tostring((select(i, ...))) end
+  stderr:write(table.concat(parts, "\t"), "\n")
+end
+io.write = function(...) return stderr:write(...) end
+
+local verbose = false
+for i = 1, arg and #arg or 0 do
+  if arg[i] == "--verbose" then verbose = true end
+end
+
+-- ==================== JSON ====================
+
+local json_null = setmetatable({}, {__tostring = function() return "null" end})
+
+local escapes = {
+  ['"'] = '\\"', ["\\"] = "\\\\", ["\b"] = "\\b", ["\f"] = "\\f",
+  ["\n"] = "\\n", ["\r"] = "\\r", ["\t"] = "\\t"
+}
+
+local function encode_string(s)
+  return '"' .. s:gsub('[%c"\\]', function(c)
+    return escapes[c] or string.format("\\u%04x", c:byte())
+  end) .. '"'
+end
+
+local function is_array(t)
+  local n = #t
+  for k in pairs(t) do
+    if type(k) ~= "number" or k < 1 or k > n or k % 1 ~= 0 then return false end
+  end
+  return true
+end
+
+-- to_ref(table) returns a ref id when the table should go out by reference
+local function encode(value, to_ref, out)
+  local kind = type(value)
+  if value == nil or value == json_null then
+    out[#out + 1] = "null"
+  elseif kind == "boolean" then
+    out[#out + 1] = value and "true" or "false"
+  elseif kind == "number" then
+    if value ~= value or value == math.huge or value == -math.huge then
+      out[#out + 1] = "null"
+    elseif math.type and math.type(value) == "integer" then
+      out[#out + 1] = tostring(value)
+    else
+      local text = string.format("%.17g", value)
+      -- Keep floats floats on the Python side
+      if not text:find("[.eEn]") then text = text .. ".0" end
+      out[#out + 1] = text
+    end
+  elseif kind == "string" then
+    out[#out + 1] = encode_string(value)
+  elseif kind == "table" then
+    local ref = to_ref(value)
+    if ref then
+      out[#out + 1] = '{"$ref":' .. ref .. "}"
+    elseif is_array(value) then
+      out[#out + 1] = "["
+      for i = 1, #value do
+        if i > 1 then out[#out + 1] = "," end
+        encode(value[i], to_ref, out)
+      end
+      out[#out + 1] = "]"
+    else
+      out[#out + 1] = "{"
+      local first = true
+      for k, v in pairs(value) do
+        if type(v) ~= "function" then
+          if not first then out[#out + 1] = "," end
+          first = false
+          out[#out + 1] = encode_string(tostring(k))
+          out[#out + 1] = ":"
+          encode(v, to_ref, out)
+        end
+      end
+      out[#out + 1] = "}"
+    end
+  else
+    out[#out + 1] = "null"
+  end
+  return out
+end
+
+local decode_value
+
+local function decode_error(s, pos, what)
+  error(string.format("invalid JSON at %d: %s", pos, what), 0)
+end
+
+local function skip_space(s, pos)
+  return s:find("[^ \t\r\n]", pos) or #s + 1
+end
+
+local function decode_string(s, pos)
+  local parts, i = {}, pos + 1
+  while true do
+    local j = s:find('["\\]', i)
+    if not j then decode_error(s, pos, "unterminated string") end
+    parts[#parts + 1] = s:sub(i, j - 1)
+    if s:sub(j, j) == '"' then return table.concat(parts), j + 1 end
+    local esc = s:sub(j + 1, j + 1)
+    if esc == "u" then
+      local code = tonumber(s:sub(j + 2, j + 5), 16)
+      if not code then decode_error(s, j, "bad unicode escape") end
+      i = j + 6
+      if code >= 0xD800 and code <= 0xDBFF and s:sub(i, i + 1) == "\\u" then
+        local low = tonumber(s:sub(i + 2, i + 5), 16)
+        if low then
+          code = 0x10000 + (code - 0xD800) * 0x400 + (low - 0xDC00)
+          i = i + 6
+        end
+      end
+      parts[#parts + 1] = utf8 and utf8.char(code) or string.char(code % 256)
+    else
+      local map = {b = "\b", f = "\f", n = "\n", r = "\r", t = "\t"}
+      parts[#parts + 1] = map[esc] or esc
+      i = j + 2
+    end
+  end
+end
+
+decode_value = function(s, pos)
+  pos = skip_space(s, pos)
+  local c = s:sub(pos, pos)
+  if c == "{" then
+    local obj = {}
+    pos = skip_space(s, pos + 1)
+    if s:sub(pos, pos) == "}" then return obj, pos + 1 end
+    while true do
+      if s:sub(pos, pos) ~= '"' then decode_error(s, pos, "expected key") end
+      local key
+      key, pos = decode_string(s, pos)
+      pos = skip_space(s, pos)
+      if s:sub(pos, pos) ~= ":" then decode_error(s, pos, "expected ':'") end
+      local value
+      value, pos = decode_value(s, pos + 1)
+      if value ~= json_null then obj[key] = value end
+      pos = skip_space(s, pos)
+      local sep = s:sub(pos, pos)
+      if sep == "}" then return obj, pos + 1 end
+      if sep ~= "," then decode_error(s, pos, "expected ',' or '}'") end
+      pos = skip_space(s, pos + 1)
+    end
+  elseif c == "[" then
+    local arr, n = {}, 0
+    pos = skip_space(s, pos + 1)
+    if s:sub(pos, pos) == "]" then return arr, pos + 1 end
+    while true do
+      local value
+      value, pos = decode_value(s, pos)
+      n = n + 1
+      arr[n] = value -- nulls stay as json_null so positions are kept
+      pos = skip_space(s, pos)
+      local sep = s:sub(pos, pos)
+      if sep == "]" then return arr, pos + 1 end
+      if sep ~= "," then decode_error(s, pos, "expected ',' or ']'") end
+      pos = pos + 1
+    end
+  elseif c == '"' then
+    return decode_string(s, pos)
+  elseif s:sub(pos, pos + 3) == "true" then
+    return true, pos + 4
+  elseif s:sub(pos, pos + 4) == "false" then
+    return false, pos + 5
+  elseif s:sub(pos, pos + 3) == "null" then
+    return json_null, pos + 4
+  end
+  local num = s:match("^-?%d+%.?%d*[eE]?[-+]?%d*", pos)
+  if not num or num == "" or num == "-" then decode_error(s, pos, "unexpected character") end
+  return tonumber(num), pos + #num
+end
+
+local function json_decode(s)
+  local value, pos = decode_value(s, 1)
+  if skip_space(s, pos) <= #s then decode_error(s, pos, "trailing data") end
+  return value
+end
+
+-- ==================== HANDLE REGISTRY ====================
+
+local refs, ref_ids, next_ref = {}, {}, 0
+
+local function ref_for(value)
+  local id = ref_ids[value]
+  if not id then
+    next_ref = next_ref + 1
+    id = next_ref
+    refs[id], ref_ids[value] = value, id
+  end
+  return id
+end
+
+-- API results: every table goes out by reference
+local function always_ref(value)
+  return ref_for(value)
+end
+
+-- Protocol data (errors, ids): never by reference
+local function never_ref()
+  return nil
+end
+
+-- State snapshots: only handles (tables with a metatable) and known refs
+local function handles_only(value)
+  if ref_ids[value] or getmetatable(value) then return ref_for(value) end
+  return nil
+end
+
+local function resolve(value)
+  if value == json_null then return nil end
+  if type(value) == "table" then
+    if value["$ref"] then return refs[value["$ref"]] end
+    for k, v in pairs(value) do value[k] = resolve(v) end
+  end
+  return value
+end
+
+-- ==================== DISPATCH ====================
+
+local VirtualReaper = require("enhanced_virtual_reaper")
+local reaper
+
+local function reset_environment()
+  refs, ref_ids, next_ref = {}, {}, 0
+  reaper = VirtualReaper.create_environment()
+  VirtualReaper.reset_statistics()
+  VirtualReaper.set_verbose_logging(verbose)
+end
+
+-- Globals and modules as they were before any script ran. run_test puts
+-- them back, with a fresh VirtualState, so every script starts the same way
+-- it would in a new process.
+local baseline_globals, baseline_loaded
+
+local function snapshot(t)
+  local copy = {}
+  for k, v in pairs(t) do copy[k] = v end
+  return copy
+end
+
+local function restore(t, baseline)
+  for k in pairs(t) do
+    if baseline[k] == nil then t[k] = nil end
+  end
+  for k, v in pairs(baseline) do t[k] = v end
+end
+
+local function run_test(path)
+  restore(_G, baseline_globals)
+  restore(package.loaded, baseline_loaded)
+  refs, ref_ids, next_ref = {}, {}, 0
+  VirtualReaper.reset_state()
+  local output = {}
+  local host_write = io.write
+  print = function(...)
+    local parts = {}
+    for i = 1, select("#", ...) do parts[i] = tostring((select(i, ...))) end
+    output[#output + 1] = table.concat(parts, "\t") .. "\n"
+  end
+  io.write = function(...)
+    for i = 1, select("#", ...) do output[#output + 1] = tostring((select(i, ...))) end
+    return io.stderr
+  end
+  local ok, passed = pcall(VirtualReaper.run_test_script, path)
+  if not ok then
+    output[#output + 1] = tostring(passed) .. "\n"
+    passed = false
+  end
+  restore(_G, baseline_globals)
+  io.write = host_write
+  return {passed and true or false, table.concat(output)}
+end
+
+local running = true
+
+local builtins = {
+  ping = function() return {"pong"} end,
+  reset = function() reset_environment() return {true} end,
+  state = function(kind) return {VirtualReaper.query_state(kind)}, handles_only end,
+  run_script = function(path)
+    local chunk, err = loadfile(path)
+    if not chunk then error(err, 0) end
+    return table.pack(chunk())
+  end,
+  run_test = run_test,
+  shutdown = function()
+    running = false
+    VirtualReaper.shutdown()
+    return {true}
+  end
+}
+
+local function call_params(params)
+  if params == nil then return {n = 0} end
+  local args = {n = #params}
+  for i = 1, args.n do args[i] = resolve(params[i]) end
+  return args
+end
+
+local function dispatch(method, params)
+  local args = call_params(params)
+  local unpack_args = table.unpack or unpack
+  local fn, ref_mode
+  local builtin = builtins[method]
+  if builtin then
+    local results, mode = builtin(unpack_args(args, 1, args.n))
+    return results, mode or always_ref
+  end
+  local namespace, name = method:match("^(%a+)%.([%w_]+)$")
+  if namespace == "reaper" then
+    fn = reaper[name]
+  elseif namespace == "env" then
+    fn = VirtualReaper[name]
+    ref_mode = handles_only
+  end
+  if type(fn) ~= "function" then return nil, nil, -32601, "Method not found: " .. method end
+  return table.pack(fn(unpack_args(args, 1, args.n))), ref_mode or always_ref
+end
+
+local function handle_request(request)
+  if type(request) ~= "table" or type(request.method) ~= "string" then
+    return {jsonrpc = "2.0", id = json_null, error = {code = -32600, message = "Invalid request"}}, always_ref
+  end
+  local ok, results, ref_mode, code, message = xpcall(function()
+    return dispatch(request.method, request.params)
+  end, debug.traceback)
+  if request.id == nil then return nil end -- notification
+  if not ok then
+    return {jsonrpc = "2.0", id = request.id, error = {code = -32000, message = tostring(results)}}, always_ref
+  end
+  if code then
+    return {jsonrpc = "2.0", id = request.id, error = {code = code, message = message}}, always_ref
+  end
+  -- Multiple return values travel as an array; nils become null
+  local list = {}
+  for i = 1, results.n or #results do
+    local value = results[i]
+    list[i] = value == nil and json_null or value
+  end
+  return {jsonrpc = "2.0", id = request.id, result = list}, ref_mode
+end
+
+local function encode_response(response, ref_mode)
+  local out = {'{"jsonrpc":"2.0","id":'}
+  encode(response.id, never_ref, out)
+  if response.error then
+    out[#out + 1] = ',"error":'
+    encode(response.error, never_ref, out)
+  else
+    out[#out + 1] = ',"result":['
+    local list = response.result
+    for i = 1, #list do
+      if i > 1 then out[#out + 1] = "," end
+      local value = list[i]
+      -- Top-level tables from API calls are handles; nested data follows ref_mode
+      if type(value) == "table" and value ~= json_null then
+        if ref_mode == always_ref or getmetatable(value) or ref_ids[value] then
+          out[#out + 1] = '{"$ref":' .. ref_for(value) .. "}"
+        else
+          encode(value, ref_mode, out)
+        end
+      else
+        encode(value, ref_mode, out)
+      end
+    end
+    out[#out + 1] = "]"
+  end
+  out[#out + 1] = "}"
+  return table.concat(out)
+end
+
+local function handle_line(line)
+  local ok, request = pcall(json_decode, line)
+  if not ok then
+    return '{"jsonrpc":"2.0","id":null,"error":{"code":-32700,"message":' .. encode_string(request) .. "}}"
+  end
+  if type(request) == "table" and request.method == nil and #request > 0 then
+    -- Batch: one line in, one array out
+    local parts = {}
+    for i = 1, #request do
+      local response, ref_mode = handle_request(request[i])
+      if response then parts[#parts + 1] = encode_response(response, ref_mode) end
+    end
+    if #parts == 0 then return nil end
+    return "[" .. table.concat(parts, ",") .. "]"
+  end
+  local response, ref_mode = handle_request(request)
+  return response and encode_response(response, ref_mode)
+end
+
+-- ==================== MAIN LOOP ====================
+
+reset_environment()
+baseline_globals = snapshot(_G)
+baseline_loaded = snapshot(package.loaded)
+protocol_out:write('{"jsonrpc":"2.0","method":"ready","params":[]}\n')
+protocol_out:flush()
+
+for line in io.stdin:lines() do
+  if line:match("%S") then
+    local reply = handle_line(line)
+    if reply then
+      protocol_out:write(reply, "\n")
+      protocol_out:flush()
+    end
+  end
+  if not running then break end
+end
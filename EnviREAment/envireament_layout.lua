@@ -0,0 +1,691 @@
+-- envireament_layout.lua
+-- Headless ImGui layout for the Enhanced Virtual REAPER Environment: a
+-- layout pass after Dear ImGui's own. Each window keeps a cursor; a widget
+-- takes the rect at the cursor, sized from its label and the style, and
+-- moves the cursor to the next line (or along the line after SameLine).
+-- Text is measured with glyph advance tables per font family and size,
+-- and each table memoizes the strings it has measured, so a widget costs a
+-- hash lookup and a few additions.
+--
+-- The mock loads this file as it starts and hands it a host table; the
+-- ImGui widgets call the layout table Layout.new returns.
+
+local Layout = {}
+
+-- host: state (the mock's VirtualState), log_warning, split_label and
+-- playback(), which returns the scenario being played or nil
+function Layout.new(host)
+  local VirtualState, log_warning, split_label = host.state, host.log_warning, host.split_label
+  local layout = {}
+
+  -- Dear ImGui's default style, keyed by ImGui_StyleVar_* index
+  local WINDOW_PADDING, FRAME_PADDING, ITEM_SPACING, ITEM_INNER_SPACING,
+        INDENT_SPACING, CELL_PADDING = 1, 10, 13, 14, 15, 22
+  local DEFAULT_STYLE = {
+    [WINDOW_PADDING] = {8, 8},
+    [FRAME_PADDING] = {4, 3},
+    [ITEM_SPACING] = {8, 4},
+    [ITEM_INNER_SPACING] = {4, 4},
+    [INDENT_SPACING] = 21,
+    [CELL_PADDING] = {4, 2},
+  }
+
+  -- Advances of printable ASCII (32-126) in 1/1000 em, from Helvetica's
+  -- metrics; any font that is not monospaced measures with these
+  local SANS_ADVANCES = {
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+  }
+  -- ProggyClean, ImGui's built-in font, advances 7 pixels at size 13
+  local MONO_ADVANCE = 7 / 13
+  -- Strings each table remembers before it starts over
+  local MAX_MEMOIZED = 16384
+
+  local tables = {} -- "sans:14" -> metrics, shared by fonts alike
+  local byte, ceil, max, min = string.byte, math.ceil, math.max, math.min
+
+  local function is_monospace(name)
+    name = tostring(name or ""):lower()
+    return name == "default" or name:find("mono") or name:find("courier") or
+           name:find("proggy") or name:find("consol")
+  end
+
+  -- Advance per byte at the font's size: continuation bytes of a UTF-8
+  -- sequence advance nothing, 2-byte characters advance like a digit and
+  -- 3- and 4-byte ones (CJK, emoji) a whole em
+  local function build_metrics(mono, size)
+    local advance = {}
+    for b = 0, 255 do
+      local em
+      if b < 32 or b == 127 or (b >= 128 and b < 192) then em = 0
+      elseif mono then em = MONO_ADVANCE
+      elseif b < 127 then em = SANS_ADVANCES[b - 31] / 1000
+      elseif b < 224 then em = 0.556
+      else em = 1 end
+      advance[b] = em * size
+    end
+    return {size = size, advance = advance, widths = {}, count = 0}
+  end
+
+  local function font_metrics(ctx)
+    local font = ctx.font_stack[#ctx.font_stack] or ctx.default_font
+    local metrics = font.metrics
+    if metrics then return metrics end
+    local mono = is_monospace(font.name)
+    local size = font.size or 13
+    local key = (mono and "mono:" or "sans:") .. size
+    metrics = tables[key] or build_metrics(mono, size)
+    tables[key] = metrics
+    font.metrics = metrics
+    return metrics
+  end
+
+  -- Width of one line of text, memoized per font table
+  local function line_width(metrics, text)
+    local width = metrics.widths[text]
+    if width then return width end
+    local advance = metrics.advance
+    width = 0
+    for i = 1, #text do width = width + advance[byte(text, i)] end
+    if metrics.count >= MAX_MEMOIZED then
+      metrics.widths, metrics.count = {}, 0
+    end
+    metrics.widths[text] = width
+    metrics.count = metrics.count + 1
+    return width
+  end
+
+  -- Greedy word wrap: width of the widest line and the number of lines
+  local function wrapped_width(metrics, text, wrap_width)
+    local space = metrics.advance[32]
+    local widest, line, lines = 0, 0, 1
+    for word in text:gmatch("%S+") do
+      local w = line_width(metrics, word)
+      if line > 0 and line + space + w > wrap_width then
+        widest = max(widest, line)
+        line, lines = w, lines + 1
+      else
+        line = line > 0 and line + space + w or w
+      end
+    end
+    return max(widest, line), lines
+  end
+
+  -- w, h of text in the context's current font, as ImGui_CalcTextSize
+  local function text_size(ctx, text, wrap_width)
+    local metrics = font_metrics(ctx)
+    local wraps = wrap_width and wrap_width > 0
+    local width = metrics.widths[text]
+    if width and not wraps then return ceil(width), metrics.size end
+    text = tostring(text or "")
+    if not wraps and not text:find("\n", 1, true) then
+      return ceil(line_width(metrics, text)), metrics.size
+    end
+    local widest, lines = 0, 0
+    for line in (text .. "\n"):gmatch("(.-)\n") do
+      local w, n = line_width(metrics, line), 1
+      if wraps and w > wrap_width then
+        w, n = wrapped_width(metrics, line, wrap_width)
+      end
+      widest, lines = max(widest, w), lines + n
+    end
+    return ceil(widest), lines * metrics.size
+  end
+  layout.text_size = text_size
+
+  function layout.font_size(ctx)
+    return font_metrics(ctx).size
+  end
+
+  local function style(ctx, idx)
+    return ctx.style_vars[idx] or DEFAULT_STYLE[idx]
+  end
+  layout.style = style
+
+  function layout.frame_height(ctx)
+    return font_metrics(ctx).size + 2 * style(ctx, FRAME_PADDING)[2]
+  end
+
+  local function current(ctx)
+    local stack = ctx and ctx.window_stack
+    return stack and stack[#stack]
+  end
+  layout.current = current
+
+  -- Sets the content region and puts the cursor at its top left. The
+  -- content scrolls by scroll_y; the clip rect (clip_y0 to clip_y1) is the
+  -- part of the window that shows, and decides which items are visible.
+  local function start_window(window, pad_x, pad_y, top, scroll_y)
+    local pos, size = window.pos, window.size
+    window.scroll_y, window.pad_y, window.top = scroll_y, pad_y, top
+    window.clip_y0, window.clip_y1 = pos.y + top, pos.y + size.h
+    window.content_min_x, window.content_min_y = pos.x + pad_x, pos.y + top + pad_y - scroll_y
+    window.content_max_x, window.content_max_y = pos.x + size.w - pad_x, pos.y + size.h - pad_y - scroll_y
+    window.cursor_x, window.cursor_y = window.content_min_x, window.content_min_y
+    window.start_x, window.start_y = window.cursor_x, window.cursor_y
+    window.prev_x, window.prev_y = window.cursor_x, window.cursor_y
+    window.max_x, window.max_y = window.cursor_x, window.cursor_y
+    window.line_x, window.indent = window.cursor_x, 0
+    window.line_h, window.prev_line_h = 0, 0
+    window.item_x0, window.item_y0, window.item_x1, window.item_y1 = 0, 0, 0, 0
+    window.item_width_default = math.floor(size.w * 0.65)
+    window.item_widths, window.groups, window.tables = {}, {}, {}
+    window.items_submitted, window.items_visible, window.items_listed = 0, 0, 0
+  end
+
+  -- The scroll ImGui would show: SetScrollY and scenario scroll events
+  -- apply when the window next begins, clamped to the content height the
+  -- window had at its last End
+  local function scroll_max(saved, pad_y, inner_h)
+    return max(0, (saved.content_h or 0) + 2 * pad_y - inner_h)
+  end
+
+  local function begin_scroll(window, saved, pad_y, top)
+    local playback = host.playback()
+    local events = playback and playback.events
+    local event = events and (events[window.path] or events[window.name])
+    if event and event.kind == "scroll" and not event.widget then
+      event.widget = "Window"
+      saved.scroll_target = event.value
+    end
+    local scroll = saved.scroll_target or saved.scroll_y or 0
+    saved.scroll_target = nil
+    saved.scroll_y = min(max(0, scroll), scroll_max(saved, pad_y, window.size.h - top))
+    return saved.scroll_y
+  end
+
+  -- SetNextWindowSize/Pos: Always (or no cond) applies every time, Once
+  -- and FirstUseEver the first time the window begins, Appearing when it
+  -- was not begun the frame before
+  local function cond_applies(cond, saved, appearing)
+    if not cond or cond == 0 or cond == 1 then return true end
+    if cond == 8 then return appearing end
+    return saved.new
+  end
+
+  -- Window size and position persist by name, as ImGui keeps them
+  function layout.begin_window(ctx, window)
+    local saved = ctx.windows[window.name]
+    if not saved then
+      saved = {new = true, x = window.pos.x, y = window.pos.y, w = window.size.w, h = window.size.h}
+      ctx.windows[window.name] = saved
+    end
+    local appearing = saved.new or saved.frame ~= VirtualState.frame_count - 1
+    local next_window = ctx.next_window
+    if next_window then
+      if next_window.w and cond_applies(next_window.size_cond, saved, appearing) then
+        saved.w, saved.h = next_window.w, next_window.h
+      end
+      if next_window.x and cond_applies(next_window.pos_cond, saved, appearing) then
+        saved.x, saved.y = next_window.x, next_window.y
+      end
+      ctx.next_window = nil
+    end
+    saved.new, saved.frame = false, VirtualState.frame_count
+    window.path = window.name
+    window.pos.x, window.pos.y, window.size.w, window.size.h = saved.x, saved.y, saved.w, saved.h
+    local flags = window.flags
+    local top = 0
+    if math.floor(flags / 1) % 2 == 0 then top = top + layout.frame_height(ctx) end    -- title bar
+    if math.floor(flags / 1024) % 2 == 1 then top = top + layout.frame_height(ctx) end -- menu bar
+    local pad = style(ctx, WINDOW_PADDING)
+    start_window(window, pad[1], pad[2], top, begin_scroll(window, saved, pad[2], top))
+    window.saved = saved
+  end
+
+  -- Windows submitting far more items than they show are worth a warning:
+  -- that is the list ImGui_ListClipper is for
+  local UNCLIPPED_ITEMS = 1000
+  local UNCLIPPED_RATIO = 10
+
+  -- Called as a window or child ends: keeps its content height for
+  -- scrolling and counts the items it took this frame
+  function layout.end_window(ctx, window)
+    if window.saved then window.saved.content_h = window.max_y - window.start_y end
+    local counts = VirtualState.item_counts[window.path]
+    if not counts then
+      counts = {frames = 0, submitted = 0, visible = 0, listed = 0, max_submitted = 0, max_visible = 0}
+      VirtualState.item_counts[window.path] = counts
+    end
+    local submitted, visible = window.items_submitted, window.items_visible
+    counts.frames = counts.frames + 1
+    counts.submitted, counts.visible = counts.submitted + submitted, counts.visible + visible
+    counts.listed = max(counts.listed, window.items_listed)
+    counts.last_submitted, counts.last_visible, counts.last_listed = submitted, visible, window.items_listed
+    counts.max_submitted, counts.max_visible = max(counts.max_submitted, submitted), max(counts.max_visible, visible)
+    if submitted >= UNCLIPPED_ITEMS and submitted > UNCLIPPED_RATIO * max(1, visible) and not counts.warned then
+      counts.warned = true
+      log_warning(string.format("Window '%s' submitted %d items to show %d; clip long lists with ImGui_ListClipper",
+                                window.path, submitted, visible))
+    end
+  end
+
+  function layout.scroll(ctx)
+    local window = current(ctx)
+    if not window then return 0, 0 end
+    local saved = window.saved
+    return window.scroll_y, saved and scroll_max(saved, window.pad_y, window.size.h - window.top) or 0
+  end
+
+  function layout.set_scroll(ctx, y)
+    local window = current(ctx)
+    if window and window.saved then window.saved.scroll_target = y end
+  end
+
+  function layout.set_next_window(ctx, field, a, b, cond)
+    local next_window = ctx.next_window or {}
+    ctx.next_window = next_window
+    if field == "size" then
+      next_window.w, next_window.h, next_window.size_cond = a, b, cond
+    else
+      next_window.x, next_window.y, next_window.pos_cond = a, b, cond
+    end
+  end
+
+  -- Moves the cursor past a w x h item, as ImGui::ItemSize
+  local function advance(window, ctx, w, h)
+    local x, y = window.cursor_x, window.cursor_y
+    local line_h = max(window.line_h, h)
+    window.prev_x, window.prev_y = x + w, y
+    if x + w > window.max_x then window.max_x = x + w end
+    if y + line_h > window.max_y then window.max_y = y + line_h end
+    window.cursor_x = window.line_x
+    window.cursor_y = y + line_h + style(ctx, ITEM_SPACING)[2]
+    window.prev_line_h, window.line_h = line_h, 0
+  end
+
+  -- SetCursorPos and friends: the content grows to reach the cursor
+  function layout.set_cursor(window, x, y)
+    window.cursor_x, window.cursor_y = x, y
+    if x > window.max_x then window.max_x = x end
+    if y > window.max_y then window.max_y = y end
+  end
+
+  -- Moves the cursor to the start of a line at y (ListClipper skipping items)
+  local function seek(window, ctx, y)
+    window.cursor_x, window.cursor_y, window.line_h = window.line_x, y, 0
+    window.max_y = max(window.max_y, y - style(ctx, ITEM_SPACING)[2])
+  end
+  layout.seek = seek
+
+  -- Places a w x h item at the cursor; it becomes the last item
+  local function place(window, ctx, w, h)
+    local x, y = window.cursor_x, window.cursor_y
+    window.item_x0, window.item_y0, window.item_x1, window.item_y1 = x, y, x + w, y + h
+    window.items_submitted = window.items_submitted + 1
+    if y + h > window.clip_y0 and y < window.clip_y1 then window.items_visible = window.items_visible + 1 end
+    advance(window, ctx, w, h)
+  end
+
+  local function item(ctx, w, h)
+    local window = current(ctx)
+    if window then place(window, ctx, w, h) end
+  end
+  layout.item = item
+
+  -- Width left on the cursor's line
+  local function avail_width(window)
+    return window.content_max_x - window.cursor_x
+  end
+
+  -- ImGui_CalcItemWidth: SetNextItemWidth, then PushItemWidth, then 65%
+  -- of the window; a negative width leaves that much of the line free
+  local function item_width(ctx, window)
+    local w = window.next_item_width
+    if w then
+      window.next_item_width = nil
+    else
+      w = window.item_widths[#window.item_widths]
+    end
+    if not w or w == 0 then w = window.item_width_default end
+    if w < 0 then w = max(1, avail_width(window) + w) end
+    return w
+  end
+  function layout.item_width(ctx)
+    local window = current(ctx)
+    return window and item_width(ctx, window) or 0
+  end
+
+  function layout.set_next_item_width(ctx, w)
+    local window = current(ctx)
+    if window then window.next_item_width = w end
+  end
+
+  function layout.push_item_width(ctx, w)
+    local window = current(ctx)
+    if window then window.item_widths[#window.item_widths + 1] = w end
+  end
+
+  function layout.pop_item_width(ctx)
+    local window = current(ctx)
+    if window then window.item_widths[#window.item_widths] = nil end
+  end
+
+  -- Text wraps at PushTextWrapPos's position: 0 is the end of the content
+  -- region, a negative position turns wrapping off
+  local function wrap_width(ctx, window)
+    local wrap = ctx.wrap_pos and ctx.wrap_pos[#ctx.wrap_pos]
+    if not wrap or wrap < 0 then return nil end
+    local right = wrap == 0 and window.content_max_x or window.pos.x + wrap
+    return max(1, right - window.cursor_x)
+  end
+
+  function layout.push_wrap_pos(ctx, pos)
+    ctx.wrap_pos = ctx.wrap_pos or {}
+    ctx.wrap_pos[#ctx.wrap_pos + 1] = pos or 0
+  end
+
+  function layout.pop_wrap_pos(ctx)
+    if ctx.wrap_pos then ctx.wrap_pos[#ctx.wrap_pos] = nil end
+  end
+
+  -- Text, TextColored, TextDisabled; wrapped forces a wrap at the region's end
+  function layout.text(ctx, text, wrapped, indent_w)
+    local window = current(ctx)
+    if not window then return end
+    local wrap = nil
+    if wrapped then
+      wrap = max(1, window.content_max_x - window.cursor_x)
+    elseif ctx.wrap_pos then
+      wrap = wrap_width(ctx, window)
+    end
+    local w, h = text_size(ctx, text, wrap)
+    place(window, ctx, w + (indent_w or 0), h)
+  end
+
+  -- BulletText: a bullet a frame-padded font size wide, then the text
+  function layout.bullet_text(ctx, text)
+    local metrics = font_metrics(ctx)
+    layout.text(ctx, text, false, metrics.size + 2 * style(ctx, FRAME_PADDING)[1])
+  end
+
+  -- Button-like sizing: a non-zero size wins, negative meaning the room
+  -- left; otherwise the label plus frame padding
+  local function sized(size, content, pad, room)
+    if size and size > 0 then return size end
+    if size and size < 0 then return max(4, room + size) end
+    return content + 2 * pad
+  end
+
+  function layout.button(ctx, label, size_w, size_h, no_pad_y)
+    local window = current(ctx)
+    if not window then return end
+    local w, h = text_size(ctx, (split_label(label)))
+    local pad = style(ctx, FRAME_PADDING)
+    item(ctx, sized(size_w, w, pad[1], avail_width(window)),
+              sized(size_h, h, no_pad_y and 0 or pad[2],
+              window.content_max_y - window.cursor_y))
+  end
+
+  -- ProgressBar: the whole line by default, a frame high
+  function layout.progress_bar(ctx, size_w, size_h)
+    local window = current(ctx)
+    if not window then return end
+    item(ctx, sized(size_w or -1e-38, 0, 0, avail_width(window)),
+              sized(size_h, layout.font_size(ctx), style(ctx, FRAME_PADDING)[2],
+                    window.content_max_y - window.cursor_y))
+  end
+
+  -- An item of an explicit size (InvisibleButton, Dummy)
+  function layout.sized_item(ctx, size_w, size_h)
+    local window = current(ctx)
+    if not window then return end
+    item(ctx, sized(size_w, 0, 0, avail_width(window)),
+              sized(size_h, 0, 0, window.content_max_y - window.cursor_y))
+  end
+
+  -- Width of a visible label after ItemInnerSpacing, or 0 without one
+  local function label_width(ctx, label)
+    local visible = split_label(label)
+    if visible == "" then return 0 end
+    return style(ctx, ITEM_INNER_SPACING)[1] + text_size(ctx, visible)
+  end
+
+  -- Framed widgets (inputs, sliders, drags, combos): the item width, then
+  -- the label; height is given for multi-line frames
+  function layout.frame(ctx, label, height)
+    local window = current(ctx)
+    if not window then return end
+    if height == 0 then height = font_metrics(ctx).size end -- LabelText
+    item(ctx, item_width(ctx, window) + label_width(ctx, label), height or layout.frame_height(ctx))
+  end
+
+  -- Multi-line frames (ListBox, InputTextMultiline): a non-zero size_w
+  -- replaces the item width, and without size_h the frame is lines high
+  function layout.list_frame(ctx, label, size_w, size_h, lines)
+    local window = current(ctx)
+    if not window then return end
+    if size_w and size_w ~= 0 then window.next_item_width = size_w end
+    if not size_h or size_h <= 0 then
+      size_h = math.floor(font_metrics(ctx).size * lines + 2 * style(ctx, FRAME_PADDING)[2])
+    end
+    layout.frame(ctx, label, size_h)
+  end
+
+  -- Checkbox and RadioButton: a frame-high square, then the label
+  function layout.check(ctx, label)
+    if not current(ctx) then return end
+    local square = layout.frame_height(ctx)
+    item(ctx, square + label_width(ctx, label), square)
+  end
+
+  -- Square frame-high items (ArrowButton)
+  function layout.square(ctx)
+    if not current(ctx) then return end
+    local square = layout.frame_height(ctx)
+    item(ctx, square, square)
+  end
+
+  function layout.selectable(ctx, label, size_w, size_h)
+    local window = current(ctx)
+    if not window then return end
+    local w, h = text_size(ctx, (split_label(label)))
+    item(ctx, size_w and size_w > 0 and size_w or w, size_h and size_h > 0 and size_h or h)
+  end
+
+  -- Tree nodes: the arrow takes a font size plus padding; Framed (2)
+  -- nodes are frame high
+  function layout.tree_node(ctx, label, flags)
+    local window = current(ctx)
+    if not window then return end
+    local metrics = font_metrics(ctx)
+    local pad = style(ctx, FRAME_PADDING)
+    local w = text_size(ctx, (split_label(label)))
+    local framed = math.floor((flags or 0) / 2) % 2 == 1
+    item(ctx, metrics.size + 2 * pad[1] + w, framed and layout.frame_height(ctx) or metrics.size)
+  end
+
+  -- A line across the content region
+  function layout.separator(ctx, text)
+    local window = current(ctx)
+    if not window then return end
+    local h = 1
+    if text then h = select(2, text_size(ctx, text)) + 6 end -- SeparatorTextPadding
+    item(ctx, max(0, window.content_max_x - window.line_x), h)
+  end
+
+  -- A bar a frame high across the content region (tab bars)
+  function layout.bar(ctx)
+    local window = current(ctx)
+    if not window then return end
+    item(ctx, max(0, avail_width(window)), layout.frame_height(ctx))
+  end
+
+  function layout.same_line(ctx, offset_from_start_x, spacing)
+    local window = current(ctx)
+    if not window then return end
+    offset_from_start_x, spacing = offset_from_start_x or 0, spacing or -1
+    if offset_from_start_x ~= 0 then
+      if spacing < 0 then spacing = 0 end
+      window.cursor_x = window.start_x - style(ctx, WINDOW_PADDING)[1] + offset_from_start_x + spacing
+    else
+      if spacing < 0 then spacing = style(ctx, ITEM_SPACING)[1] end
+      window.cursor_x = window.prev_x + spacing
+    end
+    window.cursor_y = window.prev_y
+    window.line_h = window.prev_line_h
+  end
+
+  -- NewLine ends the current line, or adds an empty one
+  function layout.new_line(ctx)
+    local window = current(ctx)
+    if not window then return end
+    advance(window, ctx, 0, window.line_h > 0 and 0 or font_metrics(ctx).size)
+  end
+
+  function layout.spacing(ctx)
+    local window = current(ctx)
+    if window then advance(window, ctx, 0, 0) end
+  end
+
+  function layout.indent(ctx, indent_w, sign)
+    local window = current(ctx)
+    if not window then return end
+    if not indent_w or indent_w == 0 then indent_w = style(ctx, INDENT_SPACING) end
+    window.indent = window.indent + sign * indent_w
+    window.line_x = window.content_min_x + window.indent
+    window.cursor_x = window.line_x
+  end
+
+  -- Lines in a group start at the group's left edge; EndGroup places the
+  -- group's bounding box as one item
+  function layout.begin_group(ctx)
+    local window = current(ctx)
+    if not window then return end
+    window.groups[#window.groups + 1] = {
+      x = window.cursor_x, y = window.cursor_y, line_x = window.line_x,
+      line_h = window.line_h, max_x = window.max_x, max_y = window.max_y,
+    }
+    window.line_x = window.cursor_x
+    window.max_x, window.max_y = window.cursor_x, window.cursor_y
+  end
+
+  function layout.end_group(ctx)
+    local window = current(ctx)
+    local group = window and table.remove(window.groups)
+    if not group then return end
+    local w = max(0, window.max_x - group.x)
+    local h = max(0, window.max_y - group.y)
+    window.line_x, window.line_h = group.line_x, group.line_h
+    window.max_x, window.max_y = max(window.max_x, group.max_x), max(window.max_y, group.max_y)
+    window.cursor_x, window.cursor_y = group.x, group.y
+    item(ctx, w, h)
+  end
+
+  -- Child windows lay out inside the rect they take in their parent: a
+  -- zero size fills the room left and a negative one leaves that much
+  -- free. Only bordered children (ChildFlags_Border, 1) are padded.
+  function layout.begin_child(ctx, str_id, size_w, size_h, child_flags)
+    local parent = current(ctx)
+    if not parent then return nil end
+    local room_w = avail_width(parent)
+    local room_h = parent.content_max_y - parent.cursor_y
+    local w = size_w and size_w > 0 and size_w or max(4, room_w + (size_w or 0))
+    local h = size_h and size_h > 0 and size_h or max(4, room_h + (size_h or 0))
+    local child = {name = str_id, child = true, path = (parent.path or parent.name) .. "/" .. tostring(str_id),
+                   pos = {x = parent.cursor_x, y = parent.cursor_y}, size = {w = w, h = h}}
+    local pad = math.floor((child_flags or 0) / 1) % 2 == 1 and style(ctx, WINDOW_PADDING) or {0, 0}
+    local saved = ctx.windows[child.path]
+    if not saved then
+      saved = {}
+      ctx.windows[child.path] = saved
+    end
+    start_window(child, pad[1], pad[2], 0, begin_scroll(child, saved, pad[2], 0))
+    child.saved = saved
+    child.clip_y0, child.clip_y1 = max(child.clip_y0, parent.clip_y0), min(child.clip_y1, parent.clip_y1)
+    return child
+  end
+
+  -- Called with the child popped: it becomes an item of the parent
+  function layout.end_child(ctx, child)
+    item(ctx, child.size.w, child.size.h)
+  end
+
+  -- Tables split the room left into equal columns. Each cell is a
+  -- content region of its own; a row is as tall as its tallest cell.
+  function layout.begin_table(ctx, columns, outer_w)
+    local window = current(ctx)
+    if not window then return end
+    local width = outer_w and outer_w > 0 and outer_w or max(columns, avail_width(window) + (outer_w or 0))
+    local pad = style(ctx, CELL_PADDING)
+    window.tables[#window.tables + 1] = {
+      x = window.cursor_x, y = window.cursor_y, width = width, columns = columns,
+      column_w = width / columns, column = 0, pad_x = pad[1], pad_y = pad[2],
+      row_y = window.cursor_y, row_bottom = window.cursor_y,
+      line_x = window.line_x, indent = window.indent, content_max_x = window.content_max_x,
+    }
+  end
+
+  local function current_table(ctx)
+    local window = current(ctx)
+    return window, window and window.tables[#window.tables]
+  end
+
+  local function close_cell(window, tbl)
+    if tbl.column > 0 then
+      tbl.row_bottom = max(tbl.row_bottom, window.max_y + tbl.pad_y)
+    end
+  end
+
+  local function start_row(window, tbl, min_row_height)
+    close_cell(window, tbl)
+    tbl.row_y = tbl.row_bottom
+    tbl.row_bottom = tbl.row_y + (min_row_height or 0)
+    tbl.column = 0
+  end
+
+  function layout.table_next_row(ctx, min_row_height)
+    local window, tbl = current_table(ctx)
+    if tbl then start_row(window, tbl, min_row_height) end
+  end
+
+  -- Moves into column n (1-based); without n, into the next column,
+  -- starting a row after the last one
+  function layout.table_column(ctx, n)
+    local window, tbl = current_table(ctx)
+    if not tbl then return end
+    if not n then
+      n = tbl.column + 1
+      if n > tbl.columns then
+        start_row(window, tbl)
+        n = 1
+      end
+    end
+    close_cell(window, tbl)
+    tbl.column = n
+    local x = tbl.x + (n - 1) * tbl.column_w + tbl.pad_x
+    window.line_x, window.indent = x, x - window.content_min_x
+    window.content_max_x = tbl.x + n * tbl.column_w - tbl.pad_x
+    window.cursor_x, window.cursor_y = x, tbl.row_y + tbl.pad_y
+    window.line_h = 0
+  end
+
+  -- A row of one text line per column
+  function layout.table_headers_row(ctx)
+    local window, tbl = current_table(ctx)
+    if not tbl then return end
+    start_row(window, tbl)
+    for n = 1, tbl.columns do
+      layout.table_column(ctx, n)
+      advance(window, ctx, 0, font_metrics(ctx).size)
+    end
+  end
+
+  function layout.end_table(ctx)
+    local window, tbl = current_table(ctx)
+    if not tbl then return end
+    window.tables[#window.tables] = nil
+    close_cell(window, tbl)
+    window.line_x, window.indent, window.content_max_x = tbl.line_x, tbl.indent, tbl.content_max_x
+    window.cursor_x, window.cursor_y = tbl.x, tbl.y
+    item(ctx, tbl.width, tbl.row_bottom - tbl.y)
+  end
+
+  return layout
+end
+
+return Layout
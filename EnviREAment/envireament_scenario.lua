@@ -0,0 +1,271 @@
+-- envireament_scenario.lua
+-- Scenario playback for the Enhanced Virtual REAPER Environment. The mock
+-- loads it the first time a scenario plays; widgets find their events in
+-- the playback table it hands over (see INPUT EVENTS in
+-- enhanced_virtual_reaper.lua).
+--
+-- A scenario is a list of steps, each placed on a frame and holding the
+-- events that frame sees:
+--   {frame = 3, click = "Save"}                  absolute frame (frame 1 is the script's first run)
+--   {wait = 2, set = "##search", value = "bass"} frames after the previous step (default 1)
+--   {name = "pick", events = {{hover = "Row 3"}, {key = "Enter"}}}
+-- Widget events (click, hover, set) name their target by ID path, ID or
+-- visible label, and click takes an optional mouse button. A scroll event
+-- scrolls a window or child, named by path, as it next begins:
+--   {scroll = "Song Browser/song_list", y = 2400} Key events tap
+-- a key (key = "Enter"), or hold and release it with down = true/false.
+-- Mouse events move the pointer and press buttons:
+--   {mouse = {x = 120, y = 40, button = 0, action = "click" | "down" | "up"}}
+-- Playback drives the script's deferred frames on the virtual clock as fast
+-- as they run, and reports each step's frame cost and any event no widget took.
+
+local Scenario = {}
+
+local DEFAULT_SCENARIO_SETTLE = 1 -- frames run after the last step so its effects show
+local MAX_SCENARIO_STEPS_LISTED = 20
+local WIDGET_EVENTS = {"click", "set", "hover", "scroll"}
+
+local function describe_event(event)
+  if event.kind == "set" then return string.format("set %s = %s", event.target, tostring(event.value)) end
+  if event.kind == "scroll" then return string.format("scroll %s to %g", event.target, event.value) end
+  if event.kind == "key" then
+    return "key " .. event.name .. (event.down == nil and "" or event.down and " down" or " up")
+  end
+  if event.kind == "mouse" then
+    local text = "mouse"
+    if event.x then text = text .. string.format(" %g,%g", event.x, event.y) end
+    if event.action then text = text .. " " .. event.action .. " " .. event.button end
+    return text
+  end
+  return event.kind .. " " .. event.target .. ((event.button or 0) ~= 0 and " (button " .. event.button .. ")" or "")
+end
+
+local function has_event(step)
+  return step.click ~= nil or step.set ~= nil or step.hover ~= nil or step.scroll ~= nil or step.key ~= nil
+      or step.mouse ~= nil
+end
+
+local function compile_event(raw, where, key_code)
+  for _, kind in ipairs(WIDGET_EVENTS) do
+    if raw[kind] ~= nil then
+      if kind == "set" and raw.value == nil then return nil, where .. ": set needs a value" end
+      if kind == "scroll" then
+        if type(raw.y) ~= "number" then return nil, where .. ": scroll needs a y" end
+        return {kind = kind, target = tostring(raw.scroll), value = raw.y}
+      end
+      return {kind = kind, target = tostring(raw[kind]), value = raw.value, button = raw.button}
+    end
+  end
+  if raw.key ~= nil then
+    local code = key_code(raw.key)
+    if not code then return nil, where .. ": unknown key " .. tostring(raw.key) end
+    return {kind = "key", code = code, name = tostring(raw.key), down = raw.down}
+  end
+  if type(raw.mouse) == "table" then
+    local mouse = raw.mouse
+    local action = mouse.action or (mouse.button and "click")
+    if action and action ~= "click" and action ~= "down" and action ~= "up" then
+      return nil, where .. ": unknown mouse action " .. tostring(action)
+    end
+    if (mouse.x == nil) ~= (mouse.y == nil) then return nil, where .. ": mouse needs both x and y" end
+    return {kind = "mouse", x = mouse.x, y = mouse.y, button = mouse.button or 0, action = action}
+  end
+  return nil, where .. ": no click, set, hover, scroll, key or mouse event"
+end
+
+-- {name, frames = {[frame] = {targets = {[target] = event}, input = {...}, step}}, steps, last}
+local function compile_scenario(scenario, key_code)
+  if type(scenario) ~= "table" then return nil, "a scenario is a table of steps" end
+  local frames, steps, frame = {}, {}, 0
+  for i, step in ipairs(scenario.steps or scenario) do
+    local where = "step " .. i
+    if type(step) ~= "table" then return nil, where .. ": not a table" end
+    if step.frame then
+      if step.frame <= frame then
+        return nil, string.format("%s: frame %d is not after frame %d", where, step.frame, frame)
+      end
+      frame = math.floor(step.frame)
+    else
+      frame = frame + math.max(1, math.floor(tonumber(step.wait) or 1))
+    end
+    local slot = {targets = {}, input = {}, step = i}
+    local described = {}
+    for _, raw in ipairs(step.events or (has_event(step) and {step}) or {}) do
+      local event, err = compile_event(raw, where, key_code)
+      if not event then return nil, err end
+      if event.target then
+        if slot.targets[event.target] then return nil, where .. ": two events for " .. event.target end
+        slot.targets[event.target] = event
+      else
+        slot.input[#slot.input + 1] = event
+      end
+      described[#described + 1] = describe_event(event)
+    end
+    frames[frame] = slot
+    steps[i] = {name = step.name or described[1] or "wait", frame = frame, events = described,
+                frames = 0, total_ms = 0, max_ms = 0, missed = {}}
+  end
+  return {name = scenario.name, frames = frames, steps = steps, last = frame}
+end
+
+local function load_scenario(source, load_data)
+  if type(source) == "table" then return source end
+  local file, err = io.open(source, "rb")
+  if not file then return nil, err end
+  local text = file:read("*a")
+  file:close()
+  local ok, scenario = pcall(load_data, text, "@" .. source)
+  if not ok then return nil, scenario end
+  return scenario
+end
+
+-- Applies one frame's key and mouse events; presses, clicks and releases
+-- last a single frame, and a tapped key is released on the next one
+local function apply_input(input, slot)
+  if next(input.pressed) then input.pressed = {} end
+  if next(input.released) then input.released = {} end
+  if next(input.clicked) then input.clicked = {} end
+  if next(input.mouse_released) then input.mouse_released = {} end
+  for i = #input.tapped, 1, -1 do
+    local tap = input.tapped[i]
+    input.tapped[i] = nil
+    if tap.key then
+      input.keys_down[tap.key], input.released[tap.key] = nil, true
+    else
+      input.mouse_down[tap.button], input.mouse_released[tap.button] = nil, true
+    end
+  end
+  if not slot then return end
+  for _, event in ipairs(slot.input) do
+    if event.kind == "key" then
+      local code = event.code
+      if event.down == false then
+        input.keys_down[code], input.released[code] = nil, true
+      else
+        if not input.keys_down[code] then input.pressed[code] = true end
+        input.keys_down[code] = true
+        if event.down == nil then input.tapped[#input.tapped + 1] = {key = code} end
+      end
+    else
+      if event.x then input.mouse_x, input.mouse_y = event.x, event.y end
+      local button = event.button
+      if event.action == "up" then
+        input.mouse_down[button], input.mouse_released[button] = nil, true
+      elseif event.action then
+        if not input.mouse_down[button] then input.clicked[button] = true end
+        input.mouse_down[button] = true
+        if event.action == "click" then input.tapped[#input.tapped + 1] = {button = button} end
+      end
+    end
+  end
+end
+
+local function print_scenario_report(report)
+  print(string.format("🎬 Scenario%s: %d steps over %d frames (%.2f s virtual, %.3f s CPU)",
+                      report.name and (" '" .. report.name .. "'") or "", #report.steps, report.frames,
+                      report.virtual_seconds, report.cpu_seconds))
+  -- A long scenario lists its costliest steps and those with missed events
+  local shown = report.steps
+  if #shown > MAX_SCENARIO_STEPS_LISTED then
+    shown = {}
+    for _, step in ipairs(report.steps) do shown[#shown + 1] = step end
+    table.sort(shown, function(a, b)
+      if (#a.missed > 0) ~= (#b.missed > 0) then return #a.missed > 0 end
+      return (a.ms or -1) > (b.ms or -1)
+    end)
+    for i = #shown, MAX_SCENARIO_STEPS_LISTED + 1, -1 do shown[i] = nil end
+    table.sort(shown, function(a, b) return a.frame < b.frame end)
+    print(string.format("   %d costliest of %d steps:", #shown, #report.steps))
+  end
+  print("   frame  step                                  frame ms   step ms (frames)")
+  for _, step in ipairs(shown) do
+    local name = #step.name > 36 and step.name:sub(1, 33) .. "..." or step.name
+    if step.ms then
+      print(string.format("   %5d  %-36s %9.3f %9.3f (%d)", step.frame, name, step.ms, step.total_ms,
+                          step.frames))
+    else
+      print(string.format("   %5d  %-36s   not reached", step.frame, name))
+    end
+    for _, missed in ipairs(step.missed) do print("          ⚠️  no widget took: " .. missed) end
+  end
+end
+
+-- Plays a scenario (a table or a scenario file) against script_path.
+-- host carries the mock's side: key_code, load_data, new_input,
+-- drive_frames, log_warning, state (its VirtualState) and set_playback,
+-- which hands the widgets the playback table or nil.
+-- options: settle (frames after the last step), allow_missed.
+-- Returns ok, report; ok is false when the script failed, stopped before
+-- the last step, or an event matched no widget.
+function Scenario.run(host, script_path, source, options)
+  options = options or {}
+  local scenario, err = load_scenario(source, host.load_data)
+  if scenario then scenario, err = compile_scenario(scenario, host.key_code) end
+  if not scenario then return false, "invalid scenario: " .. tostring(err) end
+  local steps, frames = scenario.steps, scenario.frames
+  local VirtualState = host.state
+  local verbose = VirtualState.verbose_logging
+  VirtualState.verbose_logging = false
+  local playback = {input = host.new_input(), events = nil}
+  host.set_playback(playback)
+  local current, slot, frame_start = nil, nil, 0
+  local missed = 0
+
+  local function before(frame)
+    slot = frames[frame]
+    if slot then current = steps[slot.step] end
+    apply_input(playback.input, slot)
+    playback.events = slot and slot.targets
+    for _, ctx in ipairs(VirtualState.contexts) do
+      ctx.last_item = nil
+      if ctx.ids then ctx.ids.n = 0 end
+    end
+    frame_start = os.clock()
+  end
+
+  local function after(frame)
+    local ms = (os.clock() - frame_start) * 1000
+    if current then
+      if frame == current.frame then current.ms = ms end
+      current.frames = current.frames + 1
+      current.total_ms = current.total_ms + ms
+      if ms > current.max_ms then current.max_ms = ms end
+    end
+    if slot then
+      local untaken = {}
+      for _, event in pairs(slot.targets) do
+        if not event.widget then untaken[#untaken + 1] = describe_event(event) end
+      end
+      table.sort(untaken)
+      for _, text in ipairs(untaken) do
+        current.missed[#current.missed + 1] = text
+        host.log_warning(string.format("[frame %d] scenario event '%s' matched no widget", frame, text))
+      end
+      missed = missed + #untaken
+    end
+  end
+
+  local clock_start, cpu_start = VirtualState.clock, os.clock()
+  local limit = scenario.last + math.max(0, math.floor(tonumber(options.settle) or DEFAULT_SCENARIO_SETTLE))
+  local ok, run_err, frame, stopped = host.drive_frames(function() dofile(script_path) end, limit, before, after)
+  host.set_playback(nil)
+  VirtualState.verbose_logging = verbose
+
+  local report = {
+    name = scenario.name, steps = steps, frames = frame, missed = missed, stopped = stopped,
+    virtual_seconds = VirtualState.clock - clock_start, cpu_seconds = os.clock() - cpu_start,
+    error = not ok and run_err or nil,
+  }
+  print_scenario_report(report)
+  if not ok then return false, run_err end
+  if frame < scenario.last then
+    return false, string.format("script stopped deferring at frame %d, before the step on frame %d",
+                                frame, scenario.last)
+  end
+  if missed > 0 and not options.allow_missed then
+    return false, string.format("%d scenario event(s) matched no widget", missed)
+  end
+  return true, report
+end
+
+return Scenario
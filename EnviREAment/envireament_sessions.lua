@@ -0,0 +1,241 @@
+-- envireament_sessions.lua
+-- Sessions for the Enhanced Virtual REAPER Environment. Many scripts in
+-- one VM. Each session owns a VirtualState (project, contexts,
+-- ExtState, statistics, frame counter and clock) and a globals table
+-- its script is loaded into. It also has a reaper table whose replaced
+-- functions stay local to it, its own copies of the modules it
+-- requires, and a queue of deferred callbacks. Activating a session
+-- swaps its state into VirtualState key by key, as reset_state() does.
+-- The API functions keep their one upvalue, and a switch costs a few
+-- dozen assignments. The scheduler resumes each session's coroutine
+-- once per frame, round robin, until every script has stopped deferring
+-- or used up its frames (or its CPU time, with a timeout).
+--
+-- The mock loads this file the first time sessions run.
+
+local Sessions = {}
+
+local DEFAULT_SESSION_FRAMES = 10000
+local SESSION_EXIT = {} -- metatable of the error os.exit raises inside a session
+
+local active_session = nil
+
+-- Parks VirtualState's contents in park and moves load's in
+local function swap_state(VirtualState, park, load)
+  for key, value in pairs(VirtualState) do
+    park[key] = value
+    VirtualState[key] = nil
+  end
+  for key, value in pairs(load) do
+    VirtualState[key] = value
+    load[key] = nil
+  end
+end
+
+-- session = nil goes back to the caller (whoever called Sessions.run)
+local function activate_session(host, session, caller)
+  if active_session == session then return end
+  swap_state(host.state, active_session and active_session.state or caller.state,
+             session and session.state or caller.state)
+  _G.print = session and session.print or caller.print -- the mock's own logging included
+  active_session = session
+end
+
+-- Like loadfile, but the chunk's globals are env
+local function load_file_in(path, env)
+  local file = io.open(path, "rb")
+  if not file then return nil, "cannot open " .. path end
+  local source = file:read("*a")
+  file:close()
+  if source:sub(1, 1) == "#" then source = "--" .. source end -- a shebang line
+  local chunk, err
+  if setfenv then
+    chunk, err = loadstring(source, "@" .. path)
+    if chunk then setfenv(chunk, env) end
+  else
+    chunk, err = load(source, "@" .. path, "t", env)
+  end
+  return chunk, err
+end
+
+local function session_env(host, session)
+  local env = setmetatable({}, {__index = _G})
+  env._G = env
+  -- A script that loads this file again gets a fresh copy of the mock
+  -- that must not act on the command line
+  env.__envireament_cli = rawget(_G, "__envireament_cli")
+  env.reaper = setmetatable({}, {__index = host.reaper})
+  env.dofile = function(path)
+    local chunk, err = load_file_in(path, env)
+    if not chunk then error(err, 2) end
+    return chunk()
+  end
+  env.loadfile = function(path, mode, chunk_env)
+    return load_file_in(path, chunk_env or env)
+  end
+  -- Lua modules load once per session; standard and C modules are shared
+  env.require = function(name)
+    local loaded = session.loaded
+    if loaded[name] ~= nil then return loaded[name] end
+    if name == "enhanced_virtual_reaper" then return host.module end
+    local path = package.searchpath and package.searchpath(name, package.path)
+    if not path then return require(name) end
+    local chunk, err = load_file_in(path, env)
+    if not chunk then error(err, 2) end
+    local module = chunk(name, path)
+    if module == nil then module = loaded[name] == nil or loaded[name] end
+    loaded[name] = module
+    return module
+  end
+  -- Exiting ends this session only
+  env.os = setmetatable({exit = function(code)
+    error(setmetatable({code = code}, SESSION_EXIT), 0)
+  end}, {__index = os})
+  return env
+end
+
+-- Frame 1 is the script's top level; each resume after that runs one
+-- frame's deferred callbacks
+local function session_main(session)
+  print("🧪 Running test script: " .. session.path)
+  local chunk, err = load_file_in(session.path, session.env)
+  if not chunk then error(err, 0) end
+  chunk()
+  while true do
+    local callbacks = coroutine.yield()
+    for i = 1, #callbacks do callbacks[i]() end
+  end
+end
+
+-- Stops a session once it has used `timeout` seconds of CPU time, from a
+-- hook on its coroutine, as call_with_timeout in enhanced_test_runner.lua
+-- does; a coverage or profiler hook the coroutine got is called on
+local function set_session_deadline(session, timeout)
+  local co = session.co
+  local hook, mask, count = debug.gethook(co)
+  local function expired()
+    session.timed_out = true
+    return string.format("timed out after %s seconds", timeout)
+  end
+  if hook then
+    local events = 0
+    debug.sethook(co, function(...)
+      events = events + 1
+      if events % 1000 == 0 and session.cpu + os.clock() - session.resumed > timeout then
+        error(expired(), 2)
+      end
+      return hook(...)
+    end, mask, count)
+  else
+    debug.sethook(co, function()
+      if session.cpu + os.clock() - session.resumed > timeout then
+        error(expired(), 2)
+      end
+    end, "", 1000000)
+  end
+end
+
+local function new_session(host, path, verbose)
+  local state = host.new_state()
+  state.time = os.time()
+  state.verbose_logging = verbose == true
+  local output = {}
+  local session = {path = path, state = state, output = output, loaded = {}, frames = 0, cpu = 0}
+  session.print = function(...)
+    local parts = {}
+    for i = 1, select("#", ...) do parts[i] = tostring((select(i, ...))) end
+    output[#output + 1] = table.concat(parts, "\t")
+  end
+  session.env = session_env(host, session)
+  session.co = coroutine.create(session_main)
+  return session
+end
+
+-- Runs every script in its own session. host: state (the mock's
+-- VirtualState), new_state() (a fresh one with its statistics and default
+-- project), reaper, module (EnhancedVirtualReaper), end_frame,
+-- finish_script, deferred() and set_deferred(callbacks), the queue defer
+-- adds to. options: frames (per script), timeout (CPU seconds per script),
+-- verbose. Returns one result per script, in order: {path, ok, error,
+-- frames, stopped, timed_out, seconds (CPU), output, api_calls, errors,
+-- warnings}
+function Sessions.run(host, paths, options)
+  options = options or {}
+  if host.deferred() or active_session then error("frames are already being driven", 2) end
+  local VirtualState = host.state
+  local max_frames = math.max(1, math.floor(tonumber(options.frames) or DEFAULT_SESSION_FRAMES))
+  local timeout = tonumber(options.timeout)
+  local caller = {state = {}, print = print}
+  local sessions, running = {}, {}
+  for i, path in ipairs(paths) do
+    sessions[i] = new_session(host, path, options.verbose)
+    running[i] = sessions[i]
+    if timeout then set_session_deadline(sessions[i], timeout) end
+  end
+
+  -- Runs with the session active
+  local function finish(session, ok, err)
+    if type(err) == "table" and getmetatable(err) == SESSION_EXIT then
+      ok = err.code == nil or err.code == true or err.code == 0
+      err = not ok and "os.exit(" .. tostring(err.code) .. ")" or nil
+    end
+    host.finish_script()
+    if ok then
+      print("✅ Script executed successfully")
+    else
+      print("❌ Script execution failed: " .. tostring(err))
+      VirtualState.stats.errors = VirtualState.stats.errors + 1
+    end
+    host.module.print_statistics()
+    session.ok, session.error, session.stats = ok, err, VirtualState.stats
+    session.env, session.co, session.loaded, session.callbacks = nil, nil, nil, nil
+  end
+
+  for frame = 1, max_frames do
+    local n = 0
+    for i = 1, #running do
+      local session = running[i]
+      activate_session(host, session, caller)
+      session.resumed = os.clock()
+      if frame > 1 then host.end_frame() end
+      host.set_deferred({})
+      local ok, err = coroutine.resume(session.co, frame == 1 and session or session.callbacks)
+      local queued = host.deferred()
+      host.set_deferred(nil)
+      session.cpu = session.cpu + os.clock() - session.resumed
+      session.frames = frame
+      if session.timed_out then -- even if the script caught the error
+        finish(session, false, not ok and err or string.format("timed out after %s seconds", timeout))
+      elseif not ok then
+        finish(session, false, err)
+      elseif #queued == 0 then
+        session.stopped = true
+        finish(session, true)
+      else
+        session.callbacks = queued
+        n = n + 1
+        running[n] = session
+      end
+    end
+    for i = n + 1, #running do running[i] = nil end
+    if n == 0 then break end
+  end
+  for _, session in ipairs(running) do -- out of frames, still deferring
+    activate_session(host, session, caller)
+    finish(session, true)
+  end
+  activate_session(host, nil, caller)
+
+  local results = {}
+  for i, session in ipairs(sessions) do
+    results[i] = {
+      path = session.path, ok = session.ok, error = session.error, frames = session.frames,
+      stopped = session.stopped == true, timed_out = session.timed_out == true, seconds = session.cpu,
+      output = table.concat(session.output, "\n"), api_calls = session.stats.api_calls,
+      errors = session.stats.errors, warnings = session.stats.warnings,
+    }
+  end
+  return results
+end
+
+return Sessions
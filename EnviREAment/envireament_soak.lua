@@ -0,0 +1,225 @@
+-- envireament_soak.lua
+-- Soak mode for the Enhanced Virtual REAPER Environment. Drives a deferred
+-- script for many frames on the virtual clock. defer queues its callback
+-- and one loop runs each frame's callbacks, so a million frames need no
+-- stack. Every `every` frames the run samples the heap as the collector
+-- left it, the live heap after a full collection, and the GC cycles and
+-- API calls since the previous sample. After the warm-up, a least-squares
+-- line through the live heap decides whether memory keeps growing, and
+-- the tables that grew are named by their path from _G or from the
+-- pending callbacks' upvalues.
+--
+-- The mock loads this file the first time a soak run starts.
+
+local Soak = {}
+
+local DEFAULT_SOAK_FRAMES = 10000
+local DEFAULT_SOAK_EVERY = 100
+local DEFAULT_SOAK_LIMIT_KB = 64
+local SOAK_MIN_R2 = 0.5 -- below this the heap wanders rather than grows
+local SOAK_TABLE_LIMIT = 100000 -- tables visited per snapshot
+
+-- Counts completed GC cycles: the sentinel is finalized once per cycle
+local gc_cycles = 0
+local gc_counting = false
+local function gc_sentinel()
+  setmetatable({}, {__gc = function()
+    gc_cycles = gc_cycles + 1
+    if gc_counting then gc_sentinel() end
+  end})
+end
+
+local function key_label(key)
+  if type(key) == "string" and key:match("^[%a_][%w_]*$") then return "." .. key end
+  if type(key) == "string" then return "[" .. string.format("%q", key):gsub("\\\n", "\\n") .. "]" end
+  if type(key) == "number" or type(key) == "boolean" then return "[" .. tostring(key) .. "]" end
+  return "[" .. type(key) .. "]"
+end
+
+local function callback_label(func)
+  local info = debug.getinfo(func, "S")
+  return string.format("defer callback (%s:%d)", info.short_src, info.linedefined)
+end
+
+-- Entries of every table reachable from _G and the pending callbacks,
+-- keyed by the first (shortest) path found to it
+local function table_sizes(host, callbacks)
+  local seen = {[host.reaper] = true, [host.module] = true, [host.state] = true}
+  local queue = {{_G, "_G"}}
+  for i = 1, #(callbacks or {}) do queue[#queue + 1] = {callbacks[i], callback_label(callbacks[i])} end
+  local sizes, head, visited = {}, 1, 0
+  while head <= #queue and visited < SOAK_TABLE_LIMIT do
+    local value, path = queue[head][1], queue[head][2]
+    head = head + 1
+    if not seen[value] then
+      seen[value] = true
+      if type(value) == "table" then
+        visited = visited + 1
+        local n = 0
+        for k, v in next, value do
+          n = n + 1
+          if (type(v) == "table" or type(v) == "function") and not seen[v] then
+            queue[#queue + 1] = {v, path .. key_label(k)}
+          end
+        end
+        sizes[path] = n
+      elseif not host.mock_sources[debug.getinfo(value, "S").source] then
+        local i = 1
+        while true do
+          local name, v = debug.getupvalue(value, i)
+          if not name then break end
+          if (type(v) == "table" or type(v) == "function") and not seen[v] and name ~= "_ENV" then
+            queue[#queue + 1] = {v, path .. " -> " .. name}
+          end
+          i = i + 1
+        end
+      end
+    end
+  end
+  return sizes
+end
+
+-- Least-squares line through the live heap, updated one sample at a time
+-- (Welford)
+local function new_fit()
+  return {n = 0, mx = 0, my = 0, sxx = 0, sxy = 0, syy = 0}
+end
+
+local function fit_add(fit, x, y)
+  fit.n = fit.n + 1
+  local dx, dy = x - fit.mx, y - fit.my
+  fit.mx, fit.my = fit.mx + dx / fit.n, fit.my + dy / fit.n
+  fit.sxx = fit.sxx + dx * (x - fit.mx)
+  fit.sxy = fit.sxy + dx * (y - fit.my)
+  fit.syy = fit.syy + dy * (y - fit.my)
+end
+
+-- slope, r²
+local function fit_line(fit)
+  if fit.n < 2 or fit.sxx == 0 then return 0, 0 end
+  return fit.sxy / fit.sxx, fit.syy > 0 and fit.sxy * fit.sxy / (fit.sxx * fit.syy) or 0
+end
+
+local function format_apis(calls)
+  local names = {}
+  for name in pairs(calls) do names[#names + 1] = name end
+  table.sort(names)
+  for i = 1, #names do names[i] = names[i] .. ":" .. calls[names[i]] end
+  return table.concat(names, ",")
+end
+
+-- Runs script_path for up to options.frames frames. host: reaper, module
+-- (EnhancedVirtualReaper), state (its VirtualState), mock_sources,
+-- log_warning, drive_frames, untimed (leaves sampling out of frame
+-- timing), deferred() (the callbacks queued so far) and
+-- set_api_window(calls), which has log_api_call count into calls or stop.
+-- Returns ok, report (ok is false when the script failed or its memory
+-- kept growing). With options.output, the samples are streamed to that
+-- file as they are taken.
+function Soak.run(host, script_path, options)
+  options = options or {}
+  local VirtualState = host.state
+  local frames = math.max(1, math.floor(tonumber(options.frames) or DEFAULT_SOAK_FRAMES))
+  local every = math.max(1, math.floor(tonumber(options.every) or DEFAULT_SOAK_EVERY))
+  local warmup = math.floor(tonumber(options.warmup) or frames / 10)
+  local limit_kb = tonumber(options.limit_kb) or DEFAULT_SOAK_LIMIT_KB
+  local out = options.output and io.open(options.output .. ".tmp", "wb")
+  if options.output and not out then host.log_warning("Cannot write soak series to " .. options.output) end
+  if out then
+    out:write("envireament-soak 1\nscript ", script_path, "\n",
+              string.format("frames %d every %d warmup %d limit %g\n", frames, every, warmup, limit_kb))
+  end
+  local verbose = VirtualState.verbose_logging
+  VirtualState.verbose_logging = false
+  local api_window = {}
+  host.set_api_window(api_window)
+  gc_cycles, gc_counting = 0, true
+  gc_sentinel()
+  local last_cycles, last_calls = 0, VirtualState.stats.api_calls
+  -- The fitted samples are also kept (two numbers each) for the late fit
+  local fit, fitted_frames, fitted_live = new_fit(), {}, {}
+  local samples, first_live, last_live, fit_start, before = 0, nil, nil, nil, nil
+
+  local function sample(frame)
+    if frame % every ~= 0 then return end
+    host.untimed(function() -- sampling is not part of the script's frame
+      local heap, cycles = collectgarbage("count"), gc_cycles - last_cycles
+      collectgarbage("collect")
+      last_cycles = gc_cycles -- the forced collection is not the script's
+      local live, calls = collectgarbage("count"), VirtualState.stats.api_calls - last_calls
+      if out then
+        out:write(string.format("sample %d %.1f %.1f %d %d\n", frame, heap, live, cycles, calls))
+        if next(api_window) then out:write("apis ", format_apis(api_window), "\n") end
+      end
+      last_calls, api_window = VirtualState.stats.api_calls, {}
+      host.set_api_window(api_window)
+      samples, first_live, last_live = samples + 1, first_live or live, live
+      if frame >= warmup then
+        if not before then before, fit_start = table_sizes(host, host.deferred()), frame end
+        fit_add(fit, frame, live)
+        fitted_frames[#fitted_frames + 1], fitted_live[#fitted_live + 1] = frame, live
+      end
+    end)
+  end
+  local ok, err, frame, stopped, pending = host.drive_frames(function() dofile(script_path) end, frames,
+                                                            nil, sample)
+  local after = before and table_sizes(host, pending) or {}
+  host.set_api_window(nil)
+  gc_counting = false
+  VirtualState.verbose_logging = verbose
+
+  local slope, r2 = fit_line(fit)
+  local report = {
+    frames = frame, samples = samples, stopped = stopped, slope_kb = slope * 1000, r2 = r2,
+    growth_kb = slope * (frame - (fit_start or frame)), tables = {}, error = not ok and err or nil,
+  }
+  -- The second half of the frames actually fitted gets its own line (the
+  -- script may stop long before options.frames): memory still growing
+  -- there is a leak, not a cache that filled up once. With too few late
+  -- samples to fit, the whole-run trend decides.
+  local late, late_from = new_fit(), fit_start and fit_start + (frame - fit_start) / 2
+  for i = 1, #fitted_frames do
+    if fitted_frames[i] >= late_from then fit_add(late, fitted_frames[i], fitted_live[i]) end
+  end
+  report.leak = report.growth_kb > limit_kb and r2 >= SOAK_MIN_R2
+                and (late.n < 2 or fit_line(late) > slope / 4)
+  for path, n in pairs(after) do
+    if before[path] and n > before[path] then
+      report.tables[#report.tables + 1] = {path = path, before = before[path], after = n}
+    end
+  end
+  table.sort(report.tables, function(a, b)
+    local ga, gb = a.after - a.before, b.after - b.before
+    if ga ~= gb then return ga > gb end
+    return a.path < b.path
+  end)
+  if out then
+    for _, grown in ipairs(report.tables) do
+      out:write(string.format("table %d %d %s\n", grown.before, grown.after, grown.path))
+    end
+    out:write(string.format("trend %d %.4f %.4f %.1f %s\n", fit_start or 0, report.slope_kb, r2,
+                            report.growth_kb, report.leak and "growing" or "stable"))
+    if report.error then out:write("error ", (tostring(report.error):gsub("\n", " ")), "\n") end
+    out:close()
+    os.remove(options.output)
+    os.rename(options.output .. ".tmp", options.output)
+  end
+
+  print(string.format("🔁 Soak: %d frames, %d samples, live heap %.1f KB -> %.1f KB", frame, samples,
+                      first_live or 0, last_live or 0))
+  if stopped then print("   Script stopped deferring at frame " .. frame) end
+  print(string.format("   Trend after frame %d: %+.2f KB per 1000 frames (r² %.2f): %s", fit_start or 0,
+                      report.slope_kb, r2, report.leak and "growing" or "stable"))
+  for i = 1, math.min(5, #report.tables) do
+    local grown = report.tables[i]
+    print(string.format("   %s: %d -> %d entries", grown.path, grown.before, grown.after))
+  end
+  if not ok then return false, err end
+  if report.leak then
+    return false, string.format("memory kept growing (%+.1f KB over %d frames)", report.growth_kb,
+                                frame - fit_start)
+  end
+  return true, report
+end
+
+return Soak
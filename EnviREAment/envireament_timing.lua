@@ -0,0 +1,207 @@
+-- envireament_timing.lua
+-- Frame timing for the Enhanced Virtual REAPER Environment: per-frame CPU
+-- cost against a frame budget. Frames are timed with os.clock (process CPU
+-- time, so parallel workers do not inflate each other) and split three ways:
+--   mock    time inside mock_reaper functions, measured by wrappers
+--   gc      the collector is stopped during the frame and, at its end,
+--           collectgarbage("step") pays for what the frame allocated
+--   script  everything else
+-- Costs go into 10 µs histogram buckets, so a soak run of a million
+-- frames keeps its percentiles in constant memory.
+--
+-- The mock loads this file as it starts; end_frame closes each frame
+-- through the table FrameTiming.new returns.
+
+local FrameTiming = {}
+
+-- host: reaper (the mock's API table, whose functions are wrapped while
+-- timing runs), state (its VirtualState) and set_active(timing), which
+-- hands end_frame the running timing or nil
+function FrameTiming.new(host)
+  local mock_reaper, VirtualState, set_active = host.reaper, host.state, host.set_active
+  local frame_timing, last_frame_timing = nil, nil
+
+  local FRAME_BUCKET_MS = 0.01
+  local DEFAULT_FRAME_BUDGET_MS = 1000 / 60
+  local MAX_OVER_BUDGET_LISTED = 100
+  local FRAME_SPLITS = {"frame", "script", "mock", "gc"}
+
+  local function new_split()
+    return {hist = {}, total = 0, max = 0}
+  end
+
+  local function add_cost(split, ms)
+    local bucket = math.floor(ms / FRAME_BUCKET_MS)
+    split.hist[bucket] = (split.hist[bucket] or 0) + 1
+    split.total = split.total + ms
+    if ms > split.max then split.max = ms end
+  end
+
+  -- Upper edge of the bucket holding the p-th percentile, capped at the max
+  local function split_percentile(split, frames, p)
+    if frames == 0 then return 0 end
+    local buckets = {}
+    for bucket in pairs(split.hist) do buckets[#buckets + 1] = bucket end
+    table.sort(buckets)
+    local rank, seen = math.ceil(frames * p / 100), 0
+    for _, bucket in ipairs(buckets) do
+      seen = seen + split.hist[bucket]
+      if seen >= rank then return math.min((bucket + 1) * FRAME_BUCKET_MS, split.max) end
+    end
+    return split.max
+  end
+
+  -- Wraps every API function (except defer, whose callback is the next
+  -- frame) so the outermost call adds its duration to the frame's mock time
+  local function wrap_for_timing(timing)
+    local depth = 0
+    local function finish(start, ...)
+      timing.mock = timing.mock + os.clock() - start
+      depth = 0
+      return ...
+    end
+    for name, fn in pairs(mock_reaper) do
+      if type(fn) == "function" and name ~= "defer" then
+        local wrapper = function(...)
+          if depth > 0 or frame_timing ~= timing then return fn(...) end
+          depth = 1
+          return finish(os.clock(), fn(...))
+        end
+        timing.originals[name], timing.wrappers[name] = fn, wrapper
+        mock_reaper[name] = wrapper
+      end
+    end
+    timing.reset_depth = function() depth = 0 end -- a call that raised never got to finish
+  end
+
+  local function start_frame_timing(budget_ms)
+    if frame_timing then return end
+    local timing = {
+      budget = tonumber(budget_ms) or DEFAULT_FRAME_BUDGET_MS, frames = 0, mock = 0, excluded = 0,
+      splits = {}, over = {}, over_count = 0, originals = {}, wrappers = {},
+      gc_was_running = collectgarbage("isrunning"),
+    }
+    for _, name in ipairs(FRAME_SPLITS) do timing.splits[name] = new_split() end
+    wrap_for_timing(timing)
+    frame_timing = timing
+    set_active(timing)
+    collectgarbage("stop")
+    timing.heap = collectgarbage("count")
+    timing.start = os.clock()
+  end
+
+  -- Closes the running frame: pays its GC debt and records its cost
+  local function close_frame_timing()
+    local timing = frame_timing
+    local now = os.clock()
+    local work = (now - timing.start - timing.excluded) * 1000
+    local mock = timing.mock * 1000
+    local debt = collectgarbage("count") - timing.heap
+    if debt > 0 then collectgarbage("step", math.floor(debt) + 1) end
+    local after = os.clock()
+    local gc = (after - now) * 1000
+    timing.frames = timing.frames + 1
+    add_cost(timing.splits.frame, work + gc)
+    add_cost(timing.splits.script, math.max(0, work - mock))
+    add_cost(timing.splits.mock, mock)
+    add_cost(timing.splits.gc, gc)
+    if work + gc > timing.budget then
+      timing.over_count = timing.over_count + 1
+      if #timing.over < MAX_OVER_BUDGET_LISTED then
+        timing.over[#timing.over + 1] = {frame = VirtualState.frame_count, ms = work + gc,
+                                         script = math.max(0, work - mock), mock = mock, gc = gc}
+      end
+    end
+    timing.reset_depth()
+    timing.mock, timing.excluded, timing.heap = 0, 0, collectgarbage("count")
+    timing.start = os.clock()
+  end
+
+  -- Leaves the time spent in fn out of the running frame (soak sampling)
+  local function untimed(fn)
+    if not frame_timing then return fn() end
+    local start = os.clock()
+    fn()
+    frame_timing.excluded = frame_timing.excluded + os.clock() - start
+    frame_timing.heap = collectgarbage("count")
+  end
+
+  local function stop_frame_timing()
+    local timing = frame_timing
+    if not timing then return end
+    frame_timing = nil
+    set_active(nil)
+    for name, wrapper in pairs(timing.wrappers) do
+      if mock_reaper[name] == wrapper then mock_reaper[name] = timing.originals[name] end
+    end
+    if timing.gc_was_running then collectgarbage("restart") end
+    last_frame_timing = timing
+  end
+
+  -- {budget, frames, over_budget, over_budget_frames, frame/script/mock/gc = {p50, p95, p99, max, total}}
+  local function frame_timing_report()
+    local timing = frame_timing or last_frame_timing
+    if not timing then return nil end
+    local report = {budget = timing.budget, frames = timing.frames, over_budget = timing.over_count,
+                    over_budget_frames = timing.over}
+    for _, name in ipairs(FRAME_SPLITS) do
+      local split = timing.splits[name]
+      report[name] = {
+        p50 = split_percentile(split, timing.frames, 50), p95 = split_percentile(split, timing.frames, 95),
+        p99 = split_percentile(split, timing.frames, 99), max = split.max, total = split.total,
+      }
+    end
+    return report
+  end
+
+  local function print_frame_timing(report)
+    print(string.format("⏱️  Frame timing: %d frames, budget %.1f ms", report.frames, report.budget))
+    print("             p50      p95      p99      max      total (ms)")
+    for _, name in ipairs(FRAME_SPLITS) do
+      local split = report[name]
+      print(string.format("   %-6s %8.2f %8.2f %8.2f %8.2f %10.1f", name, split.p50, split.p95,
+                          split.p99, split.max, split.total))
+    end
+    if report.over_budget > 0 then
+      print(string.format("   Over budget: %d frame(s)", report.over_budget))
+      for i = 1, math.min(10, #report.over_budget_frames) do
+        local over = report.over_budget_frames[i]
+        print(string.format("     frame %d: %.2f ms (script %.2f, mock %.2f, gc %.2f)", over.frame,
+                            over.ms, over.script, over.mock, over.gc))
+      end
+    end
+  end
+
+  -- limits: {p95 = 16.6, max = 33, script_p99 = 8, gc_max = 2, over_budget = 0}.
+  -- Keys are <split>_<stat> or <stat> (the whole frame). Returns ok, message.
+  local function check_frame_budget(report, limits)
+    if not report then return false, "frame timing was not started" end
+    local names = {}
+    for key in pairs(limits) do names[#names + 1] = key end
+    table.sort(names)
+    for _, key in ipairs(names) do
+      local limit = limits[key]
+      local value
+      if key == "over_budget" then
+        value = report.over_budget
+      else
+        local split, stat = key:match("^(%a+)_(%w+)$")
+        split, stat = split or "frame", stat or key
+        value = report[split] and report[split][stat]
+        if value == nil then return false, "unknown frame budget limit: " .. key end
+      end
+      if value > limit then
+        return false, string.format("frame budget exceeded: %s = %.2f > %.2f", key, value, limit)
+      end
+    end
+    return true
+  end
+
+  return {
+    start_frame_timing = start_frame_timing, stop_frame_timing = stop_frame_timing,
+    close_frame_timing = close_frame_timing, untimed = untimed, frame_timing_report = frame_timing_report,
+    print_frame_timing = print_frame_timing, check_frame_budget = check_frame_budget,
+  }
+end
+
+return FrameTiming
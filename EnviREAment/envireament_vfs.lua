@@ -0,0 +1,158 @@
+-- envireament_vfs.lua
+-- Virtual filesystem for the Enhanced Virtual REAPER Environment.
+-- Directory trees mounted at a path answer EnumerateFiles,
+-- EnumerateSubdirectories, file_exists and io.open for reading, so a
+-- script can crawl a library of 50,000 files without touching the disk.
+-- A tree is a table: subdirectories are tables, files are their
+-- content, either a string or a function(path) that returns it. Mounts
+-- are read-only, and paths outside every mount behave as before.
+
+local VirtualFiles = {}
+
+-- Returns vfs: lookup(path) and enumerate(path, index, dirs) for the API,
+-- mount(root, tree) and unmount(root)
+function VirtualFiles.new()
+  local vfs = {}
+  local mounts = {}          -- normalized root -> tree
+  local real_open = io.open
+  local listings = setmetatable({}, {__mode = "k"}) -- tree -> {files, dirs}, sorted
+  local last_path, last_node -- EnumerateFiles asks for the same directory index after index
+
+  local function normalize(path)
+    path = tostring(path):gsub("\\", "/"):gsub("//+", "/")
+    if #path > 1 then path = path:gsub("/$", "") end
+    return path
+  end
+
+  -- node, mounted: the tree or file content at path (nil if missing), and
+  -- whether path lies in a mount at all
+  local function lookup(path)
+    if path == last_path then return last_node, true end
+    path = normalize(path)
+    for root, tree in pairs(mounts) do
+      if path == root then return tree, true end
+      if path:sub(1, #root + 1) == root .. "/" then
+        local node = tree
+        for part in path:sub(#root + 2):gmatch("[^/]+") do
+          node = type(node) == "table" and node[part] or nil
+          if node == nil then return nil, true end
+        end
+        return node, true
+      end
+    end
+    return nil, false
+  end
+  vfs.lookup = lookup
+
+  local function listing(tree)
+    local list = listings[tree]
+    if not list then
+      list = {files = {}, dirs = {}}
+      for name, entry in pairs(tree) do
+        local names = type(entry) == "table" and list.dirs or list.files
+        names[#names + 1] = name
+      end
+      table.sort(list.files)
+      table.sort(list.dirs)
+      listings[tree] = list
+    end
+    return list
+  end
+
+  -- name, mounted: entry index (0-based) of the directory at path
+  function vfs.enumerate(path, index, dirs)
+    if not next(mounts) then return nil, false end
+    local node, mounted = lookup(path)
+    if not mounted then return nil, false end
+    if type(node) ~= "table" then return nil, true end
+    last_path, last_node = path, node
+    local list = listing(node)
+    return (dirs and list.dirs or list.files)[(index or 0) + 1], true
+  end
+
+  -- Read-only file handles over a string, for io.open
+  local MemoryFile = {}
+  MemoryFile.__index = MemoryFile
+  MemoryFile.__name = "FILE*"
+
+  local function read_one(file, format)
+    local text, pos = file.text, file.pos
+    if type(format) == "number" then
+      if pos > #text then return nil end
+      file.pos = pos + format
+      return text:sub(pos, pos + format - 1)
+    end
+    format = tostring(format or "l"):gsub("^%*", "")
+    local kind = format:sub(1, 1)
+    if kind == "a" then
+      file.pos = #text + 1
+      return text:sub(pos)
+    elseif kind == "n" then
+      local number, stop = text:match("^%s*([%+%-]?%d*%.?%d+[eE]?[%+%-]?%d*)()", pos)
+      if not number then return nil end
+      file.pos = stop
+      return tonumber(number)
+    end
+    if pos > #text then return nil end
+    local eol = text:find("\n", pos, true)
+    file.pos = eol and eol + 1 or #text + 1
+    if kind == "L" then return text:sub(pos, eol or #text) end
+    return text:sub(pos, (eol or #text + 1) - 1)
+  end
+
+  function MemoryFile:read(...)
+    local count = select("#", ...)
+    if count <= 1 then return read_one(self, ...) end
+    local results = {}
+    for i = 1, count do
+      results[i] = read_one(self, (select(i, ...)))
+      if results[i] == nil then return table.unpack(results, 1, i) end
+    end
+    return table.unpack(results, 1, count)
+  end
+
+  function MemoryFile:lines(format)
+    return function() return read_one(self, format) end
+  end
+
+  function MemoryFile:seek(whence, offset)
+    local base = whence == "set" and 0 or whence == "end" and #self.text or self.pos - 1
+    if whence ~= nil or offset ~= nil then self.pos = base + (offset or 0) + 1 end
+    return self.pos - 1
+  end
+
+  function MemoryFile:close() return true end
+  function MemoryFile:setvbuf() return true end
+  function MemoryFile:flush() return self end
+  function MemoryFile:write() return nil, "Bad file descriptor", 9 end
+
+  local function open(path, mode)
+    if type(path) == "string" and not tostring(mode or "r"):find("[wa+]") then
+      local node, mounted = lookup(path)
+      if mounted then
+        if type(node) == "function" then node = node(path) end
+        if type(node) ~= "string" then return nil, path .. ": No such file or directory", 2 end
+        return setmetatable({text = node, pos = 1}, MemoryFile)
+      end
+    end
+    return real_open(path, mode)
+  end
+
+  -- Mounting a first tree routes io.open through the mounts; unmounting
+  -- the last one gives io.open back
+  function vfs.mount(root, tree)
+    mounts[normalize(root)] = tree
+    last_path, last_node = nil, nil
+    io.open = open
+  end
+
+  function vfs.unmount(root)
+    if root then mounts[normalize(root)] = nil else mounts = {} end
+    last_path, last_node = nil, nil
+    if not next(mounts) and io.open == open then io.open = real_open end
+  end
+
+  return vfs
+end
+
+return VirtualFiles
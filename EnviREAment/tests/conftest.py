@@ -0,0 +1,21 @@
+"""Shared fixtures for the EnviREAment Python tests."""
+
+import shutil
+
+import pytest
+
+from envireament import PACKAGE_DIR
+
+
+@pytest.fixture
+def lua():
+    """The Lua interpreter; tests that run the mock are skipped without one."""
+    path = shutil.which("lua")
+    if path is None:
+        pytest.skip("lua is not installed")
+    return path
+
+
+@pytest.fixture
+def package_dir():
+    return PACKAGE_DIR
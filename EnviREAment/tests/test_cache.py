@@ -0,0 +1,93 @@
+"""Result cache keys and replay (cache.py, runner.execute_tests)."""
+
+import pytest
+
+from envireament.cache import ResultCache
+from envireament.deps import DependencyScanner
+from envireament.runner import PASSED, execute_tests, harness_hash
+
+# Stands in for the mock: `lua enhanced_virtual_reaper.lua --test path`
+FAKE_MOCK = 'local helper = require("fake_helper")\ndofile(arg[2])\n'
+
+
+@pytest.fixture
+def package(tmp_path):
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "enhanced_virtual_reaper.lua").write_text(FAKE_MOCK)
+    (package / "fake_helper.lua").write_text("return {}")
+    return package
+
+
+@pytest.fixture
+def tests_dir(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    return tests
+
+
+def run(files, package, cache):
+    return execute_tests(files, package, jobs=1, lua="lua", cache=cache,
+                         scanner=DependencyScanner(package))
+
+
+def test_key_depends_on_every_part(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.key(tmp_path / "test_a.lua", "closure", "mock", 30)
+    assert key == cache.key(tmp_path / "test_a.lua", "closure", "mock", 30)
+    assert key != cache.key(tmp_path / "test_b.lua", "closure", "mock", 30)
+    assert key != cache.key(tmp_path / "test_a.lua", "other", "mock", 30)
+    assert key != cache.key(tmp_path / "test_a.lua", "closure", "other", 30)
+    assert key != cache.key(tmp_path / "test_a.lua", "closure", "mock", 60)
+
+
+def test_harness_hash_covers_mock_and_its_modules(package):
+    scanner = DependencyScanner(package)
+    before = harness_hash(scanner, package)
+    (package / "fake_helper.lua").write_text("return {changed = true}")
+    after_module = harness_hash(scanner, package)
+    assert after_module != before
+    (package / "enhanced_virtual_reaper.lua").write_text(FAKE_MOCK + "-- edited\n")
+    assert harness_hash(scanner, package) != after_module
+
+
+def test_unchanged_test_replays(lua, package, tests_dir, tmp_path):
+    test = tests_dir / "test_ok.lua"
+    test.write_text('print("ran")\n')
+    cache = ResultCache(tmp_path / "cache")
+    first, = run([test], package, cache)
+    assert first.status == PASSED and not first.cached
+    second, = run([test], package, cache)
+    assert second.cached and second.status == PASSED and "ran" in second.output
+
+
+def test_mock_change_invalidates_cached_results(lua, package, tests_dir, tmp_path):
+    test = tests_dir / "test_ok.lua"
+    test.write_text("assert(true)\n")
+    cache = ResultCache(tmp_path / "cache")
+    run([test], package, cache)
+    (package / "enhanced_virtual_reaper.lua").write_text(FAKE_MOCK + "-- edited\n")
+    result, = run([test], package, cache)
+    assert not result.cached
+
+
+def test_dependency_change_invalidates_cached_results(lua, package, tests_dir, tmp_path):
+    (tests_dir / "helper.lua").write_text("return 1")
+    test = tests_dir / "test_dep.lua"
+    test.write_text('assert(require("helper") == 1)\n')
+    cache = ResultCache(tmp_path / "cache")
+    run([test], package, cache)
+    (tests_dir / "helper.lua").write_text("return 2")
+    result, = run([test], package, cache)
+    assert not result.cached and result.status != PASSED
+
+
+def test_dynamic_require_is_never_cached(lua, package, tests_dir, tmp_path):
+    (tests_dir / "plugin.lua").write_text("return {}")
+    test = tests_dir / "test_dynamic.lua"
+    test.write_text('local name = "plug" .. "in"\nrequire(name)\n')
+    cache = ResultCache(tmp_path / "cache")
+    first, = run([test], package, cache)
+    second, = run([test], package, cache)
+    assert first.status == PASSED and not second.cached
+    assert not list((tmp_path / "cache").rglob("*.json"))
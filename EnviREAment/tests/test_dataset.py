@@ -0,0 +1,121 @@
+"""Duplicate detection across song datasets (dataset.py)."""
+
+import json
+
+import pytest
+
+from envireament.dataset import (_Groups, _join_near, content_digest, find_duplicates, minhash,
+                                 normalize_chord, shingles, similarity, song_chords)
+
+VERSE = ["C", "Am", "F", "G", "Em", "Am", "Dm", "G7", "C", "F", "Bb", "Eb"]
+
+
+def normalized(symbols):
+    return [normalize_chord(symbol) for symbol in symbols]
+
+
+def song(title=None, chords=VERSE, **fields):
+    data = dict(fields, sections=[{"name": "Verse", "chords": [{"symbol": c} for c in chords]}])
+    if title is not None:
+        data["title"] = title
+    return data
+
+
+def write_songs(root, files):
+    for relative, data in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data))
+
+
+@pytest.mark.parametrize("spellings, expected", [
+    (("Cmin7", "C-7", "cm7", "C mi7"), (0, "m7")),
+    (("CM7", "Cmaj7", "C^7", "Cma7"), (0, "maj7")),
+    (("C", "CM", "Cmaj", "Cmajor"), (0, "")),
+    (("Db", "C#", "C♯"), (1, "")),
+    (("Bb+", "A#aug"), (10, "aug")),
+    (("G/B",), (7, "/4")),
+])
+def test_chord_spellings_normalize_alike(spellings, expected):
+    assert {normalize_chord(spelling) for spelling in spellings} == {expected}
+
+
+def test_non_chords_keep_no_root():
+    assert normalize_chord(" N ") == (None, "n")
+
+
+def test_song_chords_reads_symbols_and_strings():
+    data = {"sections": [{"chords": [{"symbol": "C"}, "G", {"symbol": " "}, {}]},
+                         "not a section", {"chords": None}]}
+    assert song_chords(data) == ["C", "G"]
+
+
+def test_digest_evens_out_spelling_case_and_field_order():
+    a = content_digest({"title": "Blue  Song", "artist": "X", "key": "C"},
+                       normalized(["Cmin7", "F7"]))
+    b = content_digest({"key": "c", "name": "blue song", "performer": "x"},
+                       normalized(["C-7", "F7"]))
+    assert a == b
+
+
+def test_untitled_songs_are_told_apart_by_file_name():
+    chords = normalized(VERSE)
+    assert content_digest({}, chords, "one") != content_digest({}, chords, "two")
+    assert content_digest({}, chords, "one") == content_digest({}, chords, "One")
+    # A title wins over the file name
+    assert content_digest({"title": "A"}, chords, "one") == content_digest({"title": "A"}, chords,
+                                                                           "two")
+
+
+def test_transposed_progression_shingles_the_same():
+    up_a_tone = normalized(["D", "Bm", "G", "A", "F#m", "Bm", "Em", "A7", "D", "G", "C", "F"])
+    assert shingles(normalized(VERSE)) and shingles(normalized(VERSE)) == shingles(up_a_tone)
+    altered = ["D" if chord == "C" else chord for chord in VERSE]
+    assert shingles(normalized(altered)) != shingles(normalized(VERSE))
+    assert shingles(normalized(["C", "C", "G"])) == set()
+
+
+def test_minhash_estimates_jaccard():
+    a = {f"s{i}" for i in range(100)}
+    b = {f"s{i}" for i in range(20, 120)}  # Jaccard 80 / 120
+    assert minhash(set()) is None
+    assert similarity(minhash(a), minhash(a)) == 1.0
+    assert abs(similarity(minhash(a, 256), minhash(b, 256)) - 80 / 120) < 0.1
+
+
+def test_lsh_joins_only_similar_sketches():
+    base = {f"s{i}" for i in range(50)}
+    sketches = {0: minhash(base).tobytes(),
+                1: minhash(base | {"extra"}).tobytes(),
+                2: minhash({f"t{i}" for i in range(50)}).tobytes()}
+    groups = _Groups(3)
+    checked = _join_near(groups, sketches, bands=16, threshold=0.7)
+    assert checked >= 1
+    assert groups.find(1) == 0 and groups.find(2) == 2
+
+
+def test_find_duplicates_exact_near_and_empty(tmp_path):
+    write_songs(tmp_path, {
+        "datasets/blue.jcrd": song("Blue", artist="X"),
+        "examples/blue.jcrd": song("blue", artist="x",
+                                   chords=[c + "in" if c.endswith("m") else c for c in VERSE]),
+        "examples/blue_live.jcrd": song("Blue (Live)", chords=VERSE[:-1] + ["Ab"]),
+        "datasets/untitled_a.json": song(chords=["E", "A", "B", "C#m"]),
+        "jcrddatasets/untitled_b.json": song(chords=["E", "A", "B", "C#m"]),
+        "datasets/blank.jcrd": {"sections": []},
+        "examples/blank.jcrd": {"sections": []},
+        "examples/broken.jcrd": "not a song",
+    })
+    (tmp_path / "examples" / "garbled.jcrd").write_text("{")
+    result = find_duplicates(tmp_path, jobs=1)
+    duplicates = result["duplicates"]
+
+    assert duplicates["examples/blue.jcrd"] == {"of": "datasets/blue.jcrd", "kind": "exact",
+                                                "similarity": 1.0}
+    assert duplicates["examples/blue_live.jcrd"]["of"] == "datasets/blue.jcrd"
+    assert duplicates["examples/blue_live.jcrd"]["kind"] == "near"
+    # Same progression, different files: not one song by content
+    assert duplicates.get("jcrddatasets/untitled_b.json", {}).get("kind") != "exact"
+    assert result["empty"] == ["datasets/blank.jcrd", "examples/blank.jcrd"]
+    assert not {"datasets/blank.jcrd", "examples/blank.jcrd"} & set(duplicates)
+    assert set(result["unreadable"]) == {"examples/broken.jcrd", "examples/garbled.jcrd"}
@@ -0,0 +1,94 @@
+"""Dependency closures of Lua scripts (deps.py)."""
+
+from envireament.deps import DependencyScanner, scan_source
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def closure_names(closure):
+    return sorted(path.relative_to(closure.root).as_posix() for path in closure.files)
+
+
+def test_scan_source_finds_loads():
+    deps = scan_source(
+        'local a = require("alpha")\n'
+        "local b = require 'beta.gamma'\n"
+        'dofile("setup.lua")\n'
+        'local chunk = loadfile "data/table.lua"\n'
+        '-- require("commented")\n'
+        'local s = "require(\\"quoted\\")"\n')
+    assert deps.requires == ["alpha", "beta.gamma"]
+    assert deps.dofiles == ["setup.lua", "data/table.lua"]
+    assert not deps.dynamic
+
+
+def test_package_path_template(tmp_path):
+    write(tmp_path / "lib" / "helper.lua", 'return require("inner")')
+    write(tmp_path / "lib" / "inner.lua", "return {}")
+    script = write(tmp_path / "test_paths.lua",
+                   'local script_dir = debug.getinfo(1, "S").source:match("@(.*/)")\n'
+                   'package.path = script_dir .. "lib/?.lua;" .. package.path\n'
+                   'require("helper")\n')
+    closure = DependencyScanner(tmp_path / "pkg").closure(script)
+    assert closure_names(closure) == ["lib/helper.lua", "lib/inner.lua", "test_paths.lua"]
+    assert not closure.missing
+
+
+def test_package_path_from_local_literal(tmp_path):
+    write(tmp_path / "vendor" / "util.lua", "return {}")
+    script = write(tmp_path / "test_literal.lua",
+                   'local base = "vendor/"\n'
+                   'package.path = base .. "?.lua;" .. package.path\n'
+                   'require("util")\n')
+    closure = DependencyScanner(tmp_path / "pkg").closure(script)
+    assert "vendor/util.lua" in closure_names(closure)
+
+
+def test_dofile_and_loadfile_targets(tmp_path):
+    write(tmp_path / "setup.lua", 'dofile("fixtures/data.lua")')
+    write(tmp_path / "fixtures" / "data.lua", "return {}")
+    write(tmp_path / "extra.lua", "return 1")
+    script = write(tmp_path / "test_files.lua",
+                   'dofile("setup.lua")\nlocal f = loadfile("extra.lua")\n')
+    closure = DependencyScanner(tmp_path / "pkg").closure(script)
+    assert closure_names(closure) == ["extra.lua", "fixtures/data.lua", "setup.lua",
+                                      "test_files.lua"]
+
+
+def test_dynamic_require_marks_closure(tmp_path):
+    write(tmp_path / "plugin_a.lua", "return {}")
+    write(tmp_path / "plugin_b.lua", "return {}")
+    script = write(tmp_path / "test_dynamic.lua",
+                   'for _, name in ipairs({"plugin_a", "plugin_b"}) do require(name) end\n')
+    closure = DependencyScanner(tmp_path / "pkg").closure(script)
+    assert closure.dynamic
+    # Every module on the search path may load
+    assert {"plugin_a.lua", "plugin_b.lua"} <= set(closure_names(closure))
+
+
+def test_missing_module_is_part_of_the_hash(tmp_path):
+    script = write(tmp_path / "test_missing.lua", 'require("not_yet")\n')
+    scanner = DependencyScanner(tmp_path / "pkg")
+    closure = scanner.closure(script)
+    assert closure.missing == {"not_yet"}
+    before = scanner.closure_hash(closure)
+
+    # Creating the module resolves it and changes the hash
+    write(tmp_path / "not_yet.lua", "return {}")
+    closure = scanner.closure(script)
+    assert not closure.missing
+    assert scanner.closure_hash(closure) != before
+
+
+def test_dependency_edit_changes_the_hash(tmp_path):
+    helper = write(tmp_path / "helper.lua", "return 1")
+    script = write(tmp_path / "test_edit.lua", 'require("helper")\n')
+    scanner = DependencyScanner(tmp_path / "pkg")
+    before = scanner.closure_hash(scanner.closure(script))
+    assert scanner.closure_hash(scanner.closure(script)) == before
+    helper.write_text("return 2 -- changed, and a different size")
+    assert scanner.closure_hash(scanner.closure(script)) != before
@@ -0,0 +1,96 @@
+"""Fixture files written in Python and loaded by the Lua mock (fixtures.py, generate.py)."""
+
+import json
+import subprocess
+
+from envireament.fixtures import FIXTURE_MAGIC, FixtureWriter, lua_string, pack_midi_event
+from envireament.generate import generate_fixture
+
+# Loads the fixture in arg[1] and prints what the mock sees as JSON; strings
+# are hex encoded so every byte comes back as it was read
+PROBE = """\
+package.path = arg[2] .. "/?.lua;" .. package.path
+local VirtualReaper = require("enhanced_virtual_reaper")
+VirtualReaper.set_verbose_logging(false)
+local r = VirtualReaper.create_environment()
+assert(VirtualReaper.load_fixture(arg[1]))
+local function hex(s)
+  return '"' .. s:gsub(".", function(c) return string.format("%02x", c:byte()) end) .. '"'
+end
+local counts = {tracks = r.CountTracks(0), items = r.CountMediaItems(0), takes = 0,
+                midi_events = 0, fx = 0, markers = select(1, r.CountProjectMarkers(0))}
+local names, buffers = {}, {}
+for t = 0, counts.tracks - 1 do
+  local track = r.GetTrack(0, t)
+  counts.fx = counts.fx + r.TrackFX_GetCount(track)
+  for i = 0, r.CountTrackMediaItems(track) - 1 do
+    local item = r.GetTrackMediaItem(track, i)
+    for k = 0, r.CountTakes(item) - 1 do
+      local take = r.GetTake(item, k)
+      counts.takes = counts.takes + 1
+      names[#names + 1] = hex(r.GetTakeName(take))
+      if r.TakeIsMIDI(take) then
+        local _, notes, ccs, texts = r.MIDI_CountEvts(take)
+        counts.midi_events = counts.midi_events + 2 * notes + ccs + texts
+        local _, buffer = r.MIDI_GetAllEvts(take, "")
+        buffers[#buffers + 1] = hex(buffer)
+      end
+    end
+  end
+end
+local parts = {}
+for key, value in pairs(counts) do parts[#parts + 1] = string.format('"%s": %d', key, value) end
+print("{" .. table.concat(parts, ", ") .. ', "names": [' .. table.concat(names, ", ")
+      .. '], "buffers": [' .. table.concat(buffers, ", ") .. "]}")
+"""
+
+
+def probe(lua, package_dir, tmp_path, fixture):
+    script = tmp_path / "probe.lua"
+    script.write_text(PROBE)
+    completed = subprocess.run([lua, str(script), str(fixture), str(package_dir)],
+                               capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["names"] = [bytes.fromhex(name) for name in result["names"]]
+    result["buffers"] = [bytes.fromhex(buffer) for buffer in result["buffers"]]
+    return result
+
+
+def test_lua_string_escapes_only_what_a_quoted_string_cannot_hold():
+    assert lua_string(b'a\\b"c\nd\re\0' + b"1\xff") == '"a\\092b\\034c\\010d\\013e\\0001\xff"'
+    assert lua_string("é") == '"\xc3\xa9"'
+
+
+def test_every_byte_survives_the_mock(lua, package_dir, tmp_path):
+    # Each NUL is followed by a digit, which a short \0 escape would swallow
+    name = bytes(range(256)) + b"\x001\x0012\\\"\r\n\x00"
+    midi = (pack_midi_event(0, 0, b"\xb0\x00\x31")
+            + pack_midi_event(10, 0, b"\x90\x3c\x40")
+            + pack_midi_event(480, 0, b"\x80\x3c\x00"))
+    path = tmp_path / "bytes.envfx"
+    with FixtureWriter(str(path), 120.0) as writer:
+        writer.add_track({"name": "Bytes"}, [{"takes": [
+            {"name": name, "source": "MIDI", "midi": midi},
+            {"name": name[::-1], "source": "WAVE"},
+        ]}])
+    assert path.read_bytes().startswith(FIXTURE_MAGIC.encode("ascii"))
+
+    result = probe(lua, package_dir, tmp_path, path)
+    assert result["names"] == [name, name[::-1]]
+    assert result["buffers"] == [midi]
+
+
+def test_generated_fixture_matches_its_summary(lua, package_dir, tmp_path):
+    path = tmp_path / "generated.envfx"
+    summary = generate_fixture(path, seed=7, tracks=40, items=4, takes=3, fx=2, markers=12,
+                               regions=3, midi_ratio=0.5, notes_per_second=4.0, length=60.0)
+    again = generate_fixture(tmp_path / "again.envfx", seed=7, tracks=40, items=4, takes=3,
+                             fx=2, markers=12, regions=3, midi_ratio=0.5,
+                             notes_per_second=4.0, length=60.0)
+    assert path.read_bytes() == (tmp_path / "again.envfx").read_bytes()
+    assert summary["midi_events"] == again["midi_events"] > 0
+
+    result = probe(lua, package_dir, tmp_path, path)
+    for key in ("tracks", "items", "takes", "fx", "markers", "midi_events"):
+        assert result[key] == summary[key], key
@@ -0,0 +1,171 @@
+"""Narrowing mock edits to the tests they can affect (impact.py)."""
+
+import pytest
+
+from envireament.impact import MOCK_SCRIPT, ImpactGraph, mock_impact, outline, parse_hunks
+
+MOCK = """\
+local EnhancedVirtualReaper = {}
+
+local VirtualState = {
+  notes = {},
+  tracks = {},
+}
+
+local function insert_event(take, event)
+  table.insert(VirtualState.notes, event)
+end
+
+local function track_name(track)
+  return track.name
+end
+
+mock_reaper = {
+  MIDI_InsertNote = function(take, note)
+    insert_event(take, note)
+    return true
+  end,
+  MIDI_InsertCC = function(take, cc)
+    insert_event(take, cc)
+    return true
+  end,
+  GetTrackName = function(track)
+    return track_name(track)
+  end,
+}
+
+function EnhancedVirtualReaper.create_environment()
+  return mock_reaper
+end
+
+for name in pairs(mock_reaper) do
+  EnhancedVirtualReaper[name] = true
+end
+
+return EnhancedVirtualReaper
+"""
+
+RENAMED = MOCK.replace("insert_event", "append_event")
+
+
+def line_of(source, text):
+    return source.splitlines().index(text) + 1
+
+
+def definition(source, name):
+    return next(d for d in outline(source) if d.name == name)
+
+
+@pytest.fixture
+def project(tmp_path):
+    """A package holding MOCK and one test per API."""
+    (tmp_path / MOCK_SCRIPT).write_text(MOCK)
+    tests = {}
+    for name, body in (("note", "reaper.MIDI_InsertNote(take, 60)"),
+                       ("cc", "reaper.MIDI_InsertCC(take, 1)"),
+                       ("track", "reaper.GetTrackName(track)")):
+        tests[name] = tmp_path / f"test_{name}.lua"
+        tests[name].write_text(body + "\n")
+    return tmp_path, tests
+
+
+def selected(project, impact):
+    package, tests = project
+    paths = list(tests.values())
+    reasons = ImpactGraph(package).build(paths).affected(paths, {package / MOCK_SCRIPT}, impact)
+    return {name for name, path in tests.items() if path.resolve() in reasons}
+
+
+def test_outline_splits_entries_and_shared_state():
+    names = {d.name: d for d in outline(MOCK)}
+    assert names["MIDI_InsertNote"].entry
+    assert names["VirtualState"].shared
+    assert not names["insert_event"].shared
+    assert names["create_environment"].exported
+
+
+def test_helper_edit_selects_tests_of_its_callers(project):
+    line = line_of(MOCK, "  table.insert(VirtualState.notes, event)")
+    impact = mock_impact(MOCK, MOCK, [(line, line)], [(line, line)])
+    assert not impact.everything
+    assert {"MIDI_InsertNote", "MIDI_InsertCC"} <= impact.names
+    assert "GetTrackName" not in impact.names
+    assert selected(project, impact) == {"note", "cc"}
+
+
+def test_api_edit_selects_only_its_tests(project):
+    line = line_of(MOCK, "    return track_name(track)")
+    impact = mock_impact(MOCK, MOCK, [(line, line)], [(line, line)])
+    assert selected(project, impact) == {"track"}
+
+
+def test_top_level_edit_selects_every_test(project):
+    line = line_of(MOCK, "  EnhancedVirtualReaper[name] = true")
+    impact = mock_impact(MOCK, MOCK, [(line, line)], [(line, line)])
+    assert impact.everything
+    assert selected(project, impact) == {"note", "cc", "track"}
+
+
+def test_shared_table_edit_selects_every_test(project):
+    line = line_of(MOCK, "  tracks = {},")
+    impact = mock_impact(MOCK, MOCK, [(line, line)], [(line, line)])
+    assert impact.everything and "VirtualState" in impact.reason
+    assert selected(project, impact) == {"note", "cc", "track"}
+
+
+def test_entry_point_edit_selects_every_test():
+    line = line_of(MOCK, "  return mock_reaper")
+    assert mock_impact(MOCK, MOCK, [(line, line)], [(line, line)]).everything
+
+
+def test_rename_keeps_callers_on_both_sides(project):
+    diff = "".join(
+        f"@@ -{line_of(MOCK, text)} +{line_of(RENAMED, text.replace('insert', 'append'))} @@\n"
+        for text in ("local function insert_event(take, event)",
+                     "    insert_event(take, note)", "    insert_event(take, cc)"))
+    old_lines, new_lines = parse_hunks(diff)
+    impact = mock_impact(MOCK, RENAMED, old_lines, new_lines)
+    assert {"insert_event", "append_event", "MIDI_InsertNote", "MIDI_InsertCC"} <= impact.names
+    assert selected(project, impact) == {"note", "cc"}
+
+
+def test_deleted_lines_are_mapped_on_the_old_side(project):
+    start = line_of(MOCK, "  GetTrackName = function(track)")
+    deleted = MOCK.splitlines(keepends=True)
+    del deleted[start - 1:start + 2]
+    old_lines, new_lines = parse_hunks(f"@@ -{start},3 +{start - 1},0 @@\n")
+    assert old_lines == [(start, start + 2)] and new_lines == []
+    impact = mock_impact(MOCK, "".join(deleted), old_lines, new_lines)
+    assert "GetTrackName" in impact.names
+    assert selected(project, impact) == {"track"}
+
+
+def test_deleted_helper_still_selects_its_callers(project):
+    first = definition(MOCK, "insert_event").first
+    old_lines, new_lines = parse_hunks(f"@@ -{first},3 +{first - 1},0 @@\n")
+    impact = mock_impact(MOCK, MOCK.replace(
+        "local function insert_event(take, event)\n"
+        "  table.insert(VirtualState.notes, event)\nend\n", ""), old_lines, new_lines)
+    assert selected(project, impact) == {"note", "cc"}
+
+
+def test_mock_module_edit_selects_every_test(project):
+    package, tests = project
+    (package / MOCK_SCRIPT).write_text('local engine = require("mock_engine")\n' + MOCK)
+    engine = package / "mock_engine.lua"
+    engine.write_text("return {}\n")
+    paths = list(tests.values())
+    reasons = ImpactGraph(package).build(paths).affected(paths, {engine})
+    assert {path.resolve() for path in paths} == set(reasons)
+    assert all("mock_engine.lua" in reason for reason in reasons.values())
+
+
+def test_engine_module_edit_selects_every_test(project):
+    package, tests = project
+    (package / MOCK_SCRIPT).write_text(
+        'local ok, engine = pcall(require_engine, "mock_engine")\n' + MOCK)
+    engine = package / "mock_engine.lua"
+    engine.write_text("return {}\n")
+    paths = list(tests.values())
+    reasons = ImpactGraph(package).build(paths).affected(paths, {engine})
+    assert {path.resolve() for path in paths} == set(reasons)
@@ -0,0 +1,158 @@
+"""Lint rules, the single-pass engine and its cache (lint.py)."""
+
+import io
+import os
+
+import pytest
+
+from envireament import lualex
+from envireament.lint import (Any, DeprecatedImGui, LintCache, LintEngine, PushPopBalance,
+                              Rule, UnknownApi, lint_files, lint_paths, suppressions)
+
+API = {"ImGui_PushStyleColor", "ImGui_PopStyleColor", "ImGui_PushID", "ImGui_PopID",
+       "GetTrack", "APIExists"}
+
+
+def lint(source, rules=None):
+    rules = rules if rules is not None else [PushPopBalance(), UnknownApi(API), DeprecatedImGui()]
+    return [(issue.line, issue.rule) for issue in LintEngine(rules).lint_source(source)]
+
+
+class Recorder(Rule):
+    id = "recorder"
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.seen = []
+
+    def match(self, state, tokens, i, report):
+        self.seen.append((tokens[i].line, tokens[i].value))
+
+
+def test_rule_needs_match():
+    class Incomplete(Rule):
+        id = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_patterns_are_offered_by_first_token():
+    by_value = Recorder((("reaper", ".", "GetTrack"),))
+    by_kind = Recorder(((Any(lualex.NUMBER),),))
+    LintEngine([by_value, by_kind]).lint_source(
+        'reaper.GetTrack(0, 1)\n'
+        'local s = "reaper.GetTrack"\n'
+        'reaper.GetTrackName(x)\n')
+    assert by_value.seen == [(1, "reaper")]
+    assert by_kind.seen == [(1, "0"), (1, "1")]
+
+
+def test_string_tokens_never_match_value_patterns():
+    rule = Recorder((("reaper",),))
+    LintEngine([rule]).lint_source('print("reaper")\nlocal x = reaper\n')
+    assert rule.seen == [(2, "reaper")]
+
+
+def test_push_pop_balance():
+    assert lint("reaper.ImGui_PushID(ctx, 1)\nreaper.ImGui_PopID(ctx)\n") == []
+    assert lint("reaper.ImGui_PushStyleColor(ctx, 0, 1)\n"
+                "reaper.ImGui_PushStyleColor(ctx, 1, 1)\n"
+                "reaper.ImGui_PopStyleColor(ctx, 2)\n") == []
+    assert lint("reaper.ImGui_PushID(ctx, 1)\nreaper.ImGui_PushID(ctx, 2)\n"
+                "reaper.ImGui_PopID(ctx)\n") == [(2, "push-pop-balance")]
+    assert lint("reaper.ImGui_PopID(ctx)\n") == [(1, "push-pop-balance")]
+    # A computed pop count cannot be checked
+    assert lint("reaper.ImGui_PushStyleColor(ctx, 0, 1)\n"
+                "reaper.ImGui_PopStyleColor(ctx, n)\n") == []
+
+
+def test_push_pop_balance_counts_each_branch():
+    source = ("reaper.ImGui_PushID(ctx, 1)\n"
+              "if x then\n  reaper.ImGui_PopID(ctx)\nelse\n  reaper.ImGui_PopID(ctx)\nend\n")
+    assert lint(source) == []
+    assert lint(source.replace("else\n", "elseif y then\n")) != []
+    assert lint("reaper.ImGui_PushID(ctx, 1)\n"
+                "if a then reaper.ImGui_PopID(ctx) elseif b then reaper.ImGui_PopID(ctx)\n"
+                "else reaper.ImGui_PopID(ctx) end\n") == []
+    # Nested blocks inside a branch close with their own end
+    assert lint("reaper.ImGui_PushID(ctx, 1)\n"
+                "if x then\n  for i = 1, 2 do f(i) end\n  reaper.ImGui_PopID(ctx)\n"
+                "else\n  local g = function() end\n  reaper.ImGui_PopID(ctx)\nend\n") == []
+
+
+def test_branch_only_mismatch_is_a_warning():
+    issues = LintEngine([PushPopBalance()]).lint_source(
+        "if dim then reaper.ImGui_PushStyleColor(ctx, 0, 1) end\n"
+        "reaper.ImGui_Text(ctx, 'x')\n"
+        "if dim then reaper.ImGui_PopStyleColor(ctx) end\n")
+    assert [(issue.line, issue.severity) for issue in issues] == [(1, "warning")]
+    # Unbalanced on every path is still an error
+    issues = LintEngine([PushPopBalance()]).lint_source(
+        "reaper.ImGui_PushID(ctx, 1)\nreaper.ImGui_PushID(ctx, 2)\n"
+        "if x then reaper.ImGui_PopID(ctx) else reaper.ImGui_PopID(ctx) end\n")
+    assert [issue.severity for issue in issues] == ["error"]
+
+
+def test_unknown_api_and_guards():
+    assert lint("reaper.GetTrack(0, 0)\nreaper.NotInMock(1)\n") == [(2, "unknown-api")]
+    assert lint("if reaper.NotInMock then reaper.NotInMock() end\n") == []
+    assert lint('if reaper.APIExists("NotInMock") then reaper.NotInMock() end\n') == []
+
+
+def test_deprecated_imgui():
+    assert lint("reaper.ImGui_PushAllowKeyboardFocus(ctx, true)\n"
+                "reaper.ImGui_PopAllowKeyboardFocus(ctx)\n",
+                [DeprecatedImGui()]) == [(1, "deprecated-imgui"), (2, "deprecated-imgui")]
+
+
+def test_suppressions_parse_ids():
+    assert suppressions("a()\nb() -- envireament-lint: disable=push-pop-balance,unknown-api\n"
+                        "c() --envireament-lint:disable=all\n") == {
+        2: {"push-pop-balance", "unknown-api"}, 3: {"all"}}
+
+
+def test_suppressed_line_leaves_the_balance():
+    source = ("reaper.ImGui_PushID(ctx, 1)\n"
+              "reaper.ImGui_PushID(ctx, 2) -- envireament-lint: disable=push-pop-balance\n"
+              "reaper.ImGui_PopID(ctx)\n")
+    assert lint(source) == []
+    # Another rule's id does not silence this one
+    assert lint(source.replace("push-pop-balance", "unknown-api")) == [(2, "push-pop-balance")]
+
+
+def test_suppression_drops_reports_on_the_line():
+    assert lint("reaper.NotInMock(1) -- envireament-lint: disable=unknown-api\n") == []
+    assert lint("reaper.NotInMock(1) -- envireament-lint: disable=all\n") == []
+    assert lint("reaper.NotInMock(1) -- envireament-lint: disable=deprecated-imgui\n") == [
+        (1, "unknown-api")]
+
+
+def test_cache_reuses_unchanged_files(tmp_path):
+    script = tmp_path / "script.lua"
+    script.write_text("reaper.ImGui_PopID(ctx)\n")
+    index = tmp_path / "lint.json"
+    cache = LintCache(index, "fp")
+    first = lint_files([script], API, jobs=1, cache=cache)
+    assert [issue.rule for issue in first[script]] == ["push-pop-balance"]
+    assert cache.hits == 0
+    cache.save()
+
+    cache = LintCache(index, "fp")
+    again = lint_files([script], API, jobs=1, cache=cache)
+    assert cache.hits == 1 and [issue.line for issue in again[script]] == [1]
+
+    # Touched but not edited: the content hash still matches
+    stat = os.stat(script)
+    os.utime(script, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert LintCache(index, "fp").lookup(script) is not None
+
+    script.write_text("reaper.ImGui_PushID(ctx)\nreaper.ImGui_PopID(ctx)\n")
+    assert LintCache(index, "fp").lookup(script) is None
+    # A different rule set or mock API discards the index
+    assert LintCache(index, "other").files == {}
+
+
+def test_repository_lints_clean(package_dir, tmp_path):
+    assert lint_paths([package_dir / "enhanced_test_runner.lua"], package_dir, jobs=1,
+                      cache_path=tmp_path / "lint.json", stream=io.StringIO())
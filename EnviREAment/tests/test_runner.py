@@ -0,0 +1,36 @@
+"""Test files run side by side in one Lua process (runner.py --sessions batches)."""
+
+from envireament import runner
+from envireament.runner import FAILED, PASSED, TIMEOUT, run_session_batch
+
+PASSING = "local n = 0\nlocal function loop() n = n + 1 if n < 3 then reaper.defer(loop) end end\nloop()\n"
+
+
+def write_tests(tmp_path, bodies):
+    paths = []
+    for index, body in enumerate(bodies):
+        path = tmp_path / f"test_{index}.lua"
+        path.write_text(body)
+        paths.append(path)
+    return paths
+
+
+def test_hung_file_times_out_in_its_own_session(lua, package_dir, tmp_path, monkeypatch):
+    paths = write_tests(tmp_path, [PASSING, "reaper.defer(function() while true do end end)\n",
+                                   PASSING])
+    reruns = []
+    monkeypatch.setattr(runner, "run_test_file", lambda path, *args: reruns.append(path))
+
+    results = run_session_batch(paths, package_dir, lua, timeout=1)
+    assert [result.status for result in results] == [PASSED, TIMEOUT, PASSED]
+    assert "Timed out after 1s" in results[1].output
+    assert reruns == []
+
+
+def test_files_are_run_again_after_a_crash(lua, package_dir, tmp_path):
+    # The real os, not the session's: exiting ends the whole process
+    paths = write_tests(tmp_path, [PASSING, 'require("os").exit(3)\n'])
+
+    results = run_session_batch(paths, package_dir, lua, timeout=10)
+    assert [result.status for result in results] == [PASSED, FAILED]
+    assert results[1].returncode == 3
@@ -0,0 +1,96 @@
+"""JSON-RPC round trips against a real envireament_host.lua."""
+
+import pytest
+
+from envireament.session import Handle, Session, SessionError
+
+
+@pytest.fixture
+def session(lua, package_dir):
+    with Session(lua=lua, package_dir=package_dir, timeout=10) as session:
+        yield session
+
+
+def test_handle_is_reused_across_a_batch(session):
+    track = session.reaper.GetTrack(0, 0)
+    assert isinstance(track, Handle)
+
+    with session.batch() as batch:
+        again = batch.call("GetTrack", 0, 0)
+        batch.call("SetMediaTrackInfo_Value", track, "D_VOL", 0.5)
+        volume = batch.call("GetMediaTrackInfo_Value", track, "D_VOL")
+        batch.call("SetTrackName", track, "Bass")
+        name = batch.call("GetTrackName", track)
+
+    assert again.result(10) == track
+    assert volume.result(10) == 0.5
+    assert name.result(10) == "Bass"
+    # The handle still points at the same track after the batch
+    assert session.call("GetTrackName", track) == "Bass"
+
+
+def test_batch_error_does_not_abort_other_items(session):
+    batch = session.batch()
+    before = batch.call("CountTracks", 0)
+    missing = batch.call("NoSuchFunction", 1)
+    failing = batch.request("run_script", "/nonexistent/script.lua")
+    after = batch.request("ping")
+    futures = batch.send()
+
+    assert len(futures) == 4
+    assert isinstance(before.result(10), int)
+    with pytest.raises(SessionError) as error:
+        missing.result(10)
+    assert error.value.code == -32601
+    with pytest.raises(SessionError) as error:
+        failing.result(10)
+    assert error.value.code == -32000
+    assert after.result(10) == "pong"
+
+
+def test_unknown_handle_resolves_to_nil(session):
+    assert session.call("ValidatePtr", Handle(9999), "MediaTrack*") is False
+
+
+def test_run_test_does_not_leak_globals(session, tmp_path):
+    leaky = tmp_path / "test_leaky.lua"
+    leaky.write_text(
+        'LEAKED_GLOBAL = 42\n'
+        'package.loaded["leaky_module"] = {}\n'
+        'print("leaking")\n')
+    clean = tmp_path / "test_clean.lua"
+    clean.write_text(
+        'assert(LEAKED_GLOBAL == nil, "global leaked")\n'
+        'assert(package.loaded["leaky_module"] == nil, "module leaked")\n'
+        'assert(reaper.CountTracks(0) > 0, "fresh environment expected")\n')
+
+    passed, output = session.run_test(leaky)
+    assert passed is True
+    assert "leaking" in output
+    passed, output = session.run_test(clean)
+    assert passed is True, output
+    # Globals set from the session itself are gone after run_test too
+    assert session.request("run_script", str(leaky)) is None
+    passed, output = session.run_test(clean)
+    assert passed is True, output
+
+
+def test_failing_test_reports_output(session, tmp_path):
+    failing = tmp_path / "test_failing.lua"
+    failing.write_text('error("boom")\n')
+    passed, output = session.run_test(failing)
+    assert passed is False
+    assert "boom" in output
+
+
+def test_write_to_exited_host_raises_session_error(session):
+    session._process.kill()
+    session._process.wait()
+    session._reader.join(10)
+
+    with pytest.raises(SessionError):
+        session.request_async("ping")
+    with pytest.raises(SessionError):
+        session.call_many([("CountTracks", 0), ("CountTracks", 0)])
+    # The failed requests are not left waiting for a reply
+    assert session._pending == {}
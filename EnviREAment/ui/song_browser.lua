@@ -53,6 +53,7 @@ local state = {
   show_details = true,
   show_metadata_editor = false,
   show_section_preview = false, -- Toggle for section preview panel
+  list_clipper = nil, -- ImGui_ListClipper for the song list, recreated with the context
   editing_metadata = false,
   edit_buffer = {
     title = "",
@@ -61,6 +62,8 @@ local state = {
     tags = ""
   },
   loading = false,
+  load = nil, -- The load in progress: {thread, phase, found, total, processed, failed, collapsed, deadline}
+  last_load = nil, -- The last load that ended, for its progress
   error = nil,
   loaded = false,  scan_paths = {}, -- Will be populated with paths to scan
   available_tags = {},  -- All tags found across all songs
@@ -78,6 +81,24 @@ local state = {
   }
 }
 
+-- Loading runs as a coroutine: each defer cycle resumes it for at most
+-- LOAD_SLICE_SECONDS of crawling and parsing (wall-clock time, by
+-- time_precise; os.clock is process CPU time in REAPER), then it yields so
+-- the UI keeps drawing. Songs show up in the list as they are parsed.
+local LOAD_SLICE_SECONDS = 0.004
+
+-- Written to the songbase folder by `envireament dataset dedupe`: maps
+-- each duplicate file (path relative to the folder) to its canonical copy
+local DEDUPE_MAP_NAME = "songbase_dedupe.json"
+
+-- Yields once the running load has used up its slice
+local function pause_loading()
+  local load = state.load
+  if load and reaper.time_precise() >= load.deadline and coroutine.isyieldable() then
+    coroutine.yield()
+  end
+end
+
 -- Find all JCRD files in directories
 local function find_jcrd_files(directory, results)
   results = results or {}
@@ -97,6 +118,7 @@ local function find_jcrd_files(directory, results)
       if not filename then break end
       table.insert(files, filename)
       idx = idx + 1
+      pause_loading()
     end
   end
   
@@ -111,6 +133,7 @@ local function find_jcrd_files(directory, results)
          not filename:match("^recent_") and not filename:match("^manifest_") and
          not filename:match("^config_") then
         table.insert(results, filepath)
+        if state.load then state.load.found = state.load.found + 1 end
       end
     end
   end
@@ -126,6 +149,7 @@ local function find_jcrd_files(directory, results)
       if not dirname then break end
       table.insert(dirs, dirname)
       idx = idx + 1
+      pause_loading()
     end
   end
   
@@ -138,18 +162,13 @@ local function find_jcrd_files(directory, results)
   return results
 end
 
--- Load song data
-local function load_songs()
-  state.loading = true
-  state.songs = {}
-  state.error = nil
-  state.available_tags = {}
-  state.available_keys = {}
-  
-  -- Paths to scan
+-- Paths to scan: the songbase folders, then custom paths from settings;
+-- also returns the songbase folder
+local function get_scan_paths()
   -- Build scan paths using file_ops.join_path for correct OS separators
   local base = reaper.GetResourcePath()
   local root = base
+  local paths
   if file_ops and file_ops.join_path then
     root = file_ops.join_path(base, "Scripts", "songbase")
     paths = {
@@ -159,6 +178,7 @@ local function load_songs()
     }
   else
     -- Fallback to default forward-slash paths
+    root = base .. "/Scripts/songbase"
     paths = {
       base .. "/Scripts/songbase/datasets",
       base .. "/Scripts/songbase/examples",
@@ -188,85 +208,92 @@ local function load_songs()
     end
   end
   
-  -- Find all files
-  local all_files = {}
-  for _, path in ipairs(paths) do
-    local files_found = find_jcrd_files(path, {})
-    reaper.ShowConsoleMsg("  Found " .. #files_found .. " files in " .. path .. "\n")
-    for _, file in ipairs(files_found) do
-      table.insert(all_files, file)
-    end
+  return paths, root
+end
+
+-- The duplicates table of the songbase folder's dedupe map, or nil
+local function read_dedupe_map(root)
+  if not file_ops.read_file then
+    return nil
+  end
+  local path = file_ops.join_path and file_ops.join_path(root, DEDUPE_MAP_NAME) or
+    root .. "/" .. DEDUPE_MAP_NAME
+  local content = file_ops.read_file(path)
+  if not content then
+    return nil
+  end
+  local success, data = pcall(function() return json.decode(content) end)
+  if not success or type(data) ~= "table" or type(data.duplicates) ~= "table" then
+    reaper.ShowConsoleMsg("Song Browser: Ignoring unreadable " .. path .. "\n")
+    return nil
+  end
+  return data.duplicates
+end
+
+-- filepath relative to root with forward slashes, as the dedupe map writes it
+local function relative_path(filepath, root)
+  filepath, root = filepath:gsub("\\", "/"), root:gsub("\\", "/")
+  if filepath:sub(1, #root + 1) == root .. "/" then
+    return filepath:sub(#root + 2)
+  end
+  return filepath
+end
+
+-- Parse one song file; returns the song, or nil and why it failed
+local function load_song_file(filepath)
+  if not file_ops.read_file then
+    return nil, "file_ops.read_file not available"
   end
   
-  reaper.ShowConsoleMsg("Song Browser: Total files to process: " .. #all_files .. "\n")
+  -- Load file contents
+  local content = file_ops.read_file(filepath)
+  if not content then
+    return nil, "Failed to read file content"
+  end
   
-  -- Load each file
-  local successful_loads = 0
-  local failed_loads = 0
-  for _, filepath in ipairs(all_files) do
-    -- Debug: Log which file we're processing
-    reaper.ShowConsoleMsg("Processing: " .. filepath .. "\n")
-    
-    -- Load file contents
-    if file_ops.read_file then
-      local content = file_ops.read_file(filepath)
-      if content then
-        local success, data = pcall(function() return json.decode(content) end)
-        if success and data then
-          -- Extract song metadata
-          local song = {
-            path = filepath,
-            filename = filepath:match("([^/\\]+)$"),
-            title = data.title or data.name or filepath:match("([^/\\]+)%.%w+$"):gsub("%.%w+$", ""),
-            artist = data.artist or data.performer or "Unknown",
-            key = data.key or "Unknown",
-            sections = data.sections or {},
-            tags = data.tags or {},
-            modified = os.time(),
-            chords = {},
-            data = data -- Store the full data for reference
-          }
-          
-          -- Extract chords from sections if available
-          if song.sections and #song.sections > 0 then
-            for _, section in ipairs(song.sections) do
-              if section.chords and #section.chords > 0 then
-                for _, chord in ipairs(section.chords) do
-                  if chord.symbol then
-                    table.insert(song.chords, chord.symbol)
-                  end
-                end
-              end
-            end
-          end
-          
-          -- Record available tags and keys for filtering
-          if song.tags and #song.tags > 0 then
-            for _, tag in ipairs(song.tags) do
-              state.available_tags[tag] = true
-            end
-          end
-          
-          if song.key and song.key ~= "Unknown" then
-            state.available_keys[song.key] = true
+  local success, data = pcall(function() return json.decode(content) end)
+  if not success or not data then
+    return nil, "Failed to parse JSON: " .. tostring(data)
+  end
+  
+  -- Extract song metadata
+  local song = {
+    path = filepath,
+    filename = filepath:match("([^/\\]+)$"),
+    title = data.title or data.name or filepath:match("([^/\\]+)%.%w+$"):gsub("%.%w+$", ""),
+    artist = data.artist or data.performer or "Unknown",
+    key = data.key or "Unknown",
+    sections = data.sections or {},
+    tags = data.tags or {},
+    modified = os.time(),
+    chords = {},
+    data = data -- Store the full data for reference
+  }
+  
+  -- Extract chords from sections if available
+  if song.sections and #song.sections > 0 then
+    for _, section in ipairs(song.sections) do
+      if section.chords and #section.chords > 0 then
+        for _, chord in ipairs(section.chords) do
+          if chord.symbol then
+            table.insert(song.chords, chord.symbol)
           end
-            -- Add to collection
-          table.insert(state.songs, song)
-          successful_loads = successful_loads + 1
-        else
-          failed_loads = failed_loads + 1
-          reaper.ShowConsoleMsg("  Failed to parse JSON: " .. tostring(data) .. "\n")
         end
-      else
-        failed_loads = failed_loads + 1
-        reaper.ShowConsoleMsg("  Failed to read file content\n")
       end
-    else
-      failed_loads = failed_loads + 1
-      reaper.ShowConsoleMsg("  file_ops.read_file not available\n")
     end
   end
   
+  return song
+end
+
+-- Ends a load, finished or cancelled; the songs loaded so far are kept
+local function finish_loading(load, cancelled)
+  if state.load == load then
+    state.load = nil
+  end
+  load.phase = cancelled and "cancelled" or "done"
+  state.last_load = load
+  
   -- Update stats
   state.stats.total_songs = #state.songs
   state.stats.total_sections = 0
@@ -280,14 +307,134 @@ local function load_songs()
   -- Complete loading
   state.loading = false
   state.loaded = true
-    -- Log results
-  reaper.ShowConsoleMsg("Song Browser: Loaded " .. successful_loads .. " songs from " .. #all_files .. " files")
-  if failed_loads > 0 then
-    reaper.ShowConsoleMsg(" (" .. failed_loads .. " failed)")
+  
+  -- Log results
+  reaper.ShowConsoleMsg("Song Browser: Loaded " .. (load.processed - load.failed) .. " songs from " .. load.total .. " files")
+  if load.failed > 0 then
+    reaper.ShowConsoleMsg(" (" .. load.failed .. " failed)")
+  end
+  if load.collapsed > 0 then
+    reaper.ShowConsoleMsg(" (" .. load.collapsed .. " duplicates collapsed)")
+  end
+  if cancelled then
+    reaper.ShowConsoleMsg(" - cancelled after " .. load.processed .. " files")
   end
   reaper.ShowConsoleMsg("\n")
+end
+
+-- The body of a load: crawl every path, then parse file by file, skipping
+-- files the dedupe map collapses into a canonical copy that was found
+local function run_load(load, paths, root)
+  -- Find all files
+  local all_files = {}
+  for _, path in ipairs(paths) do
+    local files_found = find_jcrd_files(path, {})
+    reaper.ShowConsoleMsg("  Found " .. #files_found .. " files in " .. path .. "\n")
+    for _, file in ipairs(files_found) do
+      table.insert(all_files, file)
+    end
+  end
   
-  return successful_loads > 0
+  reaper.ShowConsoleMsg("Song Browser: Total files to process: " .. #all_files .. "\n")
+  load.phase = "parsing"
+  load.total = #all_files
+  
+  -- Collapse duplicates: relative path => skipped, and canonical path =>
+  -- the relative paths of its copies
+  local relative, found, skipped, copies = {}, {}, {}, {}
+  local duplicates = read_dedupe_map(root)
+  if duplicates then
+    for i, filepath in ipairs(all_files) do
+      relative[i] = relative_path(filepath, root)
+      found[relative[i]] = true
+      pause_loading()
+    end
+    for _, path in ipairs(relative) do
+      local entry = duplicates[path]
+      if type(entry) == "table" and entry.of ~= path and found[entry.of] then
+        skipped[path] = true
+        copies[entry.of] = copies[entry.of] or {}
+        table.insert(copies[entry.of], path)
+      end
+    end
+  end
+  
+  -- Load each file
+  for i, filepath in ipairs(all_files) do
+    local song, err
+    if skipped[relative[i]] then
+      load.collapsed = load.collapsed + 1
+    else
+      song, err = load_song_file(filepath)
+      if song and relative[i] then
+        song.duplicates = copies[relative[i]]
+      end
+    end
+    if song then
+      -- Record available tags and keys for filtering
+      if song.tags and #song.tags > 0 then
+        for _, tag in ipairs(song.tags) do
+          state.available_tags[tag] = true
+        end
+      end
+      
+      if song.key and song.key ~= "Unknown" then
+        state.available_keys[song.key] = true
+      end
+      -- Add to collection
+      table.insert(state.songs, song)
+    elseif err then
+      load.failed = load.failed + 1
+      reaper.ShowConsoleMsg("  " .. filepath .. ": " .. err .. "\n")
+    end
+    load.processed = load.processed + 1
+    pause_loading()
+  end
+  
+  finish_loading(load, false)
+end
+
+-- Runs the current load for one slice; returns true while it goes on
+local function resume_loading()
+  local load = state.load
+  if not load then
+    return false
+  end
+  
+  load.deadline = reaper.time_precise() + LOAD_SLICE_SECONDS
+  local ok, err = coroutine.resume(load.thread)
+  if not ok then
+    state.error = "Loading failed: " .. tostring(err)
+    finish_loading(load, true)
+  end
+  return state.load == load
+end
+
+-- Stops the current load, keeping the songs it loaded
+local function cancel_loading()
+  local load = state.load
+  if load then
+    finish_loading(load, true)
+  end
+end
+
+-- Load song data: starts a new load (dropping one in progress) and runs
+-- its first slice; the rest runs as the browser draws
+local function load_songs()
+  state.load = nil
+  state.loading = true
+  state.songs = {}
+  state.error = nil
+  state.available_tags = {}
+  state.available_keys = {}
+  
+  local paths, root = get_scan_paths()
+  local load = {phase = "scanning", found = 0, total = 0, processed = 0, failed = 0,
+                collapsed = 0, deadline = 0}
+  load.thread = coroutine.create(function() run_load(load, paths, root) end)
+  state.load = load
+  resume_loading()
+  return true
 end
 
 -- Extract chord progression as text from a section
@@ -326,97 +473,129 @@ local function export_section_to_reaper(song, section_index)
   return utils.reaper.create_midi_item(track_name, section.chords, section.tempo or 120)
 end
 
--- Filter songs based on current search query and filters
-local function filter_songs()
-  if not state.loaded or #state.songs == 0 then
-    state.stats.filtered_count = 0
-    return {}
-  end
-  
-  local results = {}
-  local query = state.query:lower()
-  
-  -- Filter songs
-  for _, song in ipairs(state.songs) do
-    local include = true
+-- Whether a song passes the search query (lowercased) and the filters
+local function song_matches(song, query)
+  local include = true
+  
+  -- Text search
+  if query ~= "" then
+    local matchesTitle = song.title and song.title:lower():find(query, 1, true)
+    local matchesArtist = song.artist and song.artist:lower():find(query, 1, true)
+    local matchesKey = song.key and song.key:lower():find(query, 1, true)
     
-    -- Text search
-    if query ~= "" then
-      local matchesTitle = song.title and song.title:lower():find(query, 1, true)
-      local matchesArtist = song.artist and song.artist:lower():find(query, 1, true)
-      local matchesKey = song.key and song.key:lower():find(query, 1, true)
-      
-      -- Match against tags
-      local matchesTags = false
-      if song.tags then
-        for _, tag in ipairs(song.tags) do
-          if tag:lower():find(query, 1, true) then
-            matchesTags = true
-            break
-          end
-        end
-      end
-      
-      -- Match against chords
-      local matchesChords = false
-      if song.chords then
-        for _, chord in ipairs(song.chords) do
-          if chord:lower():find(query, 1, true) then
-            matchesChords = true
-            break
-          end
+    -- Match against tags
+    local matchesTags = false
+    if song.tags then
+      for _, tag in ipairs(song.tags) do
+        if tag:lower():find(query, 1, true) then
+          matchesTags = true
+          break
         end
       end
-      
-      include = matchesTitle or matchesArtist or matchesKey or matchesTags or matchesChords
     end
     
-    -- Filter by tags
-    if include and #state.filter_tags > 0 and song.tags then
-      local hasTag = false
-      for _, filterTag in ipairs(state.filter_tags) do
-        for _, songTag in ipairs(song.tags) do
-          if songTag:lower() == filterTag:lower() then
-            hasTag = true
-            break
-          end
+    -- Match against chords
+    local matchesChords = false
+    if song.chords then
+      for _, chord in ipairs(song.chords) do
+        if chord:lower():find(query, 1, true) then
+          matchesChords = true
+          break
         end
-        if hasTag then break end
       end
-      include = hasTag
     end
     
-    -- Filter by keys
-    if include and #state.filter_keys > 0 and song.key then
-      local matchesKey = false
-      for _, filterKey in ipairs(state.filter_keys) do
-        if song.key:lower() == filterKey:lower() then
-          matchesKey = true
+    include = matchesTitle or matchesArtist or matchesKey or matchesTags or matchesChords
+  end
+  
+  -- Filter by tags
+  if include and #state.filter_tags > 0 and song.tags then
+    local hasTag = false
+    for _, filterTag in ipairs(state.filter_tags) do
+      for _, songTag in ipairs(song.tags) do
+        if songTag:lower() == filterTag:lower() then
+          hasTag = true
           break
         end
       end
-      include = matchesKey
+      if hasTag then break end
     end
-    
-    -- Include this song if it passed all filters
-    if include then
+    include = hasTag
+  end
+  
+  -- Filter by keys
+  if include and #state.filter_keys > 0 and song.key then
+    local matchesKey = false
+    for _, filterKey in ipairs(state.filter_keys) do
+      if song.key:lower() == filterKey:lower() then
+        matchesKey = true
+        break
+      end
+    end
+    include = matchesKey
+  end
+  
+  return include
+end
+
+-- Sort songs in place by state.sorting; each song's key is computed once
+local function sort_songs(songs)
+  local sorting = state.sorting
+  if sorting == "modified" then
+    table.sort(songs, function(a, b) return (a.modified or 0) > (b.modified or 0) end)
+    return
+  end
+  if sorting ~= "title" and sorting ~= "artist" and sorting ~= "key" then
+    return
+  end
+  local keys = {}
+  for _, song in ipairs(songs) do
+    keys[song] = (song[sorting] or ""):lower()
+  end
+  table.sort(songs, function(a, b) return keys[a] < keys[b] end)
+end
+
+-- The last filter results. While songs are only appended (as during a
+-- load) just the new ones are filtered, and results are sorted once no
+-- load is running, so a frame never refilters and resorts the library.
+local filter_cache = {key = nil, songs = nil, count = 0, results = {}, sorted = false}
+
+-- Forget the cached results, e.g. after a song's metadata changed
+local function invalidate_filter()
+  filter_cache.key = nil
+end
+
+-- Filter songs based on current search query and filters
+local function filter_songs()
+  if #state.songs == 0 then
+    state.stats.filtered_count = 0
+    return {}
+  end
+  
+  local query = state.query:lower()
+  local key = table.concat({query, state.sorting, table.concat(state.filter_tags, "\1"),
+                            table.concat(state.filter_keys, "\1")}, "\0")
+  local cache = filter_cache
+  if cache.key ~= key or cache.songs ~= state.songs or cache.count > #state.songs then
+    cache.key, cache.songs, cache.count, cache.results, cache.sorted = key, state.songs, 0, {}, false
+  end
+  
+  -- Filter songs added since the last call
+  local results = cache.results
+  for i = cache.count + 1, #state.songs do
+    local song = state.songs[i]
+    if song_matches(song, query) then
       table.insert(results, song)
+      cache.sorted = false
     end
   end
+  cache.count = #state.songs
   
   -- Sort results
-  table.sort(results, function(a, b)
-    if state.sorting == "title" then
-      return (a.title or ""):lower() < (b.title or ""):lower()
-    elseif state.sorting == "artist" then
-      return (a.artist or ""):lower() < (b.artist or ""):lower()
-    elseif state.sorting == "key" then
-      return (a.key or ""):lower() < (b.key or ""):lower()
-    elseif state.sorting == "modified" then
-      return (a.modified or 0) > (b.modified or 0)
-    end
-    return false
-  end)
+  if not cache.sorted and not state.load then
+    sort_songs(results)
+    cache.sorted = true
+  end
   
   state.stats.filtered_count = #results
   return results
@@ -594,6 +773,7 @@ local function render_metadata_editor(ctx, song)
       end
     end
     song.tags = tags
+    invalidate_filter()
     
     -- Save to file
     save_metadata(song)
@@ -659,9 +839,22 @@ function song_browser.draw(ctx, ui_state)
   end
   
   -- Show loading state
-  if state.loading then
+  if state.load then
+    resume_loading()
+  end
+  local load = state.load
+  if load then
     reaper.ImGui_SameLine(ctx)
-    reaper.ImGui_Text(ctx, "Loading...")
+    if load.phase == "scanning" then
+      reaper.ImGui_Text(ctx, "Scanning... " .. load.found .. " files found")
+    else
+      local fraction = load.total > 0 and load.processed / load.total or 1
+      reaper.ImGui_ProgressBar(ctx, fraction, 200, 0, load.processed .. " / " .. load.total)
+    end
+    reaper.ImGui_SameLine(ctx)
+    if reaper.ImGui_Button(ctx, "Cancel##song_browser_load") then
+      cancel_loading()
+    end
   end
   
   -- Show error if any
@@ -746,23 +939,34 @@ function song_browser.draw(ctx, ui_state)
   -- For ImGui_BeginChild, ensure the 'border' argument (5th) is a number (0 or 1)
   -- Assuming signature: reaper.ImGui_BeginChild(ctx, id, width, height, border_as_number, flags_as_number)
   if reaper.ImGui_BeginChild(ctx, "song_list", list_width, 0, 1, 0) then -- Using 1 for border=true
-    -- Song list
+    -- Song list: the clipper only hands out the rows that are on screen,
+    -- so large libraries cost the same per frame as small ones
     local filtered_songs = filter_songs()
-    for i, song in ipairs(filtered_songs) do
-      local is_selected = state.selected_song == song
-      if reaper.ImGui_Selectable(ctx, song.title .. "##" .. i, is_selected) then
-        state.selected_song = song
-      end      -- Tooltip with basic info
-      if reaper.ImGui_IsItemHovered(ctx) then
-        reaper.ImGui_BeginTooltip(ctx)
-        reaper.ImGui_Text(ctx, song.artist or "")
-        reaper.ImGui_Text(ctx, "Key: " .. (song.key or "Unknown"))
-        local chord_count = song.chords and #song.chords or 0
-        local section_count = song.sections and #song.sections or 0
-        reaper.ImGui_Text(ctx, chord_count .. " chords in " .. section_count .. " sections")
-        reaper.ImGui_EndTooltip(ctx)
+    if not reaper.ImGui_ValidatePtr(state.list_clipper, "ImGui_ListClipper*") then
+      state.list_clipper = reaper.ImGui_CreateListClipper(ctx)
+    end
+    local clipper = state.list_clipper
+    reaper.ImGui_ListClipper_Begin(clipper, #filtered_songs)
+    while reaper.ImGui_ListClipper_Step(clipper) do
+      local display_start, display_end = reaper.ImGui_ListClipper_GetDisplayRange(clipper)
+      for i = display_start + 1, display_end do
+        local song = filtered_songs[i]
+        local is_selected = state.selected_song == song
+        if reaper.ImGui_Selectable(ctx, song.title .. "##" .. i, is_selected) then
+          state.selected_song = song
+        end      -- Tooltip with basic info
+        if reaper.ImGui_IsItemHovered(ctx) then
+          reaper.ImGui_BeginTooltip(ctx)
+          reaper.ImGui_Text(ctx, song.artist or "")
+          reaper.ImGui_Text(ctx, "Key: " .. (song.key or "Unknown"))
+          local chord_count = song.chords and #song.chords or 0
+          local section_count = song.sections and #song.sections or 0
+          reaper.ImGui_Text(ctx, chord_count .. " chords in " .. section_count .. " sections")
+          reaper.ImGui_EndTooltip(ctx)
+        end
       end
     end
+    reaper.ImGui_ListClipper_End(clipper)
     reaper.ImGui_EndChild(ctx)
   end
   
@@ -780,6 +984,11 @@ function song_browser.draw(ctx, ui_state)
       reaper.ImGui_Text(ctx, "Artist: " .. (state.selected_song.artist or "Unknown"))
       reaper.ImGui_Text(ctx, "Key: " .. (state.selected_song.key or "Unknown"))
       reaper.ImGui_Text(ctx, "File: " .. file_ops.get_filename(state.selected_song.path or ""))
+      local copies = state.selected_song.duplicates
+      if copies then
+        reaper.ImGui_Text(ctx, "Also in: " .. table.concat(copies, ", ", 1, math.min(#copies, 3)) ..
+          (#copies > 3 and (" and " .. (#copies - 3) .. " more") or ""))
+      end
       
       reaper.ImGui_Separator(ctx)
       
@@ -884,6 +1093,35 @@ function song_browser.draw(ctx, ui_state)
   return true
 end
 
+-- Run the current load for one slice, for hosts that load without
+-- drawing; returns true while loading goes on
+function song_browser.update_loading()
+  return resume_loading()
+end
+
+-- Stop loading, keeping the songs loaded so far
+function song_browser.cancel_loading()
+  cancel_loading()
+end
+
+-- Progress of the current load, or of the last one when none is running:
+-- phase is "scanning", "parsing", "done", "cancelled" or "idle", and
+-- collapsed counts files skipped as duplicates of another
+function song_browser.get_load_progress()
+  local load = state.load or state.last_load or
+    {phase = "idle", found = 0, total = 0, processed = 0, failed = 0, collapsed = 0}
+  return {
+    loading = state.load ~= nil,
+    phase = load.phase,
+    found = load.found,
+    total = load.total,
+    processed = load.processed,
+    failed = load.failed,
+    collapsed = load.collapsed,
+    songs = #state.songs
+  }
+end
+
 -- Shutdown function
 function song_browser.shutdown()
   -- Save state if needed
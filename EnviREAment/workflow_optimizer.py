@@ -83,39 +83,41 @@ class WorkflowOptimizer:
         self.results['files'] = file_status
         
     def analyze_imgui_coverage(self):
-        """Analyze ImGui API coverage and completeness."""
+        """Analyze which ImGui functions the mock provides and the tests exercise."""
         print("📊 Analyzing ImGui API Coverage...")
         
         try:
-            # Read virtual reaper file
+            from envireament.apicov import DEFAULT_API_COVERAGE_DIR, coverage_report
+            
             vr_file = self.working_dir / 'enhanced_virtual_reaper.lua'
             if vr_file.exists():
-                content = vr_file.read_text(encoding='utf-8')
-                
-                # Count ImGui functions
-                import re
-                imgui_functions = re.findall(r'ImGui_(\w+)\s*=', content)
-                unique_functions = set(imgui_functions)
+                # Recorded by: envireament test --api-coverage
+                report = coverage_report([self.working_dir / DEFAULT_API_COVERAGE_DIR],
+                                         self.working_dir)
                 
-                # Categorize functions
-                categories = {
-                    'window': len([f for f in unique_functions if any(w in f.lower() for w in ['begin', 'end', 'window'])]),
-                    'widgets': len([f for f in unique_functions if any(w in f.lower() for w in ['button', 'text', 'input', 'slider'])]),
-                    'layout': len([f for f in unique_functions if any(w in f.lower() for w in ['same', 'next', 'separator', 'spacing'])]),
-                    'tables': len([f for f in unique_functions if 'table' in f.lower()]),
-                    'drawing': len([f for f in unique_functions if any(w in f.lower() for w in ['draw', 'line', 'rect', 'circle'])]),
-                    'other': len(unique_functions)
-                }
+                categories = {}
+                total = exercised = 0
+                for title, entry in report['categories'].items():
+                    names = [n for n in entry['exercised'] + entry['unused'] if n.startswith('ImGui_')]
+                    if not names:
+                        continue
+                    used = sum(1 for n in entry['exercised'] if n.startswith('ImGui_'))
+                    categories[title.lower()] = f"{used}/{len(names)}"
+                    total += len(names)
+                    exercised += used
                 
-                categories['other'] -= sum(v for k, v in categories.items() if k != 'other')
+                if report['runs']:
+                    estimate = f"{exercised / total * 100:.1f}% exercised by tests" if total else "n/a"
+                else:
+                    estimate = "unknown (run: envireament test --api-coverage)"
                 
                 self.results['imgui_coverage'] = {
-                    'total_functions': len(unique_functions),
+                    'total_functions': total,
                     'categories': categories,
-                    'coverage_estimate': f"{min(100, (len(unique_functions) / 500) * 100):.1f}%"
+                    'coverage_estimate': estimate
                 }
                 
-                print(f"✅ Found {len(unique_functions)} ImGui functions")
+                print(f"✅ Found {total} ImGui functions")
                 
         except Exception as e:
             print(f"⚠️  ImGui analysis error: {e}")